@@ -313,6 +313,29 @@ async def get_cohort_analysis(
             detail=f"Failed to get cohort analysis: {str(e)}"
         )
 
+@router.get("/funnel", response_model=List[Dict[str, Any]])
+async def get_funnel_analysis(
+    steps: Optional[List[str]] = Query(None, description="Funnel steps in order"),
+    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
+    window_days: int = Query(30, description="Days allowed to complete the funnel"),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get conversion funnel (visit -> generate -> publish -> pay by default)"""
+    
+    try:
+        start = datetime.fromisoformat(start_date) if start_date else None
+        end = datetime.fromisoformat(end_date) if end_date else None
+        
+        return await analytics_service.get_funnel_analysis(steps, start, end, window_days)
+        
+    except Exception as e:
+        logger.error(f"Failed to get funnel analysis: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to get funnel analysis: {str(e)}"
+        )
+
 @router.get("/predictions", response_model=PredictiveAnalytics)
 async def get_predictive_analytics(
     current_user: dict = Depends(get_current_user)
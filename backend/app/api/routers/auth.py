@@ -11,7 +11,8 @@ from datetime import datetime
 import logging
 
 from app.database import get_db
-from app.services.auth_service import auth_service
+from app.services.auth_service import auth_service, PasswordHashingBusy
+from app.services.principal_cache import principal_cache
 from app.models.user import User
 from sqlalchemy.orm import Session
 
@@ -107,6 +108,14 @@ class TokenResponse(BaseModel):
     expires_in: int
     user: Dict[str, Any]
 
+def _hashing_unavailable(exc: PasswordHashingBusy) -> HTTPException:
+    """503 for requests shed because password hashing is saturated"""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Authentication is temporarily overloaded, please retry",
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
 # Dependency to get current user
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
@@ -177,17 +186,20 @@ async def register(
     user_agent = req.headers.get("User-Agent")
     
     # Register user
-    user, error = await auth_service.register_user(
-        db=db,
-        email=request.email,
-        username=request.username,
-        password=request.password,
-        full_name=request.full_name,
-        company_name=request.company_name,
-        cpf=request.cpf,
-        cnpj=request.cnpj,
-        phone=request.phone
-    )
+    try:
+        user, error = await auth_service.register_user(
+            db=db,
+            email=request.email,
+            username=request.username,
+            password=request.password,
+            full_name=request.full_name,
+            company_name=request.company_name,
+            cpf=request.cpf,
+            cnpj=request.cnpj,
+            phone=request.phone
+        )
+    except PasswordHashingBusy as e:
+        raise _hashing_unavailable(e)
     
     if error:
         raise HTTPException(
@@ -195,16 +207,17 @@ async def register(
             detail=error
         )
     
-    # Auto-login after registration
-    tokens, error = await auth_service.authenticate_user(
-        db=db,
-        username_or_email=request.username,
-        password=request.password,
-        ip_address=client_ip,
-        user_agent=user_agent
-    )
-    
-    if error:
+    # Auto-login after registration; the password was just hashed, so no
+    # second bcrypt call can be shed with a 503 once the account exists
+    try:
+        tokens = auth_service.create_session(
+            db=db,
+            user=user,
+            ip_address=client_ip,
+            user_agent=user_agent
+        )
+    except Exception as e:
+        logger.error(f"Auto-login after registration failed: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Registration successful but login failed"
@@ -233,13 +246,16 @@ async def login(
     user_agent = req.headers.get("User-Agent") if req else None
     
     # Authenticate user
-    tokens, error = await auth_service.authenticate_user(
-        db=db,
-        username_or_email=form_data.username,
-        password=form_data.password,
-        ip_address=client_ip,
-        user_agent=user_agent
-    )
+    try:
+        tokens, error = await auth_service.authenticate_user(
+            db=db,
+            username_or_email=form_data.username,
+            password=form_data.password,
+            ip_address=client_ip,
+            user_agent=user_agent
+        )
+    except PasswordHashingBusy as e:
+        raise _hashing_unavailable(e)
     
     if error:
         raise HTTPException(
@@ -400,11 +416,14 @@ async def confirm_password_reset(
     
     Resets the password using the reset token
     """
-    success, error = await auth_service.reset_password(
-        db=db,
-        token=request.token,
-        new_password=request.new_password
-    )
+    try:
+        success, error = await auth_service.reset_password(
+            db=db,
+            token=request.token,
+            new_password=request.new_password
+        )
+    except PasswordHashingBusy as e:
+        raise _hashing_unavailable(e)
     
     if not success:
         raise HTTPException(
@@ -425,12 +444,15 @@ async def change_password(
     
     Changes the authenticated user's password
     """
-    success, error = await auth_service.change_password(
-        db=db,
-        user=current_user,
-        current_password=request.current_password,
-        new_password=request.new_password
-    )
+    try:
+        success, error = await auth_service.change_password(
+            db=db,
+            user=current_user,
+            current_password=request.current_password,
+            new_password=request.new_password
+        )
+    except PasswordHashingBusy as e:
+        raise _hashing_unavailable(e)
     
     if not success:
         raise HTTPException(
@@ -469,7 +491,12 @@ async def delete_account(
     Permanently deletes the user's account
     """
     # Verify password
-    if not auth_service.verify_password(password, current_user.hashed_password):
+    try:
+        password_ok, _ = await auth_service.verify_password_async(password, current_user.hashed_password)
+    except PasswordHashingBusy as e:
+        raise _hashing_unavailable(e)
+    
+    if not password_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid password"
@@ -486,6 +513,7 @@ async def delete_account(
     ).update({"is_active": False, "revoked_reason": "Account deleted"})
     
     db.commit()
+    principal_cache.invalidate_user(current_user.id)
     
     logger.info(f"Account deleted: {current_user.username}")
     
@@ -532,6 +560,7 @@ async def update_user_status(
     user.is_active = is_active
     user.updated_at = datetime.utcnow()
     db.commit()
+    principal_cache.invalidate_user(user.id)
     
     action = "activated" if is_active else "deactivated"
     logger.info(f"User {user.username} {action} by admin")
@@ -4,7 +4,7 @@ ZipWP-inspired instant WordPress site generation with AI
 """
 
 from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from typing import Dict, Any, Optional
 import logging
 from datetime import datetime
@@ -13,6 +13,7 @@ from app.services.agno_manager import AgnoManager
 from app.models.ai_models import SiteGenerationRequest, AIResponse
 from app.core.config import get_settings
 from app.services.acf_integration import acf_service
+from app.services.acf_export import iter_export
 from app.services.blueprint_manager import blueprint_manager
 
 router = APIRouter(prefix="/instant", tags=["Instant Site Generation"])
@@ -388,6 +389,40 @@ async def get_brazilian_templates(industry: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/templates/brazilian/{industry}/acf-export")
+async def export_brazilian_acf_fields(industry: str, format: str = "php"):
+    """
+    Stream the ACF field groups of an industry ("all" for every industry)
+    as PHP registration code or ACF JSON
+    """
+    
+    if format not in ("php", "json"):
+        raise HTTPException(status_code=400, detail="format must be 'php' or 'json'")
+    
+    if industry == "all":
+        field_groups = acf_service.generate_all_industry_fields()
+    elif industry in acf_service.INDUSTRIES:
+        field_groups = acf_service.generate_industry_fields(industry)
+    else:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No ACF field groups for industry: {industry}"
+        )
+    
+    return StreamingResponse(
+        iter_export(field_groups, format),
+        media_type="application/x-httpd-php" if format == "php" else "application/json",
+        headers={"Content-Disposition": f'attachment; filename="acf-{industry}.{format}"'}
+    )
+
+@router.get("/templates/acf-registry")
+async def get_acf_field_key_registry():
+    """
+    Field keys of every industry's ACF groups, deduplicated, with conflicts
+    """
+    
+    return acf_service.field_key_registry(acf_service.generate_all_industry_fields())
+
 # Helper functions
 async def _post_generation_tasks(generation_id: str, user_id: str):
     """Background tasks after site generation"""
@@ -283,6 +283,128 @@ async def get_page_analytics(
             detail=f"Failed to get analytics: {str(e)}"
         )
 
+# A/B Testing
+@router.post("/pages/{page_id}/ab-test")
+async def start_ab_test(
+    page_id: str,
+    variants: List[str] = Body(..., description="Variant names; the first one is the control"),
+    traffic_split: Optional[List[float]] = Body(None, description="Relative traffic per variant"),
+    max_visitors_per_variant: Optional[int] = Body(None, description="Stop as inconclusive after this many visitors"),
+    current_user: dict = Depends(get_current_user)
+):
+    """Start an A/B test on a landing page"""
+    
+    if page_id not in landing_page_v2_service.pages:
+        raise HTTPException(status_code=404, detail=f"Page {page_id} not found")
+    
+    try:
+        results = await landing_page_v2_service.start_ab_test(
+            page_id=page_id,
+            variants=variants,
+            traffic_split=traffic_split,
+            max_visitors_per_variant=max_visitors_per_variant
+        )
+        return {
+            "success": True,
+            "ab_test": results
+        }
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Failed to start A/B test: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to start A/B test: {str(e)}"
+        )
+
+@router.post("/pages/{page_id}/ab-test/views")
+async def record_ab_view(
+    page_id: str,
+    visitor_id: str = Body(..., description="Anonymous visitor ID"),
+    variant: str = Body(..., description="Variant shown to the visitor")
+):
+    """Record that a visitor saw a variant (called from the published page)"""
+    
+    if page_id not in landing_page_v2_service.pages:
+        raise HTTPException(status_code=404, detail=f"Page {page_id} not found")
+    
+    try:
+        counted = await landing_page_v2_service.record_ab_view(page_id, visitor_id, variant)
+        return {"success": True, "counted": counted}
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Failed to record A/B view: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to record view: {str(e)}"
+        )
+
+@router.post("/pages/{page_id}/ab-test/conversions")
+async def record_ab_conversion(
+    page_id: str,
+    visitor_id: str = Body(..., description="Anonymous visitor ID"),
+    value: float = Body(0.0, description="Conversion value")
+):
+    """Record a conversion (called from the published page)"""
+    
+    try:
+        counted = await landing_page_v2_service.record_ab_conversion(page_id, visitor_id, value)
+        return {"success": True, "counted": counted}
+        
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"Failed to record A/B conversion: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to record conversion: {str(e)}"
+        )
+
+@router.get("/pages/{page_id}/ab-test")
+async def get_ab_test_results(
+    page_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get sequential A/B test statistics and the stop recommendation"""
+    
+    try:
+        return await landing_page_v2_service.get_ab_test_results(page_id)
+        
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"Failed to get A/B test results: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to get A/B test results: {str(e)}"
+        )
+
+@router.post("/pages/{page_id}/ab-test/stop")
+async def stop_ab_test(
+    page_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Stop the A/B test; later views and conversions are not counted"""
+    
+    try:
+        results = await landing_page_v2_service.stop_ab_test(page_id)
+        return {
+            "success": True,
+            "ab_test": results
+        }
+        
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"Failed to stop A/B test: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to stop A/B test: {str(e)}"
+        )
+
 # Compare V1 vs V2
 @router.get("/compare/{page_id}")
 async def compare_implementations(
@@ -555,6 +555,8 @@ async def create_email_automation(
     name: str = Body(..., description="Automation name"),
     trigger: str = Body(..., description="Trigger event"),
     emails: List[Dict[str, Any]] = Body(..., description="Email sequence"),
+    segment: Optional[Dict[str, Any]] = Body(None, description="Segment criteria the user must match"),
+    exclude_segments: Optional[List[str]] = Body(None, description="Named segments to exclude"),
     current_user: dict = Depends(get_current_user)
 ):
     """Create an email automation sequence (admin only)"""
@@ -566,7 +568,9 @@ async def create_email_automation(
         automation = await marketing_automation_service.create_email_automation(
             name=name,
             trigger=trigger,
-            emails=emails
+            emails=emails,
+            segment=segment,
+            exclude_segments=exclude_segments
         )
         
         logger.info(f"Created email automation {automation.id}")
@@ -584,6 +588,8 @@ async def create_email_automation(
         
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Failed to create email automation: {str(e)}")
         raise HTTPException(
@@ -25,6 +25,7 @@ from app.services.templates_generator import templates_generator
 from app.services.template_repository import template_repository
 from app.services.wordpress_sync_service import wordpress_sync_service
 from app.services.shared_hosting_provisioner import shared_hosting_provisioner
+from app.services.warm_pool import get_pool_backend, get_warm_pool, warm_pool_enabled
 from app.services.landing_page_service import LandingPageService
 from app.services.elementor_to_acf_converter import ElementorToACFConverter
 from app.models.landing_page_models import LandingPageType, LandingPageIndustry, LandingPageACFModel
@@ -39,6 +40,9 @@ elementor_converter = ElementorToACFConverter()
 # In-memory storage for previews (in production, use Redis)
 preview_storage = {}
 
+# Background provisioning runs for published previews
+_publish_tasks = set()
+
 async def get_agno_manager() -> AgnoManager:
     """Dependency to get Agno manager"""
     from main import app
@@ -262,15 +266,43 @@ async def create_preview(
     
     return preview
 
+@router.get("/preview/{preview_id}", response_model=SitePreview)
+async def get_preview(preview_id: str, current_user: dict = Depends(get_current_user)):
+    """
+    Get a preview, including the progress of its publication
+    """
+    preview = preview_storage.get(preview_id)
+    if not preview:
+        raise HTTPException(status_code=404, detail="Preview not found")
+    return preview
+
+async def _provision_preview(preview: SitePreview, plan: str, region: str, customer: Dict[str, Any]):
+    """Full provisioning for a published preview; the preview is only published once it succeeds"""
+    try:
+        await get_pool_backend().provision(plan, region, customer)
+    except Exception as e:
+        logger.error(f"Provisioning {customer['domain']} for preview {preview.preview_id} failed: {str(e)}")
+        preview.publish_status = "failed"
+        preview.publish_error = str(e)
+        return
+    
+    preview.is_published = True
+    preview.publish_status = "active"
+    preview.publish_error = None
+    logger.info(f"Published preview {preview.preview_id} to {customer['domain']}")
+
 @router.post("/preview/{preview_id}/publish")
 async def publish_preview(
     preview_id: str,
     domain: str,
+    region: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
     """
     Publish a preview as a live WordPress site
-    This triggers the actual WordPress provisioning
+    Claims an idle warm-pool instance when a pool is configured and has one;
+    otherwise the full WordPress provisioning runs in the background and the
+    preview's publish_status reports its outcome
     """
     
     # Get preview
@@ -281,25 +313,50 @@ async def publish_preview(
     if preview.is_published:
         raise HTTPException(status_code=400, detail="Preview already published")
     
+    if preview.publish_status == "provisioning":
+        raise HTTPException(status_code=400, detail="Preview is already being published")
+    
     # Check if preview expired
     if datetime.now() > preview.expires_at:
         raise HTTPException(status_code=400, detail="Preview has expired")
     
-    # Trigger WordPress provisioning
-    # This would integrate with the provisioning service
-    site_data = {
-        "preview_id": preview_id,
-        "customization_id": preview.customization_id,
+    plan = current_user.get("plan", "basic")
+    customer = {
         "domain": domain,
+        "business_name": domain,
         "user_id": current_user["user_id"],
-        "status": "provisioning"
+        "customization_id": preview.customization_id
     }
+    preview.publish_status = "provisioning"
+    preview.publish_error = None
     
-    # Mark preview as published
-    preview.is_published = True
-    preview_storage[preview_id] = preview
+    # Claim a pre-provisioned instance when a pool is configured
+    if warm_pool_enabled():
+        pool = get_warm_pool()
+        region = region or pool.default_region
+        try:
+            site = await pool.claim(plan, region, customer)
+        except Exception as e:
+            preview.publish_status = "failed"
+            preview.publish_error = str(e)
+            logger.error(f"Claiming a pool instance for preview {preview_id} failed: {str(e)}")
+            raise HTTPException(status_code=503, detail="Site could not be claimed; try again")
+        
+        if site is not None:
+            preview.is_published = True
+            preview.publish_status = "active"
+            logger.info(f"Published preview {preview_id} to {domain} from the warm pool")
+            return {
+                "message": "Site is ready",
+                "domain": domain,
+                "status": "active",
+                "site": site
+            }
     
     logger.info(f"Publishing preview {preview_id} to domain {domain}")
+    task = asyncio.create_task(_provision_preview(preview, plan, region or "default", customer))
+    _publish_tasks.add(task)
+    task.add_done_callback(_publish_tasks.discard)
     
     return {
         "message": "Site is being provisioned",
@@ -1012,16 +1069,35 @@ async def provision_shared_hosting_site(
         logger.error(f"Shared hosting provisioning error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Provisioning failed: {str(e)}")
 
+@router.get("/provision/shared-hosting/placement")
+async def get_shared_hosting_placement(
+    max_moves: int = 10,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Get shared hosting fleet utilization and suggested rebalancing migrations
+    """
+    if current_user.get("role") not in ["admin", "owner"]:
+        raise HTTPException(status_code=403, detail="Insufficient permissions")
+    
+    try:
+        return await shared_hosting_provisioner.get_placement_status(max_moves)
+        
+    except Exception as e:
+        logger.error(f"Error getting placement status: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to get placement status")
+
 @router.get("/provision/shared-hosting/{site_id}/status")
 async def get_shared_hosting_site_status(
     site_id: int,
+    host_id: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
     """
     Get status of a shared hosting site
     """
     try:
-        status = await shared_hosting_provisioner.get_site_status(site_id)
+        status = await shared_hosting_provisioner.get_site_status(site_id, host_id)
         return status
         
     except Exception as e:
@@ -1031,6 +1107,7 @@ async def get_shared_hosting_site_status(
 @router.post("/provision/shared-hosting/{site_id}/suspend")
 async def suspend_shared_hosting_site(
     site_id: int,
+    host_id: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
     """
@@ -1040,7 +1117,7 @@ async def suspend_shared_hosting_site(
     # (implement proper authorization logic)
     
     try:
-        result = await shared_hosting_provisioner.suspend_site(site_id)
+        result = await shared_hosting_provisioner.suspend_site(site_id, host_id)
         return result
         
     except Exception as e:
@@ -1258,6 +1335,45 @@ async def convert_elementor_page_to_acf(
         logger.error(f"Error converting Elementor page: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Conversion failed: {str(e)}")
 
+@router.post("/elementor/convert/batch", response_model=Dict[str, Any])
+async def convert_elementor_pages_to_acf(
+    pages: Dict[str, Any],
+    landing_page_type: str = "generic",
+    preserve_elementor: bool = True,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Converte várias páginas Elementor (ex.: uma biblioteca de templates)
+    Recebe os dados Elementor indexados pelo nome do arquivo e retorna um
+    resultado por arquivo
+    """
+    if current_user.get("plan") not in ["professional", "enterprise"]:
+        raise HTTPException(
+            status_code=403,
+            detail="Professional plan required for Elementor conversion"
+        )
+    if not pages:
+        raise HTTPException(status_code=400, detail="No pages to convert")
+
+    try:
+        results = await elementor_converter.convert_elementor_pages(
+            pages,
+            landing_page_type=landing_page_type,
+            preserve_elementor=preserve_elementor
+        )
+    except Exception as e:
+        logger.error(f"Error converting Elementor pages: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Conversion failed: {str(e)}")
+
+    converted = sum(1 for result in results if result["success"])
+    return {
+        "success": converted == len(results),
+        "converted": converted,
+        "failed": len(results) - converted,
+        "results": results,
+        "elementor_preserved": preserve_elementor
+    }
+
 @router.get("/landing-pages/types", response_model=Dict[str, Any])
 async def get_landing_page_types():
     """
@@ -1355,13 +1471,14 @@ async def get_acf_field_groups_for_landing_page(
 @router.post("/provision/shared-hosting/{site_id}/resume")
 async def resume_shared_hosting_site(
     site_id: int,
+    host_id: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
     """
     Resume a suspended shared hosting site
     """
     try:
-        result = await shared_hosting_provisioner.resume_site(site_id)
+        result = await shared_hosting_provisioner.resume_site(site_id, host_id)
         return result
         
     except Exception as e:
@@ -1371,6 +1488,7 @@ async def resume_shared_hosting_site(
 @router.delete("/provision/shared-hosting/{site_id}")
 async def delete_shared_hosting_site(
     site_id: int,
+    host_id: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
     """
@@ -1380,7 +1498,7 @@ async def delete_shared_hosting_site(
         raise HTTPException(status_code=403, detail="Insufficient permissions")
     
     try:
-        result = await shared_hosting_provisioner.delete_site(site_id)
+        result = await shared_hosting_provisioner.delete_site(site_id, host_id)
         return result
         
     except Exception as e:
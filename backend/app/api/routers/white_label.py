@@ -6,7 +6,6 @@ Phase 3: Launch Oficial - Basic white label for agencies
 from fastapi import APIRouter, Depends, HTTPException, Query, Body, Request
 from typing import Dict, Any, List, Optional
 import logging
-from datetime import datetime
 
 from app.services.white_label_service import (
     white_label_service,
@@ -578,7 +577,7 @@ async def update_custom_code(
         if custom_head_html is not None:
             config.custom_head_html = custom_head_html
         
-        config.updated_at = datetime.now()
+        white_label_service.mark_updated(config)
         
         logger.info(f"Updated custom code for agency {current_user['user_id']}")
         
@@ -268,13 +268,13 @@ async def list_wordpress_sites() -> JSONResponse:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/sites/{site_id}")
-async def delete_wordpress_site(site_id: int) -> JSONResponse:
+async def delete_wordpress_site(site_id: int, network_id: Optional[str] = None) -> JSONResponse:
     """
     Delete a WordPress site from the multisite network
     """
     
     try:
-        success = await wordpress_multisite_manager.delete_site(site_id)
+        success = await wordpress_multisite_manager.delete_site(site_id, network_id)
         
         if not success:
             raise HTTPException(status_code=500, detail="Failed to delete site")
@@ -289,13 +289,13 @@ async def delete_wordpress_site(site_id: int) -> JSONResponse:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/sites/{site_id}/export")
-async def export_wordpress_site(site_id: int):
+async def export_wordpress_site(site_id: int, network_id: Optional[str] = None):
     """
     Export a WordPress site as XML
     """
     
     try:
-        export_data = await wordpress_multisite_manager.export_site(site_id)
+        export_data = await wordpress_multisite_manager.export_site(site_id, network_id)
         
         if not export_data:
             raise HTTPException(status_code=500, detail="Failed to export site")
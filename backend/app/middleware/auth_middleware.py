@@ -7,10 +7,12 @@ from fastapi.security.utils import get_authorization_scheme_param
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import JSONResponse
 import logging
-from typing import Optional
+import math
+import os
+from typing import Dict, List, Optional, Tuple
 
 from app.services.auth_service import auth_service
-from app.database import get_session
+from app.services.rate_limiter import RateLimit, RateLimiter
 
 logger = logging.getLogger(__name__)
 
@@ -67,15 +69,14 @@ class AuthMiddleware(BaseHTTPMiddleware):
                     headers={"WWW-Authenticate": "Bearer"}
                 )
             
-            # Verify token
-            db = get_session()
+            # Verify token (cached principal; misses load off the event loop)
             try:
-                user = await auth_service.get_current_user(db, token)
-                if user:
+                principal = await auth_service.get_principal(token)
+                if principal:
                     # Attach user to request state
-                    request.state.user = user
-                    request.state.user_id = user.id
-                    request.state.username = user.username
+                    request.state.user = principal
+                    request.state.user_id = principal.id
+                    request.state.username = principal.username
                 else:
                     return JSONResponse(
                         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -89,8 +90,6 @@ class AuthMiddleware(BaseHTTPMiddleware):
                     content={"detail": "Authentication failed"},
                     headers={"WWW-Authenticate": "Bearer"}
                 )
-            finally:
-                db.close()
         
         # Process request
         response = await call_next(request)
@@ -108,70 +107,93 @@ class AuthMiddleware(BaseHTTPMiddleware):
         Check if path is excluded from authentication
         """
         for excluded in self.excluded_paths:
-            if path == excluded or path.startswith(excluded):
+            # "/" only excludes the root itself, not every path
+            if path == excluded or (excluded != "/" and path.startswith(excluded)):
                 return True
         return False
 
 class RateLimitMiddleware(BaseHTTPMiddleware):
     """
     Middleware for rate limiting API requests
+    
+    Every request counts against the client's general limit (per user when
+    authenticated, per IP otherwise) and, for paths under a route prefix in
+    route_limits, against that route's limit too. The general limit comes
+    from user_limits, then plan_limits, then requests_per_minute. Counters
+    live in Redis when RATE_LIMIT_REDIS_URL is set, so limits hold across
+    workers and pods.
     """
     
-    def __init__(self, app, requests_per_minute: int = 60):
+    def __init__(
+        self,
+        app,
+        requests_per_minute: int = 60,
+        route_limits: Optional[Dict[str, RateLimit]] = None,
+        plan_limits: Optional[Dict[str, RateLimit]] = None,
+        user_limits: Optional[Dict[int, RateLimit]] = None,
+        limiter: Optional[RateLimiter] = None
+    ):
         super().__init__(app)
         self.requests_per_minute = requests_per_minute
-        self.request_counts = {}  # Simple in-memory storage
+        self.default_limit = RateLimit(requests_per_minute, 60)
+        # Longest prefix first, so the most specific route wins
+        self.route_limits = sorted((route_limits or {}).items(), key=lambda item: -len(item[0]))
+        self.plan_limits = plan_limits or {}
+        self.user_limits = user_limits or {}
+        self.limiter = limiter or RateLimiter.from_url(os.getenv("RATE_LIMIT_REDIS_URL"))
     
     async def dispatch(self, request: Request, call_next):
         """
         Check rate limits
         """
-        import time
-        
-        # Get client identifier (IP or user ID)
-        client_id = request.client.host if request.client else "unknown"
-        if hasattr(request.state, "user_id"):
-            client_id = f"user_{request.state.user_id}"
-        
-        # Get current minute
-        current_minute = int(time.time() / 60)
+        buckets = self._buckets(request)
+        result = await self.limiter.hit(buckets)
+        reset_at = str(math.ceil(self.limiter.clock() + result.reset_after))
         
-        # Initialize or reset counter
-        if client_id not in self.request_counts:
-            self.request_counts[client_id] = {"minute": current_minute, "count": 0}
-        elif self.request_counts[client_id]["minute"] != current_minute:
-            self.request_counts[client_id] = {"minute": current_minute, "count": 0}
-        
-        # Check rate limit
-        if self.request_counts[client_id]["count"] >= self.requests_per_minute:
+        if not result.allowed:
             return JSONResponse(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
                 content={"detail": "Rate limit exceeded. Please try again later."},
-                headers={"Retry-After": "60"}
+                headers={
+                    "Retry-After": str(max(1, math.ceil(result.retry_after))),
+                    "X-RateLimit-Limit": str(result.limit),
+                    "X-RateLimit-Remaining": "0",
+                    "X-RateLimit-Reset": reset_at
+                }
             )
         
-        # Increment counter
-        self.request_counts[client_id]["count"] += 1
-        
-        # Clean old entries (simple cleanup)
-        if len(self.request_counts) > 10000:
-            # Keep only entries from current minute
-            self.request_counts = {
-                k: v for k, v in self.request_counts.items()
-                if v["minute"] == current_minute
-            }
-        
         # Process request
         response = await call_next(request)
         
         # Add rate limit headers
-        response.headers["X-RateLimit-Limit"] = str(self.requests_per_minute)
-        response.headers["X-RateLimit-Remaining"] = str(
-            self.requests_per_minute - self.request_counts[client_id]["count"]
-        )
-        response.headers["X-RateLimit-Reset"] = str((current_minute + 1) * 60)
+        response.headers["X-RateLimit-Limit"] = str(result.limit)
+        response.headers["X-RateLimit-Remaining"] = str(result.remaining)
+        response.headers["X-RateLimit-Reset"] = reset_at
         
         return response
+    
+    def _buckets(self, request: Request) -> List[Tuple[str, RateLimit]]:
+        """
+        (bucket key, limit) pairs the request counts against
+        """
+        user_id = getattr(request.state, "user_id", None)
+        if user_id is not None:
+            client_id = f"user:{user_id}"
+            limit = self.user_limits.get(user_id)
+            if limit is None:
+                plan = getattr(getattr(request.state, "user", None), "plan", None)
+                limit = self.plan_limits.get(getattr(plan, "value", plan), self.default_limit)
+        else:
+            client_id = f"ip:{request.client.host if request.client else 'unknown'}"
+            limit = self.default_limit
+        
+        buckets = [(client_id, limit)]
+        path = request.url.path
+        for prefix, route_limit in self.route_limits:
+            if path.startswith(prefix):
+                buckets.append((f"{client_id}:{prefix}", route_limit))
+                break
+        return buckets
 
 class CORSMiddleware(BaseHTTPMiddleware):
     """
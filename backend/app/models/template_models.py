@@ -130,6 +130,8 @@ class SitePreview(BaseModel):
     preview_url: str
     expires_at: datetime
     is_published: bool = False
+    publish_status: Optional[str] = None  # provisioning, active or failed
+    publish_error: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.now)
 
 class TemplateLibrary(BaseModel):
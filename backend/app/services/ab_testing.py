@@ -0,0 +1,356 @@
+"""
+A/B Testing Statistics Engine
+Incremental, peeking-safe experiment statistics for landing pages
+
+Counters are updated as exposure and conversion events arrive, so results
+are computed in O(variants) without rescanning events.
+
+Significance uses a mixture sequential probability ratio test (mSPRT) on
+the difference in conversion rate between each variant and the control.
+Its always-valid p-value is the running minimum of 1 / likelihood-ratio,
+which stays valid no matter how often results are looked at. A Bayesian
+probability-to-beat-control (normal approximation of Beta posteriors) is
+reported alongside for readability.
+
+Sample ratio mismatch (SRM) is detected with a chi-square goodness-of-fit
+test of observed exposures against the configured traffic split.
+"""
+
+import logging
+import math
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ALPHA = 0.05
+SRM_ALPHA = 0.001
+# Prior variance of the effect size for the mSPRT mixture; a 2pp lift scale
+# suits landing pages converting in the 1-20% range.
+DEFAULT_MIXTURE_VARIANCE = 0.02 ** 2
+
+
+def _normal_cdf(z: float) -> float:
+    return 0.5 * math.erfc(-z / math.sqrt(2))
+
+
+def _chi2_sf(x: float, df: int) -> float:
+    """Survival function of the chi-square distribution"""
+    if x <= 0:
+        return 1.0
+    return _gamma_q(df / 2.0, x / 2.0)
+
+
+def _gamma_q(a: float, x: float) -> float:
+    """Regularized upper incomplete gamma function Q(a, x)"""
+    log_prefix = a * math.log(x) - x - math.lgamma(a)
+    if x < a + 1:
+        # Series expansion of P(a, x)
+        term = total = 1.0 / a
+        n = a
+        for _ in range(500):
+            n += 1
+            term *= x / n
+            total += term
+            if abs(term) < abs(total) * 1e-15:
+                break
+        return max(0.0, 1.0 - total * math.exp(log_prefix))
+
+    # Continued fraction for Q(a, x) (modified Lentz)
+    tiny = 1e-300
+    b = x + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    h = d
+    for i in range(1, 500):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1) < 1e-15:
+            break
+    return min(1.0, math.exp(log_prefix) * h)
+
+
+@dataclass
+class VariantCounters:
+    """Running counters for one variant"""
+    name: str
+    weight: float
+    visitors: int = 0
+    conversions: int = 0
+    conversion_value: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        return self.conversions / self.visitors if self.visitors else 0.0
+
+
+@dataclass
+class Experiment:
+    """Experiment definition plus incremental state"""
+    test_id: str
+    site_id: str
+    control: str
+    variants: Dict[str, VariantCounters]
+    alpha: float = DEFAULT_ALPHA
+    max_visitors_per_variant: Optional[int] = None
+    mixture_variance: float = DEFAULT_MIXTURE_VARIANCE
+    status: str = "running"
+    started_at: datetime = field(default_factory=datetime.now)
+    stopped_at: Optional[datetime] = None
+    # visitor -> variant; dedupes exposures and attributes conversions
+    assignments: Dict[str, str] = field(default_factory=dict)
+    converted: set = field(default_factory=set)
+    # Always-valid p-value per challenger (running minimum)
+    p_values: Dict[str, float] = field(default_factory=dict)
+
+
+class ABTestEngine:
+    """Tracks experiments and computes sequential statistics incrementally"""
+
+    def __init__(self):
+        self.experiments: Dict[str, Experiment] = {}
+        # (site_id, visitor_id) -> test ids the visitor was exposed to
+        self._visitor_tests: Dict[tuple, List[str]] = {}
+
+    def create_experiment(
+        self,
+        test_id: str,
+        site_id: str,
+        variants: List[str],
+        weights: Optional[List[float]] = None,
+        alpha: float = DEFAULT_ALPHA,
+        max_visitors_per_variant: Optional[int] = None
+    ) -> Experiment:
+        """Register an experiment; the first variant is the control"""
+        if len(variants) < 2:
+            raise ValueError("An experiment needs at least two variants")
+        if weights is None:
+            weights = [1.0] * len(variants)
+        if len(weights) != len(variants) or any(w <= 0 for w in weights):
+            raise ValueError("Weights must be positive and match the variants")
+
+        total = float(sum(weights))
+        experiment = Experiment(
+            test_id=test_id,
+            site_id=site_id,
+            control=variants[0],
+            variants={
+                name: VariantCounters(name=name, weight=w / total)
+                for name, w in zip(variants, weights)
+            },
+            alpha=alpha,
+            max_visitors_per_variant=max_visitors_per_variant,
+            p_values={name: 1.0 for name in variants[1:]}
+        )
+        self.experiments[test_id] = experiment
+        return experiment
+
+    def record_exposure(self, test_id: str, visitor_id: str, variant: str) -> bool:
+        """Count a visitor in a variant; repeated exposures are ignored"""
+        experiment = self.experiments.get(test_id)
+        if experiment is None or experiment.status != "running":
+            return False
+        if variant not in experiment.variants:
+            raise ValueError(f"Unknown variant {variant} for test {test_id}")
+        if visitor_id in experiment.assignments:
+            return False
+
+        experiment.assignments[visitor_id] = variant
+        experiment.variants[variant].visitors += 1
+        self._visitor_tests.setdefault((experiment.site_id, visitor_id), []).append(test_id)
+        self._update_sequential(experiment, variant)
+        return True
+
+    def record_conversion(
+        self,
+        site_id: str,
+        visitor_id: str,
+        value: float = 0.0,
+        test_id: Optional[str] = None
+    ) -> int:
+        """
+        Attribute a conversion to the visitor's assigned variants
+
+        Only the first conversion per visitor and experiment counts, so the
+        metric stays a proportion. Returns the number of experiments updated.
+        """
+        test_ids = [test_id] if test_id else self._visitor_tests.get((site_id, visitor_id), [])
+        updated = 0
+        for tid in test_ids:
+            experiment = self.experiments.get(tid)
+            if experiment is None or experiment.status != "running":
+                continue
+            variant = experiment.assignments.get(visitor_id)
+            if variant is None or visitor_id in experiment.converted:
+                continue
+            experiment.converted.add(visitor_id)
+            counters = experiment.variants[variant]
+            counters.conversions += 1
+            counters.conversion_value += value
+            self._update_sequential(experiment, variant)
+            updated += 1
+        return updated
+
+    def _update_sequential(self, experiment: Experiment, variant: str) -> None:
+        """Refresh the always-valid p-values touched by this variant"""
+        if variant == experiment.control:
+            challengers = list(experiment.p_values)
+        else:
+            challengers = [variant]
+        control = experiment.variants[experiment.control]
+        for name in challengers:
+            p = self._msprt_p_value(control, experiment.variants[name], experiment.mixture_variance)
+            if p < experiment.p_values[name]:
+                experiment.p_values[name] = p
+
+    @staticmethod
+    def _msprt_p_value(
+        control: VariantCounters,
+        challenger: VariantCounters,
+        mixture_variance: float
+    ) -> float:
+        """1 / mixture likelihood ratio for the difference in rates"""
+        if control.visitors < 2 or challenger.visitors < 2:
+            return 1.0
+        pa, pb = control.rate, challenger.rate
+        variance = (
+            pa * (1 - pa) / control.visitors
+            + pb * (1 - pb) / challenger.visitors
+        )
+        if variance <= 0:
+            return 1.0
+        diff = pb - pa
+        tau = mixture_variance
+        log_lr = (
+            0.5 * math.log(variance / (variance + tau))
+            + tau * diff * diff / (2 * variance * (variance + tau))
+        )
+        return 1.0 if log_lr <= 0 else min(1.0, math.exp(-log_lr))
+
+    @staticmethod
+    def _probability_to_beat(control: VariantCounters, challenger: VariantCounters) -> float:
+        """P(challenger rate > control rate) under Beta(1, 1) priors"""
+        def posterior(v: VariantCounters):
+            a = v.conversions + 1
+            b = v.visitors - v.conversions + 1
+            mean = a / (a + b)
+            var = a * b / ((a + b) ** 2 * (a + b + 1))
+            return mean, var
+
+        mean_a, var_a = posterior(control)
+        mean_b, var_b = posterior(challenger)
+        return _normal_cdf((mean_b - mean_a) / math.sqrt(var_a + var_b))
+
+    def sample_ratio_mismatch(self, experiment: Experiment) -> Dict[str, Any]:
+        """Chi-square test of observed exposures against expected weights"""
+        total = sum(v.visitors for v in experiment.variants.values())
+        if total == 0:
+            return {"detected": False, "p_value": 1.0, "chi_square": 0.0}
+        chi_square = 0.0
+        for v in experiment.variants.values():
+            expected = total * v.weight
+            chi_square += (v.visitors - expected) ** 2 / expected
+        p_value = _chi2_sf(chi_square, len(experiment.variants) - 1)
+        return {
+            "detected": p_value < SRM_ALPHA,
+            "p_value": p_value,
+            "chi_square": round(chi_square, 4)
+        }
+
+    def get_results(self, test_id: str) -> Dict[str, Any]:
+        """Current statistics and stop recommendation for an experiment"""
+        experiment = self.experiments.get(test_id)
+        if experiment is None:
+            raise ValueError(f"A/B test {test_id} not found")
+
+        control = experiment.variants[experiment.control]
+        challengers = [n for n in experiment.variants if n != experiment.control]
+        # Bonferroni across challengers keeps the family-wise error at alpha
+        alpha = experiment.alpha / len(challengers)
+
+        variants = []
+        winners = []
+        losers = []
+        for name, counters in experiment.variants.items():
+            entry = {
+                "name": name,
+                "is_control": name == experiment.control,
+                "visitors": counters.visitors,
+                "conversions": counters.conversions,
+                "conversion_rate": round(counters.rate * 100, 2),
+                "conversion_value": round(counters.conversion_value, 2),
+                "expected_traffic_share": round(counters.weight * 100, 2)
+            }
+            if name != experiment.control:
+                p_value = experiment.p_values[name]
+                lift = (counters.rate - control.rate) / control.rate * 100 if control.rate else None
+                entry.update({
+                    "lift": round(lift, 2) if lift is not None else None,
+                    "p_value": p_value,
+                    "significant": p_value < alpha,
+                    "probability_to_beat_control": round(
+                        self._probability_to_beat(control, counters) * 100, 2
+                    )
+                })
+                if p_value < alpha:
+                    (winners if counters.rate > control.rate else losers).append(name)
+            variants.append(entry)
+
+        srm = self.sample_ratio_mismatch(experiment)
+        recommendation, winner = self._recommend(experiment, srm, winners, losers)
+
+        best_p = min(experiment.p_values.values())
+        return {
+            "test_id": test_id,
+            "site_id": experiment.site_id,
+            "status": experiment.status,
+            "method": "msprt",
+            "alpha": experiment.alpha,
+            "variants": variants,
+            "confidence": round((1 - best_p) * 100, 2),
+            "winner": winner,
+            "sample_ratio_mismatch": srm,
+            "recommendation": recommendation,
+            "started_at": experiment.started_at.isoformat()
+        }
+
+    def _recommend(
+        self,
+        experiment: Experiment,
+        srm: Dict[str, Any],
+        winners: List[str],
+        losers: List[str]
+    ):
+        if srm["detected"]:
+            return "stop_investigate_srm", None
+        if winners:
+            best = max(winners, key=lambda n: experiment.variants[n].rate)
+            return "stop_winner", best
+        challengers = len(experiment.variants) - 1
+        if len(losers) == challengers:
+            return "stop_keep_control", experiment.control
+        cap = experiment.max_visitors_per_variant
+        if cap and all(v.visitors >= cap for v in experiment.variants.values()):
+            return "stop_inconclusive", None
+        return "continue", None
+
+    def stop_experiment(self, test_id: str) -> Dict[str, Any]:
+        """Freeze an experiment; later events are ignored"""
+        experiment = self.experiments.get(test_id)
+        if experiment is None:
+            raise ValueError(f"A/B test {test_id} not found")
+        experiment.status = "stopped"
+        experiment.stopped_at = datetime.now()
+        return self.get_results(test_id)
+
+
+# Global instance
+ab_test_engine = ABTestEngine()
@@ -0,0 +1,193 @@
+"""
+ACF Export Writer
+Streams ACF field groups as PHP registration code or ACF JSON
+
+Field groups are emitted one chunk at a time instead of being built into a
+single string: the PHP writer appends the parts of each group to a list and
+joins them once, so nested repeater/flexible-content groups cost linear
+time, and output goes to the file or response as it is produced.
+
+PHP values are written as single-quoted literals with backslashes and
+quotes escaped, so regex patterns and texts ending in a backslash survive
+the round trip.
+"""
+
+import json
+import math
+from typing import Any, Dict, IO, Iterable, Iterator, List, Tuple
+
+CHUNK_SIZE = 64 * 1024
+
+PHP_HEADER = "<?php\n\nif( function_exists('acf_add_local_field_group') ):\n\n"
+PHP_FOOTER = "endif;"
+
+# Keys under which ACF nests field definitions
+NESTED_FIELD_KEYS = ("fields", "sub_fields", "layouts")
+
+
+def php_string(value: str) -> str:
+    return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def php_scalar(value: Any) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        if math.isnan(value):
+            return "NAN"
+        if math.isinf(value):
+            return "INF" if value > 0 else "-INF"
+        return repr(value)
+    if value is None:
+        return "null"
+    return php_string(str(value))
+
+
+def _php_key(key: Any) -> str:
+    # PHP casts integer-like keys anyway; keep them bare
+    return str(key) if isinstance(key, int) and not isinstance(key, bool) else php_string(str(key))
+
+
+def _emit_php(data: Any, indent: int, out: List[str]) -> None:
+    """Append the PHP array literal for data to out"""
+    if isinstance(data, dict):
+        keyed = True
+        items = data.items()
+    elif isinstance(data, (list, tuple)):
+        keyed = False
+        items = enumerate(data)
+    else:
+        out.append(php_scalar(data))
+        return
+
+    pad = "    " * indent
+    separator = "array(\n" + pad
+    if not data:
+        out.append("array(\n")
+    for key, value in items:
+        out.append(f"{separator}{_php_key(key)} => " if keyed else separator)
+        separator = ",\n" + pad
+        if type(value) is str:
+            out.append(php_string(value))
+        else:
+            _emit_php(value, indent + 1, out)
+    out.append("\n" + "    " * (indent - 1) + ")")
+
+
+def _buffered(chunks: Iterable[str], size: int = CHUNK_SIZE) -> Iterator[str]:
+    """Coalesce small chunks into pieces of at least size characters"""
+    buffer: List[str] = []
+    length = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield "".join(buffer)
+            buffer.clear()
+            length = 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def _php_chunks(field_groups: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    yield PHP_HEADER
+    for group in field_groups:
+        out = ["acf_add_local_field_group("]
+        _emit_php(group, 1, out)
+        out.append(");\n\n")
+        yield "".join(out)
+    yield PHP_FOOTER
+
+
+def iter_php(field_groups: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """acf_add_local_field_group() registration code, in chunks"""
+    return _buffered(_php_chunks(field_groups))
+
+
+def _json_chunks(field_groups: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    # One encode() per group keeps the C encoder; newlines inside strings are
+    # escaped, so re-indenting the group for the enclosing list is safe
+    encoder = json.JSONEncoder(indent=2, ensure_ascii=False)
+    separator = "[\n  "
+    for group in field_groups:
+        yield separator + encoder.encode(group).replace("\n", "\n  ")
+        separator = ",\n  "
+    yield "[]" if separator == "[\n  " else "\n]"
+
+
+def iter_json(field_groups: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """ACF JSON (same output as json.dumps(indent=2)), in chunks"""
+    return _buffered(_json_chunks(field_groups))
+
+
+def iter_export(field_groups: List[Dict[str, Any]], fmt: str = "php") -> Iterator[str]:
+    if fmt == "php":
+        return iter_php(field_groups)
+    if fmt == "json":
+        return iter_json(field_groups)
+    raise ValueError(f"Unknown ACF export format: {fmt}")
+
+
+def write_export(field_groups: List[Dict[str, Any]], target: IO[str], fmt: str = "php") -> int:
+    """Write an export to an open text file; returns characters written"""
+    written = 0
+    for chunk in iter_export(field_groups, fmt):
+        target.write(chunk)
+        written += len(chunk)
+    return written
+
+
+def _walk_fields(field_groups: Iterable[Dict[str, Any]]) -> Iterator[Tuple[Dict[str, Any], str, str]]:
+    """(field, group key, parent key) for every field, sub field and layout"""
+    for group in field_groups:
+        group_key = group.get("key", "")
+        stack = [(child, group_key) for child in reversed(group.get("fields") or [])]
+        while stack:
+            field, parent = stack.pop()
+            yield field, group_key, parent
+            for nested in NESTED_FIELD_KEYS:
+                children = field.get(nested)
+                if children:
+                    stack.extend((child, field.get("key", "")) for child in reversed(children))
+
+
+def field_key_registry(field_groups: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Every field key once, mapped to [name, type, group key, parent key]
+
+    Layouts are listed with type "layout". A key registered again with the
+    same name and type (e.g. the shared contact group of several industries)
+    is deduplicated; a key reused for a different field is a conflict, since
+    ACF would silently let the later definition win.
+    """
+    fields: Dict[str, List[str]] = {}
+    conflicts: List[Dict[str, Any]] = []
+    duplicates = 0
+    for field, group_key, parent in _walk_fields(field_groups):
+        key = field.get("key")
+        if not key:
+            continue
+        entry = [field.get("name", ""), field.get("type", "layout"), group_key, parent]
+        existing = fields.get(key)
+        if existing is None:
+            fields[key] = entry
+        elif existing[:2] == entry[:2]:
+            duplicates += 1
+        else:
+            conflicts.append({"key": key, "first": existing, "second": entry})
+    return {"fields": fields, "duplicates": duplicates, "conflicts": conflicts}
+
+
+def dedupe_groups(field_groups: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Drop groups whose key was already seen (first one wins)"""
+    seen = set()
+    unique = []
+    for group in field_groups:
+        key = group.get("key")
+        if key in seen:
+            continue
+        seen.add(key)
+        unique.append(group)
+    return unique
@@ -11,11 +11,19 @@ from datetime import datetime
 import hashlib
 import re
 
+from app.services.acf_export import dedupe_groups, field_key_registry, iter_json, iter_php, write_export
+
 logger = logging.getLogger(__name__)
 
 class ACFIntegrationService:
     """Service for managing ACF field groups and integrations"""
     
+    # Industries with their own field groups in generate_industry_fields
+    INDUSTRIES = (
+        'restaurante', 'dentista', 'advogado', 'clinica_estetica', 'academia',
+        'imobiliaria', 'ecommerce', 'educacao', 'consultoria', 'generic'
+    )
+    
     def __init__(self):
         self.field_types = {
             'text': 'text',
@@ -1430,53 +1438,41 @@ class ACFIntegrationService:
     def export_to_json(self, field_groups: List[Dict[str, Any]]) -> str:
         """Export field groups to JSON format for ACF import"""
         
-        return json.dumps(field_groups, indent=2, ensure_ascii=False)
+        return "".join(iter_json(field_groups))
     
     def export_to_php(self, field_groups: List[Dict[str, Any]]) -> str:
         """Export field groups to PHP format for ACF registration"""
         
-        php_code = "<?php\n\n"
-        php_code += "if( function_exists('acf_add_local_field_group') ):\n\n"
-        
-        for group in field_groups:
-            php_code += f"acf_add_local_field_group({self._dict_to_php_array(group)});\n\n"
-        
-        php_code += "endif;"
-        
-        return php_code
+        return "".join(iter_php(field_groups))
     
-    def _dict_to_php_array(self, data: Any, indent: int = 1) -> str:
-        """Convert Python dict to PHP array format"""
-        
-        if isinstance(data, dict):
-            items = []
-            for key, value in data.items():
-                php_value = self._dict_to_php_array(value, indent + 1)
-                items.append(f"{'    ' * indent}'{key}' => {php_value}")
-            
-            return "array(\n" + ",\n".join(items) + f"\n{'    ' * (indent - 1)})"
+    def write_export(self, field_groups: List[Dict[str, Any]], path: str, fmt: str = "php") -> int:
+        """
+        Stream an export to a file without building it in memory
         
-        elif isinstance(data, list):
-            items = []
-            for value in data:
-                php_value = self._dict_to_php_array(value, indent + 1)
-                items.append(f"{'    ' * indent}{php_value}")
-            
-            return "array(\n" + ",\n".join(items) + f"\n{'    ' * (indent - 1)})"
+        Args:
+            field_groups: Field groups to export
+            path: Destination file
+            fmt: "php" or "json"
         
-        elif isinstance(data, bool):
-            return 'true' if data else 'false'
+        Returns:
+            Number of characters written
+        """
         
-        elif isinstance(data, (int, float)):
-            return str(data)
+        with open(path, "w", encoding="utf-8") as handle:
+            return write_export(field_groups, handle, fmt)
+    
+    def field_key_registry(self, field_groups: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Compact, deduplicated field key registry (see acf_export)"""
         
-        elif data is None:
-            return 'null'
+        return field_key_registry(field_groups)
+    
+    def generate_all_industry_fields(self) -> List[Dict[str, Any]]:
+        """Field groups of every industry, shared groups included once"""
         
-        else:
-            # Escape single quotes in strings
-            escaped = str(data).replace("'", "\\'")
-            return f"'{escaped}'"
+        field_groups = []
+        for industry in self.INDUSTRIES:
+            field_groups.extend(self.generate_industry_fields(industry))
+        return dedupe_groups(field_groups)
 
 # Initialize the service
 acf_service = ACFIntegrationService()
\ No newline at end of file
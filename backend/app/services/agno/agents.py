@@ -10,6 +10,8 @@ import logging
 # Agno v1.8.0 imports
 from agno import Agent
 
+from .html_audit import audit_html
+
 logger = logging.getLogger(__name__)
 
 # ============= SPECIALIZED AGENTS =============
@@ -865,10 +867,18 @@ class QualityAssuranceAgent(Agent):
     
     def _validate_html(self, html: str) -> Dict[str, Any]:
         """Validate HTML structure"""
+        if not html:
+            return {
+                "valid": True,
+                "errors": [],
+                "warnings": []
+            }
+        structure = audit_html(html).select(category="structure")
+        errors = [d.to_dict() for d in structure if d.severity == "error"]
         return {
-            "valid": True,
-            "errors": [],
-            "warnings": []
+            "valid": len(errors) == 0,
+            "errors": errors,
+            "warnings": [d.to_dict() for d in structure if d.severity == "warning"]
         }
     
     def _validate_css(self, css: str) -> Dict[str, Any]:
@@ -896,7 +906,13 @@ class QualityAssuranceAgent(Agent):
     
     def _check_accessibility(self, site_data: Dict[str, Any]) -> int:
         """Check accessibility standards"""
-        return 95  # Accessibility score
+        html = site_data.get("html", "")
+        if not html:
+            return 95  # Accessibility score
+        accessibility = audit_html(html).select(category="accessibility")
+        errors = sum(1 for d in accessibility if d.severity == "error")
+        warnings = len(accessibility) - errors
+        return max(0, 100 - 5 * errors - 2 * warnings)
     
     def _check_mobile(self, site_data: Dict[str, Any]) -> bool:
         """Check mobile responsiveness"""
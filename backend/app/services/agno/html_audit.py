@@ -0,0 +1,619 @@
+"""
+Single-Pass HTML Audit
+Structural validation and accessibility checks in one scan of the document
+
+One compiled tokenizer walks the page once, keeping an element stack. Each
+token feeds every check at the same time:
+
+    - structure: unclosed and stray end tags, self-closed non-void
+      elements, duplicate attributes, duplicate ids, missing DOCTYPE
+    - accessibility: images without alt text, heading order, empty
+      links/buttons/headings, form controls without labels, inline-style
+      color contrast (WCAG AA), invalid ARIA roles/attributes/values,
+      aria-hidden on focusable elements, dangling id references, missing
+      html lang
+
+Attributes are only parsed for tags or attribute strings a check cares
+about, text is only inspected while an element that needs an accessible
+name is open, and line/column positions are computed once at the end, so
+the cost stays linear in the size of the page. References that may be
+satisfied later in the document (label[for], aria-labelledby, ...) are
+resolved after the scan.
+
+Inline <svg> and <math> are foreign content: inside them "/>" closes the
+element (<path/>, <use/>), as it does in XML.
+"""
+
+import re
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+# Text up to the next tag (stray "<" included), then the tag itself; "<!"
+# covers comments, CDATA and DOCTYPE, whose bodies are handled in the scan
+_TOKEN = re.compile(
+    r"([^<]*(?:<(?!/?[a-zA-Z]|!)[^<]*)*)"
+    r"<(/?)([a-zA-Z][a-zA-Z0-9:-]*|!)([^>]*)>"
+)
+_ATTR = re.compile(
+    r"([^\s\"'>/=]+)(?:\s*=\s*(?:\"([^\"]*)\"|'([^']*)'|([^\s\"'=<>`]+)))?"
+)
+# Attribute strings worth parsing on tags outside ATTRIBUTE_TAGS. The raw
+# string starts right after the tag name, so every attribute follows
+# whitespace; the case is spelled out because re.I is much slower here
+_INTERESTING = re.compile(
+    r"\s(?:[iI][dD]|[sS][tT][yY][lL][eE]|[rR][oO][lL][eE]|[aA][rR][iI][aA]-[a-zA-Z]+)\s*="
+)
+_NEWLINE = re.compile(r"\n")
+# Elements whose content is not markup
+RAW_TEXT = {"script", "style", "textarea", "title"}
+
+# Roots of foreign content, where "/>" closes an element
+FOREIGN_ROOTS = {"svg", "math"}
+VOID_ELEMENTS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta",
+    "param", "source", "track", "wbr"
+}
+# Elements whose end tag may be omitted
+OPTIONAL_END = {
+    "html", "head", "body", "p", "li", "dt", "dd", "option", "optgroup", "tr", "td",
+    "th", "thead", "tbody", "tfoot", "colgroup", "rb", "rt", "rtc", "rp"
+}
+# Opening the key implicitly closes an open element from the value set
+IMPLIED_CLOSE = {
+    "li": {"li"},
+    "dt": {"dt", "dd"},
+    "dd": {"dt", "dd"},
+    "tr": {"tr", "td", "th"},
+    "td": {"td", "th"},
+    "th": {"td", "th"},
+    "option": {"option"},
+    "optgroup": {"optgroup", "option"},
+    "thead": {"tbody", "tr", "td", "th"},
+    "tbody": {"thead", "tbody", "tr", "td", "th"},
+    "tfoot": {"thead", "tbody", "tr", "td", "th"}
+}
+# Block elements that close an open <p>
+P_CLOSERS = {
+    "address", "article", "aside", "blockquote", "details", "div", "dl", "fieldset",
+    "figcaption", "figure", "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6",
+    "header", "hgroup", "hr", "main", "menu", "nav", "ol", "p", "pre", "section",
+    "table", "ul"
+}
+HEADINGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+# Tags that need an accessible name from their content
+NAMED_CONTENT = {"a", "button", "h1", "h2", "h3", "h4", "h5", "h6"}
+# End tags that need more than a pop when they close the top element
+TRACKED_END = NAMED_CONTENT | FOREIGN_ROOTS | {"label"}
+# Tags whose attributes are always parsed
+ATTRIBUTE_TAGS = {
+    "html", "img", "input", "select", "textarea", "label", "a", "button", "area"
+} | VOID_ELEMENTS
+# Start tags that need more than a push onto the stack
+TRACKED_START = (
+    ATTRIBUTE_TAGS | RAW_TEXT | set(IMPLIED_CLOSE) | NAMED_CONTENT | FOREIGN_ROOTS | {"h1", "h2"}
+)
+UNLABELLED_INPUT_TYPES = {"hidden", "submit", "reset", "button", "image"}
+
+ARIA_ROLES = {
+    "alert", "alertdialog", "application", "article", "banner", "blockquote", "button",
+    "caption", "cell", "checkbox", "code", "columnheader", "combobox", "complementary",
+    "contentinfo", "definition", "deletion", "dialog", "directory", "document",
+    "emphasis", "feed", "figure", "form", "generic", "grid", "gridcell", "group",
+    "heading", "img", "insertion", "link", "list", "listbox", "listitem", "log", "main",
+    "marquee", "math", "menu", "menubar", "menuitem", "menuitemcheckbox",
+    "menuitemradio", "meter", "navigation", "none", "note", "option", "paragraph",
+    "presentation", "progressbar", "radio", "radiogroup", "region", "row", "rowgroup",
+    "rowheader", "scrollbar", "search", "searchbox", "separator", "slider",
+    "spinbutton", "status", "strong", "subscript", "superscript", "switch", "tab",
+    "table", "tablist", "tabpanel", "term", "textbox", "time", "timer", "toolbar",
+    "tooltip", "tree", "treegrid", "treeitem"
+}
+ARIA_ATTRIBUTES = {
+    "aria-activedescendant", "aria-atomic", "aria-autocomplete", "aria-braillelabel",
+    "aria-brailleroledescription", "aria-busy", "aria-checked", "aria-colcount",
+    "aria-colindex", "aria-colindextext", "aria-colspan", "aria-controls",
+    "aria-current", "aria-describedby", "aria-description", "aria-details",
+    "aria-disabled", "aria-dropeffect", "aria-errormessage", "aria-expanded",
+    "aria-flowto", "aria-grabbed", "aria-haspopup", "aria-hidden", "aria-invalid",
+    "aria-keyshortcuts", "aria-label", "aria-labelledby", "aria-level", "aria-live",
+    "aria-modal", "aria-multiline", "aria-multiselectable", "aria-orientation",
+    "aria-owns", "aria-placeholder", "aria-posinset", "aria-pressed", "aria-readonly",
+    "aria-relevant", "aria-required", "aria-roledescription", "aria-rowcount",
+    "aria-rowindex", "aria-rowindextext", "aria-rowspan", "aria-selected",
+    "aria-setsize", "aria-sort", "aria-valuemax", "aria-valuemin", "aria-valuenow",
+    "aria-valuetext"
+}
+ARIA_VALUES = {
+    "aria-hidden": {"true", "false", "undefined"},
+    "aria-expanded": {"true", "false", "undefined"},
+    "aria-disabled": {"true", "false"},
+    "aria-required": {"true", "false"},
+    "aria-readonly": {"true", "false"},
+    "aria-modal": {"true", "false"},
+    "aria-busy": {"true", "false"},
+    "aria-atomic": {"true", "false"},
+    "aria-multiline": {"true", "false"},
+    "aria-multiselectable": {"true", "false"},
+    "aria-selected": {"true", "false", "undefined"},
+    "aria-checked": {"true", "false", "mixed", "undefined"},
+    "aria-pressed": {"true", "false", "mixed", "undefined"},
+    "aria-live": {"off", "polite", "assertive"},
+    "aria-orientation": {"horizontal", "vertical", "undefined"},
+    "aria-invalid": {"true", "false", "grammar", "spelling"}
+}
+# Attributes holding space-separated id references
+ID_REFERENCES = {
+    "aria-labelledby", "aria-describedby", "aria-controls", "aria-owns",
+    "aria-flowto", "aria-activedescendant", "aria-errormessage", "aria-details"
+}
+
+NAMED_COLORS = {
+    "black": (0, 0, 0), "white": (255, 255, 255), "red": (255, 0, 0),
+    "green": (0, 128, 0), "blue": (0, 0, 255), "yellow": (255, 255, 0),
+    "gray": (128, 128, 128), "grey": (128, 128, 128), "silver": (192, 192, 192),
+    "orange": (255, 165, 0), "purple": (128, 0, 128), "navy": (0, 0, 128),
+    "maroon": (128, 0, 0), "teal": (0, 128, 128), "olive": (128, 128, 0),
+    "lime": (0, 255, 0), "aqua": (0, 255, 255), "cyan": (0, 255, 255),
+    "fuchsia": (255, 0, 255), "magenta": (255, 0, 255), "pink": (255, 192, 203),
+    "lightgray": (211, 211, 211), "lightgrey": (211, 211, 211),
+    "darkgray": (169, 169, 169), "darkgrey": (169, 169, 169), "beige": (245, 245, 220)
+}
+_STYLE_DECLARATION = re.compile(
+    r"(?:^|;)\s*(color|background-color|background|font-size|font-weight)\s*:\s*([^;]+)", re.I
+)
+_HEX_COLOR = re.compile(r"#([0-9a-f]{3,8})\b", re.I)
+_RGB_COLOR = re.compile(r"rgba?\(\s*(\d+)[\s,]+(\d+)[\s,]+(\d+)", re.I)
+_FONT_SIZE = re.compile(r"([\d.]+)\s*(px|pt|em|rem)", re.I)
+
+Color = Tuple[int, int, int]
+
+
+@dataclass
+class Diagnostic:
+    """One finding, positioned in the source"""
+    code: str
+    message: str
+    severity: str  # error, warning
+    category: str  # structure, accessibility
+    offset: int
+    line: int = 0
+    column: int = 0
+    tag: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "code": self.code,
+            "message": self.message,
+            "severity": self.severity,
+            "category": self.category,
+            "line": self.line,
+            "column": self.column,
+            "tag": self.tag
+        }
+
+    def __str__(self) -> str:
+        return f"{self.line}:{self.column} {self.message}"
+
+
+@dataclass
+class AuditReport:
+    """All diagnostics of one document"""
+    diagnostics: List[Diagnostic] = field(default_factory=list)
+    elements: int = 0
+
+    def select(self, category: Optional[str] = None, severity: Optional[str] = None) -> List[Diagnostic]:
+        return [
+            d for d in self.diagnostics
+            if (category is None or d.category == category)
+            and (severity is None or d.severity == severity)
+        ]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "elements": self.elements,
+            "errors": len(self.select(severity="error")),
+            "warnings": len(self.select(severity="warning")),
+            "diagnostics": [d.to_dict() for d in self.diagnostics]
+        }
+
+
+def parse_color(value: str) -> Optional[Color]:
+    """CSS color value to RGB (hex, rgb()/rgba() and common names)"""
+    value = value.strip().lower()
+    match = _HEX_COLOR.search(value)
+    if match:
+        digits = match.group(1)
+        if len(digits) in (3, 4):
+            return tuple(int(c * 2, 16) for c in digits[:3])
+        if len(digits) in (6, 8):
+            return tuple(int(digits[i:i + 2], 16) for i in (0, 2, 4))
+        return None
+    match = _RGB_COLOR.search(value)
+    if match:
+        return tuple(min(int(c), 255) for c in match.groups())
+    for word in value.split():
+        if word in NAMED_COLORS:
+            return NAMED_COLORS[word]
+    return None
+
+
+def _luminance(color: Color) -> float:
+    channels = []
+    for c in color:
+        c = c / 255
+        channels.append(c / 12.92 if c <= 0.03928 else ((c + 0.055) / 1.055) ** 2.4)
+    return 0.2126 * channels[0] + 0.7152 * channels[1] + 0.0722 * channels[2]
+
+
+def contrast_ratio(foreground: Color, background: Color) -> float:
+    """WCAG 2 contrast ratio between two colors"""
+    lighter, darker = sorted((_luminance(foreground), _luminance(background)), reverse=True)
+    return (lighter + 0.05) / (darker + 0.05)
+
+
+def _parse_attributes(text: str) -> Tuple[Dict[str, str], List[str]]:
+    attributes: Dict[str, str] = {}
+    duplicates: List[str] = []
+    for name, double, single, bare in _ATTR.findall(text):
+        name = name.lower()
+        if name in attributes:
+            duplicates.append(name)
+            continue
+        attributes[name] = double or single or bare
+    return attributes, duplicates
+
+
+class _Element:
+    __slots__ = ("tag", "offset", "named", "context")
+
+    def __init__(self, tag, offset, context):
+        self.tag = tag
+        self.offset = offset
+        self.named = False
+        self.context = context  # (foreground, background, large text)
+
+
+class HTMLAuditor:
+    """Scans one document (see module docstring)"""
+
+    # Black text on white, normal size
+    DEFAULT_CONTEXT = ((0, 0, 0), (255, 255, 255), False)
+
+    def __init__(self, html: str):
+        self.html = html
+        self.report = AuditReport()
+        self.stack: List[_Element] = []
+        self.naming: List[_Element] = []  # open elements still needing a name
+        self.ids: Dict[str, int] = {}
+        self.label_targets: Dict[str, int] = {}
+        self.unlabelled: List[Tuple[str, int, str]] = []  # (id, offset, tag)
+        self.references: List[Tuple[str, str, int, str]] = []  # (attr, id, offset, tag)
+        self.label_depth = 0
+        self.foreign_depth = 0  # open <svg>/<math> elements
+        self.last_heading = 0
+        self.has_doctype = False
+        self.html_tag_seen = False
+
+    def add(self, code: str, message: str, offset: int, severity: str = "error",
+            category: str = "accessibility", tag: Optional[str] = None) -> None:
+        self.report.diagnostics.append(Diagnostic(code, message, severity, category, offset, tag=tag))
+
+    # Scan ----------------------------------------------------------------
+
+    def run(self) -> AuditReport:
+        stack = self.stack
+        naming = self.naming
+        offset = 0
+        raw_until = None
+        in_comment = False
+
+        for text, slash, name, raw in _TOKEN.findall(self.html):
+            start = offset + len(text)
+            offset = start + len(slash) + len(name) + len(raw) + 2
+
+            if in_comment:
+                if "-->" in text:
+                    in_comment = False
+                else:
+                    in_comment = "-->" not in raw
+                    continue
+            if raw_until is not None:
+                # Inside script/style/...: only its own end tag counts
+                if not slash or name.lower() != raw_until:
+                    continue
+                raw_until = None
+            elif naming and text and not text.isspace():
+                self._mark_named()
+
+            if name == "!":
+                if raw.startswith("--"):
+                    in_comment = len(raw) < 4 or not raw.endswith("--")
+                elif raw[:7].upper() == "DOCTYPE":
+                    self.has_doctype = True
+                continue
+
+            tag = name.lower()
+            if slash:
+                if stack and stack[-1].tag == tag and tag not in TRACKED_END:
+                    stack.pop()
+                else:
+                    self._close(tag, start)
+                continue
+
+            self.report.elements += 1
+            # Plain containers (the bulk of builder markup) only need a push
+            if (stack and tag not in TRACKED_START
+                    and (tag not in P_CLOSERS or stack[-1].tag != "p")
+                    and not (raw and (raw[-1] == "/" or _INTERESTING.search(raw)))):
+                stack.append(_Element(tag, start, stack[-1].context))
+                continue
+            self._open(tag, raw, start)
+            if tag in RAW_TEXT and not raw.endswith("/"):
+                raw_until = tag
+
+        self._finish()
+        self._position()
+        return self.report
+
+    def _mark_named(self) -> None:
+        for element in self.naming:
+            element.named = True
+        self.naming.clear()
+
+    def _open(self, tag: str, raw: str, offset: int) -> None:
+        stack = self.stack
+
+        # Implied end tags
+        if stack:
+            top = stack[-1].tag
+            if top == "p" and tag in P_CLOSERS:
+                self._pop_implied()
+            else:
+                closes = IMPLIED_CLOSE.get(tag)
+                if closes and top in closes:
+                    self._pop_implied()
+                    if tag in ("thead", "tbody", "tfoot") and stack and stack[-1].tag in ("tr", "thead", "tbody"):
+                        self._pop_implied()
+
+        attributes: Dict[str, str] = {}
+        if tag in ATTRIBUTE_TAGS or (raw and _INTERESTING.search(raw)):
+            attributes, duplicates = _parse_attributes(raw)
+            for name in duplicates:
+                self.add("duplicate-attribute", f"Duplicate attribute '{name}' on <{tag}>",
+                         offset, category="structure", tag=tag)
+            self._check_attributes(tag, attributes, offset)
+
+        context = stack[-1].context if stack else self.DEFAULT_CONTEXT
+        if tag in ("h1", "h2") and not context[2]:
+            context = (context[0], context[1], True)
+        style = attributes.get("style")
+        if style:
+            context = self._check_contrast(tag, style, offset, context)
+
+        if tag in HEADINGS:
+            level = HEADINGS[tag]
+            if self.last_heading and level - self.last_heading > 1:
+                self.add("heading-order", f"Heading level skipped: H{self.last_heading} to H{level}",
+                         offset, severity="warning", tag=tag)
+            elif not self.last_heading and level != 1:
+                self.add("heading-order", f"First heading is H{level}, expected H1",
+                         offset, severity="warning", tag=tag)
+            self.last_heading = level
+
+        if tag in VOID_ELEMENTS:
+            if tag == "img" and self.naming and attributes.get("alt", "").strip():
+                self._mark_named()
+            return
+        if raw.endswith("/"):
+            if self.foreign_depth or tag in FOREIGN_ROOTS:
+                return
+            self.add("self-closing-non-void", f"<{tag}/> is not a void element; the slash is ignored",
+                     offset, severity="warning", category="structure", tag=tag)
+
+        element = _Element(tag, offset, context)
+        stack.append(element)
+        if tag == "label":
+            self.label_depth += 1
+        elif tag in FOREIGN_ROOTS:
+            self.foreign_depth += 1
+        if tag in NAMED_CONTENT:
+            if (
+                attributes.get("aria-label", "").strip() or attributes.get("aria-labelledby")
+                or attributes.get("title", "").strip() or (tag == "a" and "href" not in attributes)
+            ):
+                element.named = True
+            else:
+                self.naming.append(element)
+
+    def _pop_implied(self) -> None:
+        self._popped(self.stack.pop())
+
+    def _popped(self, element: _Element) -> None:
+        tag = element.tag
+        if tag == "label":
+            self.label_depth -= 1
+        elif tag in FOREIGN_ROOTS:
+            self.foreign_depth -= 1
+        if tag in NAMED_CONTENT and not element.named:
+            if element in self.naming:
+                self.naming.remove(element)
+            kind = "heading" if tag in HEADINGS else ("link" if tag == "a" else "button")
+            self.add(f"empty-{kind}", f"<{tag}> has no accessible name", element.offset, tag=tag)
+
+    def _close(self, tag: str, offset: int) -> None:
+        stack = self.stack
+        if tag in VOID_ELEMENTS:
+            if tag != "br":
+                self.add("void-end-tag", f"</{tag}> is not allowed; <{tag}> is a void element",
+                         offset, severity="warning", category="structure", tag=tag)
+            return
+        for index in range(len(stack) - 1, -1, -1):
+            if stack[index].tag == tag:
+                break
+        else:
+            self.add("stray-end-tag", f"</{tag}> has no matching open tag", offset,
+                     category="structure", tag=tag)
+            return
+        while len(stack) > index + 1:
+            element = stack.pop()
+            if element.tag not in OPTIONAL_END:
+                self.add("unclosed-tag", f"<{element.tag}> is not closed before </{tag}>",
+                         element.offset, category="structure", tag=element.tag)
+            self._popped(element)
+        self._popped(stack.pop())
+
+    # Attribute checks -----------------------------------------------------
+
+    def _check_attributes(self, tag: str, attributes: Dict[str, str], offset: int) -> None:
+        element_id = attributes.get("id")
+        if element_id is not None:
+            element_id = element_id.strip()
+            if not element_id:
+                self.add("empty-id", f"Empty id on <{tag}>", offset, category="structure", tag=tag)
+            elif element_id in self.ids:
+                self.add("duplicate-id", f"Duplicate id '{element_id}'", offset,
+                         category="structure", tag=tag)
+            else:
+                self.ids[element_id] = offset
+
+        if tag == "html":
+            self.html_tag_seen = True
+            if not attributes.get("lang", "").strip():
+                self.add("missing-lang", "Missing language attribute on html element", offset, tag=tag)
+        elif tag == "img" or tag == "area" or (tag == "input" and attributes.get("type", "").lower() == "image"):
+            if "alt" not in attributes and attributes.get("role") not in ("presentation", "none"):
+                self.add("missing-alt", f"<{tag}> missing alt attribute", offset, tag=tag)
+        elif tag == "label":
+            target = attributes.get("for")
+            if target:
+                self.label_targets.setdefault(target, offset)
+
+        if tag in ("input", "select", "textarea"):
+            input_type = attributes.get("type", "text").lower() if tag == "input" else tag
+            if input_type not in UNLABELLED_INPUT_TYPES and not self.label_depth and not (
+                attributes.get("aria-label", "").strip()
+                or attributes.get("aria-labelledby")
+                or attributes.get("title", "").strip()
+            ):
+                self.unlabelled.append((attributes.get("id", "").strip(), offset, tag))
+
+        role = attributes.get("role")
+        if role is not None:
+            roles = role.split()
+            if not roles or not any(r in ARIA_ROLES for r in roles):
+                self.add("invalid-role", f"Invalid ARIA role '{role}' on <{tag}>", offset, tag=tag)
+
+        for name, value in attributes.items():
+            if not name.startswith("aria-"):
+                continue
+            if name not in ARIA_ATTRIBUTES:
+                self.add("invalid-aria-attribute", f"Unknown ARIA attribute '{name}' on <{tag}>",
+                         offset, tag=tag)
+                continue
+            allowed = ARIA_VALUES.get(name)
+            if allowed is not None and value.strip().lower() not in allowed:
+                self.add("invalid-aria-value", f"Invalid value '{value}' for {name} on <{tag}>",
+                         offset, severity="warning", tag=tag)
+            if name in ID_REFERENCES:
+                for reference in value.split():
+                    self.references.append((name, reference, offset, tag))
+
+        if attributes.get("aria-hidden", "").strip().lower() == "true" and self._focusable(tag, attributes):
+            self.add("aria-hidden-focusable", f"Focusable <{tag}> is hidden with aria-hidden", offset, tag=tag)
+
+    @staticmethod
+    def _focusable(tag: str, attributes: Dict[str, str]) -> bool:
+        tabindex = attributes.get("tabindex")
+        if tabindex is not None:
+            try:
+                return int(tabindex) >= 0
+            except ValueError:
+                return False
+        if "disabled" in attributes:
+            return False
+        if tag in ("a", "area"):
+            return "href" in attributes
+        if tag == "input":
+            return attributes.get("type", "").lower() != "hidden"
+        return tag in ("button", "select", "textarea", "iframe", "summary")
+
+    def _check_contrast(self, tag, style, offset, context):
+        foreground, background, large = context
+        own_foreground = own_background = None
+        for name, value in _STYLE_DECLARATION.findall(style):
+            name = name.lower()
+            if name == "color":
+                own_foreground = parse_color(value) or own_foreground
+            elif name in ("background-color", "background"):
+                own_background = parse_color(value) or own_background
+            elif name == "font-size":
+                size = _FONT_SIZE.search(value)
+                if size:
+                    amount, unit = float(size.group(1)), size.group(2).lower()
+                    pixels = amount * {"px": 1, "pt": 4 / 3, "em": 16, "rem": 16}[unit]
+                    large = pixels >= 24
+            elif name == "font-weight" and value.strip().lower() in ("bold", "bolder", "700", "800", "900"):
+                large = large or tag in ("h3", "h4")
+
+        if own_foreground is None and own_background is None:
+            return foreground, background, large
+        foreground = own_foreground or foreground
+        background = own_background or background
+        ratio = contrast_ratio(foreground, background)
+        required = 3.0 if large else 4.5
+        if ratio < required:
+            self.add("low-contrast",
+                     f"Text contrast {ratio:.2f}:1 on <{tag}> is below {required}:1 (WCAG AA)",
+                     offset, tag=tag)
+        return foreground, background, large
+
+    # Resolution -------------------------------------------------------------
+
+    def _finish(self) -> None:
+        while self.stack:
+            element = self.stack.pop()
+            if element.tag not in OPTIONAL_END:
+                self.add("unclosed-tag", f"<{element.tag}> is never closed", element.offset,
+                         category="structure", tag=element.tag)
+            self._popped(element)
+
+        if self.html_tag_seen and not self.has_doctype:
+            self.add("missing-doctype", "Missing DOCTYPE declaration", 0, category="structure")
+
+        for element_id, offset, tag in self.unlabelled:
+            if not element_id or element_id not in self.label_targets:
+                self.add("missing-label", f"<{tag}> has no associated label", offset, tag=tag)
+
+        for attribute, reference, offset, tag in self.references:
+            if reference not in self.ids:
+                self.add("broken-reference", f"{attribute} references missing id '{reference}'",
+                         offset, severity="warning", tag=tag)
+
+        for element_id, offset in self.label_targets.items():
+            if element_id not in self.ids:
+                self.add("broken-reference", f"label for='{element_id}' references a missing id",
+                         offset, severity="warning", tag="label")
+
+    def _position(self) -> None:
+        diagnostics = self.report.diagnostics
+        if not diagnostics:
+            return
+        line_starts = [0] + [m.end() for m in _NEWLINE.finditer(self.html)]
+        for diagnostic in diagnostics:
+            line = bisect_right(line_starts, diagnostic.offset)
+            diagnostic.line = line
+            diagnostic.column = diagnostic.offset - line_starts[line - 1] + 1
+        diagnostics.sort(key=lambda d: d.offset)
+
+
+@lru_cache(maxsize=8)
+def audit_html(html: str) -> AuditReport:
+    """
+    Audit a document in one pass
+
+    Cached, so the validator and the accessibility checker share one scan
+    of the same page. Treat the returned report as read-only.
+    """
+    return HTMLAuditor(html).run()
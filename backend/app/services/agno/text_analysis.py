@@ -0,0 +1,398 @@
+"""
+SEO Text Analysis
+Keywords, phrases, keyword density, readability and meta lengths from one
+tokenization of the content
+
+The text is tokenized once into words and sentence ends, and the token
+stream is counted once into words, bigrams and trigrams. Stemming,
+syllables and stopword checks then run per distinct word or n-gram rather
+than per occurrence, which is what keeps long pages cheap. Everything else (TF-IDF keywords, keyword density, readability indices) is
+derived from those counts, so asking for more keywords or another target
+keyword never rescans the text.
+
+Portuguese and English are supported: the language is detected from
+stopword hits, stopwords are dropped from keywords, and words are reduced
+with a light (plural/gender) stemmer with accents folded, so "serviço",
+"serviços" and "servicos" count as the same keyword. Readability uses
+Flesch Reading Ease for English and the Martins et al. adaptation of Flesch
+for Portuguese.
+
+Analyses are cached per content hash; IDF comes from an optional
+KeywordCorpus (e.g. the other pages of the same site).
+"""
+
+import hashlib
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from itertools import islice
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Words and numbers (with inner apostrophes/hyphens) and sentence ends
+_TOKEN = re.compile(r"[^\W_](?:[^\W_]|['’-](?=[^\W_]))*|[.!?…]+")
+SENTENCE_END = frozenset(".!?…")
+_VOWEL_GROUP = re.compile(r"[aeiouyáàâãéêíóôõúü]+")
+_PT_DIPHTHONG = re.compile(r"[aeo][iu]|[ã][eo]|[õ]e|u[i]")
+
+STOPWORDS = {
+    "pt": {
+        "a", "à", "ao", "aos", "as", "às", "até", "com", "como", "da", "das", "de",
+        "dela", "dele", "deles", "depois", "do", "dos", "e", "é", "ela", "elas", "ele",
+        "eles", "em", "entre", "era", "essa", "essas", "esse", "esses", "esta", "está",
+        "estão", "estas", "este", "estes", "eu", "foi", "for", "foram", "há", "isso",
+        "isto", "já", "lhe", "mais", "mas", "me", "mesmo", "meu", "minha", "muito",
+        "na", "nas", "não", "nem", "no", "nos", "nós", "nossa", "nosso", "num", "numa",
+        "o", "os", "ou", "para", "pela", "pelas", "pelo", "pelos", "por", "qual",
+        "quando", "que", "quem", "se", "sem", "ser", "seu", "seus", "só", "sua", "suas",
+        "também", "te", "tem", "têm", "ter", "um", "uma", "umas", "uns", "você",
+        "vocês", "vos", "são", "sobre", "seja", "ainda", "aqui", "cada", "todo",
+        "toda", "todos", "todas", "onde", "pode", "podem"
+    },
+    "en": {
+        "a", "about", "after", "all", "also", "an", "and", "any", "are", "as", "at",
+        "be", "been", "but", "by", "can", "could", "did", "do", "does", "each", "for",
+        "from", "had", "has", "have", "he", "her", "his", "how", "i", "if", "in",
+        "into", "is", "it", "its", "just", "may", "might", "more", "most", "must",
+        "my", "no", "not", "of", "on", "or", "our", "out", "she", "should", "so",
+        "some", "such", "than", "that", "the", "their", "them", "then", "there",
+        "these", "they", "this", "those", "to", "up", "us", "was", "we", "were",
+        "what", "when", "where", "which", "who", "will", "with", "would", "you",
+        "your"
+    }
+}
+LANGUAGES = tuple(STOPWORDS)
+
+# Recommended lengths in characters
+TITLE_LENGTH = (30, 60)
+DESCRIPTION_LENGTH = (70, 160)
+# Keyword density (%) considered natural
+DENSITY_RANGE = (1.0, 3.0)
+
+MAX_PHRASE = 3
+CACHE_SIZE = 256
+
+
+def _fold(word: str) -> str:
+    """Strip accents: "serviço" -> "servico" """
+    if word.isascii():
+        return word
+    return "".join(c for c in unicodedata.normalize("NFKD", word) if not unicodedata.combining(c))
+
+
+@lru_cache(maxsize=65536)
+def stem(word: str, language: str = "pt") -> str:
+    """Light stemmer: plural and gender endings only, accents folded"""
+    word = word.lower()
+    if language == "pt":
+        if len(word) > 3 and word.endswith("s"):
+            for suffix, replacement in (("ões", "ão"), ("ães", "ão"), ("ais", "al"), ("éis", "el"),
+                                        ("óis", "ol"), ("res", "r"), ("les", "l"), ("zes", "z")):
+                if word.endswith(suffix):
+                    word = word[:-len(suffix)] + replacement
+                    break
+            else:
+                word = word[:-1]
+        if len(word) > 4 and word[-1] in "aoe":
+            word = word[:-1]
+    else:
+        if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+            word = word[:-3] + "y" if word.endswith("ies") and len(word) > 4 else word[:-1]
+        for suffix in ("ing", "ed"):
+            if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+                word = word[:-len(suffix)]
+                break
+    return _fold(word)
+
+
+@lru_cache(maxsize=65536)
+def count_syllables(word: str, language: str = "pt") -> int:
+    word = word.lower()
+    groups = _VOWEL_GROUP.findall(word)
+    count = len(groups)
+    if language == "pt":
+        # Falling diphthongs ("ai", "ei", "ou", "ão", ...) are one syllable;
+        # any other vowel sequence is a hiatus
+        count += sum(len(g) - 1 - len(_PT_DIPHTHONG.findall(g)) for g in groups if len(g) > 1)
+    elif word.endswith("e") and not word.endswith(("le", "ee")) and count > 1:
+        count -= 1
+    return max(count, 1)
+
+
+def detect_language(words: Sequence[str], sample: int = 400) -> str:
+    """Language whose stopwords are most frequent in the first words"""
+    hits = {language: 0 for language in LANGUAGES}
+    for word in words[:sample]:
+        word = word.lower()
+        for language in LANGUAGES:
+            if word in STOPWORDS[language]:
+                hits[language] += 1
+    return max(LANGUAGES, key=lambda language: hits[language])
+
+
+@dataclass
+class TextStats:
+    """Counts gathered in the single pass over one text"""
+    language: str
+    words: int = 0
+    sentences: int = 0
+    syllables: int = 0
+    complex_words: int = 0
+    terms: Counter = field(default_factory=Counter)       # stem -> count, stopwords excluded
+    phrases: Counter = field(default_factory=Counter)     # stem tuple -> count
+    surface: Dict[Any, str] = field(default_factory=dict)  # stem / stem tuple -> display form
+    tokens: List[str] = field(default_factory=list)       # lowercased words and sentence ends
+    _stems: Optional[List[str]] = field(default=None, repr=False)
+
+    @property
+    def avg_sentence_length(self) -> float:
+        return self.words / max(self.sentences, 1)
+
+    @property
+    def avg_syllables(self) -> float:
+        return self.syllables / max(self.words, 1)
+
+    def readability(self) -> Dict[str, Any]:
+        """Flesch-based indices; "score" uses the formula for the text's language"""
+        asl, asw = self.avg_sentence_length, self.avg_syllables
+        english = 206.835 - 1.015 * asl - 84.6 * asw
+        portuguese = 248.835 - 1.015 * asl - 84.6 * asw
+        score = portuguese if self.language == "pt" else english
+        return {
+            "score": round(max(0.0, min(100.0, score)), 2),
+            "flesch_reading_ease": round(english, 2),
+            "flesch_portuguese": round(portuguese, 2),
+            "grade_level": round(0.39 * asl + 11.8 * asw - 15.59, 1),
+            "avg_sentence_length": round(asl, 1),
+            "avg_syllables_per_word": round(asw, 2),
+            "complex_word_ratio": round(self.complex_words / max(self.words, 1), 2)
+        }
+
+    def count_phrase(self, keyword: str) -> Tuple[int, int]:
+        """Occurrences of a keyword or phrase and its length in words"""
+        language = self.language
+        key = tuple(stem(w, language) for w in _TOKEN.findall(keyword.lower()) if w[0] not in SENTENCE_END)
+        if not key:
+            return 0, 0
+        if len(key) == 1 and key[0] in self.terms:
+            return self.terms[key[0]], 1
+        if len(key) <= MAX_PHRASE and key in self.phrases:
+            return self.phrases[key], len(key)
+        # One-off, stopword-edged or long phrase: walk the token stream
+        if self._stems is None:
+            self._stems = [stem(t, language) for t in self.tokens]
+        stems = self._stems
+        n, first, count, index = len(key), key[0], 0, -1
+        try:
+            while True:
+                index = stems.index(first, index + 1)
+                if tuple(stems[index:index + n]) == key:
+                    count += 1
+        except ValueError:
+            return count, n
+
+    def keyword_density(self, keywords: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Share of words (%) taken by each keyword's occurrences"""
+        low, high = DENSITY_RANGE
+        result = {}
+        for keyword in keywords:
+            count, length = self.count_phrase(keyword)
+            density = count * length / self.words * 100 if self.words else 0.0
+            result[keyword] = {
+                "count": count,
+                "density": round(density, 2),
+                "recommendation": "optimal" if low <= density <= high else "adjust"
+            }
+        return result
+
+
+class KeywordCorpus:
+    """Document frequencies for IDF, e.g. across the pages of one site"""
+
+    def __init__(self):
+        self.documents = 0
+        self.frequencies: Counter = Counter()
+
+    def add(self, stats: TextStats) -> None:
+        self.documents += 1
+        self.frequencies.update(stats.terms.keys())
+        self.frequencies.update(stats.phrases.keys())
+
+    def idf(self, key) -> float:
+        # Smoothed; 1.0 for every term while the corpus is empty
+        return math.log((1 + self.documents) / (1 + self.frequencies.get(key, 0))) + 1
+
+
+def _scan(text: str, language: Optional[str]) -> TextStats:
+    # The only per-token work is the regex and C-level counting; stems,
+    # syllables and stopword checks run once per distinct word or n-gram
+    tokens = _TOKEN.findall(text.lower())
+    if language not in STOPWORDS:
+        language = detect_language(tokens)
+    stopwords = STOPWORDS[language]
+    stats = TextStats(language=language, tokens=tokens)
+    terms, phrases, surface = stats.terms, stats.phrases, stats.surface
+
+    vocabulary = Counter(tokens)
+    bigrams = Counter(zip(tokens, islice(tokens, 1, None)))
+    trigrams = Counter(zip(tokens, islice(tokens, 1, None), islice(tokens, 2, None)))
+
+    ends = sum(count for token, count in vocabulary.items() if token[0] in SENTENCE_END)
+    # Runs like "?!" separated by spaces end one sentence, not several
+    repeated = sum(
+        count for (a, b), count in bigrams.items()
+        if a[0] in SENTENCE_END and b[0] in SENTENCE_END
+    )
+    starts_with_end = bool(tokens) and tokens[0][0] in SENTENCE_END
+    ends_with_word = bool(tokens) and tokens[-1][0] not in SENTENCE_END
+    stats.words = len(tokens) - ends
+    stats.sentences = ends - repeated - starts_with_end + ends_with_word
+
+    keyword_stems: Dict[str, str] = {}  # word -> stem, for words that can be keywords
+    best: Dict[str, int] = {}
+    for word, count in vocabulary.items():
+        if word[0] in SENTENCE_END:
+            continue
+        if word[0].isdigit():
+            stats.syllables += count
+            continue
+        syllables = count_syllables(word, language)
+        stats.syllables += syllables * count
+        if syllables >= 3:
+            stats.complex_words += count
+        term = stem(word, language)
+        if word in stopwords or len(word) < 3:
+            continue
+        keyword_stems[word] = term
+        terms[term] += count
+        if count > best.get(term, 0):
+            best[term] = count
+            surface[term] = word
+
+    # Phrases: keyword-worthy words at both ends, anything but sentence ends
+    # and numbers inside ("marketing de conteúdo"). Only repeated n-grams are
+    # kept; count_phrase finds one-off occurrences in the token stream
+    for grams in (bigrams, trigrams):
+        best = {}
+        for gram, count in grams.items():
+            if count < 2:
+                continue
+            first, last = keyword_stems.get(gram[0]), keyword_stems.get(gram[-1])
+            if first is None or last is None:
+                continue
+            middle = gram[1:-1]
+            if middle and (middle[0][0] in SENTENCE_END or middle[0][0].isdigit()):
+                continue
+            key = (first,) + tuple(stem(w, language) for w in middle) + (last,)
+            phrases[key] += count
+            if count > best.get(key, 0):
+                best[key] = count
+                surface[key] = " ".join(gram)
+    return stats
+
+
+_cache: "OrderedDict[str, TextStats]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def analyze_text(text: str, language: Optional[str] = None) -> TextStats:
+    """
+    Scan a text once (see module docstring)
+
+    Cached per content hash; treat the returned stats as read-only.
+    language is "pt" or "en"; detected when omitted.
+    """
+    key = hashlib.sha1(f"{language}\0{text}".encode("utf-8")).hexdigest()
+    with _cache_lock:
+        stats = _cache.get(key)
+        if stats is not None:
+            _cache.move_to_end(key)
+            return stats
+    stats = _scan(text, language)
+    with _cache_lock:
+        _cache[key] = stats
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return stats
+
+
+def top_keywords(
+    stats: TextStats,
+    limit: int = 10,
+    corpus: Optional[KeywordCorpus] = None,
+    phrases: bool = False
+) -> List[Dict[str, Any]]:
+    """Highest TF-IDF terms (or phrases seen at least twice)"""
+    corpus = corpus or KeywordCorpus()
+    counts = stats.phrases if phrases else stats.terms
+    words = max(stats.words, 1)
+    scored = heapq.nsmallest(
+        limit,
+        ((count / words * corpus.idf(key), count, key) for key, count in counts.items()),
+        key=lambda item: (-item[0], -item[1], stats.surface[item[2]])
+    )
+    return [
+        {"keyword": stats.surface[key], "count": count, "score": round(score, 4)}
+        for score, count, key in scored
+    ]
+
+
+def check_meta(title: Optional[str] = None, description: Optional[str] = None) -> Dict[str, Any]:
+    """Title/description lengths against the recommended ranges"""
+    result = {}
+    for name, value, (low, high) in (
+        ("title", title, TITLE_LENGTH), ("description", description, DESCRIPTION_LENGTH)
+    ):
+        if value is None:
+            continue
+        length = len(value.strip())
+        status = "missing" if not length else "short" if length < low else "long" if length > high else "ok"
+        result[name] = {"length": length, "status": status, "recommended": [low, high]}
+    return result
+
+
+def analyze_seo(
+    text: str,
+    title: Optional[str] = None,
+    description: Optional[str] = None,
+    target_keywords: Sequence[str] = (),
+    language: Optional[str] = None,
+    corpus: Optional[KeywordCorpus] = None,
+    max_keywords: int = 10
+) -> Dict[str, Any]:
+    """Full SEO text report for one page"""
+    stats = analyze_text(text, language)
+    meta = check_meta(title, description)
+    density = stats.keyword_density(target_keywords)
+
+    recommendations = []
+    for name, check in meta.items():
+        if check["status"] != "ok":
+            low, high = check["recommended"]
+            recommendations.append(f"Keep the {name} between {low} and {high} characters")
+    for keyword, values in density.items():
+        if values["recommendation"] == "adjust":
+            recommendations.append(f"Adjust '{keyword}' density ({values['density']}%)")
+        if title is not None and keyword.lower() not in title.lower():
+            recommendations.append(f"Include '{keyword}' in the title")
+    readability = stats.readability()
+    if readability["avg_sentence_length"] > 20:
+        recommendations.append("Break long sentences into shorter ones")
+    if readability["score"] < 50:
+        recommendations.append("Use simpler words where possible")
+
+    return {
+        "language": stats.language,
+        "word_count": stats.words,
+        "sentence_count": stats.sentences,
+        "readability": readability,
+        "keywords": top_keywords(stats, max_keywords, corpus),
+        "phrases": top_keywords(stats, max_keywords, corpus, phrases=True),
+        "keyword_density": density,
+        "meta": meta,
+        "recommendations": recommendations
+    }
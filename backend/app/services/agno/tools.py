@@ -12,6 +12,9 @@ import hashlib
 import requests
 from bs4 import BeautifulSoup
 
+from .html_audit import audit_html
+from .text_analysis import analyze_seo, analyze_text, top_keywords
+
 @dataclass
 class Tool:
     """Base tool definition"""
@@ -55,30 +58,28 @@ class ContentTools:
         target_grade_level: int = 8
     ) -> Dict[str, Any]:
         """Optimize text readability"""
-        sentences = text.split('. ')
-        words = text.split()
-        
-        # Simple readability metrics
-        avg_sentence_length = len(words) / max(len(sentences), 1)
-        complex_words = sum(1 for w in words if len(w) > 6)
-        
-        readability_score = 206.835 - 1.015 * avg_sentence_length - 84.6 * (complex_words / len(words))
+        stats = analyze_text(text)
+        readability = stats.readability()
         
         suggestions = []
-        if avg_sentence_length > 20:
+        if readability["avg_sentence_length"] > 20:
             suggestions.append("Break long sentences into shorter ones")
-        if complex_words / len(words) > 0.3:
+        if readability["complex_word_ratio"] > 0.3:
             suggestions.append("Use simpler words where possible")
+        if stats.language == "en" and readability["grade_level"] > target_grade_level:
+            suggestions.append(f"Aim for grade level {target_grade_level} (currently {readability['grade_level']})")
         
         return {
             "original_text": text,
-            "readability_score": round(readability_score, 2),
+            "readability_score": readability["score"],
             "suggestions": suggestions,
             "metrics": {
-                "sentence_count": len(sentences),
-                "word_count": len(words),
-                "avg_sentence_length": round(avg_sentence_length, 1),
-                "complex_word_ratio": round(complex_words / len(words), 2)
+                "language": stats.language,
+                "sentence_count": stats.sentences,
+                "word_count": stats.words,
+                "avg_sentence_length": readability["avg_sentence_length"],
+                "complex_word_ratio": readability["complex_word_ratio"],
+                "grade_level": readability["grade_level"]
             }
         }
     
@@ -88,26 +89,7 @@ class ContentTools:
         max_keywords: int = 10
     ) -> List[str]:
         """Extract keywords from text"""
-        # Simple keyword extraction
-        words = re.findall(r'\b[a-z]+\b', text.lower())
-        
-        # Remove common stop words
-        stop_words = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at',
-                     'to', 'for', 'of', 'with', 'by', 'from', 'as', 'is', 'was',
-                     'are', 'were', 'been', 'be', 'have', 'has', 'had', 'do',
-                     'does', 'did', 'will', 'would', 'could', 'should', 'may',
-                     'might', 'must', 'can', 'this', 'that', 'these', 'those'}
-        
-        keywords = [w for w in words if w not in stop_words and len(w) > 3]
-        
-        # Count frequency
-        keyword_freq = {}
-        for keyword in keywords:
-            keyword_freq[keyword] = keyword_freq.get(keyword, 0) + 1
-        
-        # Sort by frequency and return top keywords
-        sorted_keywords = sorted(keyword_freq.items(), key=lambda x: x[1], reverse=True)
-        return [k for k, _ in sorted_keywords[:max_keywords]]
+        return [k["keyword"] for k in top_keywords(analyze_text(text), max_keywords)]
 
 # SEO Tools
 class SEOTools:
@@ -194,22 +176,11 @@ class SEOTools:
         target_keywords: List[str]
     ) -> Dict[str, Any]:
         """Analyze keyword density in text"""
-        text_lower = text.lower()
-        word_count = len(text.split())
-        
-        keyword_analysis = {}
-        for keyword in target_keywords:
-            count = text_lower.count(keyword.lower())
-            density = (count / word_count) * 100 if word_count > 0 else 0
-            
-            keyword_analysis[keyword] = {
-                "count": count,
-                "density": round(density, 2),
-                "recommendation": "optimal" if 1 <= density <= 3 else "adjust"
-            }
+        stats = analyze_text(text)
+        keyword_analysis = stats.keyword_density(target_keywords)
         
         return {
-            "total_words": word_count,
+            "total_words": stats.words,
             "keywords": keyword_analysis,
             "recommendations": [
                 f"Adjust '{k}' density" 
@@ -217,6 +188,23 @@ class SEOTools:
                 if v["recommendation"] == "adjust"
             ]
         }
+    
+    @staticmethod
+    def analyze_content(
+        text: str,
+        title: Optional[str] = None,
+        description: Optional[str] = None,
+        target_keywords: Optional[List[str]] = None,
+        max_keywords: int = 10
+    ) -> Dict[str, Any]:
+        """Keywords, phrases, density, readability and meta lengths in one pass"""
+        return analyze_seo(
+            text,
+            title=title,
+            description=description,
+            target_keywords=target_keywords or [],
+            max_keywords=max_keywords
+        )
 
 # Design Tools
 class DesignTools:
@@ -449,74 +437,42 @@ class ValidationTools:
     @staticmethod
     def validate_html(html: str) -> Dict[str, Any]:
         """Validate HTML structure"""
-        issues = []
-        
-        # Check for basic HTML structure
-        if not re.search(r'<!DOCTYPE', html, re.IGNORECASE):
-            issues.append("Missing DOCTYPE declaration")
-        
-        # Check for unclosed tags
-        open_tags = re.findall(r'<([a-z]+)(?:\s|>)', html, re.IGNORECASE)
-        close_tags = re.findall(r'</([a-z]+)>', html, re.IGNORECASE)
-        
-        unclosed = []
-        for tag in open_tags:
-            if tag not in ['img', 'br', 'hr', 'input', 'meta', 'link']:
-                if open_tags.count(tag) != close_tags.count(tag):
-                    unclosed.append(tag)
-        
-        if unclosed:
-            issues.append(f"Unclosed tags: {', '.join(set(unclosed))}")
-        
-        # Check for alt attributes on images
-        images = re.findall(r'<img[^>]*>', html, re.IGNORECASE)
-        for img in images:
-            if 'alt=' not in img:
-                issues.append("Image missing alt attribute")
+        report = audit_html(html)
+        structure = report.select(category="structure")
+        missing_alt = [d for d in report.diagnostics if d.code == "missing-alt"]
+        errors = [d for d in structure if d.severity == "error"] + missing_alt
+        codes = {d.code for d in errors}
         
         return {
-            "valid": len(issues) == 0,
-            "issues": issues,
+            "valid": len(errors) == 0,
+            "issues": [d.message for d in errors],
+            "warnings": [d.message for d in structure if d.severity == "warning"],
+            "diagnostics": [d.to_dict() for d in structure + missing_alt],
             "recommendations": [
-                "Add DOCTYPE declaration" if "DOCTYPE" in str(issues) else None,
-                "Close all HTML tags properly" if unclosed else None,
-                "Add alt attributes to all images" if "alt attribute" in str(issues) else None
+                "Add DOCTYPE declaration" if "missing-doctype" in codes else None,
+                "Close all HTML tags properly" if codes & {"unclosed-tag", "stray-end-tag"} else None,
+                "Add alt attributes to all images" if "missing-alt" in codes else None
             ]
         }
     
     @staticmethod
     def check_accessibility(html: str) -> Dict[str, Any]:
         """Check accessibility compliance"""
-        issues = []
-        warnings = []
-        
-        # Check for heading hierarchy
-        headings = re.findall(r'<h([1-6])', html, re.IGNORECASE)
-        if headings:
-            headings = [int(h) for h in headings]
-            for i in range(1, len(headings)):
-                if headings[i] - headings[i-1] > 1:
-                    warnings.append(f"Heading hierarchy skip: H{headings[i-1]} to H{headings[i]}")
-        
-        # Check for form labels
-        inputs = re.findall(r'<input[^>]*>', html, re.IGNORECASE)
-        for input_tag in inputs:
-            if 'type="hidden"' not in input_tag:
-                input_id = re.search(r'id="([^"]*)"', input_tag)
-                if input_id:
-                    if f'for="{input_id.group(1)}"' not in html:
-                        issues.append(f"Input missing associated label")
-        
-        # Check for language attribute
-        if not re.search(r'<html[^>]*lang=', html, re.IGNORECASE):
-            issues.append("Missing language attribute on html element")
+        accessibility = audit_html(html).select(category="accessibility")
+        issues = [d for d in accessibility if d.severity == "error"]
         
         return {
             "accessible": len(issues) == 0,
-            "issues": issues,
-            "warnings": warnings,
+            "issues": [d.message for d in issues],
+            "warnings": [d.message for d in accessibility if d.severity == "warning"],
+            "diagnostics": [d.to_dict() for d in accessibility],
             "wcag_level": "AA" if len(issues) == 0 else "Needs improvement"
         }
+    
+    @staticmethod
+    def audit_html(html: str) -> Dict[str, Any]:
+        """Structure and accessibility diagnostics with line/column positions"""
+        return audit_html(html).to_dict()
 
 # Tool Registry
 AVAILABLE_TOOLS = {
@@ -558,6 +514,15 @@ AVAILABLE_TOOLS = {
             description="Analyze keyword density",
             parameters={"text": "string", "target_keywords": "list"},
             returns="dict"
+        ),
+        "analyze_content": Tool(
+            name="analyze_content",
+            description="Analyze keywords, readability and meta lengths",
+            parameters={
+                "text": "string", "title": "string", "description": "string",
+                "target_keywords": "list", "max_keywords": "int"
+            },
+            returns="dict"
         )
     },
     "design": {
@@ -606,6 +571,12 @@ AVAILABLE_TOOLS = {
             description="Check accessibility compliance",
             parameters={"html": "string"},
             returns="dict"
+        ),
+        "audit_html": Tool(
+            name="audit_html",
+            description="Audit HTML structure and accessibility in one pass",
+            parameters={"html": "string"},
+            returns="dict"
         )
     }
 }
@@ -12,6 +12,16 @@ import hashlib
 import user_agents
 from pydantic import BaseModel
 
+from app.services.visitor_sketches import (
+    HyperLogLog,
+    UniqueVisitorStore,
+    RealtimeVisitorCounter,
+    visitor_store,
+    realtime_visitor_counter
+)
+from app.services.heatmap_service import HeatmapService, heatmap_service
+from app.services.ab_testing import ABTestEngine, ab_test_engine
+
 class AnalyticsEvent(BaseModel):
     """Analytics event model"""
     event_type: str
@@ -74,9 +84,20 @@ class ConversionMetrics(BaseModel):
 class AnalyticsService:
     """Service for tracking and analyzing site metrics"""
     
-    def __init__(self, db: Session = None):
+    def __init__(
+        self,
+        db: Session = None,
+        unique_visitors: Optional[UniqueVisitorStore] = None,
+        realtime_counter: Optional[RealtimeVisitorCounter] = None,
+        heatmaps: Optional[HeatmapService] = None,
+        ab_tests: Optional[ABTestEngine] = None
+    ):
         self.db = db
         self.geoip_reader = None  # Initialize with GeoIP database if available
+        self.unique_visitors = unique_visitors or visitor_store
+        self.realtime_counter = realtime_counter or realtime_visitor_counter
+        self.heatmaps = heatmaps or heatmap_service
+        self.ab_tests = ab_tests or ab_test_engine
         
     def track_event(self, event: AnalyticsEvent) -> bool:
         """Track an analytics event"""
@@ -115,6 +136,47 @@ class AnalyticsService:
             # self.db.add(AnalyticsEventModel(**event_data))
             # self.db.commit()
             
+            # Update unique visitor sketches
+            if event.event_type == "pageview":
+                visitor_key = self._visitor_key(event, hashed_ip)
+                dimensions = {
+                    "page": event.page_url,
+                    "referrer": self._referrer_source(event.referrer),
+                    "country": event_data["country"],
+                    "device": event_data["device_type"]
+                }
+                self.unique_visitors.add(event.site_id, visitor_key, event.timestamp, dimensions)
+                self.realtime_counter.add(event.site_id, visitor_key, {
+                    "page": event.page_url,
+                    "referrer": dimensions["referrer"],
+                    "country": event_data["country"]
+                })
+            elif event.event_type == "click" and "x" in event.metadata:
+                self.heatmaps.record_click(
+                    event.site_id,
+                    event.page_url,
+                    float(event.metadata["x"]),
+                    float(event.metadata["y"]),
+                    float(event.metadata.get("viewport_width", 1280))
+                )
+            elif event.event_type == "experiment_exposure":
+                self.ab_tests.record_exposure(
+                    event.metadata["test_id"],
+                    self._visitor_key(event, hashed_ip),
+                    event.metadata["variant"]
+                )
+            elif event.event_type == "conversion":
+                self.ab_tests.record_conversion(
+                    event.site_id,
+                    self._visitor_key(event, hashed_ip),
+                    float(event.metadata.get("conversion_value", 0) or 0),
+                    test_id=event.metadata.get("test_id")
+                )
+            elif event.event_type == "scroll" and "depth" in event.metadata:
+                self.heatmaps.record_scroll(
+                    event.site_id, event.page_url, float(event.metadata["depth"])
+                )
+            
             return True
         except Exception as e:
             print(f"Error tracking event: {e}")
@@ -222,28 +284,75 @@ class AnalyticsService:
         )
     
     def get_realtime_visitors(self, site_id: str) -> Dict[str, Any]:
-        """Get real-time visitor data"""
-        # In a real implementation, query active sessions from last 5 minutes
-        now = datetime.now(timezone.utc)
-        five_minutes_ago = now - timedelta(minutes=5)
+        """Get real-time visitor data (sliding window, last 5 minutes)"""
+        snapshot = self.realtime_counter.snapshot(site_id)
+        breakdown = snapshot["breakdown"]
         
         return {
-            "active_visitors": 42,
+            "active_visitors": snapshot["active_visitors"],
+            "window_seconds": self.realtime_counter.window_seconds,
             "pages_being_viewed": [
-                {"url": "/", "visitors": 12},
-                {"url": "/produtos", "visitors": 8},
-                {"url": "/contato", "visitors": 5}
+                {"url": url, "visitors": count}
+                for url, count in breakdown.get("page", [])
             ],
             "top_referrers": [
-                {"source": "google", "visitors": 15},
-                {"source": "direct", "visitors": 12}
+                {"source": source, "visitors": count}
+                for source, count in breakdown.get("referrer", [])
             ],
             "locations": [
-                {"country": "Brazil", "city": "São Paulo", "visitors": 18},
-                {"country": "Brazil", "city": "Rio de Janeiro", "visitors": 8}
+                {"country": country, "visitors": count}
+                for country, count in breakdown.get("country", [])
             ]
         }
     
+    def get_unique_visitors(
+        self,
+        site_id: str,
+        start_date: datetime,
+        end_date: datetime,
+        page_url: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Estimated unique visitors for a date range, site-wide or for one page
+        
+        Computed by merging the hourly HyperLogLog sketches in the range.
+        """
+        if page_url:
+            count = self.unique_visitors.unique_visitors(
+                site_id, start_date, end_date, "page", page_url
+            )
+        else:
+            count = self.unique_visitors.unique_visitors(site_id, start_date, end_date)
+        
+        return {
+            "site_id": site_id,
+            "page_url": page_url,
+            "unique_visitors": count,
+            "relative_error": HyperLogLog.relative_error(self.unique_visitors.precision),
+            "period": {
+                "start": start_date.isoformat(),
+                "end": end_date.isoformat()
+            }
+        }
+    
+    def get_daily_unique_visitors(
+        self,
+        site_id: str,
+        start_date: datetime,
+        end_date: datetime
+    ) -> List[Dict[str, Any]]:
+        """Estimated unique visitors per day"""
+        days = []
+        day = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+        while day <= end_date:
+            day_end = day + timedelta(days=1) - timedelta(seconds=1)
+            days.append({
+                "date": day.date().isoformat(),
+                "unique_visitors": self.unique_visitors.unique_visitors(site_id, day, day_end)
+            })
+            day += timedelta(days=1)
+        return days
+    
     def get_traffic_sources(
         self,
         site_id: str,
@@ -560,6 +669,21 @@ class AnalyticsService:
         else:
             return "other"
     
+    def _visitor_key(self, event: AnalyticsEvent, hashed_ip: str) -> str:
+        """Stable visitor identity used for unique counting"""
+        if event.user_id:
+            return f"user:{event.user_id}"
+        return f"anon:{hashed_ip}:{event.user_agent}"
+    
+    def _referrer_source(self, referrer: Optional[str]) -> str:
+        """Reduce a referrer URL to its source host"""
+        if not referrer:
+            return "direct"
+        host = referrer.split("//", 1)[-1].split("/", 1)[0].lower()
+        if host.startswith("www."):
+            host = host[4:]
+        return host or "direct"
+    
     def _get_location(self, ip_address: str) -> Optional[Dict[str, str]]:
         """Get location from IP address"""
         # In a real implementation, use GeoIP database
@@ -583,48 +707,28 @@ class AnalyticsService:
         site_id: str,
         test_id: str
     ) -> Dict[str, Any]:
-        """Get A/B test results"""
-        return {
-            "test_id": test_id,
-            "status": "running",
-            "variants": [
-                {
-                    "name": "Control",
-                    "visitors": 1234,
-                    "conversions": 123,
-                    "conversion_rate": 10.0
-                },
-                {
-                    "name": "Variant A",
-                    "visitors": 1256,
-                    "conversions": 145,
-                    "conversion_rate": 11.5
-                }
-            ],
-            "confidence": 95.2,
-            "winner": "Variant A"
-        }
+        """Get A/B test results (sequential statistics, see ab_testing)"""
+        results = self.ab_tests.get_results(test_id)
+        if results["site_id"] != site_id:
+            raise ValueError(f"A/B test {test_id} not found")
+        return results
     
     def get_heatmap_data(
         self,
         site_id: str,
-        page_url: str
+        page_url: str,
+        grid_columns: int = 64,
+        include_png: bool = False
     ) -> Dict[str, Any]:
-        """Get heatmap data for a page"""
-        return {
-            "page_url": page_url,
-            "click_map": [
-                {"x": 234, "y": 456, "clicks": 123},
-                {"x": 567, "y": 234, "clicks": 89}
-            ],
-            "scroll_map": {
-                "25%": 92.3,
-                "50%": 71.2,
-                "75%": 45.6,
-                "100%": 23.1
-            },
-            "attention_map": [
-                {"element": "#hero", "attention_time": 4.5},
-                {"element": "#cta-button", "attention_time": 2.3}
-            ]
-        }
\ No newline at end of file
+        """
+        Get heatmap data for a page
+        
+        `click_map` is a zlib-compressed density matrix (see
+        heatmap_service.decode_density); `overlay_png` is a base64 PNG.
+        """
+        return self.heatmaps.get_heatmap(
+            site_id,
+            page_url,
+            grid_columns=grid_columns,
+            include_png=include_png
+        )
@@ -10,7 +10,9 @@ from typing import Dict, Any, List, Optional, Tuple
 from collections import defaultdict
 import statistics
 
-from app.core.config import settings, PLAN_LIMITS
+import numpy as np
+
+from app.core.config import settings, PLAN_LIMITS, AI_CREDITS_COSTS
 from app.models.analytics_models import (
     BusinessMetrics,
     RevenueMetrics,
@@ -22,6 +24,7 @@ from app.models.analytics_models import (
     CohortAnalysis,
     PredictiveAnalytics
 )
+from app.services.business_events import business_event_store, DEFAULT_FUNNEL
 
 logger = logging.getLogger(__name__)
 
@@ -31,9 +34,20 @@ class AnalyticsService:
     Provides real-time and historical analytics data
     """
     
-    def __init__(self):
+    def __init__(self, event_store=None):
         self.cache_ttl = 300  # 5 minutes cache
         self._metrics_cache = {}
+        self.event_store = event_store if event_store is not None else business_event_store
+    
+    def _cached(self, key: str, compute):
+        """Return a cached result for key, recomputing after cache_ttl"""
+        entry = self._metrics_cache.get(key)
+        now = datetime.now()
+        if entry and (now - entry[0]).total_seconds() < self.cache_ttl:
+            return entry[1]
+        value = compute()
+        self._metrics_cache[key] = (now, value)
+        return value
         
     async def get_business_dashboard(
         self, 
@@ -381,80 +395,177 @@ class AnalyticsService:
     
     async def get_cohort_analysis(
         self,
-        cohort_months: int = 6
+        cohort_months: int = 6,
+        max_weeks: int = 52
     ) -> CohortAnalysis:
-        """Cohort retention analysis"""
+        """
+        Cohort retention analysis
         
-        # Mock cohort data
-        cohorts = []
-        for i in range(cohort_months):
-            month = datetime.now() - timedelta(days=30 * i)
-            cohort_name = month.strftime("%Y-%m")
-            
-            # Mock retention data
-            retention_curve = [100]  # Start with 100%
-            for j in range(1, min(i + 1, 12)):
-                # Simulate retention decay
-                retention_curve.append(max(65, 100 - (j * 5) + (i * 2)))
-            
-            cohorts.append({
-                "cohort": cohort_name,
-                "initial_customers": 30 - (i * 2),
-                "retention_curve": retention_curve,
-                "ltv": 3500 - (i * 100)
-            })
+        Signup cohorts are weekly; each cohort's retention curve is the share
+        of its users active in each following week. Monthly averages use
+        weeks 4, 13, 26 and 52.
+        """
+        
+        end = datetime.now()
+        start = end - timedelta(days=30 * cohort_months)
+        # Cache per cohort window (week granularity)
+        key = f"cohorts:{start:%G-%V}:{end:%G-%V}:{max_weeks}"
+        
+        events = self.event_store.snapshot()
+        retention = await asyncio.to_thread(
+            self._cached,
+            key,
+            lambda: events.weekly_retention(start, end, max_weeks=max_weeks)
+        )
+        cohorts = retention["cohorts"]
+        average = retention["average_retention"]
+        
+        def average_at(week: int) -> float:
+            if week < len(average) and average[week] is not None:
+                return average[week]
+            return 0.0
+        
+        # Rank cohorts that have lived at least four weeks by week-4 retention
+        mature = [c for c in cohorts if len(c["retention_curve"]) > 4 and c["initial_customers"]]
+        ranked = sorted(mature, key=lambda c: c["retention_curve"][4])
         
         return CohortAnalysis(
             cohorts=cohorts,
-            average_retention_month_1=85.0,
-            average_retention_month_3=72.0,
-            average_retention_month_6=65.0,
-            average_retention_month_12=58.0,
-            best_performing_cohort="2025-06",
-            worst_performing_cohort="2025-03"
+            average_retention_month_1=average_at(4),
+            average_retention_month_3=average_at(13),
+            average_retention_month_6=average_at(26),
+            average_retention_month_12=average_at(51),
+            best_performing_cohort=ranked[-1]["cohort"] if ranked else "",
+            worst_performing_cohort=ranked[0]["cohort"] if ranked else ""
+        )
+    
+    async def get_funnel_analysis(
+        self,
+        steps: Optional[List[str]] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        window_days: int = 30
+    ) -> List[Dict[str, Any]]:
+        """Ordered conversion funnel (visit -> generate -> publish -> pay by default)"""
+        
+        steps = list(steps or DEFAULT_FUNNEL)
+        if not start_date:
+            start_date = datetime.now() - timedelta(days=30)
+        if not end_date:
+            end_date = datetime.now()
+        
+        key = f"funnel:{'>'.join(steps)}:{start_date:%Y-%m-%d}:{end_date:%Y-%m-%d}:{window_days}"
+        events = self.event_store.snapshot()
+        return await asyncio.to_thread(
+            self._cached,
+            key,
+            lambda: events.funnel(
+                steps, start_date, end_date, timedelta(days=window_days)
+            )
         )
     
     async def get_predictive_analytics(self) -> PredictiveAnalytics:
-        """Predictive analytics and forecasting"""
+        """
+        Predictive analytics and forecasting
+        
+        Customer, churn and usage forecasts come from the event store:
+        paying users are projected forward with the observed 4-week
+        retention and the rate of first payments in the last 4 weeks.
+        Without payment history before that window neither can be told
+        apart from the existing base, so the projection stays flat.
+        Revenue is scaled from current MRR by the projected customer ratio.
+        """
         
-        # Mock predictions based on current trends
-        return PredictiveAnalytics(
-            # Revenue predictions
-            predicted_mrr_next_month=52000.00,
-            predicted_mrr_3_months=68000.00,
-            predicted_mrr_6_months=95000.00,
-            confidence_level=78.5,
+        now = datetime.now()
+        store = self.event_store.snapshot()
+        
+        def forecast() -> Dict[str, Any]:
+            last_4_weeks = now - timedelta(weeks=4)
+            last_8_weeks = now - timedelta(weeks=8)
             
-            # Customer predictions
-            predicted_customers_next_month=215,
-            predicted_churn_next_month=11,
-            at_risk_customers=18,
+            active_payers = store.active_users(last_4_weeks, now, "pay")
+            previous_payers = store.active_users(last_8_weeks, last_4_weeks, "pay")
+            if len(previous_payers):
+                retained = len(np.intersect1d(previous_payers, active_payers, assume_unique=True))
+                retention = retained / len(previous_payers)
+            else:
+                retention = 1.0
+            if store.has_events_before("pay", last_4_weeks):
+                new_payers = store.count_first_occurrences("pay", last_4_weeks, now)
+            else:
+                new_payers = 0
             
-            # Usage predictions
-            predicted_ai_credits_usage_next_month=145000,
-            predicted_sites_generated_next_month=280,
+            # Users active before but silent for the last two weeks
+            recent = store.active_users(now - timedelta(weeks=2), now)
+            earlier = store.active_users(last_8_weeks, now - timedelta(weeks=2))
+            at_risk = len(np.setdiff1d(earlier, recent, assume_unique=True))
             
-            # Recommendations
-            recommendations=[
-                {
-                    "type": "retention",
-                    "priority": "high",
-                    "action": "Implement proactive customer success for at-risk accounts",
-                    "potential_impact": "Reduce churn by 2%"
-                },
-                {
-                    "type": "growth",
-                    "priority": "medium",
-                    "action": "Launch referral program",
-                    "potential_impact": "Increase new customers by 15%"
-                },
-                {
-                    "type": "revenue",
-                    "priority": "high",
-                    "action": "Optimize pricing for Professional plan",
-                    "potential_impact": "Increase ARPU by R$30"
-                }
-            ]
+            return {
+                "active_payers": len(active_payers),
+                "retention": retention,
+                "new_payers": new_payers,
+                "at_risk": at_risk,
+                "generated": store.count_events("generate", last_4_weeks, now),
+                "previous_generated": store.count_events("generate", last_8_weeks, last_4_weeks),
+                "history_weeks": 8 if len(previous_payers) else 4
+            }
+        
+        stats = await asyncio.to_thread(self._cached, f"predictive:{now:%Y-%m-%d-%H}", forecast)
+        revenue = await self.get_revenue_metrics(now - timedelta(days=30), now)
+        
+        customers = stats["active_payers"]
+        retention = stats["retention"]
+        
+        def project(months: int) -> float:
+            total = customers
+            for _ in range(months):
+                total = total * retention + stats["new_payers"]
+            return total
+        
+        next_month = project(1)
+        churn_next_month = int(round(customers * (1 - retention)))
+        arpu = revenue.mrr / customers if customers else 0.0
+        
+        def predicted_mrr(months: int) -> float:
+            return round(project(months) * arpu, 2) if customers else revenue.mrr
+        
+        generation_growth = (
+            stats["generated"] / stats["previous_generated"]
+            if stats["previous_generated"] else 1.0
+        )
+        credits_per_site = AI_CREDITS_COSTS["generate_site"]
+        predicted_sites = int(round(stats["generated"] * generation_growth))
+        
+        recommendations = []
+        if retention < 0.9:
+            recommendations.append({
+                "type": "retention",
+                "priority": "high",
+                "action": "Implement proactive customer success for at-risk accounts",
+                "potential_impact": f"{stats['at_risk']} users inactive for 2+ weeks"
+            })
+        if stats["new_payers"] < churn_next_month:
+            recommendations.append({
+                "type": "growth",
+                "priority": "high",
+                "action": "New paying customers are not covering churn; review acquisition",
+                "potential_impact": f"Net change of {stats['new_payers'] - churn_next_month} customers/month"
+            })
+        
+        # Confidence grows with history and sample size
+        confidence = min(95.0, 50.0 + stats["history_weeks"] * 3 + min(customers, 1000) / 50)
+        
+        return PredictiveAnalytics(
+            predicted_mrr_next_month=predicted_mrr(1),
+            predicted_mrr_3_months=predicted_mrr(3),
+            predicted_mrr_6_months=predicted_mrr(6),
+            confidence_level=round(confidence, 1),
+            predicted_customers_next_month=int(round(next_month)),
+            predicted_churn_next_month=churn_next_month,
+            at_risk_customers=stats["at_risk"],
+            predicted_ai_credits_usage_next_month=predicted_sites * credits_per_site,
+            predicted_sites_generated_next_month=predicted_sites,
+            recommendations=recommendations
         )
     
     async def _generate_insights(
@@ -562,6 +673,14 @@ class AnalyticsService:
             "timestamp": datetime.now().isoformat()
         }
         
+        # Columnar store backs cohort and funnel queries
+        timestamp = properties.get("timestamp")
+        self.event_store.append(
+            event_type,
+            user_id,
+            datetime.fromisoformat(timestamp) if isinstance(timestamp, str) else timestamp or datetime.now()
+        )
+        
         # Would send to analytics pipeline (e.g., Kafka, Redis Stream)
         logger.info(f"Event tracked: {event_type} for user {user_id}")
     
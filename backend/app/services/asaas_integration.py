@@ -422,6 +422,43 @@ class AsaasIntegration:
                 "error": str(e)
             }
     
+    async def list_payments(
+        self,
+        status: Optional[PaymentStatus] = None,
+        offset: int = 0,
+        limit: int = 100
+    ) -> Dict[str, Any]:
+        """
+        One page of payments across all subscriptions (Asaas caps limit at 100)
+        """
+    
+        params = {"offset": offset, "limit": min(limit, 100)}
+        if status:
+            params["status"] = status.value
+    
+        try:
+            response = await self.client.get(
+                f"{self.base_url}/payments",
+                params=params
+            )
+            response.raise_for_status()
+    
+            payments_data = response.json()
+    
+            return {
+                "success": True,
+                "payments": payments_data.get("data", []),
+                "has_more": payments_data.get("hasMore", False),
+                "total": payments_data.get("totalCount", 0)
+            }
+    
+        except httpx.HTTPError as e:
+            logger.error(f"Failed to list payments: {str(e)}")
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
     async def create_payment_link(
         self,
         name: str,
@@ -4,8 +4,13 @@ Handles user authentication, JWT tokens, and authorization
 """
 
 import os
+import asyncio
+import hashlib
 import secrets
 import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Dict, Any, Tuple
 from passlib.context import CryptContext
@@ -17,6 +22,7 @@ from email_validator import validate_email, EmailNotValidError
 from app.models.user import User, UserRole, UserPlan
 from app.models.auth import AuthToken, PasswordReset
 from app.database import get_session
+from app.services.principal_cache import Principal, principal_cache
 
 logger = logging.getLogger(__name__)
 
@@ -26,9 +32,28 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
 PASSWORD_RESET_EXPIRE_HOURS = int(os.getenv("PASSWORD_RESET_EXPIRE_HOURS", "24"))
+DECODED_TOKEN_CACHE_SIZE = int(os.getenv("DECODED_TOKEN_CACHE_SIZE", "10000"))
 
 # Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Hash/verify calls allowed to wait or run at once before new ones get a 503
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "32"))
+
+# Hashes with fewer rounds than BCRYPT_ROUNDS are flagged for rehashing
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS
+)
+
+class PasswordHashingBusy(Exception):
+    """Raised when the password hashing queue is full"""
+    
+    def __init__(self, retry_after: int = 1):
+        super().__init__("Password hashing queue is full")
+        self.retry_after = retry_after
 
 class AuthService:
     """
@@ -41,6 +66,14 @@ class AuthService:
         self.access_token_expire = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         self.refresh_token_expire = timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
         self.password_reset_expire = timedelta(hours=PASSWORD_RESET_EXPIRE_HOURS)
+        # Verified token -> payload, kept until the token's own expiry
+        self._decoded: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # bcrypt releases the GIL, so hashing threads run in parallel with the loop
+        self._hash_executor = ThreadPoolExecutor(
+            max_workers=PASSWORD_HASH_WORKERS,
+            thread_name_prefix="password-hash"
+        )
+        self._hash_pending = 0
     
     def hash_password(self, password: str) -> str:
         """
@@ -67,6 +100,58 @@ class AuthService:
         """
         return pwd_context.verify(plain_password, hashed_password)
     
+    async def _run_hasher(self, func, *args):
+        """
+        Run a hashing call on the password hash executor
+        
+        Raises:
+            PasswordHashingBusy: If PASSWORD_HASH_QUEUE_LIMIT calls are already pending
+        """
+        if self._hash_pending >= PASSWORD_HASH_QUEUE_LIMIT:
+            logger.warning("Password hashing queue full, rejecting request")
+            raise PasswordHashingBusy()
+        
+        self._hash_pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._hash_executor, func, *args)
+        finally:
+            self._hash_pending -= 1
+    
+    def _release_connection(self, db: Session):
+        """
+        End the session's read transaction before a hashing await, so the
+        connection goes back to the pool (and SQLite drops its shared lock)
+        while bcrypt runs. Loaded objects are refreshed on next access.
+        """
+        db.rollback()
+    
+    async def hash_password_async(self, password: str) -> str:
+        """
+        Hash a password without blocking the event loop
+        
+        Raises:
+            PasswordHashingBusy: If the hashing queue is full
+        """
+        return await self._run_hasher(pwd_context.hash, password)
+    
+    async def verify_password_async(
+        self,
+        plain_password: str,
+        hashed_password: str
+    ) -> Tuple[bool, Optional[str]]:
+        """
+        Verify a password without blocking the event loop
+        
+        Returns:
+            Tuple of (matches, replacement hash or None); a replacement is
+            returned when the stored hash uses fewer than BCRYPT_ROUNDS rounds
+        
+        Raises:
+            PasswordHashingBusy: If the hashing queue is full
+        """
+        return await self._run_hasher(pwd_context.verify_and_update, plain_password, hashed_password)
+    
     def create_access_token(self, data: dict, expires_delta: Optional[timedelta] = None) -> str:
         """
         Create a JWT access token
@@ -87,7 +172,8 @@ class AuthService:
         
         to_encode.update({
             "exp": expire,
-            "type": "access"
+            "type": "access",
+            "jti": secrets.token_urlsafe(16)
         })
         
         encoded_jwt = jwt.encode(to_encode, self.secret_key, algorithm=self.algorithm)
@@ -113,7 +199,8 @@ class AuthService:
         
         to_encode.update({
             "exp": expire,
-            "type": "refresh"
+            "type": "refresh",
+            "jti": secrets.token_urlsafe(16)
         })
         
         encoded_jwt = jwt.encode(to_encode, self.secret_key, algorithm=self.algorithm)
@@ -123,18 +210,39 @@ class AuthService:
         """
         Decode and verify a JWT token
         
+        Successful verifications are memoized until the token expires.
+        
         Args:
             token: JWT token to decode
             
         Returns:
             Decoded token payload or None if invalid
         """
+        payload = self._decoded.get(token)
+        if payload is not None:
+            if payload.get("exp", 0) > time.time():
+                self._decoded.move_to_end(token)
+                return payload
+            del self._decoded[token]
+        
         try:
             payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
-            return payload
         except JWTError as e:
             logger.error(f"JWT decode error: {str(e)}")
             return None
+        
+        if "exp" in payload:
+            self._decoded[token] = payload
+            if len(self._decoded) > DECODED_TOKEN_CACHE_SIZE:
+                self._decoded.popitem(last=False)
+        return payload
+    
+    def token_id(self, token: str, payload: Dict[str, Any]) -> str:
+        """
+        Stable identifier of a token: its jti, or a digest for tokens issued
+        before jti was added
+        """
+        return payload.get("jti") or hashlib.sha256(token.encode()).hexdigest()
     
     def validate_password(self, password: str) -> Tuple[bool, str]:
         """
@@ -323,12 +431,16 @@ class AuthService:
         if cnpj and not self.validate_cnpj(cnpj):
             return None, "Invalid CNPJ"
         
+        # Hash outside the try block so a full queue surfaces as PasswordHashingBusy
+        self._release_connection(db)
+        hashed_password = await self.hash_password_async(password)
+        
         # Create new user
         try:
             user = User(
                 email=email,
                 username=username,
-                hashed_password=self.hash_password(password),
+                hashed_password=hashed_password,
                 full_name=full_name,
                 company_name=company_name,
                 cpf=cpf,
@@ -385,7 +497,10 @@ class AuthService:
             return None, "Account is temporarily locked due to too many failed attempts"
         
         # Verify password
-        if not self.verify_password(password, user.hashed_password):
+        stored_hash = user.hashed_password
+        self._release_connection(db)
+        password_ok, new_hash = await self.verify_password_async(password, stored_hash)
+        if not password_ok:
             # Increment failed attempts
             user.failed_login_attempts += 1
             
@@ -402,6 +517,34 @@ class AuthService:
         if not user.is_active:
             return None, "Account is deactivated. Please contact support."
         
+        # Upgrade hashes made with fewer rounds than configured
+        if new_hash:
+            user.hashed_password = new_hash
+        
+        return self.create_session(db, user, ip_address, user_agent), ""
+    
+    def create_session(
+        self,
+        db: Session,
+        user: User,
+        ip_address: Optional[str] = None,
+        user_agent: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Log in a user whose credentials were already checked
+        
+        Used by authenticate_user and by registration, which has just set
+        the password and does not need another bcrypt round.
+        
+        Args:
+            db: Database session
+            user: User to log in
+            ip_address: Client IP address
+            user_agent: Client user agent
+            
+        Returns:
+            Tokens dict
+        """
         # Reset failed login attempts
         user.failed_login_attempts = 0
         user.locked_until = None
@@ -446,7 +589,7 @@ class AuthService:
             "token_type": "bearer",
             "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
             "user": user.to_dict()
-        }, ""
+        }
     
     async def refresh_access_token(
         self,
@@ -537,6 +680,10 @@ class AuthService:
             AuthToken.access_token == access_token
         ).first()
         
+        payload = self.decode_token(access_token)
+        if payload:
+            principal_cache.revoke(self.token_id(access_token, payload), payload.get("exp", 0))
+        
         if auth_token:
             auth_token.revoke("User logout")
             db.commit()
@@ -571,6 +718,9 @@ class AuthService:
         if not user_id:
             return None
         
+        if principal_cache.is_revoked(self.token_id(token, payload)):
+            return None
+        
         user = db.query(User).filter(User.id == int(user_id)).first()
         
         if user and user.is_active:
@@ -578,6 +728,48 @@ class AuthService:
         
         return None
     
+    async def get_principal(self, token: str) -> Optional[Principal]:
+        """
+        Get the principal for an access token through the principal cache
+        
+        Cache misses load the user in a worker thread with a short-lived
+        session, so the event loop is never blocked on the database.
+        
+        Args:
+            token: Access token
+            
+        Returns:
+            Principal or None if the token is invalid, revoked or the user inactive
+        """
+        payload = self.decode_token(token)
+        if not payload or payload.get("type") != "access":
+            return None
+        
+        user_id = payload.get("sub")
+        if not user_id:
+            return None
+        
+        token_id = self.token_id(token, payload)
+        if principal_cache.is_revoked(token_id):
+            return None
+        
+        user_id = int(user_id)
+        return await principal_cache.get_or_load(
+            token_id,
+            user_id,
+            lambda: asyncio.to_thread(self._load_principal, user_id)
+        )
+    
+    def _load_principal(self, user_id: int) -> Optional[Principal]:
+        db = get_session()
+        try:
+            user = db.query(User).filter(User.id == user_id).first()
+            if user and user.is_active:
+                return Principal.from_user(user)
+            return None
+        finally:
+            db.close()
+    
     async def create_password_reset_token(
         self,
         db: Session,
@@ -661,7 +853,8 @@ class AuthService:
             return False, "User not found"
         
         # Update password
-        user.hashed_password = self.hash_password(new_password)
+        self._release_connection(db)
+        user.hashed_password = await self.hash_password_async(new_password)
         reset_token.mark_as_used()
         
         # Revoke all existing tokens for security
@@ -670,6 +863,7 @@ class AuthService:
         ).update({"is_active": False, "revoked_reason": "Password reset"})
         
         db.commit()
+        principal_cache.invalidate_user(user.id)
         
         logger.info(f"Password reset for user: {user.username}")
         
@@ -695,7 +889,10 @@ class AuthService:
             Tuple of (success, error message)
         """
         # Verify current password
-        if not self.verify_password(current_password, user.hashed_password):
+        stored_hash = user.hashed_password
+        self._release_connection(db)
+        password_ok, _ = await self.verify_password_async(current_password, stored_hash)
+        if not password_ok:
             return False, "Current password is incorrect"
         
         # Validate new password
@@ -704,8 +901,9 @@ class AuthService:
             return False, error
         
         # Update password
-        user.hashed_password = self.hash_password(new_password)
+        user.hashed_password = await self.hash_password_async(new_password)
         db.commit()
+        principal_cache.invalidate_user(user.id)
         
         logger.info(f"Password changed for user: {user.username}")
         
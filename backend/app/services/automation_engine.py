@@ -0,0 +1,557 @@
+"""
+Automation Engine
+Trigger index with compiled segment predicates, and a durable timer wheel
+
+Segments are dicts of criteria over the event's user data, compiled once
+into a single evaluator:
+
+    {"plan": "pro"}                              equality
+    {"plan": ["pro", "business"]}                membership
+    {"sites_created": {"gte": 1, "lt": 10}}      operators: eq ne in nin gt gte lt lte exists contains
+    {"address.state": "SP"}                      dotted paths into nested dicts
+    {"$any": [{...}, {...}]}                     at least one sub-segment
+    {"$not": {...}}                              negation
+
+Automations are indexed by trigger, and within a trigger by one equality or
+membership criterion (their anchor). Matching an event looks up the anchor
+values present in the user data, so it evaluates only the automations that
+can match plus those without an anchor, instead of every automation.
+
+Delayed steps go into a hashed timer wheel: timers hash into slots by due
+tick, so scheduling is O(1) and each tick only visits its slot. Timers are
+journaled with SyncJournal when a path is given and restored on restart;
+a timer is removed from the journal only when complete() is called, so a
+step popped but not finished before a crash fires again.
+
+Journal records are buffered and written by sync() in a worker thread, so
+scheduling never blocks the event loop on disk I/O. The journal may be
+shared by several processes (API workers): sync() appends under a file lock
+and applies the records the other processes appended since the last call,
+so every process sees every timer, and whichever process syncs when the
+journal is due for compaction rewrites it. Which process fires timers is up
+to the caller (see MarketingAutomationService's scheduler leader).
+"""
+
+import asyncio
+import itertools
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.services.process_lock import file_lock
+from app.services.sync_queue import SyncJournal
+
+logger = logging.getLogger(__name__)
+
+Predicate = Callable[[Dict[str, Any]], bool]
+
+_MISSING = object()
+
+
+def _getter(path: str) -> Callable[[Dict[str, Any]], Any]:
+    keys = tuple(path.split("."))
+    if len(keys) == 1:
+        key = keys[0]
+        return lambda data: data.get(key, _MISSING)
+
+    def get(data: Dict[str, Any]) -> Any:
+        value: Any = data
+        for key in keys:
+            if not isinstance(value, dict):
+                return _MISSING
+            value = value.get(key, _MISSING)
+            if value is _MISSING:
+                return _MISSING
+        return value
+    return get
+
+
+def _as_set(values: Any) -> Any:
+    values = list(values)
+    try:
+        return frozenset(values)
+    except TypeError:
+        return values
+
+
+def _compare(op: Callable[[Any, Any], bool]) -> Callable[[Any, Any], bool]:
+    def check(value: Any, arg: Any) -> bool:
+        if value is _MISSING or value is None:
+            return False
+        try:
+            return op(value, arg)
+        except TypeError:
+            return False
+    return check
+
+
+_OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    "eq": lambda value, arg: value == arg,
+    "ne": lambda value, arg: value != arg,
+    "in": lambda value, arg: value is not _MISSING and _contains(arg, value),
+    "nin": lambda value, arg: not _contains(arg, value),
+    "gt": _compare(lambda value, arg: value > arg),
+    "gte": _compare(lambda value, arg: value >= arg),
+    "lt": _compare(lambda value, arg: value < arg),
+    "lte": _compare(lambda value, arg: value <= arg),
+    "exists": lambda value, arg: (value is not _MISSING and value is not None) == bool(arg),
+    "contains": lambda value, arg: isinstance(value, (list, tuple, set, frozenset, str)) and arg in value,
+}
+
+
+def _contains(collection: Any, value: Any) -> bool:
+    try:
+        return value in collection
+    except TypeError:
+        # Unhashable value against a frozenset
+        return False
+
+
+def _field_predicates(path: str, condition: Any) -> List[Predicate]:
+    get = _getter(path)
+    if isinstance(condition, dict):
+        operations = condition.items()
+    elif isinstance(condition, (list, tuple, set)):
+        operations = [("in", condition)]
+    else:
+        operations = [("eq", condition)]
+
+    predicates = []
+    for name, arg in operations:
+        check = _OPERATORS.get(name)
+        if check is None:
+            raise ValueError(f"Unknown segment operator '{name}' for '{path}'")
+        if name in ("in", "nin"):
+            if not isinstance(arg, (list, tuple, set, frozenset)):
+                raise ValueError(f"Segment operator '{name}' for '{path}' needs a list")
+            arg = _as_set(arg)
+        predicates.append(lambda data, get=get, check=check, arg=arg: check(get(data), arg))
+    return predicates
+
+
+def _all(predicates: List[Predicate]) -> Predicate:
+    if not predicates:
+        return lambda data: True
+    if len(predicates) == 1:
+        return predicates[0]
+
+    def evaluate(data: Dict[str, Any]) -> bool:
+        for predicate in predicates:
+            if not predicate(data):
+                return False
+        return True
+    return evaluate
+
+
+def compile_segment(segment: Optional[Dict[str, Any]]) -> Predicate:
+    """Compile segment criteria (see module docstring) into a predicate"""
+    predicates: List[Predicate] = []
+    for key, condition in (segment or {}).items():
+        if key == "$any":
+            alternatives = [compile_segment(sub) for sub in condition]
+            predicates.append(lambda data, alternatives=alternatives: any(p(data) for p in alternatives))
+        elif key == "$all":
+            predicates.extend(compile_segment(sub) for sub in condition)
+        elif key == "$not":
+            negated = compile_segment(condition)
+            predicates.append(lambda data, negated=negated: not negated(data))
+        elif key.startswith("$"):
+            raise ValueError(f"Unknown segment combinator '{key}'")
+        else:
+            predicates.extend(_field_predicates(key, condition))
+    return _all(predicates)
+
+
+def segment_anchor(segment: Optional[Dict[str, Any]]) -> Optional[Tuple[str, frozenset]]:
+    """(path, values) of an equality or membership criterion the segment requires"""
+    for key in sorted(segment or {}):
+        if key.startswith("$"):
+            continue
+        condition = segment[key]
+        if isinstance(condition, dict):
+            if len(condition) != 1 or next(iter(condition)) not in ("eq", "in"):
+                continue
+            name, condition = next(iter(condition.items()))
+            if name == "eq":
+                condition = [condition]
+        elif not isinstance(condition, (list, tuple, set)):
+            condition = [condition]
+        try:
+            values = frozenset(condition)
+        except TypeError:
+            continue
+        # Floats and bools hash like ints; keep the anchor to plain keys
+        if all(type(value) in (str, int) for value in values):
+            return key, values
+    return None
+
+
+class _TriggerIndex:
+    """Automations of one trigger, bucketed by anchor value"""
+
+    def __init__(self):
+        # path -> (getter, value -> {automation id: (order, predicate)})
+        self.anchors: Dict[str, Tuple[Callable, Dict[Any, Dict[str, Tuple[int, Predicate]]]]] = {}
+        self.unanchored: Dict[str, Tuple[int, Predicate]] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self.anchors or self.unanchored)
+
+
+class AutomationIndex:
+    """Trigger -> automations whose compiled segment matches the event"""
+
+    def __init__(self):
+        self._triggers: Dict[str, _TriggerIndex] = {}
+        self._entries: Dict[str, Tuple[str, Optional[Tuple[str, frozenset]]]] = {}
+        self._order = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, automation_id: str) -> bool:
+        return automation_id in self._entries
+
+    def add(
+        self,
+        automation_id: str,
+        trigger: str,
+        segment: Optional[Dict[str, Any]] = None,
+        predicate: Optional[Predicate] = None
+    ):
+        """
+        Index an automation (replacing a previous entry for the same id)
+
+        predicate overrides the one compiled from segment, e.g. to add
+        exclusions; segment is still used to pick the anchor.
+        """
+        if predicate is None:
+            predicate = compile_segment(segment)
+        self.remove(automation_id)
+
+        index = self._triggers.setdefault(trigger, _TriggerIndex())
+        entry = (next(self._order), predicate)
+        anchor = segment_anchor(segment)
+        if anchor is None:
+            index.unanchored[automation_id] = entry
+        else:
+            path, values = anchor
+            _, buckets = index.anchors.setdefault(path, (_getter(path), {}))
+            for value in values:
+                buckets.setdefault(value, {})[automation_id] = entry
+        self._entries[automation_id] = (trigger, anchor)
+
+    def remove(self, automation_id: str) -> bool:
+        found = self._entries.pop(automation_id, None)
+        if found is None:
+            return False
+        trigger, anchor = found
+        index = self._triggers[trigger]
+        if anchor is None:
+            del index.unanchored[automation_id]
+        else:
+            path, values = anchor
+            _, buckets = index.anchors[path]
+            for value in values:
+                bucket = buckets[value]
+                del bucket[automation_id]
+                if not bucket:
+                    del buckets[value]
+            if not buckets:
+                del index.anchors[path]
+        if not index:
+            del self._triggers[trigger]
+        return True
+
+    def match(self, trigger: str, data: Dict[str, Any]) -> List[str]:
+        """Ids of the automations matching the event, in the order they were added"""
+        index = self._triggers.get(trigger)
+        if index is None:
+            return []
+
+        matched = []
+        for automation_id, (order, predicate) in index.unanchored.items():
+            if predicate(data):
+                matched.append((order, automation_id))
+        for get, buckets in index.anchors.values():
+            value = get(data)
+            if type(value) not in (str, int):
+                continue
+            for automation_id, (order, predicate) in buckets.get(value, {}).items():
+                if predicate(data):
+                    matched.append((order, automation_id))
+
+        matched.sort()
+        return [automation_id for _, automation_id in matched]
+
+
+class TimerWheel:
+    """
+    Hashed timer wheel of (timer id, due, payload), optionally journaled
+
+    Timers fire on the first pop_due() after the tick containing their due
+    time has passed, so they are late by at most one tick. Timers further
+    out than one revolution stay in their slot and are skipped until due.
+    """
+
+    def __init__(
+        self,
+        tick: float = 60.0,
+        slots: int = 1440,
+        journal_path: Optional[str] = None,
+        clock: Callable[[], float] = time.time,
+        compact_every: int = 10000
+    ):
+        self.tick = tick
+        self.slots = slots
+        self.clock = clock
+        self._slots: Dict[int, Set[str]] = {}
+        self._timers: Dict[str, Tuple[float, Any]] = {}
+        self._overdue: Set[str] = set()
+        self._firing: Dict[str, Tuple[float, Any]] = {}
+        self._cursor = int(clock() // tick) - 1  # last tick processed
+        self.journal = SyncJournal(journal_path, compact_every=compact_every) if journal_path else None
+        self._journal_buffer: List[Dict[str, Any]] = []
+        self._journal_position: Tuple[int, int] = (0, 0)  # (inode, offset) read up to
+        self._sync_lock = asyncio.Lock()
+
+        if self.journal:
+            self._restore()
+
+    def __len__(self) -> int:
+        return len(self._timers)
+
+    def __contains__(self, timer_id: str) -> bool:
+        return timer_id in self._timers or timer_id in self._firing
+
+    def items(self) -> List[Tuple[str, float, Any]]:
+        """(timer id, due, payload) of every pending or fired but incomplete timer"""
+        return [
+            (timer_id, due, payload)
+            for timer_id, (due, payload) in itertools.chain(self._timers.items(), self._firing.items())
+        ]
+
+    def _restore(self):
+        restored = 0
+        with file_lock(self._lock_path):
+            for record in self.journal.replay():
+                self._insert(record["id"], record["due"], record["payload"])
+                restored += 1
+            self.journal.compact(self._journal_state())
+            self._journal_position = self._stat_journal()
+        if restored:
+            logger.info(f"Restored {restored} automation timers from journal")
+
+    @property
+    def _lock_path(self) -> str:
+        return f"{self.journal.path}.lock"
+
+    def _journal_state(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            timer_id: {"id": timer_id, "due": due, "payload": payload}
+            for timer_id, due, payload in self.items()
+        }
+
+    def _stat_journal(self) -> Tuple[int, int]:
+        try:
+            stat = os.stat(self.journal.path)
+        except FileNotFoundError:
+            return (0, 0)
+        return (stat.st_ino, stat.st_size)
+
+    def _insert(self, timer_id: str, due: float, payload: Any):
+        self._timers[timer_id] = (due, payload)
+        due_tick = int(due // self.tick)
+        if due_tick <= self._cursor:
+            self._overdue.add(timer_id)
+        else:
+            self._slots.setdefault(due_tick % self.slots, set()).add(timer_id)
+
+    def _remove(self, timer_id: str) -> Optional[Tuple[float, Any]]:
+        """Drop a pending or fired timer without journaling it"""
+        timer = self._timers.pop(timer_id, None)
+        if timer is not None:
+            self._discard(timer_id, timer[0])
+            return timer
+        return self._firing.pop(timer_id, None)
+
+    def _discard(self, timer_id: str, due: float):
+        self._overdue.discard(timer_id)
+        slot = int(due // self.tick) % self.slots
+        timers = self._slots.get(slot)
+        if timers is not None:
+            timers.discard(timer_id)
+            if not timers:
+                del self._slots[slot]
+
+    def schedule(self, timer_id: str, due: float, payload: Any) -> bool:
+        """Add a timer; returns False if timer_id is already pending"""
+        return bool(self.schedule_many([(timer_id, due, payload)]))
+
+    def schedule_many(self, timers: Iterable[Tuple[str, float, Any]]) -> List[str]:
+        """Add (timer id, due, payload) timers; journaled by the next sync(); returns the ids added"""
+        added = []
+        for timer_id, due, payload in timers:
+            if timer_id in self:
+                continue
+            self._insert(timer_id, due, payload)
+            added.append(timer_id)
+            if self.journal:
+                self._journal_buffer.append({
+                    "op": "put", "key": repr(timer_id), "item": {"id": timer_id, "due": due, "payload": payload}
+                })
+        return added
+
+    def _journal_done(self, timer_ids: Iterable[str]):
+        if self.journal:
+            # The id is kept beside the key so other processes can apply the record
+            self._journal_buffer.extend({"op": "done", "key": repr(t), "id": t} for t in timer_ids)
+
+    def cancel(self, timer_id: str) -> bool:
+        timer = self._timers.pop(timer_id, None)
+        if timer is None:
+            return False
+        self._discard(timer_id, timer[0])
+        self._journal_done([timer_id])
+        return True
+
+    def pop_due(self, now: Optional[float] = None) -> List[Tuple[str, Any]]:
+        """(timer id, payload) of every due timer; call complete() once handled"""
+        now = self.clock() if now is None else now
+        target = int(now // self.tick) - 1  # last fully elapsed tick
+        due_ids = list(self._overdue)
+        self._overdue.clear()
+
+        if target > self._cursor:
+            if target - self._cursor >= self.slots:
+                slots: Iterable[int] = list(self._slots)
+            else:
+                slots = [t % self.slots for t in range(self._cursor + 1, target + 1)]
+            for slot in slots:
+                timers = self._slots.get(slot)
+                if not timers:
+                    continue
+                ready = [t for t in timers if int(self._timers[t][0] // self.tick) <= target]
+                if ready:
+                    timers.difference_update(ready)
+                    if not timers:
+                        del self._slots[slot]
+                    due_ids.extend(ready)
+            self._cursor = target
+
+        fired = []
+        for timer_id in due_ids:
+            timer = self._timers.pop(timer_id)
+            self._firing[timer_id] = timer
+            fired.append((timer_id, timer[1]))
+        fired.sort(key=lambda item: self._firing[item[0]][0])
+        return fired
+
+    def complete(self, *timer_ids: str):
+        """Forget fired timers (removed from the journal by the next sync())"""
+        self._journal_done([timer_id for timer_id in timer_ids if self._firing.pop(timer_id, None) is not None])
+
+    # Journal
+
+    async def sync(self) -> Tuple[List[Tuple[str, float, Any]], List[Tuple[str, float, Any]]]:
+        """
+        Write buffered journal records, then apply those other processes wrote
+
+        Returns the (timer id, due, payload) timers the other processes'
+        records added and removed. Raises if the journal write failed; the
+        records stay buffered for the next call.
+        """
+        if self.journal is None:
+            return [], []
+        async with self._sync_lock:
+            records, self._journal_buffer = self._journal_buffer, []
+            try:
+                reset, read = await asyncio.to_thread(self._exchange, records)
+            except Exception:
+                self._journal_buffer[:0] = records
+                raise
+            changes = self._apply(read, reset)
+            if self.journal.should_compact(len(self._timers) + len(self._firing)):
+                await asyncio.to_thread(self._compact_if_unchanged, self._journal_state())
+            return changes
+
+    def _exchange(self, records: List[Dict[str, Any]]) -> Tuple[bool, List[Dict[str, Any]]]:
+        """Append our records and read everything new (worker thread, under the file lock)"""
+        with file_lock(self._lock_path):
+            inode, offset = self._journal_position
+            current_inode, size = self._stat_journal()
+            # Another process compacted the journal: read it from the start
+            reset = current_inode != inode or size < offset
+            if reset:
+                offset = 0
+            if records:
+                self.journal.write_records(records)
+                self.journal.close()
+            read, offset = self.journal.read_from(offset)
+            self._journal_position = (self._stat_journal()[0], offset)
+        return reset, read
+
+    def _compact_if_unchanged(self, state: Dict[str, Dict[str, Any]]):
+        """Rewrite the journal from our state unless another process wrote to it meanwhile"""
+        with file_lock(self._lock_path):
+            if self._stat_journal() != self._journal_position:
+                return
+            self.journal.compact(state)
+            self._journal_position = self._stat_journal()
+
+    def _apply(self, records: List[Dict[str, Any]], reset: bool):
+        """Apply journal records; a reset replaces the state with the records' pending timers"""
+        # Timers changed locally since the exchange are already ahead of the journal
+        skip = {record["key"] for record in self._journal_buffer}
+        before: Dict[str, Optional[Tuple[float, Any]]] = {}
+
+        def touch(timer_id: str):
+            if timer_id not in before:
+                before[timer_id] = self._timers.get(timer_id) or self._firing.get(timer_id)
+
+        def put(item: Dict[str, Any]):
+            if item["id"] not in self:
+                touch(item["id"])
+                self._insert(item["id"], item["due"], item["payload"])
+
+        def remove(timer_id: str):
+            touch(timer_id)
+            self._remove(timer_id)
+
+        if reset:
+            pending = {}
+            for record in records:
+                if record["op"] == "put":
+                    pending[record["key"]] = record["item"]
+                else:
+                    pending.pop(record["key"], None)
+            for timer_id in [t for t, _, _ in self.items() if repr(t) not in pending and repr(t) not in skip]:
+                remove(timer_id)
+            for key, item in pending.items():
+                if key not in skip:
+                    put(item)
+        else:
+            for record in records:
+                if record["key"] in skip:
+                    continue
+                if record["op"] == "put":
+                    put(record["item"])
+                elif "id" in record:
+                    remove(record["id"])
+
+        added, removed = [], []
+        for timer_id, previous in before.items():
+            current = self._timers.get(timer_id) or self._firing.get(timer_id)
+            if previous is None and current is not None:
+                added.append((timer_id, *current))
+            elif previous is not None and current is None:
+                removed.append((timer_id, *previous))
+        return added, removed
+
+    def close(self):
+        """Write any still-buffered records synchronously and close the journal"""
+        if self.journal:
+            records, self._journal_buffer = self._journal_buffer, []
+            self._exchange(records)
+            self.journal.close()
@@ -12,11 +12,12 @@ from datetime import datetime, timedelta
 from typing import Dict, Any, Optional, List
 import boto3
 from botocore.exceptions import ClientError
-import subprocess
 import json
 from pathlib import Path
 import hashlib
 
+from app.services.command_runner import command_runner
+
 logger = logging.getLogger(__name__)
 
 class BackupService:
@@ -136,7 +137,7 @@ class BackupService:
                 )
                 
                 # Step 3: Create metadata file
-                metadata_path = self._create_backup_metadata(
+                metadata_path = await self._create_backup_metadata(
                     client_id,
                     backup_id,
                     temp_path,
@@ -229,17 +230,15 @@ class BackupService:
                 db_name
             ]
             
-            # Run mysqldump and save to file
-            result = subprocess.run(
-                " ".join(dump_cmd),
-                shell=True,
-                capture_output=True,
-                text=True
+            # Stream mysqldump straight to the dump file
+            result = await command_runner.run(
+                dump_cmd,
+                target=f"{namespace}/{pod_name}",
+                stdout_path=dump_file,
+                timeout=3600
             )
             
-            if result.returncode == 0:
-                dump_file.write_text(result.stdout)
-                
+            if result.ok:
                 # Compress the SQL dump
                 compressed_file = temp_path / f"database_{client_id}.sql.gz"
                 import gzip
@@ -294,9 +293,10 @@ class BackupService:
             ] + paths_to_backup
             
             # Execute tar command
-            result = subprocess.run(tar_cmd, capture_output=True)
+            target = f"{namespace}/{pod_name}"
+            result = await command_runner.run(tar_cmd, target=target, timeout=3600)
             
-            if result.returncode == 0:
+            if result.ok:
                 # Copy archive from pod to local
                 files_archive = temp_path / f"wordpress_files_{client_id}.tar.gz"
                 
@@ -306,7 +306,7 @@ class BackupService:
                     str(files_archive)
                 ]
                 
-                subprocess.run(copy_cmd, check=True)
+                await command_runner.run(copy_cmd, target=target, timeout=3600, check=True)
                 
                 # Clean up archive in pod
                 cleanup_cmd = [
@@ -316,19 +316,19 @@ class BackupService:
                     "--",
                     "rm", f"/tmp/wordpress_files_{client_id}.tar.gz"
                 ]
-                subprocess.run(cleanup_cmd)
+                await command_runner.run(cleanup_cmd, target=target)
                 
                 logger.info(f"WordPress files backup completed for {client_id}")
                 return files_archive
             else:
-                logger.error(f"Files backup failed: {result.stderr.decode()}")
+                logger.error(f"Files backup failed: {result.stderr}")
                 return None
                 
         except Exception as e:
             logger.error(f"Failed to backup WordPress files for {client_id}: {str(e)}")
             return None
     
-    def _create_backup_metadata(
+    async def _create_backup_metadata(
         self,
         client_id: str,
         backup_id: str,
@@ -341,7 +341,7 @@ class BackupService:
             'backup_id': backup_id,
             'client_id': client_id,
             'timestamp': datetime.now().isoformat(),
-            'wordpress_version': self._get_wordpress_version(client_id),
+            'wordpress_version': await self._get_wordpress_version(client_id),
             'php_version': '8.2',
             'mysql_version': '8.0',
             'backup_contents': backup_info,
@@ -354,7 +354,7 @@ class BackupService:
         
         return metadata_file
     
-    def _get_wordpress_version(self, client_id: str) -> str:
+    async def _get_wordpress_version(self, client_id: str) -> str:
         """Get WordPress version for the site"""
         try:
             namespace = f"client-{client_id}"
@@ -368,8 +368,8 @@ class BackupService:
                 "wp", "core", "version"
             ]
             
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            if result.returncode == 0:
+            result = await command_runner.run(cmd, target=f"{namespace}/{pod_name}", timeout=60)
+            if result.ok:
                 return result.stdout.strip()
         except:
             pass
@@ -546,21 +546,20 @@ class BackupService:
             str(sql_file),
             f"{namespace}/{pod_name}:/tmp/restore.sql"
         ]
-        subprocess.run(copy_cmd, check=True)
+        target = f"{namespace}/{pod_name}"
+        await command_runner.run(copy_cmd, target=target, timeout=3600, check=True)
         
-        # Restore database
+        # Restore database (redirect happens inside the pod)
         restore_cmd = [
             "kubectl", "exec",
             "-n", namespace,
             pod_name,
             "--",
-            "mysql",
-            f"--user=wp_{client_id}",
-            db_name,
-            "<", "/tmp/restore.sql"
+            "sh", "-c",
+            f"mysql --user=wp_{client_id} {db_name} < /tmp/restore.sql"
         ]
         
-        subprocess.run(" ".join(restore_cmd), shell=True, check=True)
+        await command_runner.run(restore_cmd, target=target, timeout=3600, check=True)
         
         # Clean up
         cleanup_cmd = [
@@ -570,7 +569,7 @@ class BackupService:
             "--",
             "rm", "/tmp/restore.sql"
         ]
-        subprocess.run(cleanup_cmd)
+        await command_runner.run(cleanup_cmd, target=target)
         
         logger.info(f"Database restored for {client_id}")
     
@@ -586,7 +585,8 @@ class BackupService:
             str(files_archive),
             f"{namespace}/{pod_name}:/tmp/restore_files.tar.gz"
         ]
-        subprocess.run(copy_cmd, check=True)
+        target = f"{namespace}/{pod_name}"
+        await command_runner.run(copy_cmd, target=target, timeout=3600, check=True)
         
         # Extract files
         extract_cmd = [
@@ -598,7 +598,7 @@ class BackupService:
             "/tmp/restore_files.tar.gz",
             "-C", "/var/www/html"
         ]
-        subprocess.run(extract_cmd, check=True)
+        await command_runner.run(extract_cmd, target=target, timeout=3600, check=True)
         
         # Fix permissions
         perms_cmd = [
@@ -609,7 +609,7 @@ class BackupService:
             "chown", "-R", "www-data:www-data",
             "/var/www/html/wp-content"
         ]
-        subprocess.run(perms_cmd)
+        await command_runner.run(perms_cmd, target=target, timeout=600)
         
         # Clean up
         cleanup_cmd = [
@@ -619,7 +619,7 @@ class BackupService:
             "--",
             "rm", "/tmp/restore_files.tar.gz"
         ]
-        subprocess.run(cleanup_cmd)
+        await command_runner.run(cleanup_cmd, target=target)
         
         logger.info(f"WordPress files restored for {client_id}")
     
@@ -0,0 +1,351 @@
+"""
+Business Event Store
+Columnar store of product events (signup, visit, generate, publish, pay)
+with vectorized cohort retention and funnel computations
+
+Events are kept as three parallel NumPy columns (user code, event code,
+unix timestamp). Cohort and funnel queries are expressed as group-bys over
+those columns (np.unique / np.bincount / ufunc.at) instead of per-user
+Python loops, so a million users are processed in well under a second.
+
+Queries run on an EventSnapshot: views of the columns taken under the
+store's lock, so they can run in a worker thread while the event loop keeps
+appending. Appends write past the end of those views (or into a regrown
+buffer), never inside them.
+"""
+
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional, Sequence
+
+import numpy as np
+
+from app.services.columnar import ColumnBuffer
+
+logger = logging.getLogger(__name__)
+
+WEEK_SECONDS = 7 * 24 * 3600
+DEFAULT_FUNNEL = ("visit", "generate", "publish", "pay")
+_NEVER = np.iinfo(np.int64).max
+
+
+def _to_timestamp(value: datetime) -> int:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
+def _week_start(ts: int) -> datetime:
+    # Unix epoch was a Thursday; shift so weeks start on Monday
+    monday = ((ts + 3 * 86400) // WEEK_SECONDS) * WEEK_SECONDS - 3 * 86400
+    return datetime.fromtimestamp(monday, tz=timezone.utc)
+
+
+def _week_index(ts: np.ndarray) -> np.ndarray:
+    return (ts + 3 * 86400) // WEEK_SECONDS
+
+
+class BusinessEventStore:
+    """Append-only columnar event store"""
+
+    def __init__(self):
+        self.users = ColumnBuffer(np.int32)
+        self.events = ColumnBuffer(np.uint8)
+        self.timestamps = ColumnBuffer(np.int64)
+        self._user_codes: Dict[str, int] = {}
+        self._user_ids: List[str] = []
+        self._event_codes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    @property
+    def user_count(self) -> int:
+        return len(self._user_ids)
+
+    def _user_code(self, user_id: str) -> int:
+        code = self._user_codes.get(user_id)
+        if code is None:
+            code = self._user_codes[user_id] = len(self._user_ids)
+            self._user_ids.append(user_id)
+        return code
+
+    def event_code(self, event_type: str, create: bool = True) -> Optional[int]:
+        code = self._event_codes.get(event_type)
+        if code is None and create:
+            with self._lock:
+                if len(self._event_codes) >= 255:
+                    raise ValueError("Too many distinct event types")
+                code = self._event_codes.setdefault(event_type, len(self._event_codes))
+        return code
+
+    def append(self, event_type: str, user_id: str, timestamp: datetime) -> None:
+        """Append one event"""
+        event = self.event_code(event_type)
+        ts = _to_timestamp(timestamp)
+        user = self._user_code(user_id)
+        with self._lock:
+            self.users.append(user)
+            self.events.append(event)
+            self.timestamps.append(ts)
+            self.version += 1
+
+    def append_batch(
+        self,
+        event_type: str,
+        user_ids: Sequence[str],
+        timestamps: Sequence[int]
+    ) -> None:
+        """Append many events of one type (timestamps in unix seconds)"""
+        event = self.event_code(event_type)
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        if len(timestamps) != len(user_ids):
+            raise ValueError("user_ids and timestamps differ in length")
+        codes = self.register_users(user_ids)
+        self._extend(event, codes, timestamps)
+
+    def append_coded(self, event_type: str, user_codes: np.ndarray, timestamps: np.ndarray) -> None:
+        """Append events for users already known by their integer code"""
+        if len(user_codes) != len(timestamps):
+            raise ValueError("user_codes and timestamps differ in length")
+        if len(user_codes) and int(user_codes.max()) >= self.user_count:
+            raise ValueError("Unknown user code")
+        event = self.event_code(event_type)
+        self._extend(event, user_codes.astype(np.int32), timestamps.astype(np.int64))
+
+    def _extend(self, event: int, user_codes: np.ndarray, timestamps: np.ndarray) -> None:
+        events = np.full(len(user_codes), event, dtype=np.uint8)
+        with self._lock:
+            self.users.extend(user_codes)
+            self.events.extend(events)
+            self.timestamps.extend(timestamps)
+            self.version += 1
+
+    def register_users(self, user_ids: Sequence[str]) -> np.ndarray:
+        """Intern user ids and return their integer codes"""
+        return np.fromiter(
+            (self._user_code(u) for u in user_ids), dtype=np.int32, count=len(user_ids)
+        )
+
+    def snapshot(self) -> "EventSnapshot":
+        """Consistent view of every event appended so far"""
+        with self._lock:
+            return EventSnapshot(
+                self.users.view(),
+                self.events.view(),
+                self.timestamps.view(),
+                self.user_count,
+                dict(self._event_codes)
+            )
+
+    def first_occurrence(self, event_type: str) -> np.ndarray:
+        return self.snapshot().first_occurrence(event_type)
+
+    def weekly_retention(self, *args, **kwargs) -> Dict[str, Any]:
+        return self.snapshot().weekly_retention(*args, **kwargs)
+
+    def funnel(self, *args, **kwargs) -> List[Dict[str, Any]]:
+        return self.snapshot().funnel(*args, **kwargs)
+
+    def active_users(self, start: datetime, end: datetime, event_type: Optional[str] = None) -> np.ndarray:
+        return self.snapshot().active_users(start, end, event_type)
+
+    def count_events(self, event_type: str, start: datetime, end: datetime) -> int:
+        return self.snapshot().count_events(event_type, start, end)
+
+
+class EventSnapshot:
+    """Read-only columns of a BusinessEventStore at one point in time"""
+
+    def __init__(
+        self,
+        users: np.ndarray,
+        events: np.ndarray,
+        timestamps: np.ndarray,
+        user_count: int,
+        event_codes: Dict[str, int]
+    ):
+        self.users = users
+        self.events = events
+        self.timestamps = timestamps
+        self.user_count = user_count
+        self._event_codes = event_codes
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def event_code(self, event_type: str) -> Optional[int]:
+        return self._event_codes.get(event_type)
+
+    def _columns(self, event_type: Optional[str] = None):
+        users = self.users
+        ts = self.timestamps
+        if event_type is None:
+            return users, ts
+        code = self.event_code(event_type)
+        if code is None:
+            return users[:0], ts[:0]
+        mask = self.events == code
+        return users[mask], ts[mask]
+
+    def first_occurrence(self, event_type: str) -> np.ndarray:
+        """Per-user timestamp of the first event of a type (_NEVER if none)"""
+        first = np.full(self.user_count, _NEVER, dtype=np.int64)
+        users, ts = self._columns(event_type)
+        np.minimum.at(first, users, ts)
+        return first
+
+    def weekly_retention(
+        self,
+        start: datetime,
+        end: datetime,
+        signup_event: str = "signup",
+        activity_events: Optional[Sequence[str]] = None,
+        max_weeks: int = 12
+    ) -> Dict[str, Any]:
+        """
+        Weekly retention matrix for signup cohorts in [start, end]
+
+        Cell [c, w] is the share of cohort c with at least one activity
+        event in week w after signup (week 0 is the signup week).
+        """
+        signup = self.first_occurrence(signup_event)
+        start_week = int(_week_index(np.int64(_to_timestamp(start))))
+        end_week = int(_week_index(np.int64(_to_timestamp(end))))
+        cohort_count = max(0, end_week - start_week + 1)
+
+        signed_up = signup != _NEVER
+        cohort_of_user = np.full(self.user_count, -1, dtype=np.int64)
+        cohort_of_user[signed_up] = _week_index(signup[signed_up]) - start_week
+        cohort_of_user[(cohort_of_user < 0) | (cohort_of_user >= cohort_count)] = -1
+
+        sizes = np.bincount(
+            cohort_of_user[cohort_of_user >= 0], minlength=cohort_count
+        )[:cohort_count]
+
+        users = self.users
+        ts = self.timestamps
+        if activity_events:
+            codes = [self.event_code(e) for e in activity_events]
+            mask = np.isin(self.events, [c for c in codes if c is not None])
+            users, ts = users[mask], ts[mask]
+
+        cohorts = cohort_of_user[users]
+        in_window = cohorts >= 0
+        users, ts, cohorts = users[in_window], ts[in_window], cohorts[in_window]
+        offsets = _week_index(ts) - _week_index(signup[users])
+        valid = (offsets >= 0) & (offsets < max_weeks)
+        users, cohorts, offsets = users[valid], cohorts[valid], offsets[valid]
+
+        # Distinct (user, week offset) pairs via a bitmap (linear, no sort),
+        # then count per (cohort, offset)
+        seen = np.zeros(self.user_count * max_weeks, dtype=bool)
+        seen[users.astype(np.int64) * max_weeks + offsets] = True
+        unique_pairs = np.flatnonzero(seen)
+        pair_users = unique_pairs // max_weeks
+        pair_offsets = unique_pairs % max_weeks
+        cells = cohort_of_user[pair_users] * max_weeks + pair_offsets
+        active = np.bincount(cells, minlength=cohort_count * max_weeks)[:cohort_count * max_weeks]
+        active = active.reshape(cohort_count, max_weeks)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rates = np.where(sizes[:, None] > 0, active / sizes[:, None] * 100, 0.0)
+
+        # Weeks a cohort has not lived through yet are unknown, not zero
+        now_week = int(_week_index(np.int64(_to_timestamp(datetime.now(timezone.utc)))))
+        elapsed = now_week - (start_week + np.arange(cohort_count))
+        observed = np.arange(max_weeks)[None, :] <= elapsed[:, None]
+
+        cohorts_out = []
+        for c in range(cohort_count):
+            week_ts = (start_week + c) * WEEK_SECONDS - 3 * 86400
+            curve = [round(float(r), 2) for r, seen in zip(rates[c], observed[c]) if seen]
+            cohorts_out.append({
+                "cohort": _week_start(week_ts).strftime("%G-W%V"),
+                "week_start": _week_start(week_ts).date().isoformat(),
+                "initial_customers": int(sizes[c]),
+                "retention_curve": curve
+            })
+
+        # Size-weighted mean retention per week offset over observed cells
+        weights = np.where(observed, sizes[:, None], 0)
+        totals = weights.sum(axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            average = np.where(totals > 0, (active * observed).sum(axis=0) / totals * 100, np.nan)
+
+        return {
+            "cohorts": cohorts_out,
+            "average_retention": [None if np.isnan(v) else round(float(v), 2) for v in average],
+            "matrix": rates.round(2).tolist()
+        }
+
+    def funnel(
+        self,
+        steps: Sequence[str] = DEFAULT_FUNNEL,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        window: timedelta = timedelta(days=30)
+    ) -> List[Dict[str, Any]]:
+        """
+        Ordered multi-step funnel
+
+        A user reaches step k if they have an event of that type at or after
+        the time they reached step k-1 and within `window` of entering the
+        funnel. Entry is the first occurrence of step 1 in [start, end].
+        """
+        lo = _to_timestamp(start) if start else np.iinfo(np.int64).min
+        hi = _to_timestamp(end) if end else _NEVER - 1
+        window_seconds = int(window.total_seconds())
+
+        reached = np.full(self.user_count, _NEVER, dtype=np.int64)
+        users, ts = self._columns(steps[0])
+        in_range = (ts >= lo) & (ts <= hi)
+        np.minimum.at(reached, users[in_range], ts[in_range])
+        deadline = np.minimum(reached, _NEVER - window_seconds) + window_seconds
+
+        counts = [int(np.count_nonzero(reached != _NEVER))]
+        for step in steps[1:]:
+            users, ts = self._columns(step)
+            previous = reached[users]
+            ok = (previous != _NEVER) & (ts >= previous) & (ts <= deadline[users])
+            reached = np.full(self.user_count, _NEVER, dtype=np.int64)
+            np.minimum.at(reached, users[ok], ts[ok])
+            counts.append(int(np.count_nonzero(reached != _NEVER)))
+
+        result = []
+        for i, (step, users_at_step) in enumerate(zip(steps, counts)):
+            previous = counts[i - 1] if i else users_at_step
+            result.append({
+                "step": step,
+                "users": users_at_step,
+                "conversion_from_start": round(users_at_step / counts[0] * 100, 2) if counts[0] else 0.0,
+                "dropoff": round((1 - users_at_step / previous) * 100, 2) if i and previous else 0.0
+            })
+        return result
+
+    def active_users(self, start: datetime, end: datetime, event_type: Optional[str] = None) -> np.ndarray:
+        """Codes of users with at least one event in [start, end]"""
+        users, ts = self._columns(event_type)
+        lo, hi = _to_timestamp(start), _to_timestamp(end)
+        mask = (ts >= lo) & (ts <= hi)
+        return np.unique(users[mask])
+
+    def count_first_occurrences(self, event_type: str, start: datetime, end: datetime) -> int:
+        """Users whose first event of a type falls in [start, end]"""
+        first = self.first_occurrence(event_type)
+        return int(np.count_nonzero((first >= _to_timestamp(start)) & (first <= _to_timestamp(end))))
+
+    def has_events_before(self, event_type: str, when: datetime) -> bool:
+        _, ts = self._columns(event_type)
+        return bool(np.any(ts < _to_timestamp(when)))
+
+    def count_events(self, event_type: str, start: datetime, end: datetime) -> int:
+        _, ts = self._columns(event_type)
+        return int(np.count_nonzero((ts >= _to_timestamp(start)) & (ts <= _to_timestamp(end))))
+
+
+# Global instance
+business_event_store = BusinessEventStore()
@@ -0,0 +1,38 @@
+"""
+Columnar storage helpers for analytics services
+"""
+
+import numpy as np
+
+
+class ColumnBuffer:
+    """Growable typed array with amortized O(1) appends"""
+
+    def __init__(self, dtype, capacity: int = 1024):
+        self._data = np.empty(capacity, dtype=dtype)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, value) -> None:
+        if self._size == len(self._data):
+            self._grow(self._size + 1)
+        self._data[self._size] = value
+        self._size += 1
+
+    def extend(self, values: np.ndarray) -> None:
+        needed = self._size + len(values)
+        if needed > len(self._data):
+            self._grow(needed)
+        self._data[self._size:needed] = values
+        self._size = needed
+
+    def _grow(self, needed: int) -> None:
+        capacity = max(needed, len(self._data) * 2)
+        grown = np.empty(capacity, dtype=self._data.dtype)
+        grown[:self._size] = self._data[:self._size]
+        self._data = grown
+
+    def view(self) -> np.ndarray:
+        return self._data[:self._size]
@@ -0,0 +1,321 @@
+"""
+Async Command Runner
+Bounded, non-blocking execution of kubectl, docker and wp-cli commands
+
+Provisioning, deployment and backup code used to call subprocess.run from
+inside `async def` methods, which blocks the event loop (and every request
+served by the worker) for the duration of each command. CommandRunner runs
+commands with asyncio.create_subprocess_exec instead and adds:
+
+    - a global concurrency limit plus a per-target limit (e.g. one pod,
+      one container), so a burst of provisioning jobs cannot fork hundreds
+      of kubectl processes against the same node
+    - timeouts that terminate the whole process group (kubectl exec and
+      `sh -c` spawn children that would otherwise outlive the parent)
+    - streamed stdout/stderr capture with an optional per-line callback,
+      a size cap for captured output and an optional file sink for large
+      outputs such as database dumps
+    - structured CommandResult values instead of raw CompletedProcess
+"""
+
+import asyncio
+import logging
+import os
+import signal
+import subprocess
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+logger = logging.getLogger(__name__)
+
+OutputCallback = Callable[[str, str], None]  # (stream name, line)
+
+
+@dataclass
+class CommandResult:
+    """Outcome of one command"""
+    args: List[str]
+    returncode: int
+    stdout: str = ""
+    stderr: str = ""
+    duration: float = 0.0
+    timed_out: bool = False
+    truncated: bool = False
+    target: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0 and not self.timed_out
+
+    def check(self) -> "CommandResult":
+        """Raise CommandError unless the command succeeded"""
+        if not self.ok:
+            raise CommandError(self)
+        return self
+
+    def to_completed_process(self) -> subprocess.CompletedProcess:
+        """Compatibility shim for callers expecting subprocess results"""
+        return subprocess.CompletedProcess(
+            args=self.args, returncode=self.returncode, stdout=self.stdout, stderr=self.stderr
+        )
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "args": self.args,
+            "returncode": self.returncode,
+            "duration": round(self.duration, 3),
+            "timed_out": self.timed_out,
+            "target": self.target,
+            "stderr": self.stderr[-2000:]
+        }
+
+
+class CommandError(Exception):
+    """A command exited non-zero or timed out"""
+
+    def __init__(self, result: CommandResult):
+        self.result = result
+        reason = "timed out" if result.timed_out else f"exited with {result.returncode}"
+        detail = result.stderr.strip()[-500:] or result.stdout.strip()[-500:]
+        super().__init__(f"Command {' '.join(result.args[:4])} {reason}: {detail}")
+
+
+class _Capture:
+    """Bounded text buffer fed by a stream reader"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.chunks: List[bytes] = []
+        self.size = 0
+        self.truncated = False
+
+    def add(self, data: bytes) -> None:
+        room = self.limit - self.size
+        if room <= 0:
+            self.truncated = True
+            return
+        if len(data) > room:
+            data = data[:room]
+            self.truncated = True
+        self.chunks.append(data)
+        self.size += len(data)
+
+    def text(self) -> str:
+        return b"".join(self.chunks).decode("utf-8", errors="replace")
+
+
+class CommandRunner:
+    """Shared async subprocess executor (see module docstring)"""
+
+    def __init__(
+        self,
+        max_concurrency: int = 16,
+        per_target_concurrency: int = 4,
+        default_timeout: float = 600.0,
+        max_output_bytes: int = 10 * 1024 * 1024,
+        kill_grace: float = 5.0
+    ):
+        self.max_concurrency = max_concurrency
+        self.per_target_concurrency = per_target_concurrency
+        self.default_timeout = default_timeout
+        self.max_output_bytes = max_output_bytes
+        self.kill_grace = kill_grace
+        self._global = asyncio.Semaphore(max_concurrency)
+        self._targets: Dict[str, asyncio.Semaphore] = {}
+        self._target_users: Dict[str, int] = {}
+        self.running = 0
+        self.stats = {"started": 0, "failed": 0, "timed_out": 0, "total_seconds": 0.0}
+
+    def _target_semaphore(self, target: str) -> asyncio.Semaphore:
+        semaphore = self._targets.get(target)
+        if semaphore is None:
+            semaphore = self._targets[target] = asyncio.Semaphore(self.per_target_concurrency)
+        self._target_users[target] = self._target_users.get(target, 0) + 1
+        return semaphore
+
+    def _release_target(self, target: str) -> None:
+        self._target_users[target] -= 1
+        if self._target_users[target] == 0:
+            # Keep the map from growing with every pod ever touched
+            del self._target_users[target]
+            del self._targets[target]
+
+    async def run(
+        self,
+        args: Sequence[str],
+        *,
+        target: Optional[str] = None,
+        timeout: Optional[float] = None,
+        input: Optional[Union[str, bytes]] = None,
+        cwd: Optional[Union[str, Path]] = None,
+        env: Optional[Dict[str, str]] = None,
+        check: bool = False,
+        on_output: Optional[OutputCallback] = None,
+        stdout_path: Optional[Union[str, Path]] = None
+    ) -> CommandResult:
+        """
+        Run a command without blocking the event loop
+
+        target groups commands for the per-target limit (e.g. "ns/pod").
+        stdout_path streams stdout to a file instead of capturing it.
+        """
+        args = [str(a) for a in args]
+        if target is None:
+            return await self._run_bounded(args, None, timeout, input, cwd, env, check, on_output, stdout_path)
+
+        semaphore = self._target_semaphore(target)
+        try:
+            async with semaphore:
+                return await self._run_bounded(args, target, timeout, input, cwd, env, check, on_output, stdout_path)
+        finally:
+            self._release_target(target)
+
+    async def run_shell(self, command: str, **kwargs) -> CommandResult:
+        """Run a shell command line (pipes, redirects) through /bin/sh"""
+        return await self.run(["/bin/sh", "-c", command], **kwargs)
+
+    async def _run_bounded(self, args, target, timeout, input, cwd, env, check, on_output, stdout_path):
+        async with self._global:
+            self.running += 1
+            try:
+                result = await self._execute(args, target, timeout, input, cwd, env, on_output, stdout_path)
+            finally:
+                self.running -= 1
+
+        self.stats["total_seconds"] += result.duration
+        if result.timed_out:
+            self.stats["timed_out"] += 1
+        if not result.ok:
+            self.stats["failed"] += 1
+            logger.debug(f"Command failed ({result.returncode}): {' '.join(args)[:200]}")
+        if check:
+            result.check()
+        return result
+
+    async def _execute(self, args, target, timeout, input, cwd, env, on_output, stdout_path) -> CommandResult:
+        timeout = self.default_timeout if timeout is None else timeout
+        started = time.monotonic()
+        self.stats["started"] += 1
+
+        sink = open(stdout_path, "wb") if stdout_path is not None else None
+        try:
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    *args,
+                    stdin=asyncio.subprocess.PIPE if input is not None else asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    cwd=str(cwd) if cwd is not None else None,
+                    env={**os.environ, **env} if env else None,
+                    # New session -> own process group, killable as a unit
+                    start_new_session=True
+                )
+            except (FileNotFoundError, PermissionError) as e:
+                return CommandResult(
+                    args=args, returncode=127, stderr=str(e),
+                    duration=time.monotonic() - started, target=target
+                )
+
+            stdout = _Capture(self.max_output_bytes)
+            stderr = _Capture(self.max_output_bytes)
+            io_tasks = [
+                asyncio.ensure_future(self._pump(process.stdout, "stdout", stdout, on_output, sink)),
+                asyncio.ensure_future(self._pump(process.stderr, "stderr", stderr, on_output, None))
+            ]
+            if input is not None:
+                io_tasks.append(asyncio.ensure_future(self._feed(process, input)))
+
+            timed_out = False
+            try:
+                await asyncio.wait_for(process.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                timed_out = True
+                logger.warning(f"Command timed out after {timeout}s: {' '.join(args)[:200]}")
+                await self._kill_group(process)
+            except asyncio.CancelledError:
+                await self._kill_group(process)
+                raise
+            finally:
+                # Pipes close once the group is gone; don't wait on stragglers
+                done, pending = await asyncio.wait(io_tasks, timeout=self.kill_grace)
+                for task in pending:
+                    task.cancel()
+
+            return CommandResult(
+                args=args,
+                returncode=process.returncode if process.returncode is not None else -1,
+                stdout=stdout.text(),
+                stderr=stderr.text(),
+                duration=time.monotonic() - started,
+                timed_out=timed_out,
+                truncated=stdout.truncated or stderr.truncated,
+                target=target
+            )
+        finally:
+            if sink is not None:
+                sink.close()
+
+    @staticmethod
+    async def _pump(stream, name: str, capture: _Capture, on_output, sink) -> None:
+        pending = b""
+        while True:
+            chunk = await stream.read(65536)
+            if not chunk:
+                break
+            if sink is not None:
+                sink.write(chunk)
+            else:
+                capture.add(chunk)
+            if on_output is not None:
+                pending += chunk
+                *lines, pending = pending.split(b"\n")
+                for line in lines:
+                    on_output(name, line.decode("utf-8", errors="replace"))
+        if on_output is not None and pending:
+            on_output(name, pending.decode("utf-8", errors="replace"))
+
+    @staticmethod
+    async def _feed(process, data: Union[str, bytes]) -> None:
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        try:
+            process.stdin.write(data)
+            await process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            process.stdin.close()
+
+    async def _kill_group(self, process) -> None:
+        """SIGTERM the process group, then SIGKILL after the grace period"""
+        for sig, grace in ((signal.SIGTERM, self.kill_grace), (signal.SIGKILL, None)):
+            if process.returncode is not None:
+                return
+            try:
+                os.killpg(process.pid, sig)
+            except ProcessLookupError:
+                return
+            try:
+                await asyncio.wait_for(process.wait(), timeout=grace)
+                return
+            except asyncio.TimeoutError:
+                continue
+
+    def get_stats(self) -> Dict[str, object]:
+        return {
+            **self.stats,
+            "running": self.running,
+            "active_targets": len(self._targets),
+            "max_concurrency": self.max_concurrency,
+            "per_target_concurrency": self.per_target_concurrency
+        }
+
+
+# Global instance
+command_runner = CommandRunner(
+    max_concurrency=int(os.getenv("COMMAND_RUNNER_CONCURRENCY", "16")),
+    per_target_concurrency=int(os.getenv("COMMAND_RUNNER_PER_TARGET", "4")),
+    default_timeout=float(os.getenv("COMMAND_RUNNER_TIMEOUT_SECONDS", "600"))
+)
@@ -6,13 +6,18 @@ Part of Phase 2: Beta Público
 
 import asyncio
 import logging
+import os
 from datetime import datetime, timedelta, date
 from typing import Dict, Any, List, Optional, Tuple
 from uuid import uuid4
 from enum import Enum
 
+from pydantic import BaseModel, Field
+
 from app.core.config import settings, PLAN_LIMITS
 from app.services.agno_manager import AgnoManager
+from app.services.editorial_calendar import EditorialCalendar, PublishQueue
+from app.services.fair_pool import FairTaskPool
 from app.models.ai_models import ContentGenerationRequest, GeneratedContent
 
 logger = logging.getLogger(__name__)
@@ -121,7 +126,22 @@ class ContentAutomationService:
     def __init__(self):
         self.agno_manager = None
         self.content_plans = {}  # In production, would be in database
-        self.editorial_calendar = []  # In production, would be in database
+        
+        # Indexed by date, site, owner and status; in production, would be in database
+        self.editorial_calendar = EditorialCalendar(on_change=self._queue_for_publishing)
+        
+        # Generation slots shared round-robin between users
+        self.generation_pool = FairTaskPool(
+            concurrency=int(os.getenv('CONTENT_GENERATION_CONCURRENCY', '4')),
+            per_tenant_limit=int(os.getenv('CONTENT_GENERATION_PER_USER', '2'))
+        )
+        
+        # Scheduled items of users with auto-publishing, by publish time
+        self.publish_queue = PublishQueue()
+        self.auto_publish_users = set()
+        self.publish_concurrency = int(os.getenv('CONTENT_PUBLISH_CONCURRENCY', '8'))
+        self._publish_task: Optional[asyncio.Task] = None
+        self._publish_wakeup: Optional[asyncio.Event] = None
         
     async def initialize(self, agno_manager: AgnoManager):
         """Initialize with Agno manager"""
@@ -224,21 +244,13 @@ class ContentAutomationService:
         if not end_date:
             end_date = start_date + timedelta(days=30)
         
-        # Filter calendar items
-        items = []
-        for item in self.editorial_calendar:
-            if item.created_by != user_id:
-                continue
-            if item.scheduled_date < start_date or item.scheduled_date > end_date:
-                continue
-            if status and item.status != status:
-                continue
-            items.append(item)
-        
-        # Sort by scheduled date
-        items.sort(key=lambda x: x.scheduled_date)
-        
-        return items
+        # Already sorted by scheduled date
+        return self.editorial_calendar.range(
+            start_date,
+            end_date,
+            owner=user_id,
+            status=status
+        )
     
     async def generate_content_batch(
         self,
@@ -254,47 +266,63 @@ class ContentAutomationService:
         if not self.agno_manager:
             raise ValueError("Agno manager not initialized")
         
-        generated_contents = []
+        items = [self.editorial_calendar.get(calendar_id) for calendar_id in calendar_ids]
+        items = [item for item in items if item is not None]
         
-        for calendar_id in calendar_ids:
-            # Find calendar item
-            item = next((i for i in self.editorial_calendar if i.id == calendar_id), None)
-            if not item:
-                continue
-            
-            # Create content generation request
-            request = ContentGenerationRequest(
-                content_type="blog_post",
-                topic=item.topic,
-                keywords=item.keywords,
-                tone=item.tone,
-                target_audience=item.target_audience,
-                custom_instructions=item.custom_instructions,
-                seo_optimized=True
-            )
-            
-            # Generate with Agno
-            response = await self.agno_manager.generate_content(
-                request=request,
-                user_id=user_id,
-                user_plan=user_plan
-            )
-            
-            if response.success and response.content:
-                # Parse and structure content
-                generated_content = self._parse_generated_content(response.content, item)
-                
-                # Update calendar item
-                item.generated_content = generated_content
-                item.status = ContentStatus.SCHEDULED
-                item.updated_at = datetime.now()
-                
-                generated_contents.append(generated_content)
-                
-                logger.info(f"Generated content for calendar item: {calendar_id}")
+        # Bounded and shared fairly with other users' batches
+        results = await self.generation_pool.map(user_id, [
+            lambda item=item: self._generate_item_content(item, user_id, user_plan)
+            for item in items
+        ])
+        
+        generated_contents = []
+        for item, result in zip(items, results):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to generate content for calendar item {item.id}: {str(result)}")
+            elif result is not None:
+                generated_contents.append(result)
         
         return generated_contents
     
+    async def _generate_item_content(
+        self,
+        item: EditorialCalendarItem,
+        user_id: str,
+        user_plan: str
+    ) -> Optional[GeneratedContent]:
+        """Generate and attach content for one calendar item"""
+        
+        # Create content generation request
+        request = ContentGenerationRequest(
+            content_type="blog_post",
+            topic=item.topic,
+            keywords=item.keywords,
+            tone=item.tone,
+            target_audience=item.target_audience,
+            custom_instructions=item.custom_instructions,
+            seo_optimized=True
+        )
+        
+        # Generate with Agno
+        response = await self.agno_manager.generate_content(
+            request=request,
+            user_id=user_id,
+            user_plan=user_plan
+        )
+        
+        if not (response.success and response.content):
+            return None
+        
+        # Parse and structure content
+        generated_content = self._parse_generated_content(response.content, item)
+        
+        # Update calendar item
+        item.generated_content = generated_content
+        self.editorial_calendar.set_status(item, ContentStatus.SCHEDULED)
+        
+        logger.info(f"Generated content for calendar item: {item.id}")
+        return generated_content
+    
     def _parse_generated_content(
         self,
         raw_content: str,
@@ -320,16 +348,21 @@ class ContentAutomationService:
         tags.append(calendar_item.topic.lower().replace(' ', '-'))
         
         return GeneratedContent(
+            content_id=str(uuid4()),
+            content_type=calendar_item.content_type,
             title=title,
             content=content,
-            excerpt=excerpt,
-            meta_title=title[:60],  # SEO title length
-            meta_description=meta_description,
-            tags=tags,
-            categories=[calendar_item.content_type],
-            word_count=len(content.split()),
-            seo_score=85,  # Would be calculated
-            readability_score=75  # Would be calculated
+            metadata={
+                "excerpt": excerpt,
+                "meta_title": title[:60],  # SEO title length
+                "meta_description": meta_description,
+                "tags": tags,
+                "categories": [calendar_item.content_type],
+                "word_count": len(content.split()),
+                "seo_score": 85,  # Would be calculated
+                "readability_score": 75  # Would be calculated
+            },
+            created_at=datetime.now()
         )
     
     async def publish_content(
@@ -344,11 +377,11 @@ class ContentAutomationService:
         """
         
         # Find calendar item
-        item = next((i for i in self.editorial_calendar if i.id == calendar_id), None)
+        item = self.editorial_calendar.get(calendar_id)
         if not item or not item.generated_content:
             raise ValueError(f"Calendar item {calendar_id} not found or has no content")
         
-        item.status = ContentStatus.PUBLISHING
+        self.editorial_calendar.set_status(item, ContentStatus.PUBLISHING)
         
         try:
             if platform == PublishingPlatform.WORDPRESS:
@@ -361,16 +394,15 @@ class ContentAutomationService:
                 raise ValueError(f"Unsupported platform: {platform}")
             
             # Update item status
-            item.status = ContentStatus.PUBLISHED
             item.published_at = datetime.now()
             item.published_url = result.get("url")
-            item.updated_at = datetime.now()
+            self.editorial_calendar.set_status(item, ContentStatus.PUBLISHED)
             
             logger.info(f"Published content {calendar_id} to {platform}")
             return result
             
         except Exception as e:
-            item.status = ContentStatus.FAILED
+            self.editorial_calendar.set_status(item, ContentStatus.FAILED)
             logger.error(f"Failed to publish content {calendar_id}: {str(e)}")
             raise
     
@@ -436,18 +468,85 @@ class ContentAutomationService:
         Will publish content at scheduled times
         """
         
-        # This would set up background tasks/cron jobs
-        # to automatically publish scheduled content
+        if enable:
+            self.auto_publish_users.add(user_id)
+            for item in self.editorial_calendar.items(owner=user_id, status=ContentStatus.SCHEDULED):
+                self._queue_for_publishing(item)
+            self._start_publisher()
+        else:
+            self.auto_publish_users.discard(user_id)
         
         status = "enabled" if enable else "disabled"
         logger.info(f"Auto-publishing {status} for user {user_id}")
         
+        next_item = None
+        if enable:
+            upcoming = self.editorial_calendar.range(datetime.now(), owner=user_id, status=ContentStatus.SCHEDULED)
+            next_item = upcoming[0] if upcoming else None
+        
         return {
             "auto_publishing": enable,
             "message": f"Automatic publishing has been {status}",
-            "next_scheduled": None if not enable else (datetime.now() + timedelta(hours=1)).isoformat()
+            "next_scheduled": next_item.scheduled_date.isoformat() if next_item else None
         }
     
+    def _queue_for_publishing(self, item: EditorialCalendarItem):
+        """Calendar change hook: keep scheduled items of auto-publishing users queued"""
+        
+        if item.status == ContentStatus.SCHEDULED and item.created_by in self.auto_publish_users:
+            self.publish_queue.push(item.id, item.scheduled_date)
+            if self._publish_wakeup is not None:
+                self._publish_wakeup.set()
+        else:
+            self.publish_queue.discard(item.id)
+    
+    async def publish_due_content(self, now: Optional[datetime] = None) -> List[str]:
+        """Publish every queued item whose scheduled time has come; returns their ids"""
+        
+        due = []
+        for calendar_id in self.publish_queue.pop_due(now):
+            item = self.editorial_calendar.get(calendar_id)
+            # Auto-publishing may have been disabled since the item was queued
+            if item and item.status == ContentStatus.SCHEDULED and item.created_by in self.auto_publish_users:
+                due.append(item)
+        
+        semaphore = asyncio.Semaphore(self.publish_concurrency)
+        
+        async def publish(item: EditorialCalendarItem) -> bool:
+            async with semaphore:
+                try:
+                    await self.publish_content(item.id, item.platform, item.site_id)
+                    return True
+                except Exception:
+                    return False  # logged and marked failed by publish_content
+        
+        results = await asyncio.gather(*(publish(item) for item in due))
+        return [item.id for item, ok in zip(due, results) if ok]
+    
+    def _start_publisher(self):
+        """Start the auto-publishing loop if it is not running"""
+        
+        if self._publish_task is None or self._publish_task.done():
+            self._publish_wakeup = asyncio.Event()
+            self._publish_task = asyncio.create_task(self._publisher_loop())
+    
+    async def _publisher_loop(self):
+        """Sleep until the earliest queued item is due (or the queue changes), then publish"""
+        
+        while True:
+            try:
+                await self.publish_due_content()
+            except Exception as e:
+                logger.error(f"Auto-publishing error: {str(e)}")
+            
+            next_time = self.publish_queue.next_time()
+            timeout = 60.0 if next_time is None else min(60.0, max(0.0, next_time - datetime.now().timestamp()))
+            self._publish_wakeup.clear()
+            try:
+                await asyncio.wait_for(self._publish_wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+    
     async def get_content_performance(
         self,
         user_id: str,
@@ -455,10 +554,7 @@ class ContentAutomationService:
     ) -> Dict[str, Any]:
         """Get content performance analytics"""
         
-        published_items = [
-            item for item in self.editorial_calendar
-            if item.created_by == user_id and item.status == ContentStatus.PUBLISHED
-        ]
+        published_items = self.editorial_calendar.items(owner=user_id, status=ContentStatus.PUBLISHED)
         
         total_views = sum(item.views for item in published_items)
         avg_engagement = sum(item.engagement_rate for item in published_items) / len(published_items) if published_items else 0
@@ -478,9 +574,9 @@ class ContentAutomationService:
                 for item in sorted(published_items, key=lambda x: x.views, reverse=True)[:5]
             ],
             "publishing_consistency": {
-                "scheduled": len([i for i in self.editorial_calendar if i.status == ContentStatus.SCHEDULED]),
+                "scheduled": self.editorial_calendar.count(ContentStatus.SCHEDULED),
                 "published": len(published_items),
-                "failed": len([i for i in self.editorial_calendar if i.status == ContentStatus.FAILED])
+                "failed": self.editorial_calendar.count(ContentStatus.FAILED)
             }
         }
     
@@ -1,24 +1,132 @@
 """
 DNS Manager Service
 Automated DNS management with Cloudflare integration
+
+Records are applied as a batch: the zone's existing records are listed once,
+diffed against the desired records, and only the differences are sent, in
+chunks, to Cloudflare's batch endpoint (falling back to concurrent single
+calls where the endpoint is unavailable). Records that already match are
+skipped, so applying hundreds of records costs a handful of API calls.
+
+Propagation is verified by querying several public resolvers concurrently
+with an async DNS resolver. Resolvers that already answer correctly are not
+asked again; the others are re-queried with exponential backoff, waiting at
+least as long as the TTL of the stale answer they returned.
 """
 
 import logging
 import httpx
 import asyncio
-from typing import Dict, Any, Optional, List
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional, List, Iterable, Tuple
 from datetime import datetime
 import os
 import re
 
+try:
+    import dns.asyncresolver
+    import dns.exception
+    import dns.resolver
+    DNSPYTHON_AVAILABLE = True
+except ImportError:
+    DNSPYTHON_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+# Fields compared when deciding whether an existing record needs an update
+DIFF_FIELDS = ('ttl', 'proxied', 'priority')
+PROXIABLE_TYPES = {'A', 'AAAA', 'CNAME'}
+
+
+def _normalize_content(record_type: str, content: str) -> str:
+    content = str(content).strip()
+    if record_type == 'TXT':
+        return content.strip('"')
+    if record_type in ('CNAME', 'MX', 'NS', 'PTR'):
+        return content.rstrip('.').lower()
+    return content.lower()
+
+
+def record_key(record: Dict[str, Any]) -> Tuple[str, str, str]:
+    """Identity of a record: (type, fqdn, content)"""
+    record_type = record['type'].upper()
+    return (
+        record_type,
+        record['name'].rstrip('.').lower(),
+        _normalize_content(record_type, record['content'])
+    )
+
+
+@dataclass
+class RecordDiff:
+    """Changes needed to turn the existing records into the desired ones"""
+    create: List[Dict[str, Any]] = field(default_factory=list)
+    update: List[Tuple[Dict[str, Any], Dict[str, Any]]] = field(default_factory=list)  # (existing, desired)
+    delete: List[Dict[str, Any]] = field(default_factory=list)
+    unchanged: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def changes(self) -> int:
+        return len(self.create) + len(self.update) + len(self.delete)
+
+    def summary(self) -> Dict[str, int]:
+        return {
+            'created': len(self.create),
+            'updated': len(self.update),
+            'deleted': len(self.delete),
+            'unchanged': len(self.unchanged)
+        }
+
+
+def diff_records(
+    existing: Iterable[Dict[str, Any]],
+    desired: Iterable[Dict[str, Any]],
+    prune: bool = False
+) -> RecordDiff:
+    """
+    Compare zone records with desired records (names must be FQDNs)
+
+    With prune, existing records sharing a (type, name) with a desired
+    record but not desired themselves are deleted (e.g. a server IP that
+    was removed from a load-balanced name).
+    """
+    current = {record_key(r): r for r in existing}
+    diff = RecordDiff()
+    wanted = set()
+
+    for record in desired:
+        key = record_key(record)
+        if key in wanted:
+            continue
+        wanted.add(key)
+        found = current.get(key)
+        if found is None:
+            diff.create.append(record)
+            continue
+        changed = any(
+            field_name in record and record[field_name] != found.get(field_name)
+            for field_name in DIFF_FIELDS
+            if field_name != 'proxied' or key[0] in PROXIABLE_TYPES
+        )
+        if changed:
+            diff.update.append((found, record))
+        else:
+            diff.unchanged.append(found)
+
+    if prune:
+        managed = {(key[0], key[1]) for key in wanted}
+        diff.delete = [
+            record for key, record in current.items()
+            if (key[0], key[1]) in managed and key not in wanted
+        ]
+    return diff
+
 class DNSManager:
     """
     Manages DNS records automatically via Cloudflare API
     """
     
-    def __init__(self):
+    def __init__(self, client: Optional[httpx.AsyncClient] = None):
         self.cloudflare_api_token = os.getenv('CLOUDFLARE_API_TOKEN', '')
         self.cloudflare_zone_id = os.getenv('CLOUDFLARE_ZONE_ID', '')
         self.base_domain = os.getenv('BASE_DOMAIN', 'kenzysites.com.br')
@@ -29,12 +137,191 @@ class DNSManager:
             'Content-Type': 'application/json'
         }
         
-        self.client = httpx.AsyncClient(headers=self.headers, timeout=30.0)
+        self.client = client or httpx.AsyncClient(headers=self.headers, timeout=30.0)
         
         # IP addresses for load balancing
         self.server_ips = os.getenv('SERVER_IPS', '').split(',')
         if not self.server_ips or self.server_ips == ['']:
             self.server_ips = ['192.168.1.100']  # Default IP
+        
+        # Batch application of record changes
+        self.batch_size = int(os.getenv('CLOUDFLARE_BATCH_SIZE', '200'))
+        self.api_concurrency = int(os.getenv('CLOUDFLARE_API_CONCURRENCY', '8'))
+        self._batch_supported = True
+        
+        # Public resolvers used to verify propagation ("ip" or "ip:port")
+        self.propagation_resolvers = [
+            r.strip() for r in os.getenv(
+                'DNS_PROPAGATION_RESOLVERS', '1.1.1.1,8.8.8.8,9.9.9.9,208.67.222.222'
+            ).split(',') if r.strip()
+        ]
+    
+    @property
+    def records_url(self) -> str:
+        return f"{self.base_url}/zones/{self.cloudflare_zone_id}/dns_records"
+    
+    def _fqdn(self, name: str) -> str:
+        """Zone-relative or '@' name to the FQDN Cloudflare reports"""
+        name = name.rstrip('.').lower()
+        if name in ('@', '', self.base_domain):
+            return self.base_domain
+        if name.endswith(f".{self.base_domain}"):
+            return name
+        return f"{name}.{self.base_domain}"
+    
+    async def list_zone_records(self, name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """All records of the zone (optionally one name), following pagination"""
+        records: List[Dict[str, Any]] = []
+        page = 1
+        while True:
+            params = {'page': page, 'per_page': 1000}
+            if name:
+                params['name'] = self._fqdn(name)
+            response = await self.client.get(self.records_url, params=params)
+            response.raise_for_status()
+            result = response.json()
+            records.extend(result.get('result') or [])
+            total_pages = (result.get('result_info') or {}).get('total_pages', 1)
+            if page >= total_pages:
+                return records
+            page += 1
+    
+    async def apply_records(
+        self,
+        desired: List[Dict[str, Any]],
+        prune: bool = False,
+        existing: Optional[List[Dict[str, Any]]] = None,
+        dry_run: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Make the zone contain the desired records, skipping unchanged ones
+        
+        Records use Cloudflare fields (type, name, content, ttl, proxied,
+        priority, comment); names may be zone-relative. existing can be
+        passed to reuse a zone listing across calls.
+        """
+        desired = [{**record, 'name': self._fqdn(record['name'])} for record in desired]
+        
+        try:
+            if existing is None:
+                names = {record['name'] for record in desired}
+                # One listing for a single name, the whole zone for bulk work
+                existing = await self.list_zone_records(next(iter(names))) if len(names) == 1 \
+                    else await self.list_zone_records()
+        except httpx.HTTPError as e:
+            logger.error(f"Failed to list DNS records: {str(e)}")
+            return {'success': False, 'error': str(e)}
+        
+        diff = diff_records(existing, desired, prune=prune)
+        result = {'success': True, **diff.summary(), 'records': list(diff.unchanged), 'errors': []}
+        if dry_run or not diff.changes:
+            return result
+        
+        applied, errors = await self._submit_changes(diff)
+        result['records'].extend(applied)
+        result['errors'] = errors
+        result['success'] = not errors
+        logger.info(
+            f"Applied DNS changes: {diff.summary()}" + (f", {len(errors)} errors" if errors else "")
+        )
+        return result
+    
+    @staticmethod
+    def _payload(record: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            key: value for key, value in record.items()
+            if key in ('type', 'name', 'content', 'ttl', 'proxied', 'priority', 'comment', 'data')
+        }
+    
+    async def _submit_changes(self, diff: RecordDiff) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """Send a diff in batch-endpoint chunks; returns (records written, errors)"""
+        operations = (
+            [('deletes', {'id': record['id']}) for record in diff.delete]
+            + [('patches', {'id': found['id'], **self._payload(record)}) for found, record in diff.update]
+            + [('posts', self._payload(record)) for record in diff.create]
+        )
+        applied: List[Dict[str, Any]] = []
+        errors: List[str] = []
+        
+        for start in range(0, len(operations), self.batch_size):
+            chunk = operations[start:start + self.batch_size]
+            if self._batch_supported:
+                body: Dict[str, List[Dict[str, Any]]] = {}
+                for kind, payload in chunk:
+                    body.setdefault(kind, []).append(payload)
+                try:
+                    response = await self.client.post(f"{self.records_url}/batch", json=body)
+                    if response.status_code in (404, 405):
+                        logger.info("Cloudflare batch endpoint unavailable, using single calls")
+                        self._batch_supported = False
+                    else:
+                        response.raise_for_status()
+                        result = response.json().get('result') or {}
+                        applied.extend(result.get('patches', []) + result.get('posts', []))
+                        continue
+                except httpx.HTTPError as e:
+                    # A batch is atomic: nothing in this chunk was applied
+                    errors.extend(
+                        f"{kind[:-1]} {payload.get('name', payload.get('id'))}: {str(e)}"
+                        for kind, payload in chunk
+                    )
+                    continue
+            
+            chunk_applied, chunk_errors = await self._submit_individually(chunk)
+            applied.extend(chunk_applied)
+            errors.extend(chunk_errors)
+        
+        return applied, errors
+    
+    async def _submit_individually(self, operations) -> Tuple[List[Dict[str, Any]], List[str]]:
+        semaphore = asyncio.Semaphore(self.api_concurrency)
+        
+        async def submit(kind: str, payload: Dict[str, Any]):
+            async with semaphore:
+                if kind == 'deletes':
+                    response = await self.client.delete(f"{self.records_url}/{payload['id']}")
+                elif kind == 'patches':
+                    record_id = payload['id']
+                    body = {k: v for k, v in payload.items() if k != 'id'}
+                    response = await self.client.patch(f"{self.records_url}/{record_id}", json=body)
+                else:
+                    response = await self.client.post(self.records_url, json=payload)
+                response.raise_for_status()
+                return None if kind == 'deletes' else response.json().get('result')
+        
+        # Deletes first, so a pruned record never collides with its replacement
+        deletes = [op for op in operations if op[0] == 'deletes']
+        writes = [op for op in operations if op[0] != 'deletes']
+        applied, errors = [], []
+        for group in (deletes, writes):
+            results = await asyncio.gather(*(submit(*op) for op in group), return_exceptions=True)
+            for (kind, payload), outcome in zip(group, results):
+                if isinstance(outcome, Exception):
+                    errors.append(f"{kind[:-1]} {payload.get('name', payload.get('id'))}: {str(outcome)}")
+                elif outcome:
+                    applied.append(outcome)
+        return applied, errors
+    
+    def _subdomain_records(
+        self,
+        subdomain: str,
+        client_id: str,
+        record_type: str = 'A',
+        proxied: bool = True,
+        ttl: int = 1
+    ) -> List[Dict[str, Any]]:
+        """One record per server IP (load balancing)"""
+        return [
+            {
+                'type': record_type,
+                'name': subdomain,
+                'content': ip,
+                'ttl': ttl,
+                'proxied': proxied,
+                'comment': f'Client: {client_id}, Created: {datetime.now().isoformat()}'
+            }
+            for ip in self.server_ips
+        ]
     
     async def create_subdomain(
         self,
@@ -58,92 +345,33 @@ class DNSManager:
         # Full domain name
         full_domain = f"{subdomain}.{self.base_domain}"
         
-        try:
-            # Check if record already exists
-            existing = await self._get_dns_record(full_domain)
-            if existing:
-                logger.info(f"DNS record already exists for {full_domain}")
-                return {
-                    'success': True,
-                    'domain': full_domain,
-                    'record_id': existing['id'],
-                    'message': 'Record already exists'
-                }
-            
-            # Create DNS record
-            data = {
-                'type': record_type,
-                'name': subdomain,
-                'content': self.server_ips[0],  # Primary IP
-                'ttl': ttl,
-                'proxied': proxied,
-                'comment': f'Client: {client_id}, Created: {datetime.now().isoformat()}'
-            }
-            
-            response = await self.client.post(
-                f"{self.base_url}/zones/{self.cloudflare_zone_id}/dns_records",
-                json=data
-            )
-            
-            response.raise_for_status()
-            result = response.json()
-            
-            if result.get('success'):
-                record = result['result']
-                logger.info(f"Created DNS record for {full_domain}")
-                
-                # Create additional A records for load balancing if multiple IPs
-                if len(self.server_ips) > 1:
-                    for ip in self.server_ips[1:]:
-                        await self._create_additional_a_record(subdomain, ip, client_id)
-                
-                return {
-                    'success': True,
-                    'domain': full_domain,
-                    'record_id': record['id'],
-                    'proxied': record['proxied'],
-                    'ip_address': record['content']
-                }
-            else:
-                errors = result.get('errors', [])
-                return {
-                    'success': False,
-                    'error': errors[0]['message'] if errors else 'Unknown error'
-                }
-                
-        except httpx.HTTPError as e:
-            logger.error(f"Failed to create DNS record: {str(e)}")
+        # One record per server IP; records that already exist are skipped
+        result = await self.apply_records(
+            self._subdomain_records(subdomain, client_id, record_type, proxied, ttl)
+        )
+        if not result['success']:
             return {
                 'success': False,
-                'error': str(e)
+                'error': result.get('error') or '; '.join(result['errors'])
             }
-    
-    async def _create_additional_a_record(
-        self,
-        subdomain: str,
-        ip: str,
-        client_id: str
-    ):
-        """Create additional A records for load balancing"""
-        
-        data = {
-            'type': 'A',
-            'name': subdomain,
-            'content': ip,
-            'ttl': 1,
-            'proxied': True,
-            'comment': f'Client: {client_id}, Load balanced IP'
-        }
         
-        try:
-            response = await self.client.post(
-                f"{self.base_url}/zones/{self.cloudflare_zone_id}/dns_records",
-                json=data
-            )
-            response.raise_for_status()
-            logger.info(f"Added additional A record for {subdomain} with IP {ip}")
-        except Exception as e:
-            logger.error(f"Failed to add additional A record: {str(e)}")
+        primary = next(
+            (r for r in result['records'] if r.get('content') == self.server_ips[0]),
+            result['records'][0] if result['records'] else {}
+        )
+        response = {
+            'success': True,
+            'domain': full_domain,
+            'record_id': primary.get('id'),
+            'proxied': primary.get('proxied', proxied),
+            'ip_address': primary.get('content', self.server_ips[0])
+        }
+        if not result['created'] and not result['updated']:
+            logger.info(f"DNS record already exists for {full_domain}")
+            response['message'] = 'Record already exists'
+        else:
+            logger.info(f"Created DNS record for {full_domain}")
+        return response
     
     async def create_custom_domain(
         self,
@@ -322,15 +550,12 @@ class DNSManager:
         full_domain = f"{subdomain}.{self.base_domain}"
         
         try:
-            # Get all records for this subdomain
+            # Get all records for this subdomain and delete them in one batch
             records = await self._get_all_dns_records(subdomain)
-            
-            # Delete each record
-            deleted_count = 0
-            for record in records:
-                result = await self.delete_dns_record(record['id'])
-                if result.get('success'):
-                    deleted_count += 1
+            _, errors = await self._submit_changes(RecordDiff(delete=records))
+            for error in errors:
+                logger.error(f"Failed to delete DNS record: {error}")
+            deleted_count = len(records) - len(errors)
             
             logger.info(f"Deleted {deleted_count} DNS records for {full_domain}")
             
@@ -347,29 +572,6 @@ class DNSManager:
                 'error': str(e)
             }
     
-    async def _get_dns_record(self, domain: str) -> Optional[Dict]:
-        """
-        Get DNS record by domain name
-        """
-        
-        try:
-            response = await self.client.get(
-                f"{self.base_url}/zones/{self.cloudflare_zone_id}/dns_records",
-                params={'name': domain}
-            )
-            
-            response.raise_for_status()
-            result = response.json()
-            
-            if result.get('success') and result.get('result'):
-                return result['result'][0] if result['result'] else None
-            
-            return None
-            
-        except Exception as e:
-            logger.error(f"Failed to get DNS record: {str(e)}")
-            return None
-    
     async def _get_all_dns_records(self, subdomain: str) -> List[Dict]:
         """
         Get all DNS records for a subdomain
@@ -432,38 +634,133 @@ class DNSManager:
         # For now, just log
         logger.info(f"Stored custom domain mapping: {custom_domain} -> {target} for client {client_id}")
     
-    async def verify_dns_propagation(self, domain: str) -> Dict[str, Any]:
+    async def _query_resolver(
+        self,
+        resolver: str,
+        domain: str,
+        record_type: str,
+        lifetime: float
+    ) -> Dict[str, Any]:
+        """Ask one resolver ("ip" or "ip:port") directly, bypassing any cache"""
+        host, port = resolver, 53
+        if resolver.count(':') == 1:
+            host, port_text = resolver.split(':')
+            port = int(port_text)
+        
+        query = dns.asyncresolver.Resolver(configure=False)
+        query.nameservers = [host]
+        query.port = port
+        query.cache = None
+        try:
+            answer = await query.resolve(
+                domain, record_type, raise_on_no_answer=False, lifetime=lifetime
+            )
+        except dns.resolver.NXDOMAIN:
+            return {'answers': [], 'error': 'NXDOMAIN'}
+        except (dns.exception.Timeout, dns.resolver.NoNameservers) as e:
+            return {'answers': [], 'error': type(e).__name__}
+        except dns.exception.DNSException as e:
+            return {'answers': [], 'error': str(e)}
+        
+        if answer.rrset is None:
+            return {'answers': [], 'error': 'NoAnswer'}
+        return {
+            'answers': [_normalize_content(record_type, rdata.to_text()) for rdata in answer.rrset],
+            'ttl': answer.rrset.ttl
+        }
+    
+    async def _query_system_resolver(self, domain: str) -> Dict[str, Any]:
+        """Fallback without dnspython: the host's resolver, A/AAAA only"""
+        loop = asyncio.get_running_loop()
+        try:
+            infos = await loop.getaddrinfo(domain, None)
+        except OSError as e:
+            return {'answers': [], 'error': str(e)}
+        return {'answers': sorted({info[4][0] for info in infos})}
+    
+    async def verify_dns_propagation(
+        self,
+        domain: str,
+        expected: Optional[List[str]] = None,
+        record_type: str = 'A',
+        resolvers: Optional[List[str]] = None,
+        min_resolvers: Optional[int] = None,
+        wait_seconds: float = 0,
+        query_timeout: float = 3.0,
+        initial_delay: float = 1.0,
+        max_delay: float = 30.0
+    ) -> Dict[str, Any]:
         """
         Check if DNS has propagated
-        """
         
-        import socket
+        All resolvers are queried concurrently. A resolver counts as
+        propagated when it returns one of the expected values (any answer
+        when expected is None); the domain is propagated once min_resolvers
+        (default: all) agree. With wait_seconds, unpropagated resolvers are
+        re-queried with backoff until then.
+        """
+        resolvers = resolvers or self.propagation_resolvers
+        if not DNSPYTHON_AVAILABLE:
+            resolvers = ['system']
+        quorum = min(min_resolvers or len(resolvers), len(resolvers))
+        wanted = {_normalize_content(record_type, value) for value in expected} if expected else None
+        
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + wait_seconds
+        results: Dict[str, Dict[str, Any]] = {}
+        pending = list(resolvers)
+        delay = initial_delay
+        attempts = 0
         
         try:
-            # Try to resolve domain
-            ip = socket.gethostbyname(domain)
-            
-            # Check if resolved IP matches our servers
-            is_ours = ip in self.server_ips
-            
-            return {
-                'success': True,
-                'propagated': True,
-                'resolved_ip': ip,
-                'is_configured': is_ours
-            }
-            
-        except socket.gaierror:
-            return {
-                'success': True,
-                'propagated': False,
-                'message': 'DNS not propagated yet'
-            }
+            while True:
+                attempts += 1
+                answers = await asyncio.gather(*(
+                    self._query_system_resolver(domain) if resolver == 'system'
+                    else self._query_resolver(resolver, domain, record_type, query_timeout)
+                    for resolver in pending
+                ))
+                for resolver, answer in zip(pending, answers):
+                    answer['propagated'] = bool(answer['answers']) and (
+                        wanted is None or bool(wanted & set(answer['answers']))
+                    )
+                    results[resolver] = answer
+                pending = [r for r in pending if not results[r]['propagated']]
+                
+                remaining = deadline - loop.time()
+                if len(resolvers) - len(pending) >= quorum or remaining <= 0:
+                    break
+                # A resolver holding a stale answer won't change before its TTL expires
+                ttls = [results[r]['ttl'] for r in pending if results[r].get('ttl')]
+                stale = min(ttls) if ttls else 0
+                pause = min(max(delay, stale), max_delay, remaining)
+                await asyncio.sleep(pause)
+                delay = min(delay * 2, max_delay)
+        
         except Exception as e:
             return {
                 'success': False,
                 'error': str(e)
             }
+        
+        propagated_count = len(resolvers) - len(pending)
+        resolved = next((a['answers'][0] for a in results.values() if a['answers']), None)
+        response = {
+            'success': True,
+            'propagated': propagated_count >= quorum,
+            'propagated_resolvers': propagated_count,
+            'total_resolvers': len(resolvers),
+            'resolvers': results,
+            'attempts': attempts
+        }
+        if resolved is not None:
+            response['resolved_ip'] = resolved
+            response['is_configured'] = any(
+                ip in self.server_ips for a in results.values() for ip in a['answers']
+            )
+        else:
+            response['message'] = 'DNS not propagated yet'
+        return response
     
     async def setup_email_records(
         self,
@@ -495,40 +792,28 @@ class DNSManager:
         full_domain = f"{subdomain}.{self.base_domain}"
         
         try:
-            # Create MX records
-            for mx in config['mx']:
-                await self.client.post(
-                    f"{self.base_url}/zones/{self.cloudflare_zone_id}/dns_records",
-                    json={
-                        'type': 'MX',
-                        'name': subdomain,
-                        'content': mx['server'],
-                        'priority': mx['priority'],
-                        'ttl': 3600
-                    }
-                )
-            
-            # Create SPF record
-            await self.client.post(
-                f"{self.base_url}/zones/{self.cloudflare_zone_id}/dns_records",
-                json={
-                    'type': 'TXT',
+            records = [
+                {
+                    'type': 'MX',
                     'name': subdomain,
-                    'content': config['spf'],
+                    'content': mx['server'],
+                    'priority': mx['priority'],
                     'ttl': 3600
                 }
-            )
-            
-            # Create DMARC record
-            await self.client.post(
-                f"{self.base_url}/zones/{self.cloudflare_zone_id}/dns_records",
-                json={
-                    'type': 'TXT',
-                    'name': f'_dmarc.{subdomain}',
-                    'content': 'v=DMARC1; p=quarantine; rua=mailto:dmarc@kenzysites.com.br',
-                    'ttl': 3600
-                }
-            )
+                for mx in config['mx']
+            ]
+            # SPF and DMARC
+            records.append({'type': 'TXT', 'name': subdomain, 'content': config['spf'], 'ttl': 3600})
+            records.append({
+                'type': 'TXT',
+                'name': f'_dmarc.{subdomain}',
+                'content': 'v=DMARC1; p=quarantine; rua=mailto:dmarc@kenzysites.com.br',
+                'ttl': 3600
+            })
+            
+            result = await self.apply_records(records)
+            if not result['success']:
+                raise RuntimeError(result.get('error') or '; '.join(result['errors']))
             
             logger.info(f"Email records configured for {full_domain}")
             
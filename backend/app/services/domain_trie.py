@@ -0,0 +1,145 @@
+"""
+Domain Trie
+Host name -> value index over reversed labels
+
+"client.agency.com.br" is stored along the path br -> com -> agency -> client,
+so a lookup walks at most one node per label of the requested host regardless
+of how many domains are registered. Two kinds of entries are supported:
+
+- exact: "agency.com.br" matches only that host
+- wildcard: "*.agency.com.br" matches any host below agency.com.br, at any depth
+
+The most specific entry wins: an exact match beats any wildcard, and a
+deeper wildcard beats a shallower one. Results of lookup() are memoized per
+raw host string until the trie changes.
+"""
+
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+_EXACT = "\x00exact"
+_WILDCARD = "\x00wildcard"
+
+def normalize_host(host: str) -> str:
+    """Lower-case host without port, trailing dot or surrounding whitespace"""
+    host = host.strip().lower()
+    if host.startswith("["):  # IPv6 literal
+        return host.split("]", 1)[0] + "]"
+    return host.split(":", 1)[0].rstrip(".")
+
+class DomainTrie:
+    """Reversed-label trie of exact and wildcard domain entries"""
+
+    def __init__(self, lookup_cache_size: int = 65536):
+        self._root: Dict[str, Any] = {}
+        self._size = 0
+        self._lookup_cache: Dict[str, Optional[Any]] = {}
+        self._lookup_cache_size = lookup_cache_size
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, domain: str) -> bool:
+        wildcard, labels = self._split(domain)
+        node = self._find(labels)
+        return node is not None and (_WILDCARD if wildcard else _EXACT) in node
+
+    def insert(self, domain: str, value: Any):
+        """Register an exact host or a "*.domain" wildcard"""
+        wildcard, labels = self._split(domain)
+        if not labels:
+            raise ValueError(f"Invalid domain: {domain!r}")
+        node = self._root
+        for label in labels:
+            node = node.setdefault(label, {})
+        key = _WILDCARD if wildcard else _EXACT
+        if key not in node:
+            self._size += 1
+        node[key] = value
+        self._lookup_cache.clear()
+
+    def remove(self, domain: str) -> bool:
+        """Remove an entry; returns whether it existed"""
+        wildcard, labels = self._split(domain)
+        key = _WILDCARD if wildcard else _EXACT
+        path = [self._root]
+        for label in labels:
+            child = path[-1].get(label)
+            if child is None:
+                return False
+            path.append(child)
+        if key not in path[-1]:
+            return False
+        del path[-1][key]
+        self._size -= 1
+        self._lookup_cache.clear()
+        # Prune nodes left empty
+        for depth in range(len(labels), 0, -1):
+            if path[depth]:
+                break
+            del path[depth - 1][labels[depth - 1]]
+        return True
+
+    def lookup(self, host: str) -> Optional[Any]:
+        """Value of the most specific entry matching host, or None"""
+        try:
+            return self._lookup_cache[host]
+        except KeyError:
+            pass
+        match = self.match(host)
+        value = match[1] if match else None
+        if len(self._lookup_cache) >= self._lookup_cache_size:
+            self._lookup_cache.clear()
+        self._lookup_cache[host] = value
+        return value
+
+    def match(self, host: str) -> Optional[Tuple[str, Any]]:
+        """(matched entry, value) for host, or None"""
+        labels = normalize_host(host).split(".")
+        node = self._root
+        best: Optional[Tuple[int, Any]] = None
+        depth = 0
+        for label in reversed(labels):
+            node = node.get(label)
+            if node is None:
+                break
+            depth += 1
+            if depth < len(labels) and _WILDCARD in node:
+                best = (depth, node[_WILDCARD])
+        else:
+            if _EXACT in node:
+                return ".".join(labels), node[_EXACT]
+        if best is None:
+            return None
+        return "*." + ".".join(labels[len(labels) - best[0]:]), best[1]
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        """All (entry, value) pairs"""
+        stack: List[Tuple[Dict[str, Any], List[str]]] = [(self._root, [])]
+        while stack:
+            node, labels = stack.pop()
+            for key, child in node.items():
+                if key == _EXACT:
+                    yield ".".join(reversed(labels)), child
+                elif key == _WILDCARD:
+                    yield "*." + ".".join(reversed(labels)), child
+                else:
+                    stack.append((child, labels + [key]))
+
+    def _find(self, labels: List[str]) -> Optional[Dict[str, Any]]:
+        node = self._root
+        for label in labels:
+            node = node.get(label)
+            if node is None:
+                return None
+        return node
+
+    @staticmethod
+    def _split(domain: str) -> Tuple[bool, List[str]]:
+        """(is wildcard, labels from the TLD down)"""
+        domain = normalize_host(domain)
+        wildcard = domain.startswith("*.")
+        if wildcard:
+            domain = domain[2:]
+        labels = [label for label in domain.split(".") if label]
+        labels.reverse()
+        return wildcard, labels
@@ -0,0 +1,245 @@
+"""
+Editorial Calendar Index
+Calendar items indexed by date, site, owner and status, plus the publish queue
+
+Every item sits in a per-site partition (items without a site share one)
+and a per-owner partition, each a list kept sorted by scheduled date, so a
+range query bisects to the first item in range and reads only those. Range
+queries across all sites go through day buckets, and per-status id sets
+answer status filters and counts without scanning the calendar.
+
+Status and date changes must go through set_status() and reschedule() so
+the indexes stay in sync. The calendar still supports the list operations
+callers used on the old flat list (append, iteration, len).
+
+PublishQueue is a min-heap of scheduled publish times; entries are
+validated lazily when they reach the top, so rescheduling or unscheduling
+an item needs no heap surgery.
+"""
+
+import heapq
+import itertools
+from bisect import bisect_left, bisect_right, insort
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+_Key = Tuple[float, int, str]  # (scheduled timestamp, insertion order, item id)
+
+_ANY = object()
+
+
+class EditorialCalendar:
+    """Indexed store of EditorialCalendarItem-like objects (see module docstring)"""
+
+    def __init__(self, on_change: Optional[Callable[[Any], None]] = None):
+        self._items: Dict[str, Any] = {}
+        self._keys: Dict[str, _Key] = {}
+        self._by_site: Dict[Optional[str], List[_Key]] = {}
+        self._by_owner: Dict[str, List[_Key]] = {}
+        self._by_day: Dict[date, Set[str]] = {}
+        self._by_status: Dict[Any, Set[str]] = {}
+        self._seq = itertools.count()
+        # Called with the item after it is added, rescheduled or changes status
+        self.on_change = on_change
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(list(self._items.values()))
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self._items
+
+    def get(self, item_id: str) -> Optional[Any]:
+        return self._items.get(item_id)
+
+    def add(self, item: Any) -> Any:
+        if item.id in self._items:
+            self.remove(item.id)
+        self._items[item.id] = item
+        self._index(item)
+        self._by_status.setdefault(item.status, set()).add(item.id)
+        self._changed(item)
+        return item
+
+    # The calendar used to be a list
+    append = add
+
+    def extend(self, items) -> None:
+        for item in items:
+            self.add(item)
+
+    def remove(self, item_id: str) -> Optional[Any]:
+        item = self._items.pop(item_id, None)
+        if item is None:
+            return None
+        self._unindex(item)
+        self._discard_status(item.status, item_id)
+        return item
+
+    def set_status(self, item: Any, status: Any) -> None:
+        if item.status == status:
+            return
+        self._discard_status(item.status, item.id)
+        item.status = status
+        item.updated_at = datetime.now()
+        self._by_status.setdefault(status, set()).add(item.id)
+        self._changed(item)
+
+    def reschedule(self, item: Any, scheduled_date: datetime) -> None:
+        self._unindex(item)
+        item.scheduled_date = scheduled_date
+        item.updated_at = datetime.now()
+        self._index(item)
+        self._changed(item)
+
+    def range(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        owner: Optional[str] = None,
+        site_id: Any = _ANY,
+        status: Optional[Any] = None
+    ) -> List[Any]:
+        """Items scheduled in [start, end] (either bound optional), by date"""
+        if owner is not None:
+            items = self._slice(self._by_owner.get(owner, []), start, end)
+            if site_id is not _ANY:
+                items = [item for item in items if item.site_id == site_id]
+        elif site_id is not _ANY:
+            items = self._slice(self._by_site.get(site_id, []), start, end)
+        else:
+            items = self._across_sites(start, end)
+
+        if status is not None:
+            items = [item for item in items if item.status == status]
+        return items
+
+    def items(self, owner: Optional[str] = None, status: Optional[Any] = None) -> List[Any]:
+        """Unordered items of an owner and/or status"""
+        if status is not None:
+            ids = self._by_status.get(status, set())
+            if owner is None:
+                return [self._items[item_id] for item_id in ids]
+            partition = self._by_owner.get(owner, [])
+            if len(ids) < len(partition):
+                return [self._items[item_id] for item_id in ids if self._items[item_id].created_by == owner]
+            return [self._items[key[2]] for key in partition if key[2] in ids]
+        if owner is not None:
+            return [self._items[key[2]] for key in self._by_owner.get(owner, [])]
+        return list(self._items.values())
+
+    def count(self, status: Any) -> int:
+        return len(self._by_status.get(status, ()))
+
+    def owners(self) -> List[str]:
+        return list(self._by_owner)
+
+    def _slice(self, partition: List[_Key], start: Optional[datetime], end: Optional[datetime]) -> List[Any]:
+        low = bisect_left(partition, (start.timestamp(),)) if start else 0
+        high = bisect_right(partition, (end.timestamp(), float("inf"))) if end else len(partition)
+        return [self._items[key[2]] for key in partition[low:high]]
+
+    def _across_sites(self, start: Optional[datetime], end: Optional[datetime]) -> List[Any]:
+        first = start.date() if start else date.min
+        last = end.date() if end else date.max
+        if start is None or end is None or (last - first).days + 1 > len(self._by_day):
+            # Wider than the populated days: visit those instead
+            days = [day for day in self._by_day if first <= day <= last]
+        else:
+            days = [first + timedelta(days=offset) for offset in range((last - first).days + 1)]
+
+        low = start.timestamp() if start else float("-inf")
+        high = end.timestamp() if end else float("inf")
+        keys = []
+        for day in days:
+            for item_id in self._by_day.get(day, ()):
+                key = self._keys[item_id]
+                if low <= key[0] <= high:
+                    keys.append(key)
+        keys.sort()
+        return [self._items[key[2]] for key in keys]
+
+    def _index(self, item: Any) -> None:
+        key = (item.scheduled_date.timestamp(), next(self._seq), item.id)
+        self._keys[item.id] = key
+        insort(self._by_site.setdefault(item.site_id, []), key)
+        insort(self._by_owner.setdefault(item.created_by, []), key)
+        self._by_day.setdefault(item.scheduled_date.date(), set()).add(item.id)
+
+    def _unindex(self, item: Any) -> None:
+        key = self._keys.pop(item.id)
+        self._remove_key(self._by_site, item.site_id, key)
+        self._remove_key(self._by_owner, item.created_by, key)
+        day = item.scheduled_date.date()
+        ids = self._by_day[day]
+        ids.discard(item.id)
+        if not ids:
+            del self._by_day[day]
+
+    @staticmethod
+    def _remove_key(partitions: Dict[Any, List[_Key]], name: Any, key: _Key) -> None:
+        partition = partitions[name]
+        del partition[bisect_left(partition, key)]
+        if not partition:
+            del partitions[name]
+
+    def _discard_status(self, status: Any, item_id: str) -> None:
+        ids = self._by_status.get(status)
+        if ids is not None:
+            ids.discard(item_id)
+            if not ids:
+                del self._by_status[status]
+
+    def _changed(self, item: Any) -> None:
+        if self.on_change is not None:
+            self.on_change(item)
+
+
+class PublishQueue:
+    """Min-heap of (publish time, item id) with lazy invalidation"""
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, str]] = []
+        self._queued: Dict[str, float] = {}  # item id -> publish time of its live entry
+        self._seq = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._queued)
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self._queued
+
+    def push(self, item_id: str, when: datetime) -> None:
+        """Queue (or move) an item; any older entry for it becomes stale"""
+        timestamp = when.timestamp()
+        if self._queued.get(item_id) == timestamp:
+            return
+        self._queued[item_id] = timestamp
+        heapq.heappush(self._heap, (timestamp, next(self._seq), item_id))
+
+    def discard(self, item_id: str) -> None:
+        self._queued.pop(item_id, None)
+
+    def _drop_stale(self) -> None:
+        heap = self._heap
+        while heap and self._queued.get(heap[0][2]) != heap[0][0]:
+            heapq.heappop(heap)
+
+    def next_time(self) -> Optional[float]:
+        """Timestamp of the earliest live entry"""
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: Optional[datetime] = None) -> List[str]:
+        """Ids of every item due at now, earliest first"""
+        timestamp = (now or datetime.now()).timestamp()
+        due = []
+        while True:
+            self._drop_stale()
+            if not self._heap or self._heap[0][0] > timestamp:
+                return due
+            _, _, item_id = heapq.heappop(self._heap)
+            del self._queued[item_id]
+            due.append(item_id)
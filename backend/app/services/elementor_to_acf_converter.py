@@ -5,7 +5,10 @@ Converts existing Elementor landing pages to ACF-enabled templates
 
 import json
 import logging
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
 import uuid
@@ -15,15 +18,40 @@ from app.models.template_models import ACFField, ACFFieldGroup, ACFFieldType
 
 logger = logging.getLogger(__name__)
 
+_HTML_TAG = re.compile(r'<[^>]+>')
+
+# Widget settings holding the text shown for each widget type
+WIDGET_CONTENT_FIELDS = {
+    "heading": ["title"],
+    "text-editor": ["editor"],
+    "button": ["text"],
+    "image": ["alt_text"],
+    "icon-box": ["title_text"],
+    "testimonial": ["testimonial_content"]
+}
+
+# Widget settings checked against the common dynamic element patterns
+TEXT_PATTERN_FIELDS = ("title", "editor", "text", "description")
+
 class ElementorToACFConverter:
     """
     Service to convert Elementor landing pages to ACF-enabled templates
     """
     
-    def __init__(self):
+    def __init__(self, batch_workers: Optional[int] = None):
         self.widget_acf_mappings = self._initialize_widget_mappings()
         self.industry_specific_fields = self._initialize_industry_fields()
         self.common_dynamic_elements = self._initialize_common_elements()
+        # All common patterns in one alternation; the group name is the index
+        # of the pattern definition, so one scan finds every match
+        self._text_patterns = re.compile(
+            "|".join(f"(?P<p{i}>{d['pattern']})" for i, d in enumerate(self.common_dynamic_elements)),
+            re.IGNORECASE
+        )
+        self.batch_workers = batch_workers or int(
+            os.getenv("ELEMENTOR_CONVERT_WORKERS", str(os.cpu_count() or 2))
+        )
+        self._pool: Optional[ProcessPoolExecutor] = None
     
     def _initialize_widget_mappings(self) -> Dict[str, Dict]:
         """Initialize mappings between Elementor widgets and ACF fields"""
@@ -791,28 +819,34 @@ function add_whatsapp_button() {{
             landing_page_type: Type of landing page (captura_leads, vendas, etc.)
             preserve_elementor: Whether to keep Elementor or convert to pure PHP
         """
+        return self.convert_page(page_data, landing_page_type, preserve_elementor)
+    
+    def convert_page(
+        self,
+        page_data: Any,
+        landing_page_type: str = "generic",
+        preserve_elementor: bool = True
+    ) -> Dict[str, Any]:
+        """Synchronous conversion; also what batch workers run"""
         try:
             logger.info(f"Converting Elementor page - Type: {landing_page_type}, Preserve: {preserve_elementor}")
             
-            # 1. Analyze Elementor structure
-            page_analysis = await self._analyze_elementor_structure(page_data)
+            # 1. Analyze structure and extract dynamic content candidates in one pass
+            page_analysis, dynamic_elements = self._walk_page(page_data, landing_page_type)
             
-            # 2. Extract dynamic content candidates
-            dynamic_elements = await self._extract_dynamic_elements(page_data, landing_page_type)
+            # 2. Generate ACF fields
+            acf_field_groups = self._generate_acf_fields(dynamic_elements, landing_page_type)
             
-            # 3. Generate ACF fields
-            acf_field_groups = await self._generate_acf_fields(dynamic_elements, landing_page_type)
-            
-            # 4. Generate template code
+            # 3. Generate template code
             if preserve_elementor:
-                template_code = await self._generate_hybrid_template(page_data, acf_field_groups)
+                template_code = self._generate_hybrid_template(page_data, acf_field_groups)
                 template_type = "hybrid"
             else:
-                template_code = await self._generate_pure_acf_template(page_analysis, acf_field_groups)
+                template_code = self._generate_pure_acf_template(page_analysis, acf_field_groups)
                 template_type = "pure_acf"
             
-            # 5. Generate conversion report
-            conversion_report = await self._generate_conversion_report(
+            # 4. Generate conversion report
+            conversion_report = self._generate_conversion_report(
                 page_analysis, dynamic_elements, acf_field_groups
             )
             
@@ -833,8 +867,70 @@ function add_whatsapp_button() {{
             logger.error(f"Error converting Elementor page: {str(e)}")
             raise
     
-    async def _analyze_elementor_structure(self, page_data: List[Dict]) -> Dict[str, Any]:
-        """Analyze Elementor page structure"""
+    async def convert_elementor_pages(
+        self,
+        pages: Dict[str, Any],
+        landing_page_type: str = "generic",
+        preserve_elementor: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Convert a batch of pages (e.g. a template library) in a process pool
+        
+        Args:
+            pages: Elementor page data keyed by file or template name
+        
+        Returns one result per page, in input order; a page that fails to
+        convert reports its error without failing the batch.
+        """
+        names = list(pages)
+        loop = asyncio.get_running_loop()
+        if self.batch_workers <= 1 or len(names) < 2:
+            futures = [
+                loop.run_in_executor(None, self.convert_page, pages[name], landing_page_type, preserve_elementor)
+                for name in names
+            ]
+        else:
+            pool = self._get_pool()
+            futures = [
+                loop.run_in_executor(pool, _convert_page_in_worker, pages[name], landing_page_type, preserve_elementor)
+                for name in names
+            ]
+        outcomes = await asyncio.gather(*futures, return_exceptions=True)
+        
+        results = []
+        for name, outcome in zip(names, outcomes):
+            if isinstance(outcome, BrokenProcessPool):
+                # A worker died; start a fresh pool for the next batch
+                self._pool = None
+            if isinstance(outcome, Exception):
+                logger.error(f"Error converting Elementor page {name}: {str(outcome)}")
+                results.append({"name": name, "success": False, "error": str(outcome)})
+            else:
+                results.append({"name": name, "success": True, "conversion_result": outcome})
+        return results
+    
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.batch_workers)
+        return self._pool
+    
+    @staticmethod
+    def _page_elements(page_data: Any) -> List[Dict]:
+        """Top-level elements from _elementor_data or an exported template"""
+        if isinstance(page_data, dict):
+            if "elType" in page_data:
+                return [page_data]
+            page_data = page_data.get("content") or page_data.get("elements") or []
+        return page_data if isinstance(page_data, list) else []
+    
+    def _walk_page(self, page_data: Any, landing_page_type: str) -> Tuple[Dict[str, Any], List[Dict]]:
+        """
+        Structure analysis and dynamic content extraction in one pass
+        
+        Walks sections, columns, containers and widgets at any depth.
+        Top-level sections/containers count as sections; columns and nested
+        containers count as columns.
+        """
         try:
             analysis = {
                 "sections": 0,
@@ -845,133 +941,88 @@ function add_whatsapp_button() {{
                 "animations": 0,
                 "custom_css": False
             }
+            dynamic_elements = []
+            element_counter = {}
             
-            for section in page_data:
-                if section.get('elType') == 'section':
-                    analysis["sections"] += 1
+            stack = [(element, 0) for element in reversed(self._page_elements(page_data))]
+            while stack:
+                element, depth = stack.pop()
+                if not isinstance(element, dict):
+                    continue
+                el_type = element.get('elType')
+                settings = element.get('settings') or {}
+                
+                if el_type == 'widget':
+                    widget_type = element.get('widgetType')
+                    widget_id = element.get('id')
+                    analysis["widgets"].append({
+                        "id": widget_id,
+                        "type": widget_type,
+                        "settings": settings
+                    })
+                    analysis["widget_types"][widget_type] = analysis["widget_types"].get(widget_type, 0) + 1
+                    if settings.get('_animation'):
+                        analysis["animations"] += 1
                     
-                    # Check for custom CSS
-                    if section.get('settings', {}).get('_css_classes'):
-                        analysis["custom_css"] = True
+                    if widget_type in self.widget_acf_mappings:
+                        dynamic_element = self._process_widget_to_dynamic_element(
+                            widget_id, widget_type, settings, element_counter, landing_page_type
+                        )
+                        if dynamic_element:
+                            dynamic_elements.append(dynamic_element)
                     
-                    # Analyze columns
-                    for column in section.get('elements', []):
-                        if column.get('elType') == 'column':
-                            analysis["columns"] += 1
-                            
-                            # Analyze widgets
-                            for widget in column.get('elements', []):
-                                if widget.get('elType') == 'widget':
-                                    widget_type = widget.get('widgetType')
-                                    analysis["widgets"].append({
-                                        "id": widget.get('id'),
-                                        "type": widget_type,
-                                        "settings": widget.get('settings', {})
-                                    })
-                                    
-                                    # Count widget types
-                                    analysis["widget_types"][widget_type] = \
-                                        analysis["widget_types"].get(widget_type, 0) + 1
-                                    
-                                    # Check for animations
-                                    if widget.get('settings', {}).get('_animation'):
-                                        analysis["animations"] += 1
+                    self._check_text_patterns(settings, dynamic_elements, widget_id)
+                    continue
+                
+                if el_type == 'section' or (el_type == 'container' and depth == 0):
+                    analysis["sections"] += 1
+                elif el_type in ('column', 'container'):
+                    analysis["columns"] += 1
+                if el_type in ('section', 'container'):
+                    if settings.get('_css_classes'):
+                        analysis["custom_css"] = True
+                    if settings.get('animation'):
+                        analysis["animations"] += 1
+                
+                children = element.get('elements')
+                if children:
+                    stack.extend((child, depth + 1) for child in reversed(children))
             
-            # Calculate complexity score
             analysis["complexity_score"] = (
                 analysis["sections"] * 2 +
-                analysis["widgets"].__len__() +
+                len(analysis["widgets"]) +
                 analysis["animations"] * 3 +
                 (10 if analysis["custom_css"] else 0)
             )
             
-            return analysis
-            
-        except Exception as e:
-            logger.error(f"Error analyzing Elementor structure: {str(e)}")
-            return {}
-    
-    async def _extract_dynamic_elements(self, page_data: List[Dict], landing_page_type: str) -> List[Dict]:
-        """Extract elements that should be dynamic (ACF fields)"""
-        try:
-            dynamic_elements = []
-            element_counter = {}
-            
-            for section in page_data:
-                await self._process_section_for_dynamic_content(
-                    section, dynamic_elements, element_counter, landing_page_type
-                )
-            
             # Add industry-specific fields
-            if landing_page_type in self.industry_specific_fields:
-                for field_def in self.industry_specific_fields[landing_page_type]:
-                    dynamic_elements.append({
-                        "source": "industry_specific",
-                        "field_name": field_def["name"],
-                        "field_type": field_def["type"],
-                        "label": field_def["label"],
-                        "default_value": "",
-                        "priority": "high"
-                    })
-            
-            return dynamic_elements
-            
-        except Exception as e:
-            logger.error(f"Error extracting dynamic elements: {str(e)}")
-            return []
-    
-    async def _process_section_for_dynamic_content(
-        self, 
-        section: Dict, 
-        dynamic_elements: List[Dict],
-        element_counter: Dict,
-        landing_page_type: str
-    ):
-        """Process a section to find dynamic content candidates"""
-        try:
-            if section.get('elType') != 'section':
-                return
+            for field_def in self.industry_specific_fields.get(landing_page_type, []):
+                dynamic_elements.append({
+                    "source": "industry_specific",
+                    "field_name": field_def["name"],
+                    "field_type": field_def["type"],
+                    "label": field_def["label"],
+                    "default_value": "",
+                    "priority": "high"
+                })
             
-            for column in section.get('elements', []):
-                if column.get('elType') != 'column':
-                    continue
-                    
-                for widget in column.get('elements', []):
-                    if widget.get('elType') != 'widget':
-                        continue
-                    
-                    widget_type = widget.get('widgetType')
-                    widget_settings = widget.get('settings', {})
-                    
-                    # Process based on widget type
-                    if widget_type in self.widget_acf_mappings:
-                        dynamic_element = await self._process_widget_to_dynamic_element(
-                            widget, widget_type, element_counter, landing_page_type
-                        )
-                        
-                        if dynamic_element:
-                            dynamic_elements.append(dynamic_element)
-                    
-                    # Check for text content that matches common patterns
-                    await self._check_text_patterns(
-                        widget_settings, dynamic_elements, widget.get('id')
-                    )
+            return analysis, dynamic_elements
             
         except Exception as e:
-            logger.error(f"Error processing section: {str(e)}")
+            logger.error(f"Error analyzing Elementor page: {str(e)}")
+            return {}, []
     
-    async def _process_widget_to_dynamic_element(
+    def _process_widget_to_dynamic_element(
         self, 
-        widget: Dict, 
+        widget_id: Optional[str],
         widget_type: str,
+        widget_settings: Dict,
         element_counter: Dict,
         landing_page_type: str
     ) -> Optional[Dict]:
         """Process a widget to create dynamic element"""
         try:
             mapping = self.widget_acf_mappings[widget_type]
-            widget_settings = widget.get('settings', {})
-            widget_id = widget.get('id')
             
             # Count elements of this type
             element_counter[widget_type] = element_counter.get(widget_type, 0) + 1
@@ -1017,52 +1068,44 @@ function add_whatsapp_button() {{
     
     def _extract_widget_content(self, settings: Dict, widget_type: str) -> str:
         """Extract content from widget settings"""
-        content_mappings = {
-            "heading": ["title"],
-            "text-editor": ["editor"],
-            "button": ["text"],
-            "image": ["alt_text"],
-            "icon-box": ["title_text"],
-            "testimonial": ["testimonial_content"]
-        }
-        
-        if widget_type in content_mappings:
-            for field in content_mappings[widget_type]:
-                if field in settings:
-                    content = settings[field]
-                    # Clean HTML tags if present
-                    if isinstance(content, str):
-                        content = re.sub(r'<[^>]+>', '', content)
-                        return content.strip()
+        for field in WIDGET_CONTENT_FIELDS.get(widget_type, ()):
+            if field in settings:
+                content = settings[field]
+                # Clean HTML tags if present
+                if isinstance(content, str):
+                    return _HTML_TAG.sub('', content).strip()
         
         return ""
     
-    async def _check_text_patterns(self, settings: Dict, dynamic_elements: List[Dict], widget_id: str):
+    def _check_text_patterns(self, settings: Dict, dynamic_elements: List[Dict], widget_id: str):
         """Check text content against common patterns"""
-        try:
-            text_fields = ["title", "editor", "text", "description"]
+        for field_name in TEXT_PATTERN_FIELDS:
+            if field_name not in settings:
+                continue
+            text_content = str(settings[field_name])
             
-            for field_name in text_fields:
-                if field_name in settings:
-                    text_content = str(settings[field_name])
-                    
-                    for pattern_def in self.common_dynamic_elements:
-                        if re.search(pattern_def["pattern"], text_content, re.IGNORECASE):
-                            # Found a match
-                            dynamic_elements.append({
-                                "source": "pattern_match",
-                                "widget_id": widget_id,
-                                "field_name": pattern_def["field"],
-                                "field_type": pattern_def["type"],
-                                "label": self._generate_field_label(pattern_def["field"]),
-                                "matched_text": text_content,
-                                "pattern": pattern_def["pattern"],
-                                "priority": "medium"
-                            })
-                            break
+            # Earliest pattern definition that matches anywhere in the text
+            first = None
+            for match in self._text_patterns.finditer(text_content):
+                index = int(match.lastgroup[1:])
+                if first is None or index < first:
+                    first = index
+                    if index == 0:
+                        break
+            if first is None:
+                continue
             
-        except Exception as e:
-            logger.error(f"Error checking text patterns: {str(e)}")
+            pattern_def = self.common_dynamic_elements[first]
+            dynamic_elements.append({
+                "source": "pattern_match",
+                "widget_id": widget_id,
+                "field_name": pattern_def["field"],
+                "field_type": pattern_def["type"],
+                "label": self._generate_field_label(pattern_def["field"]),
+                "matched_text": text_content,
+                "pattern": pattern_def["pattern"],
+                "priority": "medium"
+            })
     
     def _suggest_field_name(self, content: str, widget_type: str, counter: int, landing_page_type: str) -> str:
         """Suggest appropriate field name based on content and context"""
@@ -1120,7 +1163,7 @@ function add_whatsapp_button() {{
         # Generate from field name
         return field_name.replace("_", " ").title()
     
-    async def _generate_acf_fields(self, dynamic_elements: List[Dict], landing_page_type: str) -> List[ACFFieldGroup]:
+    def _generate_acf_fields(self, dynamic_elements: List[Dict], landing_page_type: str) -> List[ACFFieldGroup]:
         """Generate ACF field groups from dynamic elements"""
         try:
             # Group fields logically
@@ -1235,9 +1278,9 @@ function add_whatsapp_button() {{
         if element.get("source") == "pattern_match":
             return f"Campo identificado automaticamente do texto: {element.get('matched_text', '')[:50]}..."
         
-        return f"Personalize este {element['widget_type']} para seu negócio"
+        return f"Personalize este {element.get('widget_type', 'campo')} para seu negócio"
     
-    async def _generate_hybrid_template(self, page_data: List[Dict], acf_field_groups: List[ACFFieldGroup]) -> str:
+    def _generate_hybrid_template(self, page_data: List[Dict], acf_field_groups: List[ACFFieldGroup]) -> str:
         """Generate hybrid template that keeps Elementor but adds ACF integration"""
         try:
             template_parts = []
@@ -1369,7 +1412,7 @@ function replacePlaceholders(data) {
             logger.error(f"Error generating hybrid template: {str(e)}")
             return ""
     
-    async def _generate_pure_acf_template(self, page_analysis: Dict, acf_field_groups: List[ACFFieldGroup]) -> str:
+    def _generate_pure_acf_template(self, page_analysis: Dict, acf_field_groups: List[ACFFieldGroup]) -> str:
         """Generate pure ACF template (no Elementor dependency)"""
         # This would be more complex - converting Elementor structure to pure PHP/HTML
         # For now, return a basic template structure
@@ -1404,7 +1447,7 @@ get_header(); ?>
 
 <?php get_footer(); ?>"""
     
-    async def _generate_conversion_report(
+    def _generate_conversion_report(
         self, 
         page_analysis: Dict, 
         dynamic_elements: List[Dict],
@@ -1495,5 +1538,13 @@ get_header(); ?>
         
         return instructions
 
+def _convert_page_in_worker(
+    page_data: Any,
+    landing_page_type: str,
+    preserve_elementor: bool
+) -> Dict[str, Any]:
+    """Batch conversion entry point inside a pool worker process"""
+    return elementor_converter.convert_page(page_data, landing_page_type, preserve_elementor)
+
 # Global instance
 elementor_converter = ElementorToACFConverter()
\ No newline at end of file
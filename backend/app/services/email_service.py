@@ -3,35 +3,79 @@ Email Service
 Handles transactional emails via SendGrid/Resend
 """
 
+import asyncio
+import hashlib
 import logging
 import os
-from typing import Dict, Any, List, Optional
+import re
+import uuid
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
 import httpx
-from jinja2 import Template
+from jinja2 import Environment, Template
+
+from app.services.rate_limiter import RateLimit, RateLimiter
 
 logger = logging.getLogger(__name__)
 
+# Recipients per provider batch request (SendGrid personalizations, Resend /emails/batch)
+BATCH_SIZES = {
+    'sendgrid': 1000,
+    'resend': 100
+}
+
+# Default request rates per provider (requests per second)
+PROVIDER_RATE_LIMITS = {
+    'sendgrid': 10,
+    'resend': 2
+}
+
+# Responses worth retrying, honouring Retry-After. A 5xx may come after the
+# provider accepted the batch, so those are only retried with an idempotency key
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# Providers that deduplicate a retried batch by its Idempotency-Key header
+IDEMPOTENT_PROVIDERS = {'resend'}
+
+# Failures that happen before the request reaches the provider
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+# SendGrid validation errors point at the rejected recipient by field
+SENDGRID_RECIPIENT_FIELD = re.compile(r'personalizations\.(\d+)')
+
 class EmailService:
     """
     Manages transactional email sending
     """
     
-    def __init__(self):
+    def __init__(self, client: Optional[httpx.AsyncClient] = None):
         # Email provider configuration
         self.provider = os.getenv('EMAIL_PROVIDER', 'sendgrid')  # sendgrid or resend
         self.api_key = os.getenv('EMAIL_API_KEY', '')
         self.from_email = os.getenv('FROM_EMAIL', 'noreply@kenzysites.com.br')
         self.from_name = os.getenv('FROM_NAME', 'KenzySites')
         
-        # API endpoints
+        # API endpoints (EMAIL_API_BASE_URL points both providers at a local sink)
+        base_url = os.getenv('EMAIL_API_BASE_URL', '').rstrip('/')
         self.endpoints = {
-            'sendgrid': 'https://api.sendgrid.com/v3/mail/send',
-            'resend': 'https://api.resend.com/emails'
+            'sendgrid': f'{base_url or "https://api.sendgrid.com"}/v3/mail/send',
+            'resend': f'{base_url or "https://api.resend.com"}/emails',
+            'resend_batch': f'{base_url or "https://api.resend.com"}/emails/batch'
         }
         
-        self.client = httpx.AsyncClient(timeout=30.0)
+        # Bulk sending: concurrent requests under the provider's request rate
+        self.bulk_concurrency = int(os.getenv('EMAIL_BULK_CONCURRENCY', '8'))
+        self.max_attempts = int(os.getenv('EMAIL_MAX_ATTEMPTS', '3'))
+        rate = float(os.getenv('EMAIL_RATE_LIMIT_PER_SECOND', PROVIDER_RATE_LIMITS.get(self.provider, 5)))
+        self.rate_limit = RateLimit(max(1, int(rate)), max(1, int(rate)) / rate)
+        self.rate_limiter = RateLimiter()
+        
+        self.client = client or httpx.AsyncClient(timeout=30.0)
         self.templates = self._load_email_templates()
+        
+        # Compiled templates by (name, source hash); editing a template compiles a new version
+        self.jinja_env = Environment()
+        self._compiled: Dict[Tuple[str, str], Template] = {}
     
     def _load_email_templates(self) -> Dict[str, str]:
         """Load email templates"""
@@ -145,6 +189,38 @@ class EmailService:
             """
         }
     
+    def register_template(self, name: str, source: str):
+        """
+        Add or replace a template; the new version is compiled on first use
+        """
+        
+        self.templates[name] = source
+    
+    def get_template(self, name: str) -> Template:
+        """
+        Compiled template for the current version of name
+        """
+        
+        source = self.templates[name]
+        version = hashlib.sha1(source.encode('utf-8')).hexdigest()
+        template = self._compiled.get((name, version))
+        if template is None:
+            template = self.jinja_env.from_string(source)
+            # Older versions of this template are no longer reachable
+            for key in [key for key in self._compiled if key[0] == name]:
+                del self._compiled[key]
+            self._compiled[(name, version)] = template
+        return template
+    
+    def render(self, template_name: str, data: Dict[str, Any], fallback_html: str = '') -> str:
+        """
+        Render a named template, or return fallback_html for unknown names
+        """
+        
+        if template_name in self.templates:
+            return self.get_template(template_name).render(**data)
+        return fallback_html
+    
     async def send_email(self, email_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Send transactional email
@@ -152,14 +228,11 @@ class EmailService:
         
         try:
             # Render template with data
-            template_name = email_data.get('template', 'default')
-            template_data = email_data.get('data', {})
-            
-            if template_name in self.templates:
-                template = Template(self.templates[template_name])
-                html_content = template.render(**template_data)
-            else:
-                html_content = email_data.get('html', '')
+            html_content = self.render(
+                email_data.get('template', 'default'),
+                email_data.get('data', {}),
+                email_data.get('html', '')
+            )
             
             # Prepare email based on provider
             if self.provider == 'sendgrid':
@@ -283,39 +356,210 @@ class EmailService:
         recipients: List[str],
         subject: str,
         template: str,
-        data: Dict[str, Any]
+        data: Dict[str, Any],
+        recipient_data: Optional[Dict[str, Dict[str, Any]]] = None,
+        text: str = ''
     ) -> Dict[str, Any]:
         """
         Send bulk emails to multiple recipients
-        """
         
-        sent = 0
-        failed = 0
+        Recipients are grouped into provider batch requests (SendGrid
+        personalizations for identical content, Resend /emails/batch),
+        which are sent concurrently under the provider rate limit.
         
-        for recipient in recipients:
-            email_data = {
-                'to': recipient,
-                'subject': subject,
-                'template': template,
-                'data': data
-            }
-            
-            result = await self.send_email(email_data)
+        Args:
+            recipients: Recipient addresses
+            subject: Subject line
+            template: Template name
+            data: Template data shared by all recipients
+            recipient_data: Optional per-recipient data merged over data
+            text: Plain text alternative
             
-            if result.get('success'):
-                sent += 1
-            else:
-                failed += 1
-            
-            # Rate limiting
-            await asyncio.sleep(0.1)
+        Returns:
+            Totals plus a per-recipient result list (to, success, message_id/error)
+        """
+        
+        results: List[Optional[Dict[str, Any]]] = [None] * len(recipients)
+        
+        # Render each distinct content once
+        shared_html = None if recipient_data else self.render(template, data)
+        messages = []
+        for index, recipient in enumerate(recipients):
+            if shared_html is not None:
+                messages.append((index, recipient, shared_html))
+                continue
+            try:
+                html = self.render(template, {**data, **recipient_data.get(recipient, {})})
+            except Exception as e:
+                results[index] = {'to': recipient, 'success': False, 'error': f'Render failed: {e}'}
+                continue
+            messages.append((index, recipient, html))
+        
+        semaphore = asyncio.Semaphore(self.bulk_concurrency)
+        
+        async def send_batch(batch):
+            async with semaphore:
+                outcome = await self._send_batch(batch, subject, text)
+            for (index, recipient, _), result in zip(batch, outcome):
+                results[index] = {'to': recipient, **result}
+        
+        await asyncio.gather(*(send_batch(batch) for batch in self._batches(messages)))
+        
+        sent = sum(1 for result in results if result and result.get('success'))
         
         return {
             'success': True,
             'sent': sent,
-            'failed': failed,
-            'total': len(recipients)
+            'failed': len(recipients) - sent,
+            'total': len(recipients),
+            'results': results
         }
+    
+    def _batches(self, messages: List[Tuple[int, str, str]]) -> List[List[Tuple[int, str, str]]]:
+        """
+        Split messages into provider batch requests
+        """
+        
+        size = BATCH_SIZES.get(self.provider, 1)
+        if self.provider != 'sendgrid':
+            return [messages[i:i + size] for i in range(0, len(messages), size)]
+        
+        # A SendGrid request carries one content, so batch recipients per content
+        by_content: Dict[str, List[Tuple[int, str, str]]] = {}
+        for message in messages:
+            by_content.setdefault(message[2], []).append(message)
+        return [
+            group[i:i + size]
+            for group in by_content.values()
+            for i in range(0, len(group), size)
+        ]
+    
+    async def _send_batch(
+        self,
+        batch: List[Tuple[int, str, str]],
+        subject: str,
+        text: str
+    ) -> List[Dict[str, Any]]:
+        """
+        Send one batch request; returns one result per message
+        """
+        
+        headers = {
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json'
+        }
+        idempotent = self.provider in IDEMPOTENT_PROVIDERS
+        if idempotent:
+            # Same key on every attempt, so a retry never delivers twice
+            headers['Idempotency-Key'] = str(uuid.uuid4())
+        
+        if self.provider == 'sendgrid':
+            url = self.endpoints['sendgrid']
+            payload = {
+                'personalizations': [{'to': [{'email': recipient}], 'subject': subject} for _, recipient, _ in batch],
+                'from': {
+                    'email': self.from_email,
+                    'name': self.from_name
+                },
+                'content': [
+                    {'type': 'text/plain', 'value': text or 'Please view this email in HTML'},
+                    {'type': 'text/html', 'value': batch[0][2]}
+                ]
+            }
+        else:  # resend
+            url = self.endpoints['resend_batch']
+            payload = [
+                {
+                    'from': f'{self.from_name} <{self.from_email}>',
+                    'to': recipient,
+                    'subject': subject,
+                    'html': html,
+                    'text': text or 'Please view this email in HTML'
+                }
+                for _, recipient, html in batch
+            ]
+        
+        error = 'No attempts made'
+        for attempt in range(self.max_attempts):
+            await self._wait_for_send_slot()
+            try:
+                response = await self.client.post(url, headers=headers, json=payload)
+            except httpx.HTTPError as e:
+                error = str(e) or type(e).__name__
+                # A timeout after sending may still have been delivered
+                if not idempotent and not isinstance(e, NOT_SENT_ERRORS):
+                    break
+                await asyncio.sleep(2 ** attempt)
+                continue
+            
+            if response.status_code in (200, 202):
+                if self.provider == 'sendgrid':
+                    message_id = response.headers.get('X-Message-Id')
+                    return [{'success': True, 'message_id': message_id} for _ in batch]
+                ids = [item.get('id') for item in response.json().get('data', [])]
+                ids += [None] * (len(batch) - len(ids))
+                return [{'success': True, 'message_id': message_id} for message_id in ids[:len(batch)]]
+            
+            error = response.text
+            if response.status_code in (400, 422):
+                # One bad address rejects the whole request; errors about the
+                # payload itself (sender, content) fail the batch as a whole
+                named = self._named_recipients(batch, error)
+                if named and len(named) < len(batch):
+                    return await self._send_without(batch, named, error, subject, text)
+                break
+            if response.status_code != 429 and not (idempotent and response.status_code in RETRYABLE_STATUS):
+                break
+            retry_after = response.headers.get('Retry-After', '')
+            await asyncio.sleep(float(retry_after) if retry_after.replace('.', '', 1).isdigit() else 2 ** attempt)
+        
+        logger.error(f"Bulk email batch of {len(batch)} failed ({self.provider}): {error}")
+        return [{'success': False, 'error': error} for _ in batch]
+    
+    def _named_recipients(self, batch: List[Tuple[int, str, str]], error: str) -> set:
+        """
+        Positions in the batch of the recipients a validation error names
+        """
+        
+        named = set()
+        if self.provider == 'sendgrid':
+            named.update(int(position) for position in SENDGRID_RECIPIENT_FIELD.findall(error))
+        lowered = error.lower()
+        for position, (_, recipient, _) in enumerate(batch):
+            address = recipient.lower()
+            if address in lowered and re.search(rf'(?<![\w.+-]){re.escape(address)}(?![\w.-])', lowered):
+                named.add(position)
+        return {position for position in named if position < len(batch)}
+    
+    async def _send_without(
+        self,
+        batch: List[Tuple[int, str, str]],
+        rejected: set,
+        error: str,
+        subject: str,
+        text: str
+    ) -> List[Dict[str, Any]]:
+        """
+        Fail the rejected recipients and resend the batch without them
+        """
+        
+        rest = [message for position, message in enumerate(batch) if position not in rejected]
+        outcome = iter(await self._send_batch(rest, subject, text))
+        return [
+            {'success': False, 'error': error} if position in rejected else next(outcome)
+            for position in range(len(batch))
+        ]
+    
+    async def _wait_for_send_slot(self):
+        """
+        Block until the provider rate limit admits another request
+        """
+        
+        while True:
+            result = await self.rate_limiter.hit([(f'email:{self.provider}', self.rate_limit)])
+            if result.allowed:
+                return
+            await asyncio.sleep(result.retry_after)
 
 # Global instance
 email_service = EmailService()
\ No newline at end of file
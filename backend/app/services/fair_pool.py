@@ -0,0 +1,118 @@
+"""
+Fair Task Pool
+Bounded-concurrency pool that shares its slots round-robin across tenants
+
+Each tenant has its own FIFO of pending jobs. Whenever a slot frees up the
+next tenant in rotation with pending work (and below its own limit) starts
+its next job, so one tenant submitting a thousand jobs delays another
+tenant's single job by at most one job per slot rather than the whole batch.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+JobFactory = Callable[[], Awaitable[Any]]
+
+
+class FairTaskPool:
+    """
+    Round-robin pool of at most `concurrency` running jobs
+
+    Args:
+        concurrency: Jobs running at once across all tenants
+        per_tenant_limit: Jobs running at once for one tenant (None for no limit)
+    """
+
+    def __init__(self, concurrency: int = 4, per_tenant_limit: Optional[int] = None):
+        self.concurrency = max(1, concurrency)
+        self.per_tenant_limit = per_tenant_limit
+        self._pending: Dict[str, Deque[Tuple[JobFactory, asyncio.Future]]] = {}
+        self._rotation: Deque[str] = deque()
+        self._running: Dict[str, int] = {}
+        self._active = 0
+        self._tasks: set = set()
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    def pending(self, tenant: Optional[str] = None) -> int:
+        if tenant is not None:
+            return len(self._pending.get(tenant, ()))
+        return sum(len(jobs) for jobs in self._pending.values())
+
+    def submit(self, tenant: str, factory: JobFactory) -> asyncio.Future:
+        """Queue a job for tenant; the future resolves with its result"""
+        future = asyncio.get_running_loop().create_future()
+        jobs = self._pending.get(tenant)
+        if jobs is None:
+            jobs = self._pending[tenant] = deque()
+            self._rotation.append(tenant)
+        jobs.append((factory, future))
+        self._dispatch()
+        return future
+
+    async def map(self, tenant: str, factories: List[JobFactory]) -> List[Any]:
+        """
+        Run jobs for tenant; results (or exceptions) in submission order
+
+        If the caller is cancelled, its jobs that have not started are dropped.
+        """
+        futures = [self.submit(tenant, factory) for factory in factories]
+        try:
+            return await asyncio.gather(*futures, return_exceptions=True)
+        except asyncio.CancelledError:
+            for future in futures:
+                future.cancel()
+            raise
+
+    def _next_job(self) -> Optional[Tuple[str, JobFactory, asyncio.Future]]:
+        for _ in range(len(self._rotation)):
+            tenant = self._rotation.popleft()
+            jobs = self._pending[tenant]
+            while jobs and jobs[0][1].done():
+                jobs.popleft()  # cancelled before it started
+            if not jobs:
+                del self._pending[tenant]
+                continue
+            self._rotation.append(tenant)
+            if self.per_tenant_limit is not None and self._running.get(tenant, 0) >= self.per_tenant_limit:
+                continue
+            factory, future = jobs.popleft()
+            return tenant, factory, future
+        return None
+
+    def _dispatch(self) -> None:
+        while self._active < self.concurrency:
+            job = self._next_job()
+            if job is None:
+                return
+            tenant, factory, future = job
+            self._active += 1
+            self._running[tenant] = self._running.get(tenant, 0) + 1
+            task = asyncio.ensure_future(self._run(tenant, factory, future))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, tenant: str, factory: JobFactory, future: asyncio.Future) -> None:
+        try:
+            result = await factory()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(result)
+        finally:
+            self._active -= 1
+            self._running[tenant] -= 1
+            if not self._running[tenant]:
+                del self._running[tenant]
+            self._dispatch()
@@ -0,0 +1,279 @@
+"""
+Heatmap Service for KenzySites Analytics
+Compact click/scroll storage and vectorized heatmap aggregation
+
+Clicks are stored per page as columnar NumPy arrays with coordinates
+normalized by the viewport width, so clicks from phones and desktops land
+on the same grid:
+
+    x_rel = x / viewport_width            (0..1, stored as uint16)
+    y_rel = y / viewport_width            (0..MAX_PAGE_RATIO, stored as uint32)
+
+Each click costs 6 bytes. Aggregation is a single np.bincount over the cell
+index, which bins a million clicks in a few milliseconds.
+"""
+
+import base64
+import struct
+import zlib
+from collections import defaultdict
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.columnar import ColumnBuffer
+
+FIXED_POINT = 65535  # Fixed-point scale for normalized coordinates
+MAX_PAGE_RATIO = 64  # Page height may be up to 64x the viewport width
+DEFAULT_GRID_COLUMNS = 64
+SCROLL_THRESHOLDS = (25, 50, 75, 100)
+
+
+class PageInteractions:
+    """Click and scroll events recorded for a single page"""
+
+    def __init__(self):
+        self.click_x = ColumnBuffer(np.uint16)
+        self.click_y = ColumnBuffer(np.uint32)
+        self.scroll_depth = ColumnBuffer(np.uint16)  # Max depth per pageview
+
+    @property
+    def total_clicks(self) -> int:
+        return len(self.click_x)
+
+    @property
+    def memory_bytes(self) -> int:
+        return (
+            self.click_x.view().nbytes
+            + self.click_y.view().nbytes
+            + self.scroll_depth.view().nbytes
+        )
+
+    def add_clicks(
+        self,
+        x: Sequence[float],
+        y: Sequence[float],
+        viewport_width: Sequence[float]
+    ) -> None:
+        """Add a batch of clicks in page pixels"""
+        width = np.maximum(np.asarray(viewport_width, dtype=np.float64), 1.0)
+        x_rel = np.clip(np.asarray(x, dtype=np.float64) / width, 0.0, 1.0)
+        y_rel = np.clip(np.asarray(y, dtype=np.float64) / width, 0.0, MAX_PAGE_RATIO)
+        self.click_x.extend(np.rint(x_rel * FIXED_POINT).astype(np.uint16))
+        self.click_y.extend(np.rint(y_rel * FIXED_POINT).astype(np.uint32))
+
+    def add_scroll_depths(self, depth_percent: Sequence[float]) -> None:
+        """Add maximum scroll depths (0-100% of page height)"""
+        depth = np.clip(np.asarray(depth_percent, dtype=np.float64), 0.0, 100.0)
+        self.scroll_depth.extend(np.rint(depth / 100.0 * FIXED_POINT).astype(np.uint16))
+
+
+class HeatmapService:
+    """Stores page interactions and builds heatmaps from them"""
+
+    def __init__(self):
+        # (site_id, page_url) -> interactions
+        self.pages: Dict[Tuple[str, str], PageInteractions] = defaultdict(PageInteractions)
+
+    def record_click(
+        self,
+        site_id: str,
+        page_url: str,
+        x: float,
+        y: float,
+        viewport_width: float
+    ) -> None:
+        """Record a single click"""
+        self.pages[(site_id, page_url)].add_clicks([x], [y], [viewport_width])
+
+    def record_clicks(
+        self,
+        site_id: str,
+        page_url: str,
+        x: Sequence[float],
+        y: Sequence[float],
+        viewport_width: Sequence[float]
+    ) -> None:
+        """Record a batch of clicks (preferred for ingestion pipelines)"""
+        self.pages[(site_id, page_url)].add_clicks(x, y, viewport_width)
+
+    def record_scroll(self, site_id: str, page_url: str, depth_percent: float) -> None:
+        """Record the maximum scroll depth reached in a pageview"""
+        self.pages[(site_id, page_url)].add_scroll_depths([depth_percent])
+
+    def click_density(
+        self,
+        site_id: str,
+        page_url: str,
+        grid_columns: int = DEFAULT_GRID_COLUMNS,
+        max_rows: Optional[int] = None
+    ) -> np.ndarray:
+        """
+        Bin clicks into a (rows, grid_columns) count matrix
+
+        Cells are square in viewport-width units, so the number of rows
+        follows the page length of the lowest click.
+        """
+        page = self.pages.get((site_id, page_url))
+        if page is None or page.total_clicks == 0:
+            return np.zeros((0, grid_columns), dtype=np.uint32)
+
+        # Integer cell indices without materializing float copies
+        cols = (page.click_x.view().astype(np.uint32) * grid_columns) // (FIXED_POINT + 1)
+        rows = (page.click_y.view().astype(np.uint64) * grid_columns) // (FIXED_POINT + 1)
+
+        row_count = int(rows.max()) + 1
+        if max_rows is not None and row_count > max_rows:
+            row_count = max_rows
+            rows = np.minimum(rows, max_rows - 1)
+
+        flat = rows * grid_columns + cols
+        counts = np.bincount(flat, minlength=row_count * grid_columns)
+        return counts.astype(np.uint32).reshape(row_count, grid_columns)
+
+    def scroll_map(self, site_id: str, page_url: str) -> Dict[str, float]:
+        """Percentage of pageviews reaching each scroll threshold"""
+        page = self.pages.get((site_id, page_url))
+        if page is None or len(page.scroll_depth) == 0:
+            return {f"{t}%": 0.0 for t in SCROLL_THRESHOLDS}
+
+        depths = np.sort(page.scroll_depth.view())
+        total = len(depths)
+        thresholds = np.array(
+            [round(t / 100.0 * FIXED_POINT) for t in SCROLL_THRESHOLDS], dtype=np.int64
+        )
+        below = np.searchsorted(depths, thresholds, side="left")
+        return {
+            f"{t}%": round(float(total - b) / total * 100, 1)
+            for t, b in zip(SCROLL_THRESHOLDS, below)
+        }
+
+    def get_heatmap(
+        self,
+        site_id: str,
+        page_url: str,
+        grid_columns: int = DEFAULT_GRID_COLUMNS,
+        max_rows: Optional[int] = None,
+        include_png: bool = False,
+        cell_pixels: int = 8
+    ) -> Dict[str, Any]:
+        """Heatmap payload with a compressed density matrix and optional PNG"""
+        density = self.click_density(site_id, page_url, grid_columns, max_rows)
+        page = self.pages.get((site_id, page_url))
+
+        result = {
+            "page_url": page_url,
+            "total_clicks": page.total_clicks if page else 0,
+            "click_map": encode_density(density),
+            "scroll_map": self.scroll_map(site_id, page_url),
+            "hotspots": top_cells(density, grid_columns)
+        }
+        if include_png:
+            png = render_png(density, cell_pixels)
+            result["overlay_png"] = base64.b64encode(png).decode("ascii")
+        return result
+
+
+def encode_density(density: np.ndarray) -> Dict[str, Any]:
+    """Compress a density matrix as zlib'd little-endian integers"""
+    peak = int(density.max()) if density.size else 0
+    dtype = np.uint16 if peak <= np.iinfo(np.uint16).max else np.uint32
+    raw = density.astype(dtype).astype(np.dtype(dtype).newbyteorder("<")).tobytes()
+    return {
+        "shape": list(density.shape),
+        "dtype": np.dtype(dtype).name,
+        "encoding": "zlib+base64",
+        "data": base64.b64encode(zlib.compress(raw, 6)).decode("ascii"),
+        "max": peak,
+        "total": int(density.sum())
+    }
+
+
+def decode_density(payload: Dict[str, Any]) -> np.ndarray:
+    """Inverse of encode_density"""
+    raw = zlib.decompress(base64.b64decode(payload["data"]))
+    dtype = np.dtype(payload["dtype"]).newbyteorder("<")
+    return np.frombuffer(raw, dtype=dtype).reshape(payload["shape"])
+
+
+def top_cells(density: np.ndarray, grid_columns: int, limit: int = 10) -> List[Dict[str, Any]]:
+    """Hottest cells as x/y fractions of the viewport width"""
+    if density.size == 0:
+        return []
+    flat = density.ravel()
+    limit = min(limit, int(np.count_nonzero(flat)))
+    if limit == 0:
+        return []
+    idx = np.argpartition(flat, -limit)[-limit:]
+    idx = idx[np.argsort(flat[idx])[::-1]]
+    rows, cols = np.divmod(idx, grid_columns)
+    return [
+        {
+            "x": round((int(c) + 0.5) / grid_columns, 4),
+            "y": round((int(r) + 0.5) / grid_columns, 4),
+            "clicks": int(flat[i])
+        }
+        for r, c, i in zip(rows, cols, idx)
+    ]
+
+
+def _smooth(density: np.ndarray) -> np.ndarray:
+    """3x3 box blur so isolated clicks read as spots"""
+    padded = np.pad(density.astype(np.float32), 1, mode="constant")
+    rows, cols = density.shape
+    total = np.zeros((rows, cols), dtype=np.float32)
+    for dy in range(3):
+        for dx in range(3):
+            total += padded[dy:dy + rows, dx:dx + cols]
+    return total / 9.0
+
+
+def render_png(density: np.ndarray, cell_pixels: int = 8) -> bytes:
+    """Render a density matrix as a translucent RGBA PNG overlay"""
+    if density.size == 0:
+        density = np.zeros((1, 1), dtype=np.uint32)
+
+    smoothed = _smooth(density)
+    peak = float(smoothed.max())
+    # Log scale keeps a few very hot cells from washing out the rest
+    intensity = np.log1p(smoothed) / np.log1p(peak) if peak > 0 else smoothed
+
+    # Blue -> green -> yellow -> red ramp
+    stops = np.array([0.0, 0.33, 0.66, 1.0], dtype=np.float32)
+    red = np.interp(intensity, stops, [0, 0, 255, 255])
+    green = np.interp(intensity, stops, [0, 255, 255, 0])
+    blue = np.interp(intensity, stops, [255, 0, 0, 0])
+    alpha = np.where(intensity > 0, 64 + intensity * 150, 0)
+    rgba = np.stack([red, green, blue, alpha], axis=-1).astype(np.uint8)
+
+    if cell_pixels > 1:
+        rgba = np.repeat(np.repeat(rgba, cell_pixels, axis=0), cell_pixels, axis=1)
+    return _encode_png(rgba)
+
+
+def _encode_png(rgba: np.ndarray) -> bytes:
+    """Minimal PNG encoder for an (h, w, 4) uint8 array"""
+    height, width, _ = rgba.shape
+    # Filter type 0 (None) byte at the start of every scanline
+    scanlines = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    scanlines[:, 1:] = rgba.reshape(height, width * 4)
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return (
+            struct.pack(">I", len(data)) + tag + data
+            + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+        )
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(scanlines.tobytes(), 6))
+        + chunk(b"IEND", b"")
+    )
+
+
+# Create singleton instance
+heatmap_service = HeatmapService()
+
+__all__ = ['heatmap_service', 'HeatmapService', 'encode_density', 'decode_density', 'render_png']
@@ -16,6 +16,7 @@ from app.services.boltdiy_integration import (
     BoltProjectType,
     BoltProjectStatus
 )
+from app.services.ab_testing import ab_test_engine
 
 logger = logging.getLogger(__name__)
 
@@ -50,6 +51,9 @@ class LandingPageV2(BaseModel):
     views: int = 0
     conversions: int = 0
     conversion_rate: float = 0.0
+    
+    # A/B testing
+    ab_test_id: Optional[str] = None
 
 class TemplateV2(BaseModel):
     """Template model for V2"""
@@ -411,9 +415,7 @@ export default App"""
         if not page:
             raise ValueError(f"Page {page_id} not found")
         
-        # Calculate conversion rate
-        if page.views > 0:
-            page.conversion_rate = (page.conversions / page.views) * 100
+        self._update_conversion_rate(page)
         
         return {
             "page_id": page.id,
@@ -424,9 +426,95 @@ export default App"""
             "conversion_rate": round(page.conversion_rate, 2),
             "created_at": page.created_at.isoformat(),
             "published_at": page.published_at.isoformat() if page.published_at else None,
-            "last_updated": page.updated_at.isoformat()
+            "last_updated": page.updated_at.isoformat(),
+            "ab_test": ab_test_engine.get_results(page.ab_test_id) if page.ab_test_id else None
         }
     
+    async def start_ab_test(
+        self,
+        page_id: str,
+        variants: List[str],
+        traffic_split: Optional[List[float]] = None,
+        max_visitors_per_variant: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Start an A/B test on a landing page; the first variant is the control"""
+        
+        page = self.pages.get(page_id)
+        if not page:
+            raise ValueError(f"Page {page_id} not found")
+        
+        test_id = f"ab_{page.id}_{uuid.uuid4().hex[:6]}"
+        ab_test_engine.create_experiment(
+            test_id=test_id,
+            site_id=page.id,
+            variants=variants,
+            weights=traffic_split,
+            max_visitors_per_variant=max_visitors_per_variant
+        )
+        page.ab_test_id = test_id
+        page.updated_at = datetime.now()
+        
+        logger.info(f"Started A/B test {test_id} for page {page_id}")
+        return ab_test_engine.get_results(test_id)
+    
+    async def record_ab_view(self, page_id: str, visitor_id: str, variant: str) -> bool:
+        """Record that a visitor saw a variant of the page"""
+        
+        page = self.pages.get(page_id)
+        if not page:
+            raise ValueError(f"Page {page_id} not found")
+        
+        page.views += 1
+        self._update_conversion_rate(page)
+        if not page.ab_test_id:
+            return False
+        return ab_test_engine.record_exposure(page.ab_test_id, visitor_id, variant)
+    
+    async def record_ab_conversion(self, page_id: str, visitor_id: str, value: float = 0.0) -> bool:
+        """Record a conversion for a visitor of the page"""
+        
+        page = self.pages.get(page_id)
+        if not page:
+            raise ValueError(f"Page {page_id} not found")
+        
+        page.conversions += 1
+        self._update_conversion_rate(page)
+        if not page.ab_test_id:
+            return False
+        return ab_test_engine.record_conversion(
+            page.id, visitor_id, value, test_id=page.ab_test_id
+        ) > 0
+    
+    async def stop_ab_test(self, page_id: str) -> Dict[str, Any]:
+        """Stop the page's A/B test and return its final statistics"""
+        
+        page = self.pages.get(page_id)
+        if not page:
+            raise ValueError(f"Page {page_id} not found")
+        if not page.ab_test_id:
+            raise ValueError(f"Page {page_id} has no A/B test")
+        
+        page.updated_at = datetime.now()
+        logger.info(f"Stopped A/B test {page.ab_test_id} for page {page_id}")
+        return ab_test_engine.stop_experiment(page.ab_test_id)
+    
+    @staticmethod
+    def _update_conversion_rate(page: LandingPageV2) -> None:
+        """Keep the stored conversion rate in step with the counters"""
+        if page.views > 0:
+            page.conversion_rate = (page.conversions / page.views) * 100
+    
+    async def get_ab_test_results(self, page_id: str) -> Dict[str, Any]:
+        """Get sequential A/B test statistics for a page"""
+        
+        page = self.pages.get(page_id)
+        if not page:
+            raise ValueError(f"Page {page_id} not found")
+        if not page.ab_test_id:
+            raise ValueError(f"Page {page_id} has no A/B test")
+        
+        return ab_test_engine.get_results(page.ab_test_id)
+    
     async def compare_with_v1(
         self,
         page_id: str
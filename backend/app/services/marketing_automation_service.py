@@ -3,9 +3,12 @@ Marketing Automation Service
 Phase 3: Launch Oficial - Marketing automation and growth tools
 """
 
+import asyncio
 import logging
-from typing import Dict, Any, List, Optional, Tuple
+import os
+from typing import Dict, Any, Iterable, List, Optional, Tuple
 from datetime import datetime, timedelta
+from pathlib import Path
 from pydantic import BaseModel, Field, HttpUrl
 from enum import Enum
 import uuid
@@ -13,6 +16,9 @@ import json
 import hashlib
 import random
 
+from app.services.automation_engine import AutomationIndex, TimerWheel, compile_segment
+from app.services.process_lock import acquire_leader_lock, file_lock, release_leader_lock
+
 logger = logging.getLogger(__name__)
 
 # Enums
@@ -293,8 +299,38 @@ class MarketingAutomationService:
         self.product_hunt_launch: Optional[ProductHuntLaunch] = None
         self.lifetime_deals: Dict[str, LifetimeDeal] = {}
         self.email_automations: Dict[str, EmailAutomation] = {}
+        self.segments: Dict[str, Dict[str, Any]] = {}
         self.growth_metrics: List[GrowthMetrics] = []
         
+        # Active automations indexed by trigger with compiled segments; email
+        # steps (including the first) are timers, journaled if a path is set.
+        # Automation and segment definitions are saved next to the journal so
+        # restored timers find their automation after a restart, and reloaded
+        # every tick to pick up the ones other workers created or changed
+        self.automation_index = AutomationIndex()
+        journal_path = os.getenv('AUTOMATION_TIMER_JOURNAL_PATH') or None
+        self.automation_timers = TimerWheel(
+            tick=float(os.getenv('AUTOMATION_TIMER_TICK_SECONDS', '60')),
+            journal_path=journal_path
+        )
+        self._definitions_path = Path(f"{journal_path}.automations.json") if journal_path else None
+        self._definitions_mtime: Optional[int] = None
+        self._load_automation_definitions()
+        # Due steps sent at once (a backlog after downtime can be large)
+        self._step_sends = asyncio.Semaphore(int(os.getenv('AUTOMATION_SEND_CONCURRENCY', '20')))
+        # Failed sends are retried with exponential backoff
+        self._max_send_attempts = int(os.getenv('AUTOMATION_MAX_SEND_ATTEMPTS', '5'))
+        self._retry_backoff = float(os.getenv('AUTOMATION_RETRY_BACKOFF_SECONDS', '300'))
+        # Workers share the journal; only the holder of this lock sends due steps
+        self._scheduler_lock_path = f"{journal_path}.leader" if journal_path else None
+        self._scheduler_lock: Optional[int] = None
+        # Enrollment (automation id:user) -> timer id of its next step
+        self._enrollments: Dict[str, str] = {
+            payload['enrollment']: timer_id
+            for timer_id, _, payload in self.automation_timers.items()
+        }
+        self._scheduler_task: Optional[asyncio.Task] = None
+        
         # Initialize with sample data
         self._initialize_sample_campaigns()
     
@@ -655,41 +691,384 @@ class MarketingAutomationService:
         self,
         name: str,
         trigger: str,
-        emails: List[Dict[str, Any]]
+        emails: List[Dict[str, Any]],
+        segment: Optional[Dict[str, Any]] = None,
+        exclude_segments: Optional[List[str]] = None
     ) -> EmailAutomation:
         """Create an email automation sequence"""
         
         automation = EmailAutomation(
             name=name,
             trigger=trigger,
-            emails=emails
+            emails=emails,
+            segment=segment or {},
+            exclude_segments=exclude_segments or []
         )
         
+        # Compiles the segment, so invalid criteria fail here
+        self._index_automation(automation)
         self.email_automations[automation.id] = automation
+        self._save_automation_definitions(automations=[automation])
         
         logger.info(f"Created email automation {automation.id}: {name}")
         return automation
     
+    async def define_segment(
+        self,
+        name: str,
+        criteria: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Create or replace a named segment usable in exclude_segments"""
+        
+        compile_segment(criteria)
+        self.segments[name] = criteria
+        
+        # Recompile automations excluding this segment
+        for automation in self.email_automations.values():
+            if name in automation.exclude_segments:
+                self._index_automation(automation)
+        self._save_automation_definitions(segments=[name])
+        
+        logger.info(f"Defined segment {name}")
+        return criteria
+    
+    async def set_email_automation_active(
+        self,
+        automation_id: str,
+        active: bool
+    ) -> EmailAutomation:
+        """Activate or pause an automation (steps falling due while paused are dropped)"""
+        
+        automation = self.email_automations.get(automation_id)
+        if not automation:
+            raise ValueError(f"Email automation {automation_id} not found")
+        
+        automation.active = active
+        self._index_automation(automation)
+        self._save_automation_definitions(automations=[automation])
+        
+        logger.info(f"Set email automation {automation_id} active={active}")
+        return automation
+    
+    def _index_automation(self, automation: EmailAutomation):
+        """(Re)index an automation with its segment and exclusions compiled"""
+        
+        if not automation.active:
+            self.automation_index.remove(automation.id)
+            return
+        
+        excluded = []
+        for name in automation.exclude_segments:
+            if name not in self.segments:
+                raise ValueError(f"Segment {name} not found")
+            excluded.append(compile_segment(self.segments[name]))
+        
+        included = compile_segment(automation.segment)
+        if excluded:
+            predicate = lambda data: included(data) and not any(p(data) for p in excluded)
+        else:
+            predicate = included
+        
+        self.automation_index.add(automation.id, automation.trigger, automation.segment, predicate)
+    
+    def _load_automation_definitions(self):
+        """Restore automations and segments saved by _save_automation_definitions"""
+        
+        if self._definitions_path is None or not self._definitions_path.exists():
+            return
+        try:
+            mtime = self._definitions_path.stat().st_mtime_ns
+            definitions = json.loads(self._definitions_path.read_text())
+        except Exception as e:
+            logger.error(f"Failed to load email automations: {str(e)}")
+            return
+        
+        self._definitions_mtime = mtime
+        self.segments.update(definitions.get('segments', {}))
+        for data in definitions.get('automations', []):
+            automation = EmailAutomation(**data)
+            try:
+                self._index_automation(automation)
+            except ValueError as e:
+                logger.error(f"Email automation {automation.id} not indexed: {str(e)}")
+            self.email_automations[automation.id] = automation
+        logger.debug(f"Loaded {len(self.email_automations)} email automations")
+    
+    def _reload_automation_definitions(self):
+        """Load the definitions again if another worker (or we) saved since"""
+        
+        try:
+            mtime = self._definitions_path.stat().st_mtime_ns if self._definitions_path else None
+        except FileNotFoundError:
+            return
+        if mtime is not None and mtime != self._definitions_mtime:
+            self._load_automation_definitions()
+    
+    def _save_automation_definitions(
+        self,
+        automations: Iterable[EmailAutomation] = (),
+        segments: Iterable[str] = (),
+        counters: bool = False
+    ):
+        """
+        Merge automations and segments into the definitions next to the timer journal
+        
+        Workers share the file, so only the given entries are written. Send
+        counters belong to the scheduler leader: counters=True writes just
+        those, and other saves keep the counters already in the file.
+        """
+        
+        if self._definitions_path is None:
+            return
+        try:
+            with file_lock(f"{self._definitions_path}.lock"):
+                saved = {'segments': {}, 'automations': []}
+                if self._definitions_path.exists():
+                    saved = json.loads(self._definitions_path.read_text())
+                for name in segments:
+                    saved['segments'][name] = self.segments[name]
+                by_id = {data['id']: data for data in saved['automations']}
+                for automation in automations:
+                    data = automation.dict()
+                    current = by_id.get(automation.id)
+                    if current is None:
+                        by_id[automation.id] = data
+                    elif counters:
+                        current['sent'] = data['sent']
+                    else:
+                        current.update({key: value for key, value in data.items() if key != 'sent'})
+                saved['automations'] = list(by_id.values())
+                
+                tmp = self._definitions_path.with_suffix('.tmp')
+                tmp.write_text(json.dumps(saved, default=str))
+                os.replace(tmp, self._definitions_path)
+        except Exception as e:
+            logger.error(f"Failed to persist email automations: {str(e)}")
+    
     async def trigger_email_automation(
         self,
         trigger: str,
         user_data: Dict[str, Any]
     ) -> List[str]:
-        """Trigger email automations based on event"""
+        """
+        Trigger email automations based on event
         
-        triggered = []
+        Returns the automations the user was enrolled in; a user already in
+        an automation's sequence is not enrolled again.
+        """
         
-        for automation in self.email_automations.values():
-            if automation.active and automation.trigger == trigger:
-                # Check segment criteria
-                # Would queue emails for sending
-                automation.sent += 1
-                triggered.append(automation.id)
-                
-                logger.info(f"Triggered automation {automation.id} for {trigger}")
+        user_key = user_data.get('id') or user_data.get('user_id') or user_data.get('email')
+        if not user_key:
+            logger.warning(f"Ignoring {trigger} event without user id or email")
+            return []
         
+        triggered = []
+        timers = []
+        now = datetime.now().timestamp()
+        
+        for automation_id in self.automation_index.match(trigger, user_data):
+            enrollment = f"{automation_id}:{user_key}"
+            if enrollment in self._enrollments:
+                continue
+            
+            automation = self.email_automations[automation_id]
+            if automation.emails:
+                timers.append(self._automation_step_timer(automation, enrollment, 0, user_data, now))
+            triggered.append(automation_id)
+        
+        self._schedule_automation_steps(timers)
+        await self._sync_automation_timers()
+        
+        if triggered:
+            logger.debug(f"Triggered automations {triggered} for {trigger}")
         return triggered
     
+    def _automation_step_timer(
+        self,
+        automation: EmailAutomation,
+        enrollment: str,
+        step: int,
+        user_data: Dict[str, Any],
+        previous_due: float
+    ) -> Tuple[str, float, Dict[str, Any]]:
+        """Timer for a step of an enrollment, delay_hours (or the default gap) after the previous one"""
+        
+        email = automation.emails[step]
+        default_hours = automation.delay_between_emails_hours if step else 0
+        due = previous_due + float(email.get('delay_hours', default_hours)) * 3600
+        
+        return f"{enrollment}:{step}", due, {
+            'automation_id': automation.id,
+            'enrollment': enrollment,
+            'step': step,
+            'due': due,
+            'user': user_data
+        }
+    
+    def _automation_retry_timer(
+        self,
+        payload: Dict[str, Any],
+        now: float
+    ) -> Tuple[str, float, Dict[str, Any]]:
+        """Timer resending a failed step after an exponential backoff"""
+        
+        attempt = payload.get('attempt', 0) + 1
+        due = now + self._retry_backoff * 2 ** (attempt - 1)
+        # 'due' in the payload stays the step's schedule, so later steps keep their spacing
+        return f"{payload['enrollment']}:{payload['step']}:retry{attempt}", due, {**payload, 'attempt': attempt}
+    
+    def _schedule_automation_steps(self, timers: List[Tuple[str, float, Dict[str, Any]]]):
+        """Queue step timers (journaled by the next _sync_automation_timers)"""
+        
+        self.automation_timers.schedule_many(timers)
+        for timer_id, _, payload in timers:
+            self._enrollments[payload['enrollment']] = timer_id
+    
+    async def _sync_automation_timers(self):
+        """Journal our timer changes and pick up the ones other workers made"""
+        
+        added, removed = await self.automation_timers.sync()
+        for timer_id, _, payload in removed:
+            if self._enrollments.get(payload['enrollment']) == timer_id:
+                del self._enrollments[payload['enrollment']]
+        for timer_id, _, payload in added:
+            self._enrollments[payload['enrollment']] = timer_id
+    
+    async def process_due_automation_steps(self, now: Optional[float] = None) -> int:
+        """Send every due automation email and queue the next steps; returns emails sent"""
+        
+        from app.services.email_service import email_service
+        
+        now = self.automation_timers.clock() if now is None else now
+        due_steps = self.automation_timers.pop_due(now)
+        if not due_steps:
+            return 0
+        
+        results = await asyncio.gather(*(
+            self._send_automation_step(payload, email_service)
+            for _, payload in due_steps
+        ))
+        sent_by = {
+            payload['automation_id']
+            for (_, payload), result in zip(due_steps, results) if result == 'sent'
+        }
+        
+        next_steps = []
+        for (timer_id, payload), result in zip(due_steps, results):
+            if result == 'failed':
+                if payload.get('attempt', 0) + 1 < self._max_send_attempts:
+                    next_steps.append(self._automation_retry_timer(payload, now))
+                    continue
+                logger.error(
+                    f"Giving up on step {payload['step']} of {payload['enrollment']} "
+                    f"after {self._max_send_attempts} attempts"
+                )
+            automation = self.email_automations.get(payload['automation_id'])
+            next_step = payload['step'] + 1
+            if automation and automation.active and next_step < len(automation.emails):
+                next_steps.append(self._automation_step_timer(
+                    automation, payload['enrollment'], next_step, payload['user'], payload['due']
+                ))
+            elif self._enrollments.get(payload['enrollment']) == timer_id:
+                del self._enrollments[payload['enrollment']]
+        
+        self._schedule_automation_steps(next_steps)
+        self.automation_timers.complete(*(timer_id for timer_id, _ in due_steps))
+        await self._sync_automation_timers()
+        if sent_by:
+            await asyncio.to_thread(
+                self._save_automation_definitions,
+                automations=[self.email_automations[automation_id] for automation_id in sent_by],
+                counters=True
+            )
+        
+        return sum(1 for result in results if result == 'sent')
+    
+    async def _send_automation_step(self, payload: Dict[str, Any], email_service) -> str:
+        """Send one step; returns 'sent', 'skipped' or 'failed' (retried)"""
+        
+        automation = self.email_automations.get(payload['automation_id'])
+        if not automation:
+            logger.warning(
+                f"Dropping step {payload['step']} of {payload['enrollment']}: "
+                f"unknown automation {payload['automation_id']}"
+            )
+            return 'skipped'
+        if not automation.active or payload['step'] >= len(automation.emails):
+            return 'skipped'
+        
+        email = automation.emails[payload['step']]
+        user = payload['user']
+        try:
+            async with self._step_sends:
+                result = await email_service.send_email({
+                    'to': user.get('email'),
+                    'subject': email.get('subject', automation.name),
+                    'template': email.get('template', 'default'),
+                    'html': email.get('html', ''),
+                    'data': {**user, **email.get('data', {})}
+                })
+        except Exception as e:
+            logger.error(f"Failed to send automation {automation.id} step {payload['step']}: {str(e)}")
+            return 'failed'
+        
+        if result.get('success'):
+            automation.sent += 1
+            return 'sent'
+        logger.error(
+            f"Failed to send automation {automation.id} step {payload['step']}: "
+            f"{result.get('error', 'unknown error')}"
+        )
+        return 'failed'
+    
+    async def start_automation_scheduler(self):
+        """Send due automation steps every timer tick in the background"""
+        
+        if self._scheduler_task is None:
+            self._scheduler_task = asyncio.create_task(self._automation_scheduler_loop())
+    
+    async def stop_automation_scheduler(self):
+        """Stop the scheduler and close the timer journal"""
+        
+        if self._scheduler_task is not None:
+            self._scheduler_task.cancel()
+            await asyncio.gather(self._scheduler_task, return_exceptions=True)
+            self._scheduler_task = None
+        release_leader_lock(self._scheduler_lock)
+        self._scheduler_lock = None
+        self.automation_timers.close()
+    
+    def _lead_automation_scheduler(self) -> bool:
+        """Whether this worker sends due steps (the one holding the leader lock)"""
+        
+        if self._scheduler_lock_path is None:
+            # No shared journal: every worker only knows its own timers
+            return True
+        if self._scheduler_lock is None:
+            self._scheduler_lock = acquire_leader_lock(self._scheduler_lock_path)
+            if self._scheduler_lock is not None:
+                logger.info("This worker now sends due automation steps")
+        return self._scheduler_lock is not None
+    
+    async def _automation_scheduler_tick(self, now: Optional[float] = None) -> int:
+        """One scheduler pass: pick up other workers' automations and timers, send due steps if leading"""
+        
+        self._reload_automation_definitions()
+        await self._sync_automation_timers()
+        if not self._lead_automation_scheduler():
+            return 0
+        return await self.process_due_automation_steps(now)
+    
+    async def _automation_scheduler_loop(self):
+        """Background loop started by start_automation_scheduler"""
+        
+        while True:
+            try:
+                await self._automation_scheduler_tick()
+            except Exception as e:
+                logger.error(f"Automation scheduler error: {str(e)}")
+            await asyncio.sleep(self.automation_timers.tick)
+    
     # Analytics and Reporting
     async def get_campaign_performance(
         self,
@@ -0,0 +1,176 @@
+"""
+Principal Cache
+Short-lived cache of authenticated principals, keyed by token id
+
+AuthMiddleware used to open a database session and load the user on every
+request. Principals are now cached for a few seconds per token; misses are
+loaded off the event loop and concurrent misses for the same token share a
+single load. Entries are dropped on logout (the token id stays revoked until
+the token expires), password change/reset and account status changes.
+
+The cache is per process, so with several workers a change made elsewhere
+is picked up within PRINCIPAL_CACHE_TTL_SECONDS.
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from app.models.user import User, UserPlan, UserRole
+
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "30"))
+PRINCIPAL_CACHE_MAX_ENTRIES = int(os.getenv("PRINCIPAL_CACHE_MAX_ENTRIES", "10000"))
+
+@dataclass(frozen=True)
+class Principal:
+    """Immutable snapshot of the authenticated user, safe to share across requests"""
+    id: int
+    username: str
+    email: str
+    role: UserRole
+    plan: UserPlan
+    is_verified: bool = False
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            role=user.role,
+            plan=user.plan,
+            is_verified=bool(user.is_verified)
+        )
+
+    def has_permission(self, permission: str) -> bool:
+        """Same rules as User.has_permission"""
+        return User.has_permission(self, permission)
+
+class PrincipalCache:
+    """
+    TTL + LRU cache of token id -> Principal (or None for inactive users)
+    """
+
+    def __init__(
+        self,
+        ttl: float = PRINCIPAL_CACHE_TTL_SECONDS,
+        max_entries: int = PRINCIPAL_CACHE_MAX_ENTRIES
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, int, Optional[Principal]]]" = OrderedDict()
+        self._by_user: Dict[int, Set[str]] = {}
+        self._revoked: Dict[str, float] = {}  # token id -> token expiry (epoch seconds)
+        self._loading: Dict[str, asyncio.Future] = {}
+        # Bumped by every invalidation so a load that raced with one is not stored
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token_id: str) -> Tuple[bool, Optional[Principal]]:
+        """(found, principal) for a live entry"""
+        entry = self._entries.get(token_id)
+        if entry is None:
+            return False, None
+        if entry[0] <= time.monotonic():
+            self._drop(token_id)
+            return False, None
+        self._entries.move_to_end(token_id)
+        return True, entry[2]
+
+    def put(self, token_id: str, user_id: int, principal: Optional[Principal]):
+        if token_id in self._entries:
+            self._drop(token_id)
+        self._entries[token_id] = (time.monotonic() + self.ttl, user_id, principal)
+        self._by_user.setdefault(user_id, set()).add(token_id)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    async def get_or_load(
+        self,
+        token_id: str,
+        user_id: int,
+        loader: Callable[[], Awaitable[Optional[Principal]]]
+    ) -> Optional[Principal]:
+        """
+        Cached principal for token_id, loading it once on a miss
+
+        Waiters share the pending load; a cancelled waiter does not cancel it.
+        """
+        found, principal = self.get(token_id)
+        if found:
+            self.hits += 1
+            return principal
+
+        pending = self._loading.get(token_id)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        epoch = self._epoch
+        pending = asyncio.ensure_future(loader())
+        self._loading[token_id] = pending
+        try:
+            principal = await asyncio.shield(pending)
+        finally:
+            if self._loading.get(token_id) is pending:
+                del self._loading[token_id]
+        if epoch == self._epoch and not self.is_revoked(token_id):
+            self.put(token_id, user_id, principal)
+        return principal
+
+    def invalidate(self, token_id: str):
+        self._epoch += 1
+        self._drop(token_id)
+
+    def invalidate_user(self, user_id: int):
+        """Drop every cached token of a user (password, role or status change)"""
+        self._epoch += 1
+        for token_id in list(self._by_user.get(user_id, ())):
+            self._drop(token_id)
+
+    def revoke(self, token_id: str, expires_at: float):
+        """Reject token_id until it expires (logout)"""
+        self.invalidate(token_id)
+        now = time.time()
+        self._revoked[token_id] = expires_at
+        if len(self._revoked) > self.max_entries:
+            self._revoked = {k: v for k, v in self._revoked.items() if v > now}
+
+    def is_revoked(self, token_id: str) -> bool:
+        expires_at = self._revoked.get(token_id)
+        if expires_at is None:
+            return False
+        if expires_at <= time.time():
+            del self._revoked[token_id]
+            return False
+        return True
+
+    def clear(self):
+        self._epoch += 1
+        self._entries.clear()
+        self._by_user.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "revoked": len(self._revoked),
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+    def _drop(self, token_id: str):
+        entry = self._entries.pop(token_id, None)
+        if entry is None:
+            return
+        tokens = self._by_user.get(entry[1])
+        if tokens is not None:
+            tokens.discard(token_id)
+            if not tokens:
+                del self._by_user[entry[1]]
+
+# Create singleton instance
+principal_cache = PrincipalCache()
@@ -0,0 +1,68 @@
+"""
+Process Locks
+File locks shared by the API worker processes
+
+The API runs as several uvicorn/gunicorn workers, each executing the same
+lifespan. Background loops that must run once per deployment (the warm pool
+replenisher, the automation scheduler) take a leader lock: a non-blocking
+exclusive flock held for the life of the process. Exactly one worker gets
+it; the others skip the loop. The kernel drops the lock when its holder
+exits, so a restarted deployment elects a new leader without cleanup.
+
+file_lock() is the short-lived counterpart for read-modify-write cycles on
+state files shared by the workers.
+
+Both rely on flock(2), so every worker must see the same local filesystem
+(they do: workers of one deployment share a host).
+"""
+
+import fcntl
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+PathLike = Union[str, Path]
+
+
+def _open_lock_file(path: PathLike) -> int:
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    return os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+
+
+def acquire_leader_lock(path: PathLike) -> Optional[int]:
+    """
+    Try to become the leader for `path`
+
+    Returns the locked file descriptor (keep it for as long as the process
+    leads, pass it to release_leader_lock() to step down) or None when
+    another process already holds the lock.
+    """
+    fd = _open_lock_file(path)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    os.ftruncate(fd, 0)
+    os.write(fd, str(os.getpid()).encode())
+    return fd
+
+
+def release_leader_lock(fd: Optional[int]) -> None:
+    if fd is None:
+        return
+    fcntl.flock(fd, fcntl.LOCK_UN)
+    os.close(fd)
+
+
+@contextmanager
+def file_lock(path: PathLike) -> Iterator[None]:
+    """Hold an exclusive lock on `path` for the duration of the block"""
+    fd = _open_lock_file(path)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
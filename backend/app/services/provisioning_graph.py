@@ -0,0 +1,261 @@
+"""
+Provisioning Stage Graph
+Runs provisioning stages as a dependency graph with checkpoints
+
+Each stage declares the stages it depends on; every stage whose
+dependencies have completed starts immediately, so independent work (e.g.
+ingress, backup CronJob and monitoring) overlaps with the long readiness
+waits instead of queueing behind them.
+
+Completed stages are checkpointed to a JSON state file per run. A run that
+crashed resumes by skipping every checkpointed stage. The caller deletes the
+checkpoint (it holds the run's parameters, credentials included) once the
+run has finished, and holds the run's lock while it runs so another process
+never resumes a run that is still in progress. When a stage fails,
+the stages still running are cancelled and only the stages that actually
+completed are rolled back, in reverse completion order.
+"""
+
+import asyncio
+import json
+import logging
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from app.services.process_lock import acquire_leader_lock
+from app.services.readiness import StageTimer
+
+logger = logging.getLogger(__name__)
+
+StageFunc = Callable[[], Awaitable[Any]]
+
+
+@dataclass
+class Stage:
+    """One node of the provisioning graph"""
+    name: str
+    run: StageFunc
+    depends_on: Sequence[str] = ()
+    rollback: Optional[StageFunc] = None
+
+
+class StageGraphError(Exception):
+    """A stage failed; carries the original error and rollback outcome"""
+
+    def __init__(self, stage: str, error: BaseException, rolled_back: List[str]):
+        self.stage = stage
+        self.error = error
+        self.rolled_back = rolled_back
+        super().__init__(f"Stage '{stage}' failed: {error}")
+
+
+class ProvisioningGraph:
+    """Validated stage DAG"""
+
+    def __init__(self, stages: Sequence[Stage]):
+        self.stages: Dict[str, Stage] = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"Duplicate stage: {stage.name}")
+            self.stages[stage.name] = stage
+        for stage in stages:
+            for dependency in stage.depends_on:
+                if dependency not in self.stages:
+                    raise ValueError(f"Stage '{stage.name}' depends on unknown stage '{dependency}'")
+        self.order = self._topological_order()
+
+    def _topological_order(self) -> List[str]:
+        remaining = {name: set(stage.depends_on) for name, stage in self.stages.items()}
+        order = []
+        while remaining:
+            ready = sorted(name for name, deps in remaining.items() if not deps)
+            if not ready:
+                raise ValueError(f"Cycle between stages: {sorted(remaining)}")
+            for name in ready:
+                order.append(name)
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+        return order
+
+    def critical_path(self, durations: Dict[str, float]) -> List[str]:
+        """Longest dependency chain by measured duration"""
+        finish: Dict[str, float] = {}
+        previous: Dict[str, Optional[str]] = {}
+        for name in self.order:
+            deps = self.stages[name].depends_on
+            best = max(deps, key=lambda d: finish[d], default=None)
+            finish[name] = durations.get(name, 0.0) + (finish[best] if best else 0.0)
+            previous[name] = best
+        if not finish:
+            return []
+        node = max(finish, key=finish.get)
+        path = []
+        while node is not None:
+            path.append(node)
+            node = previous[node]
+        return path[::-1]
+
+
+class ProvisioningCheckpointStore:
+    """One JSON state file per provisioning run"""
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, run_id: str) -> Path:
+        return self.directory / f"{run_id}.json"
+
+    def load(self, run_id: str) -> Optional[Dict[str, Any]]:
+        path = self._path(run_id)
+        try:
+            if path.exists():
+                return json.loads(path.read_text())
+        except Exception as e:
+            logger.error(f"Failed to load provisioning checkpoint {run_id}: {str(e)}")
+        return None
+
+    def save(self, run_id: str, state: Dict[str, Any]) -> None:
+        path = self._path(run_id)
+        tmp = path.with_suffix(".tmp")
+        # State may hold credentials; keep it private to the service user
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as handle:
+            json.dump(state, handle, indent=2, default=str)
+        os.replace(tmp, path)
+
+    def delete(self, run_id: str) -> None:
+        self._path(run_id).unlink(missing_ok=True)
+        # Resumers re-read the checkpoint once they hold the lock, so it can go too
+        (self.directory / f"{run_id}.lock").unlink(missing_ok=True)
+
+    def lock(self, run_id: str) -> Optional[int]:
+        """Lock a run for this process (see process_lock); None if another process holds it"""
+        return acquire_leader_lock(self.directory / f"{run_id}.lock")
+
+    def pending_runs(self) -> List[str]:
+        """Runs that started but neither finished nor rolled back"""
+        runs = []
+        for path in self.directory.glob("*.json"):
+            state = self.load(path.stem)
+            if state and state.get("status") == "running":
+                runs.append(path.stem)
+        return runs
+
+
+class StageGraphRunner:
+    """Executes a ProvisioningGraph for one run (see module docstring)"""
+
+    def __init__(
+        self,
+        graph: ProvisioningGraph,
+        store: Optional[ProvisioningCheckpointStore] = None,
+        timer: Optional[StageTimer] = None
+    ):
+        self.graph = graph
+        self.store = store
+        self.timer = timer or StageTimer()
+
+    def _checkpoint(self, run_id: str, state: Dict[str, Any]) -> None:
+        if self.store is not None:
+            state["updated_at"] = datetime.now().isoformat()
+            self.store.save(run_id, state)
+
+    async def run(self, run_id: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Run every stage not yet checkpointed as completed
+
+        params are stored with the checkpoint so a crashed run can be
+        resumed with the same inputs. Returns the final run state.
+        """
+        state = (self.store.load(run_id) if self.store else None) or {
+            "run_id": run_id,
+            "params": params or {},
+            "completed": [],
+            "created_at": datetime.now().isoformat()
+        }
+        if state.get("status") == "rolled_back":
+            # Everything this run created was undone; start over
+            state["completed"] = []
+        state["status"] = "running"
+        completed: List[str] = list(state["completed"])
+        if completed:
+            logger.info(f"Resuming provisioning run {run_id} after {len(completed)} completed stages")
+        self._checkpoint(run_id, state)
+
+        done = set(completed)
+        running: Dict[asyncio.Task, str] = {}
+        failure = None
+
+        def launch_ready() -> None:
+            active = set(running.values())
+            for name in self.graph.order:
+                stage = self.graph.stages[name]
+                if name in done or name in active:
+                    continue
+                if all(dep in done for dep in stage.depends_on):
+                    running[asyncio.ensure_future(self._run_stage(stage))] = name
+
+        launch_ready()
+        try:
+            while running:
+                finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    name = running.pop(task)
+                    if task.exception() is not None:
+                        failure = failure or (name, task.exception())
+                        continue
+                    done.add(name)
+                    completed.append(name)
+                    state["completed"] = completed
+                    self._checkpoint(run_id, state)
+                if failure:
+                    break
+                launch_ready()
+        finally:
+            if running:
+                # Failure elsewhere (or caller cancelled): stop in-flight stages
+                for task in running:
+                    task.cancel()
+                await asyncio.gather(*running, return_exceptions=True)
+
+        if failure is None:
+            state["status"] = "completed"
+            state["timings"] = self.timer.to_dict()
+            state["critical_path"] = self.graph.critical_path(
+                {s["stage"]: s["seconds"] for s in self.timer.stages}
+            )
+            self._checkpoint(run_id, state)
+            return state
+
+        name, error = failure
+        rolled_back = await self.rollback(completed)
+        state["status"] = "rolled_back"
+        state["failed_stage"] = name
+        state["error"] = str(error)
+        state["rolled_back"] = rolled_back
+        state["completed"] = []
+        self._checkpoint(run_id, state)
+        raise StageGraphError(name, error, rolled_back) from error
+
+    async def _run_stage(self, stage: Stage) -> Any:
+        with self.timer.stage(stage.name):
+            return await stage.run()
+
+    async def rollback(self, completed: Sequence[str]) -> List[str]:
+        """Undo completed stages in reverse order; returns those undone"""
+        rolled_back = []
+        for name in reversed(completed):
+            stage = self.graph.stages[name]
+            if stage.rollback is None:
+                continue
+            try:
+                await stage.rollback()
+                rolled_back.append(name)
+            except Exception as e:
+                logger.error(f"Rollback of stage '{name}' failed: {str(e)}")
+        return rolled_back
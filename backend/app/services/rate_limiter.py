@@ -0,0 +1,187 @@
+"""
+Rate Limiter
+GCRA (generic cell rate algorithm) limiter shared across workers
+
+Each bucket is a single number, the theoretical arrival time (TAT) of the
+next request, so a check is O(1) time and memory per bucket and there is no
+window to clean up. With Redis the check-and-update for all buckets of a
+request runs in one Lua script, which keeps limits global across uvicorn
+workers and pods. Without Redis (or if it errors) a bounded in-process LRU of
+TATs is used; evicting a key only forgets a bucket that would soon be full
+again.
+
+A limit of N requests per period allows bursts of up to N and then one
+request every period / N.
+"""
+
+import logging
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+# KEYS: bucket keys; ARGV: now (ms), then emission interval (ms) and burst per key.
+# All buckets are admitted or none is; returns {allowed, retry_after_ms, tat...}.
+GCRA_SCRIPT = """
+local now = tonumber(ARGV[1])
+local retry = 0
+local tats = {}
+for i, key in ipairs(KEYS) do
+    local interval = tonumber(ARGV[i * 2])
+    local burst = tonumber(ARGV[i * 2 + 1])
+    local tat = tonumber(redis.call('GET', key) or now)
+    if tat < now then tat = now end
+    local allow_at = tat + interval - burst * interval
+    if now < allow_at then
+        retry = math.max(retry, allow_at - now)
+        tats[i] = tat
+    else
+        tats[i] = tat + interval
+    end
+end
+if retry == 0 then
+    for i, key in ipairs(KEYS) do
+        redis.call('SET', key, string.format('%.3f', tats[i]), 'PX', math.ceil(tats[i] - now))
+    end
+end
+local result = {retry == 0 and 1 or 0, math.ceil(retry)}
+for i = 1, #tats do result[i + 2] = string.format('%.3f', tats[i]) end
+return result
+"""
+
+@dataclass(frozen=True)
+class RateLimit:
+    """N requests per period (seconds)"""
+    limit: int
+    period: float = 60.0
+
+    @property
+    def interval_ms(self) -> float:
+        return self.period * 1000.0 / self.limit
+
+@dataclass
+class RateLimitResult:
+    """Outcome of a check, reported for the most restrictive bucket"""
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_after: float  # seconds until the bucket is fully replenished
+    retry_after: float = 0.0  # seconds until a request would be admitted
+
+class RateLimiter:
+    """
+    GCRA limiter over any number of buckets per request
+
+    Args:
+        redis_client: redis.asyncio client, or None for in-process only
+        prefix: Key prefix in Redis
+        max_local_keys: Bound of the in-process bucket table
+        clock: Time source in seconds (injectable for tests)
+    """
+
+    def __init__(
+        self,
+        redis_client: Any = None,
+        prefix: str = "kenzysites:ratelimit:",
+        max_local_keys: int = 100_000,
+        clock: Callable[[], float] = time.time
+    ):
+        self.redis = redis_client
+        self.prefix = prefix
+        self.max_local_keys = max_local_keys
+        self.clock = clock
+        self._local: "OrderedDict[str, float]" = OrderedDict()
+        self._script = redis_client.register_script(GCRA_SCRIPT) if redis_client is not None else None
+        self._redis_retry_at = 0.0
+
+    @classmethod
+    def from_url(cls, redis_url: Optional[str], **kwargs) -> "RateLimiter":
+        """Redis-backed limiter if redis_url is set and redis is installed"""
+        if redis_url and aioredis is not None:
+            return cls(aioredis.from_url(redis_url, socket_timeout=0.5), **kwargs)
+        if redis_url:
+            logger.warning("redis package not installed, rate limits are per process")
+        return cls(**kwargs)
+
+    async def hit(self, buckets: Sequence[Tuple[str, RateLimit]]) -> RateLimitResult:
+        """Count one request against every bucket (all or nothing)"""
+        now_ms = self.clock() * 1000.0
+
+        tats = None
+        retry_ms = 0.0
+        # After a Redis error, stay local for a few seconds instead of timing out per request
+        if self._script is not None and now_ms >= self._redis_retry_at:
+            try:
+                tats, retry_ms = await self._hit_redis(buckets, now_ms)
+            except Exception as e:
+                self._redis_retry_at = now_ms + 5000
+                logger.warning(f"Rate limiter Redis error, using in-process limits: {e}")
+        if tats is None:
+            tats, retry_ms = self._hit_local(buckets, now_ms)
+
+        return self._result(buckets, tats, now_ms, retry_ms)
+
+    async def _hit_redis(
+        self,
+        buckets: Sequence[Tuple[str, RateLimit]],
+        now_ms: float
+    ) -> Tuple[List[float], float]:
+        args: List[Any] = [f"{now_ms:.3f}"]
+        for _, rule in buckets:
+            args.extend((f"{rule.interval_ms:.3f}", rule.limit))
+        reply = await self._script(keys=[self.prefix + key for key, _ in buckets], args=args)
+        return [float(tat) for tat in reply[2:]], float(reply[1])
+
+    def _hit_local(
+        self,
+        buckets: Sequence[Tuple[str, RateLimit]],
+        now_ms: float
+    ) -> Tuple[List[float], float]:
+        local = self._local
+        tats = []
+        retry_ms = 0.0
+        for key, rule in buckets:
+            tat = max(local.get(key, now_ms), now_ms)
+            allow_at = tat + rule.interval_ms - rule.limit * rule.interval_ms
+            if now_ms < allow_at:
+                retry_ms = max(retry_ms, allow_at - now_ms)
+                tats.append(tat)
+            else:
+                tats.append(tat + rule.interval_ms)
+
+        if retry_ms == 0:
+            for (key, _), tat in zip(buckets, tats):
+                local[key] = tat
+                local.move_to_end(key)
+            while len(local) > self.max_local_keys:
+                local.popitem(last=False)
+        return tats, retry_ms
+
+    def _result(
+        self,
+        buckets: Sequence[Tuple[str, RateLimit]],
+        tats: List[float],
+        now_ms: float,
+        retry_ms: float
+    ) -> RateLimitResult:
+        result = None
+        for (_, rule), tat in zip(buckets, tats):
+            # Requests still admissible before the bucket is empty
+            remaining = max(0, math.floor((now_ms - (tat - rule.limit * rule.interval_ms)) / rule.interval_ms))
+            if result is None or remaining < result.remaining:
+                result = RateLimitResult(
+                    allowed=retry_ms == 0,
+                    limit=rule.limit,
+                    remaining=remaining,
+                    reset_after=max(0.0, tat - now_ms) / 1000.0
+                )
+        result.retry_after = retry_ms / 1000.0
+        return result
@@ -0,0 +1,322 @@
+"""
+Readiness Waiting for Provisioned Sites
+Event-driven readiness tracking and per-stage provisioning timings
+
+Kubernetes targets are tracked with watch streams on the deployment and its
+pods instead of polling read_namespaced_deployment every few seconds: the
+waiter returns as soon as the deployment reports its replicas ready, and
+fails fast when a pod enters a state that will not recover on its own
+(CrashLoopBackOff, image pull errors, repeated restarts).
+
+Docker/SSH/HTTP targets use exponential-backoff probes, which react within
+a fraction of a second when the target comes up quickly and back off to a
+few seconds when it does not.
+
+The kubernetes client is synchronous, so each watch stream is consumed in a
+dedicated thread and its events are handed to the event loop. Every wait
+starts its own threads (one per stream), so concurrent waits never queue
+behind each other for threads. Watches are opened in short server-side
+chunks (watch_chunk_seconds) because Watch.stop() is only checked between
+events: after a wait ends, its threads exit within one chunk instead of
+blocking in an idle stream. The watch factory is injectable, which lets
+tests drive the waiter with a fake stream.
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Container waiting reasons that do not resolve without intervention
+FATAL_WAITING_REASONS = {
+    "CrashLoopBackOff",
+    "ImagePullBackOff",
+    "ErrImagePull",
+    "InvalidImageName",
+    "ErrImageNeverPull",
+    "CreateContainerConfigError",
+    "CreateContainerError",
+    "RunContainerError"
+}
+
+
+class ReadinessError(Exception):
+    """Target failed in a way that waiting longer will not fix"""
+
+    def __init__(self, target: str, reason: str, message: str = ""):
+        self.target = target
+        self.reason = reason
+        self.message = message
+        super().__init__(f"{target} failed: {reason}" + (f" ({message})" if message else ""))
+
+
+class ReadinessTimeout(TimeoutError):
+    """Target did not become ready in time"""
+
+
+def deployment_is_ready(deployment: Any) -> bool:
+    """All desired replicas of the current generation are ready"""
+    status = deployment.status
+    if status is None:
+        return False
+    desired = deployment.spec.replicas if deployment.spec.replicas is not None else 1
+    observed = status.observed_generation or 0
+    generation = deployment.metadata.generation or 0
+    return observed >= generation and (status.ready_replicas or 0) >= max(desired, 1)
+
+
+def deployment_failure_reason(deployment: Any) -> Optional[str]:
+    """Reason if the rollout has given up (progress deadline exceeded)"""
+    status = deployment.status
+    for condition in (status.conditions or []) if status else []:
+        if condition.type == "Progressing" and condition.status == "False":
+            return condition.reason or "ProgressDeadlineExceeded"
+    return None
+
+
+def pod_failure_reason(pod: Any, max_restarts: int = 3) -> Optional[str]:
+    """First fatal condition found in a pod's container statuses"""
+    status = pod.status
+    if status is None:
+        return None
+    if status.phase == "Failed":
+        return status.reason or "PodFailed"
+
+    statuses = list(status.init_container_statuses or []) + list(status.container_statuses or [])
+    for container in statuses:
+        waiting = container.state.waiting if container.state else None
+        if waiting is not None and waiting.reason in FATAL_WAITING_REASONS:
+            detail = f": {waiting.message}" if waiting.message else ""
+            return f"{waiting.reason} in container {container.name}{detail}"
+        if (container.restart_count or 0) >= max_restarts:
+            return f"Container {container.name} restarted {container.restart_count} times"
+    return None
+
+
+class StageTimer:
+    """Records how long each provisioning stage takes"""
+
+    def __init__(self):
+        self.stages: List[Dict[str, Any]] = []
+        self._started = time.monotonic()
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.monotonic()
+        status = "ok"
+        try:
+            yield
+        except BaseException:
+            status = "failed"
+            raise
+        finally:
+            self.stages.append({
+                "stage": name,
+                "seconds": round(time.monotonic() - started, 3),
+                "status": status
+            })
+
+    @property
+    def total_seconds(self) -> float:
+        return round(time.monotonic() - self._started, 3)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"stages": list(self.stages), "total_seconds": self.total_seconds}
+
+    def summary(self) -> str:
+        return ", ".join(f"{s['stage']}={s['seconds']:.2f}s" for s in self.stages)
+
+
+async def wait_with_backoff(
+    probe: Callable[[], Awaitable[bool]],
+    what: str,
+    timeout: float = 300.0,
+    initial_delay: float = 0.25,
+    max_delay: float = 5.0,
+    factor: float = 2.0
+) -> float:
+    """
+    Call probe() until it returns True, backing off exponentially
+
+    A probe may raise ReadinessError to abort immediately; any other
+    exception counts as "not ready yet" and is reported on timeout.
+    Returns the seconds waited.
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline = started + timeout
+    delay = initial_delay
+    last_error = None
+
+    while True:
+        try:
+            if await probe():
+                return loop.time() - started
+            last_error = None
+        except ReadinessError:
+            raise
+        except Exception as e:
+            last_error = f"{type(e).__name__}: {e}"
+
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            suffix = f" (last error: {last_error})" if last_error else ""
+            raise ReadinessTimeout(f"{what} not ready after {timeout} seconds{suffix}")
+        await asyncio.sleep(min(delay * random.uniform(0.8, 1.2), remaining))
+        delay = min(delay * factor, max_delay)
+
+
+def http_probe(session, url: str, ok_statuses=(200,), request_timeout: float = 5.0):
+    """Probe that succeeds when GET url answers with an accepted status"""
+    import aiohttp
+
+    async def probe() -> bool:
+        try:
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=request_timeout)) as response:
+                return response.status in ok_statuses
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+            logger.debug(f"{url} not ready: {type(e).__name__}: {e}")
+            return False
+
+    return probe
+
+
+class KubernetesReadinessWaiter:
+    """Waits for deployments using watch streams (see module docstring)"""
+
+    def __init__(
+        self,
+        apps_v1,
+        core_v1,
+        watch_factory: Optional[Callable[[], Any]] = None,
+        watch_chunk_seconds: int = 5,
+        max_restarts: int = 3
+    ):
+        if watch_factory is None:
+            from kubernetes import watch
+            watch_factory = watch.Watch
+        self.apps_v1 = apps_v1
+        self.core_v1 = core_v1
+        self.watch_factory = watch_factory
+        self.watch_chunk_seconds = watch_chunk_seconds
+        self.max_restarts = max_restarts
+
+    def _produce(self, loop, queue, stop, watches, kind, list_func, namespace, **kwargs) -> None:
+        """Thread body: forward watch events to the loop until stopped"""
+        while not stop.is_set():
+            started = time.monotonic()
+            w = self.watch_factory()
+            watches.append(w)
+            try:
+                for event in w.stream(
+                    list_func, namespace,
+                    timeout_seconds=self.watch_chunk_seconds,
+                    # Client-side bound in case the server never ends the chunk
+                    _request_timeout=self.watch_chunk_seconds + 5,
+                    **kwargs
+                ):
+                    if stop.is_set():
+                        break
+                    loop.call_soon_threadsafe(queue.put_nowait, (kind, event))
+            except Exception as e:
+                if stop.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, ("error", e))
+                stop.wait(1.0)
+                continue
+            # Server-side watch timeout: resume at once, but don't spin on
+            # streams that end immediately
+            if time.monotonic() - started < 1.0:
+                stop.wait(0.5)
+
+    def _start_producer(self, loop, queue, stop, watches, kind, list_func, namespace, **kwargs) -> threading.Thread:
+        """Run _produce in a thread of its own (daemon: never holds up shutdown)"""
+        thread = threading.Thread(
+            target=self._produce,
+            args=(loop, queue, stop, watches, kind, list_func, namespace),
+            kwargs=kwargs,
+            name=f"k8s-watch-{kind}-{namespace}",
+            daemon=True
+        )
+        thread.start()
+        return thread
+
+    async def wait_for_deployment(
+        self,
+        namespace: str,
+        name: str,
+        timeout: float = 300.0,
+        label_selector: Optional[str] = None
+    ) -> float:
+        """
+        Wait until a deployment is ready; returns the seconds waited
+
+        label_selector selects the deployment's pods for early failure
+        detection; without it only the deployment itself is watched.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+        watches: List[Any] = []
+        started = loop.time()
+        deadline = started + timeout
+
+        self._start_producer(
+            loop, queue, stop, watches, "deployment",
+            self.apps_v1.list_namespaced_deployment, namespace,
+            field_selector=f"metadata.name={name}"
+        )
+        if label_selector:
+            self._start_producer(
+                loop, queue, stop, watches, "pod",
+                self.core_v1.list_namespaced_pod, namespace,
+                label_selector=label_selector
+            )
+
+        last_state = "no events received"
+        try:
+            while True:
+                remaining = deadline - loop.time()
+                try:
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError()
+                    kind, event = await asyncio.wait_for(queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    raise ReadinessTimeout(
+                        f"{namespace}/{name} not ready after {timeout} seconds ({last_state})"
+                    )
+
+                if kind == "error":
+                    last_state = f"watch error: {event}"
+                    logger.debug(f"Watch error for {namespace}/{name}: {event}")
+                    continue
+
+                obj = event["object"]
+                if kind == "deployment":
+                    if event["type"] == "DELETED":
+                        raise ReadinessError(f"{namespace}/{name}", "DeploymentDeleted")
+                    if deployment_is_ready(obj):
+                        waited = loop.time() - started
+                        logger.info(f"{namespace}/{name} ready after {waited:.2f}s")
+                        return waited
+                    reason = deployment_failure_reason(obj)
+                    if reason:
+                        raise ReadinessError(f"{namespace}/{name}", reason)
+                    ready = (obj.status.ready_replicas or 0) if obj.status else 0
+                    last_state = f"{ready} replicas ready"
+                elif event["type"] != "DELETED":
+                    reason = pod_failure_reason(obj, self.max_restarts)
+                    if reason:
+                        raise ReadinessError(f"{namespace}/{obj.metadata.name}", reason)
+                    last_state = f"pod {obj.metadata.name} {obj.status.phase if obj.status else 'Unknown'}"
+        finally:
+            stop.set()
+            for w in list(watches):
+                w.stop()
+            # Producer threads exit once the stream yields or the current
+            # chunk ends (at most watch_chunk_seconds); don't hold the caller
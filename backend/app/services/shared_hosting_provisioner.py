@@ -5,19 +5,40 @@ Alternative to Kubernetes - uses WordPress Multisite on shared hosting
 
 import asyncio
 import logging
-import subprocess
 import json
 import os
 import requests
-from typing import Dict, Any, List, Optional
+import shlex
+import time
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Union
 from datetime import datetime
 from pathlib import Path
 import hashlib
 import secrets
 import string
 
+from app.services.command_runner import command_runner
+from app.services.tenant_placement import HostCapacity, PlacementEngine, PlacementError
+
 logger = logging.getLogger(__name__)
 
+
+@dataclass
+class SharedHost:
+    """Connection details of one multisite host in the fleet"""
+    host_id: str
+    ssh_host: str = ""
+    ssh_user: str = ""
+    ssh_key_path: str = ""
+    multisite_path: str = "/public_html/multisite/"
+    multisite_domain: str = "kenzysites.com"
+
+    @property
+    def has_ssh(self) -> bool:
+        return bool(self.ssh_host and self.ssh_user)
+
+
 class SharedHostingProvisioner:
     """
     Handles WordPress provisioning on shared hosting using Multisite Network
@@ -41,7 +62,145 @@ class SharedHostingProvisioner:
         self.ssh_key_path = os.getenv('SSH_KEY_PATH', '')
         self.has_ssh = all([self.ssh_host, self.ssh_user])
         
-        logger.info(f"SharedHostingProvisioner initialized - Type: {self.hosting_type}, SSH: {self.has_ssh}")
+        # Fleet of multisite hosts; a single host from the settings above
+        # unless SHARED_HOSTING_HOSTS lists several
+        self.placement = PlacementEngine(
+            target_utilization=float(os.getenv('SHARED_HOSTING_TARGET_UTILIZATION', '0.8')),
+            high_water=float(os.getenv('SHARED_HOSTING_HIGH_WATER', '0.9')),
+            strategy=os.getenv('SHARED_HOSTING_PLACEMENT', 'best_fit')
+        )
+        self.hosts: Dict[str, SharedHost] = {}
+        self._load_hosts()
+        self.metrics_ttl = float(os.getenv('SHARED_HOSTING_METRICS_TTL', '300'))
+        self._metrics_refreshed = 0.0
+        # Saved by default: destructive commands refuse sites of unknown placement
+        self.placement_state_path = os.getenv(
+            'SHARED_HOSTING_PLACEMENT_STATE', '/tmp/kenzysites/shared_hosting_placement.json'
+        )
+        self._restore_placement()
+        
+        logger.info(
+            f"SharedHostingProvisioner initialized - Type: {self.hosting_type}, SSH: {self.has_ssh}, "
+            f"Hosts: {len(self.hosts)}"
+        )
+    
+    def _load_hosts(self):
+        """Register fleet hosts and their capacity with the placement engine"""
+        try:
+            hosts = json.loads(os.getenv('SHARED_HOSTING_HOSTS', '') or '[]')
+        except json.JSONDecodeError as e:
+            logger.error(f"Invalid SHARED_HOSTING_HOSTS: {str(e)}")
+            hosts = []
+        if not hosts:
+            hosts = [{
+                "id": "default",
+                "ssh_host": self.ssh_host,
+                "ssh_user": self.ssh_user,
+                "ssh_key_path": self.ssh_key_path,
+                "multisite_path": self.multisite_path,
+                "multisite_domain": self.multisite_domain
+            }]
+        
+        for spec in hosts:
+            host = SharedHost(
+                host_id=spec["id"],
+                ssh_host=spec.get("ssh_host", ""),
+                ssh_user=spec.get("ssh_user", self.ssh_user),
+                ssh_key_path=spec.get("ssh_key_path", self.ssh_key_path),
+                multisite_path=spec.get("multisite_path", self.multisite_path),
+                multisite_domain=spec.get("multisite_domain", self.multisite_domain)
+            )
+            self.hosts[host.host_id] = host
+            self.placement.add_host(HostCapacity(
+                host_id=host.host_id,
+                cpu=float(spec.get("cpu", os.getenv('SHARED_HOSTING_CPU', '4'))),
+                memory_mb=float(spec.get("memory_mb", os.getenv('SHARED_HOSTING_MEMORY_MB', '8192'))),
+                disk_gb=float(spec.get("disk_gb", os.getenv('SHARED_HOSTING_DISK_GB', '100'))),
+                sites=int(spec.get("max_sites", os.getenv('SHARED_HOSTING_MAX_SITES', '200'))),
+                traffic_rpm=float(spec.get("traffic_rpm", os.getenv('SHARED_HOSTING_TRAFFIC_RPM', '6000'))),
+                region=spec.get("region"),
+                draining=bool(spec.get("draining", False))
+            ))
+    
+    def _restore_placement(self):
+        if not self.placement_state_path or not Path(self.placement_state_path).exists():
+            return
+        try:
+            self.placement.restore(json.loads(Path(self.placement_state_path).read_text()))
+        except Exception as e:
+            logger.error(f"Failed to restore tenant placement: {str(e)}")
+    
+    def _save_placement(self):
+        if not self.placement_state_path:
+            return
+        try:
+            path = Path(self.placement_state_path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix('.tmp')
+            tmp.write_text(json.dumps(self.placement.snapshot(), indent=2))
+            os.replace(tmp, path)
+        except Exception as e:
+            logger.error(f"Failed to save tenant placement: {str(e)}")
+    
+    def _host_for_site(self, site_id: int, host_id: Optional[str] = None) -> SharedHost:
+        """
+        Host serving a site; site ids are only unique within one network
+        
+        Raises ValueError when the host cannot be determined, rather than
+        sending the command to a host where the same id is another tenant.
+        """
+        if host_id:
+            if host_id not in self.hosts:
+                raise ValueError(f"Unknown host {host_id}")
+            return self.hosts[host_id]
+        tenant = self.placement.find_tenant(site_id=site_id)
+        if tenant is not None and tenant.host_id in self.hosts:
+            return self.hosts[tenant.host_id]
+        if len(self.hosts) == 1:
+            # A single host is the only place the site can be
+            return next(iter(self.hosts.values()))
+        raise ValueError(f"Placement of site {site_id} is unknown; pass host_id explicitly")
+    
+    async def refresh_host_metrics(self, force: bool = False):
+        """Measure CPU load, memory and disk usage on every SSH host"""
+        if not force and time.monotonic() - self._metrics_refreshed < self.metrics_ttl:
+            return
+        self._metrics_refreshed = time.monotonic()
+        probe = (
+            "echo $(cut -d' ' -f1 /proc/loadavg) "
+            "$(free -m | awk '/^Mem:/{print $3}') "
+            "$(df -Pm . | awk 'NR==2{print $3}')"
+        )
+        
+        async def measure(host: SharedHost):
+            if not host.has_ssh:
+                return
+            try:
+                load, memory_mb, disk_mb = (await self._execute_ssh_command(probe, host)).split()[:3]
+                self.placement.update_host_metrics(
+                    host.host_id,
+                    cpu=float(load),
+                    memory_mb=float(memory_mb),
+                    disk_gb=float(disk_mb) / 1024
+                )
+            except Exception as e:
+                logger.warning(f"Could not measure host {host.host_id}: {str(e)}")
+        
+        await asyncio.gather(*(measure(host) for host in self.hosts.values()))
+    
+    def record_site_traffic(self, client_id: str, requests_per_minute: float):
+        """Feed recent traffic of a site into placement decisions"""
+        self.placement.record_traffic(client_id, requests_per_minute)
+    
+    async def get_placement_status(self, max_moves: int = 10) -> Dict[str, Any]:
+        """Fleet utilization plus suggested rebalancing migrations"""
+        await self.refresh_host_metrics()
+        return {
+            **self.placement.get_status(),
+            "suggested_migrations": [
+                m.to_dict() for m in self.placement.suggest_migrations(max_moves)
+            ]
+        }
     
     def generate_secure_password(self, length: int = 16) -> str:
         """Generate a secure random password"""
@@ -67,16 +226,30 @@ class SharedHostingProvisioner:
         """
         Provision a WordPress site in Multisite Network
         """
+        client_subdomain = custom_domain or self.generate_client_subdomain(business_name)
+        
+        # Step 0: Choose the least-risky host with room for this plan
+        await self.refresh_host_metrics()
         try:
-            client_subdomain = custom_domain or self.generate_client_subdomain(business_name)
-            site_url = f"https://{client_subdomain}.{self.multisite_domain}"
+            host_id = self.placement.place(
+                client_subdomain,
+                plan=plan,
+                metadata={"business_name": business_name, "user_id": user_id}
+            )
+        except PlacementError as e:
+            logger.error(f"Shared hosting placement failed: {str(e)}")
+            raise
+        host = self.hosts[host_id]
+        
+        try:
+            site_url = f"https://{client_subdomain}.{host.multisite_domain}"
             
             # Generate admin credentials
             admin_user = f"admin_{client_subdomain}"
             admin_password = self.generate_secure_password()
-            admin_email = f"admin-{client_subdomain}@{self.multisite_domain}"
+            admin_email = f"admin-{client_subdomain}@{host.multisite_domain}"
             
-            logger.info(f"Provisioning WordPress site: {site_url}")
+            logger.info(f"Provisioning WordPress site: {site_url} on host {host_id}")
             
             # Step 1: Create subdomain (if not custom domain)
             if not custom_domain:
@@ -88,27 +261,31 @@ class SharedHostingProvisioner:
                 business_name,
                 admin_user,
                 admin_password,
-                admin_email
+                admin_email,
+                host
             )
+            self.placement.tenants[client_subdomain].metadata["site_id"] = site_id
+            self._save_placement()
             
             # Step 3: Configure plugins for the new site
-            await self._configure_site_plugins(site_id, industry, plan)
+            await self._configure_site_plugins(site_id, industry, plan, host)
             
             # Step 4: Apply ACF configuration if provided
             if acf_config:
-                await self._configure_site_acf(site_id, acf_config)
+                await self._configure_site_acf(site_id, acf_config, host)
             
             # Step 5: Apply template if provided
             if template_id:
                 await self._apply_template_to_site(site_id, template_id)
             
             # Step 6: Configure basic WordPress settings
-            await self._configure_site_settings(site_id, business_name, industry)
+            await self._configure_site_settings(site_id, business_name, industry, host)
             
             return {
                 "success": True,
                 "client_id": client_subdomain,
                 "site_id": site_id,
+                "host_id": host_id,
                 "site_url": site_url,
                 "admin_url": f"{site_url}/wp-admin",
                 "credentials": {
@@ -124,6 +301,8 @@ class SharedHostingProvisioner:
             logger.error(f"Shared hosting provisioning failed: {str(e)}")
             # Cleanup on failure
             await self._cleanup_failed_site(client_subdomain)
+            self.placement.release(client_subdomain)
+            self._save_placement()
             raise
     
     async def _create_subdomain(self, subdomain: str) -> bool:
@@ -216,11 +395,13 @@ class SharedHostingProvisioner:
         title: str,
         admin_user: str,
         admin_password: str,
-        admin_email: str
+        admin_email: str,
+        host: Optional[SharedHost] = None
     ) -> int:
         """Create site in WordPress Multisite Network"""
+        host = host or next(iter(self.hosts.values()))
         try:
-            site_url = f"{subdomain}.{self.multisite_domain}"
+            site_url = f"{subdomain}.{host.multisite_domain}"
             
             # WP-CLI command to create site
             command = [
@@ -234,10 +415,7 @@ class SharedHostingProvisioner:
                 '--porcelain'  # Returns only the site ID
             ]
             
-            if self.has_ssh:
-                result = await self._execute_ssh_command(' '.join(command))
-            else:
-                result = await self._execute_local_command(command)
+            result = await self._run_command(command, host)
             
             site_id = int(result.strip())
             logger.info(f"Created multisite site: {site_url} (ID: {site_id})")
@@ -248,7 +426,7 @@ class SharedHostingProvisioner:
             logger.error(f"Error creating multisite site: {str(e)}")
             raise
     
-    async def _configure_site_plugins(self, site_id: int, industry: str, plan: str):
+    async def _configure_site_plugins(self, site_id: int, industry: str, plan: str, host: Optional[SharedHost] = None):
         """Configure plugins for the new site"""
         try:
             # Essential plugins for all sites
@@ -288,10 +466,7 @@ class SharedHostingProvisioner:
                 ]
                 
                 try:
-                    if self.has_ssh:
-                        await self._execute_ssh_command(' '.join(command))
-                    else:
-                        await self._execute_local_command(command)
+                    await self._run_command(command, host)
                     
                     logger.info(f"Activated plugin {plugin} for site {site_id}")
                     
@@ -301,7 +476,7 @@ class SharedHostingProvisioner:
         except Exception as e:
             logger.error(f"Error configuring site plugins: {str(e)}")
     
-    async def _configure_site_acf(self, site_id: int, acf_config: Dict):
+    async def _configure_site_acf(self, site_id: int, acf_config: Dict, host: Optional[SharedHost] = None):
         """Configure ACF fields for the site"""
         try:
             # Import ACF field groups via WP-CLI
@@ -322,10 +497,7 @@ class SharedHostingProvisioner:
             ]
             
             for command in commands:
-                if self.has_ssh:
-                    await self._execute_ssh_command(command)
-                else:
-                    await self._execute_local_command(command.split())
+                await self._run_command(command, host)
             
             logger.info(f"Configured ACF fields for site {site_id}")
             
@@ -342,7 +514,7 @@ class SharedHostingProvisioner:
         except Exception as e:
             logger.error(f"Error applying template: {str(e)}")
     
-    async def _configure_site_settings(self, site_id: int, business_name: str, industry: str):
+    async def _configure_site_settings(self, site_id: int, business_name: str, industry: str, host: Optional[SharedHost] = None):
         """Configure basic WordPress settings for the site"""
         try:
             settings_commands = [
@@ -367,10 +539,7 @@ class SharedHostingProvisioner:
             
             for command in settings_commands:
                 try:
-                    if self.has_ssh:
-                        await self._execute_ssh_command(command)
-                    else:
-                        await self._execute_local_command(command.split())
+                    await self._run_command(command, host)
                 except Exception as e:
                     logger.warning(f"Setting command failed: {command} - {str(e)}")
             
@@ -379,51 +548,41 @@ class SharedHostingProvisioner:
         except Exception as e:
             logger.error(f"Error configuring site settings: {str(e)}")
     
-    async def _execute_ssh_command(self, command: str) -> str:
+    async def _run_command(self, command: Union[str, List[str]], host: Optional[SharedHost] = None) -> str:
+        """Run a WP-CLI/shell command on a fleet host (SSH or local)"""
+        host = host or next(iter(self.hosts.values()))
+        if host.has_ssh:
+            if not isinstance(command, str):
+                command = shlex.join(command)
+            return await self._execute_ssh_command(command, host)
+        return await self._execute_local_command(command, host)
+    
+    async def _execute_ssh_command(self, command: str, host: SharedHost) -> str:
         """Execute command via SSH"""
-        try:
-            ssh_command = [
-                'ssh',
-                '-i', self.ssh_key_path,
-                f'{self.ssh_user}@{self.ssh_host}',
-                f'cd {self.multisite_path} && {command}'
-            ]
-            
-            result = subprocess.run(
-                ssh_command,
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            
-            return result.stdout
-            
-        except subprocess.CalledProcessError as e:
-            logger.error(f"SSH command failed: {command} - {e.stderr}")
-            raise
+        ssh_command = ['ssh']
+        if host.ssh_key_path:
+            ssh_command += ['-i', host.ssh_key_path]
+        ssh_command += [
+            f'{host.ssh_user}@{host.ssh_host}',
+            f'cd {shlex.quote(host.multisite_path)} && {command}'
+        ]
+        
+        result = await command_runner.run(ssh_command, target=f"ssh:{host.host_id}")
+        if not result.ok:
+            logger.error(f"SSH command failed on {host.host_id}: {command} - {result.stderr}")
+            result.check()
+        return result.stdout
     
-    async def _execute_local_command(self, command: List[str]) -> str:
+    async def _execute_local_command(self, command: Union[str, List[str]], host: SharedHost) -> str:
         """Execute command locally (if running on same server)"""
-        try:
-            # Change to multisite directory
-            original_cwd = os.getcwd()
-            os.chdir(self.multisite_path)
-            
-            result = subprocess.run(
-                command,
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            
-            # Restore original directory
-            os.chdir(original_cwd)
-            
-            return result.stdout
-            
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Local command failed: {' '.join(command)} - {e.stderr}")
-            raise
+        if isinstance(command, str):
+            result = await command_runner.run_shell(command, cwd=host.multisite_path)
+        else:
+            result = await command_runner.run(command, cwd=host.multisite_path)
+        if not result.ok:
+            logger.error(f"Local command failed: {command if isinstance(command, str) else ' '.join(command)} - {result.stderr}")
+            result.check()
+        return result.stdout
     
     async def _cleanup_failed_site(self, subdomain: str):
         """Cleanup resources if site creation fails"""
@@ -435,15 +594,13 @@ class SharedHostingProvisioner:
         except Exception as e:
             logger.error(f"Cleanup failed: {str(e)}")
     
-    async def suspend_site(self, site_id: int):
+    async def suspend_site(self, site_id: int, host_id: Optional[str] = None):
         """Suspend a WordPress site"""
         try:
+            host = self._host_for_site(site_id, host_id)
             command = f"{self.wp_cli_path} site archive {site_id}"
             
-            if self.has_ssh:
-                await self._execute_ssh_command(command)
-            else:
-                await self._execute_local_command(command.split())
+            await self._run_command(command, host)
             
             logger.info(f"Suspended site: {site_id}")
             
@@ -459,15 +616,13 @@ class SharedHostingProvisioner:
                 "message": f"Failed to suspend site: {str(e)}"
             }
     
-    async def resume_site(self, site_id: int):
+    async def resume_site(self, site_id: int, host_id: Optional[str] = None):
         """Resume a suspended WordPress site"""
         try:
+            host = self._host_for_site(site_id, host_id)
             command = f"{self.wp_cli_path} site unarchive {site_id}"
             
-            if self.has_ssh:
-                await self._execute_ssh_command(command)
-            else:
-                await self._execute_local_command(command.split())
+            await self._run_command(command, host)
             
             logger.info(f"Resumed site: {site_id}")
             
@@ -483,18 +638,21 @@ class SharedHostingProvisioner:
                 "message": f"Failed to resume site: {str(e)}"
             }
     
-    async def delete_site(self, site_id: int):
+    async def delete_site(self, site_id: int, host_id: Optional[str] = None):
         """Delete a WordPress site"""
         try:
+            host = self._host_for_site(site_id, host_id)
             command = f"{self.wp_cli_path} site delete {site_id} --yes"
             
-            if self.has_ssh:
-                await self._execute_ssh_command(command)
-            else:
-                await self._execute_local_command(command.split())
+            await self._run_command(command, host)
             
             logger.info(f"Deleted site: {site_id}")
             
+            tenant = self.placement.find_tenant(site_id=site_id)
+            if tenant is not None and tenant.host_id == host.host_id:
+                self.placement.release(tenant.tenant_id)
+                self._save_placement()
+            
             return {
                 "success": True,
                 "message": f"Site {site_id} deleted successfully"
@@ -507,16 +665,14 @@ class SharedHostingProvisioner:
                 "message": f"Failed to delete site: {str(e)}"
             }
     
-    async def get_site_status(self, site_id: int) -> Dict[str, Any]:
+    async def get_site_status(self, site_id: int, host_id: Optional[str] = None) -> Dict[str, Any]:
         """Get status of a WordPress site"""
         try:
+            host = self._host_for_site(site_id, host_id)
             # Get site info
             command = f"{self.wp_cli_path} site list --site_id={site_id} --format=json"
             
-            if self.has_ssh:
-                result = await self._execute_ssh_command(command)
-            else:
-                result = await self._execute_local_command(command.split())
+            result = await self._run_command(command, host)
             
             site_info = json.loads(result)
             
@@ -527,6 +683,7 @@ class SharedHostingProvisioner:
                     "url": site.get('url'),
                     "status": site.get('archived', '0') == '0' and 'active' or 'suspended',
                     "last_updated": site.get('last_updated'),
+                    "host_id": host.host_id,
                     "hosting_type": "multisite_shared"
                 }
             else:
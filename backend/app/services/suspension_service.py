@@ -5,6 +5,8 @@ Handles automatic site suspension for overdue payments
 
 import logging
 import asyncio
+import os
+from pathlib import Path
 from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
 from enum import Enum
@@ -14,6 +16,7 @@ from app.services.wordpress_provisioner import wordpress_provisioner
 from app.services.asaas_integration import asaas, PaymentStatus
 from app.services.email_service import email_service
 from app.services.dns_manager import dns_manager
+from app.services.rate_limiter import RateLimit, RateLimiter
 
 logger = logging.getLogger(__name__)
 
@@ -25,12 +28,92 @@ class SuspensionStatus(Enum):
     SCHEDULED_DELETION = "scheduled_deletion"
     DELETED = "deleted"
 
+class SweepJournal:
+    """
+    Append-only checkpoint of one overdue payment sweep (JSON lines)
+    
+    The first record holds the collected sites, then one record per site
+    whose step completed, then a completion marker. Appending keeps each
+    checkpoint O(1); a torn last line from a crash is dropped on load.
+    """
+    
+    def __init__(self, path: Path):
+        self.path = path
+        self.sites: Optional[List[Dict[str, Any]]] = None
+        self.done: Dict[str, str] = {}
+        self.completed = False
+        self._handle = None
+        self._load()
+    
+    def _load(self):
+        if not self.path.exists():
+            return
+        
+        data = self.path.read_bytes()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            with self.path.open("r+b") as handle:
+                handle.truncate(end)
+        
+        for line in data[:end].splitlines():
+            entry = json.loads(line)
+            if entry['type'] == 'sites':
+                self.sites = entry['sites']
+                for site in self.sites:
+                    site['due_date'] = datetime.fromisoformat(site['due_date'])
+            elif entry['type'] == 'done':
+                self.done[entry['client_id']] = entry['status']
+            elif entry['type'] == 'completed':
+                self.completed = True
+    
+    def _append(self, entry: Dict[str, Any]):
+        if self._handle is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._handle = self.path.open("a")
+        self._handle.write(json.dumps(entry, default=str) + "\n")
+        self._handle.flush()
+    
+    def record_sites(self, sites: List[Dict[str, Any]]):
+        self.sites = sites
+        self._append({'type': 'sites', 'sites': [
+            {**site, 'due_date': site['due_date'].isoformat()} for site in sites
+        ]})
+    
+    def record_done(self, client_id: str, status: str):
+        self.done[client_id] = status
+        self._append({'type': 'done', 'client_id': client_id, 'status': status})
+    
+    def record_completed(self):
+        self.completed = True
+        self._append({'type': 'completed'})
+    
+    def pending_sites(self) -> List[Dict[str, Any]]:
+        return [site for site in self.sites or [] if site['client_id'] not in self.done]
+    
+    def results(self) -> List[Dict[str, Any]]:
+        """Collected sites with the status each one ended the sweep in"""
+        return [
+            {**site, 'new_status': self.done.get(site['client_id'])}
+            for site in self.sites or []
+        ]
+    
+    def prune_others(self):
+        """Remove journals of earlier sweeps"""
+        for path in self.path.parent.glob("overdue-*.jsonl"):
+            if path != self.path:
+                path.unlink(missing_ok=True)
+    
+    def close(self):
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
 class SuspensionService:
     """
     Manages automatic suspension and reactivation of WordPress sites
     """
     
-    def __init__(self):
+    def __init__(self, asaas_client=None, state_dir: Optional[Path] = None):
         self.grace_periods = {
             'first_warning': 3,    # Days after due date
             'suspension': 7,       # Days after due date
@@ -40,91 +123,210 @@ class SuspensionService:
         
         # In production, this would use Redis or database
         self.suspension_state = {}
+        
+        # Overdue sweep: bulk invoice paging under the Asaas rate limit,
+        # concurrent site processing and a per-day checkpoint journal
+        self.asaas = asaas_client or asaas
+        self.page_size = 100
+        self.site_concurrency = int(os.getenv('SUSPENSION_SWEEP_CONCURRENCY', '10'))
+        self.asaas_rate_limit = RateLimit(int(os.getenv('ASAAS_REQUESTS_PER_SECOND', '5')), 1.0)
+        self.rate_limiter = RateLimiter()
+        self._asaas_semaphore = asyncio.Semaphore(4)
+        self._sweep_lock = asyncio.Lock()
+        self.state_dir = Path(state_dir or os.getenv('SUSPENSION_STATE_DIR', '/tmp/kenzysites/suspension'))
     
     async def check_overdue_payments(self) -> List[Dict[str, Any]]:
         """
         Check all active subscriptions for overdue payments
         This should run daily via cron job
-        """
         
-        overdue_sites = []
+        Overdue invoices are paged from Asaas in bulk and matched to clients by
+        subscription, then sites are processed concurrently. Progress goes to
+        the day's sweep journal, so a sweep that crashed or had failures
+        resumes with the sites it had not finished, and a repeated run the
+        same day after a clean sweep is a no-op.
+        """
         
-        try:
-            # Get all active clients from database
-            # For now, using mock data
-            clients = await self._get_all_active_clients()
-            
-            for client in clients:
-                # Check payment status with Asaas
-                subscription_id = client.get('subscription_id')
-                if not subscription_id:
-                    continue
+        async with self._sweep_lock:
+            journal = SweepJournal(self.state_dir / f"overdue-{datetime.now().strftime('%Y-%m-%d')}.jsonl")
+            try:
+                if journal.completed:
+                    logger.info("Overdue payment sweep already completed today")
+                    return journal.results()
                 
-                # Get invoices from Asaas
-                invoices_result = await asaas.get_subscription_invoices(
-                    subscription_id,
-                    status=PaymentStatus.OVERDUE
-                )
+                if journal.sites is None:
+                    journal.prune_others()
+                    journal.record_sites(await self._collect_overdue_sites())
+                elif journal.done:
+                    logger.info(f"Resuming overdue payment sweep, {len(journal.done)} sites already processed")
                 
-                if invoices_result.get('success') and invoices_result.get('invoices'):
-                    for invoice in invoices_result['invoices']:
-                        due_date = datetime.fromisoformat(invoice['dueDate'])
-                        days_overdue = (datetime.now() - due_date).days
-                        
-                        overdue_sites.append({
-                            'client_id': client['id'],
-                            'client_name': client['name'],
-                            'domain': client['domain'],
-                            'invoice_id': invoice['id'],
-                            'amount': invoice['value'],
-                            'due_date': due_date,
-                            'days_overdue': days_overdue,
-                            'current_status': client.get('status', SuspensionStatus.ACTIVE.value)
-                        })
+                semaphore = asyncio.Semaphore(self.site_concurrency)
+                
+                async def process(site: Dict[str, Any]):
+                    async with semaphore:
+                        status = await self._process_overdue_site(site)
+                    # Failed sites are left out of the journal and retried on resume
+                    if status is not None:
+                        journal.record_done(site['client_id'], status.value)
+                
+                await asyncio.gather(*(
+                    process(site) for site in journal.pending_sites()
+                ))
+                failed = journal.pending_sites()
+                if failed:
+                    # Not completed: the next run today retries just these sites
+                    logger.warning(
+                        f"Overdue payment sweep left {len(failed)} sites unprocessed: "
+                        f"{', '.join(site['client_id'] for site in failed)}"
+                    )
+                else:
+                    journal.record_completed()
+                
+                overdue_sites = journal.results()
+                logger.info(f"Processed {len(overdue_sites)} overdue sites")
+                return overdue_sites
             
-            # Process each overdue site
-            for site in overdue_sites:
-                await self._process_overdue_site(site)
+            except Exception as e:
+                logger.error(f"Error checking overdue payments: {str(e)}")
+                return []
+            finally:
+                journal.close()
+    
+    async def _collect_overdue_sites(self) -> List[Dict[str, Any]]:
+        """
+        One entry per client with an overdue invoice, for its oldest invoice
+        """
+        
+        clients = await self._get_all_active_clients()
+        by_subscription = {
+            client['subscription_id']: client
+            for client in clients
+            if client.get('subscription_id')
+        }
+        if not by_subscription:
+            return []
+        
+        now = datetime.now()
+        sites: Dict[str, Dict[str, Any]] = {}
+        for invoice in await self._fetch_overdue_invoices():
+            client = by_subscription.get(invoice.get('subscription'))
+            if client is None:
+                continue
             
-            logger.info(f"Processed {len(overdue_sites)} overdue sites")
-            return overdue_sites
+            due_date = datetime.fromisoformat(invoice['dueDate'])
+            days_overdue = (now - due_date).days
+            site = sites.get(client['id'])
+            if site is not None:
+                site['overdue_invoices'] += 1
+                if days_overdue <= site['days_overdue']:
+                    continue
             
-        except Exception as e:
-            logger.error(f"Error checking overdue payments: {str(e)}")
-            return []
+            sites[client['id']] = {
+                'client_id': client['id'],
+                'client_name': client['name'],
+                'domain': client['domain'],
+                'email': client.get('email'),
+                'whatsapp': client.get('whatsapp'),
+                'invoice_id': invoice['id'],
+                'amount': invoice['value'],
+                'due_date': due_date,
+                'days_overdue': days_overdue,
+                'overdue_invoices': site['overdue_invoices'] if site else 1,
+                'current_status': client.get('status', SuspensionStatus.ACTIVE.value)
+            }
+        
+        return list(sites.values())
+    
+    async def _fetch_overdue_invoices(self) -> List[Dict[str, Any]]:
+        """
+        Every overdue invoice, paging through Asaas
+        
+        The first page gives the total; the remaining pages are fetched
+        concurrently under the Asaas rate limit. Invoices paid during the walk
+        shift later pages, so results are deduplicated by id and anything
+        skipped is picked up by the next sweep.
+        """
+        
+        first = await self._list_overdue_page(0)
+        invoices = {invoice['id']: invoice for invoice in first['payments']}
+        total = first.get('total', 0)
+        has_more = first.get('has_more', False)
+        next_offset = self.page_size
+        
+        while has_more:
+            offsets = list(range(next_offset, max(total, next_offset + 1), self.page_size))
+            pages = await asyncio.gather(*(self._list_overdue_page(offset) for offset in offsets))
+            for page in pages:
+                for invoice in page['payments']:
+                    invoices[invoice['id']] = invoice
+            has_more = pages[-1].get('has_more', False)
+            total = max(total, pages[-1].get('total', 0))
+            next_offset = offsets[-1] + self.page_size
+        
+        return list(invoices.values())
+    
+    async def _list_overdue_page(self, offset: int) -> Dict[str, Any]:
+        async with self._asaas_semaphore:
+            while True:
+                slot = await self.rate_limiter.hit([('asaas:api', self.asaas_rate_limit)])
+                if slot.allowed:
+                    break
+                await asyncio.sleep(slot.retry_after)
+            page = await self.asaas.list_payments(
+                status=PaymentStatus.OVERDUE,
+                offset=offset,
+                limit=self.page_size
+            )
+        
+        if not page.get('success'):
+            raise RuntimeError(f"Failed to list overdue payments at offset {offset}: {page.get('error')}")
+        return page
     
-    async def _process_overdue_site(self, site: Dict[str, Any]):
+    async def _process_overdue_site(self, site: Dict[str, Any]) -> Optional[SuspensionStatus]:
         """
         Process an overdue site based on days overdue
+        
+        Advances at most one step per sweep. Returns the resulting status
+        (unchanged if no step is due), or None if the step failed.
         """
         
         client_id = site['client_id']
         days_overdue = site['days_overdue']
         current_status = SuspensionStatus(site['current_status'])
+        new_status = None
         
         try:
             # Day 3: Send first warning
             if days_overdue >= self.grace_periods['first_warning'] and current_status == SuspensionStatus.ACTIVE:
                 await self._send_first_warning(site)
-                await self._update_site_status(client_id, SuspensionStatus.WARNING_SENT)
+                new_status = SuspensionStatus.WARNING_SENT
             
             # Day 7: Suspend site
             elif days_overdue >= self.grace_periods['suspension'] and current_status == SuspensionStatus.WARNING_SENT:
-                await self._suspend_site(site)
-                await self._update_site_status(client_id, SuspensionStatus.SUSPENDED)
+                if not await self._suspend_site(site):
+                    return None
+                new_status = SuspensionStatus.SUSPENDED
             
             # Day 15: Send final warning
             elif days_overdue >= self.grace_periods['final_warning'] and current_status == SuspensionStatus.SUSPENDED:
                 await self._send_final_warning(site)
-                await self._update_site_status(client_id, SuspensionStatus.FINAL_WARNING)
+                new_status = SuspensionStatus.FINAL_WARNING
             
             # Day 30: Schedule deletion
             elif days_overdue >= self.grace_periods['deletion'] and current_status == SuspensionStatus.FINAL_WARNING:
-                await self._schedule_deletion(site)
-                await self._update_site_status(client_id, SuspensionStatus.SCHEDULED_DELETION)
+                if not await self._schedule_deletion(site):
+                    return None
+                new_status = SuspensionStatus.SCHEDULED_DELETION
+            
+            if new_status is None:
+                return current_status
             
+            await self._update_site_status(client_id, new_status)
+            return new_status
+        
         except Exception as e:
             logger.error(f"Error processing overdue site {client_id}: {str(e)}")
+            return None
     
     async def _send_first_warning(self, site: Dict[str, Any]):
         """
@@ -149,7 +351,7 @@ class SuspensionService:
         await email_service.send_email(email_data)
         logger.info(f"First warning sent to {site['client_id']}")
     
-    async def _suspend_site(self, site: Dict[str, Any]):
+    async def _suspend_site(self, site: Dict[str, Any]) -> bool:
         """
         Suspend WordPress site (Day 7)
         """
@@ -181,9 +383,12 @@ class SuspensionService:
                 
                 await email_service.send_email(email_data)
                 logger.info(f"Site suspended: {client_id}")
+                return True
             
         except Exception as e:
             logger.error(f"Failed to suspend site {client_id}: {str(e)}")
+        
+        return False
     
     async def _create_suspension_page(self, site: Dict[str, Any]):
         """
@@ -301,13 +506,17 @@ class SuspensionService:
         
         logger.info(f"Final warning sent to {site['client_id']}")
     
-    async def _schedule_deletion(self, site: Dict[str, Any]):
+    async def _schedule_deletion(self, site: Dict[str, Any]) -> bool:
         """
         Schedule site for deletion (Day 30)
         """
         
         client_id = site['client_id']
         
+        # Already scheduled by an earlier (possibly interrupted) run
+        if self.suspension_state.get(client_id, {}).get('status') == SuspensionStatus.SCHEDULED_DELETION.value:
+            return True
+        
         try:
             # Create backup before deletion
             from app.services.backup_service import backup_service
@@ -349,9 +558,12 @@ class SuspensionService:
                 
                 await email_service.send_email(email_data)
                 logger.info(f"Deletion scheduled for {client_id}")
+                return True
             
         except Exception as e:
             logger.error(f"Failed to schedule deletion for {client_id}: {str(e)}")
+        
+        return False
     
     async def reactivate_site(self, client_id: str, payment_id: str) -> Dict[str, Any]:
         """
@@ -360,7 +572,7 @@ class SuspensionService:
         
         try:
             # Verify payment with Asaas
-            payment_status = await asaas.get_payment_status(payment_id)
+            payment_status = await self.asaas.get_payment_status(payment_id)
             
             if payment_status.get('status') not in [PaymentStatus.CONFIRMED.value, PaymentStatus.RECEIVED.value]:
                 return {
@@ -439,7 +651,7 @@ class SuspensionService:
                             
                             # Cancel subscription in Asaas
                             if site_info.get('subscription_id'):
-                                await asaas.cancel_subscription(
+                                await self.asaas.cancel_subscription(
                                     site_info['subscription_id'],
                                     reason='Non-payment - 30 days overdue'
                                 )
@@ -0,0 +1,447 @@
+"""
+Coalescing Sync Queue
+Asyncio work queue with coalescing, retries with backoff, a dead-letter
+list and an optional append-only journal for crash recovery
+
+Queued items must provide:
+    coalesce_key  - hashable key; pending items with the same key merge
+    merge(newer)  - returns the item that replaces both
+    to_dict()     - JSON-serializable form (journal only)
+    retry_count / error_message attributes
+
+Producers call put(), which never blocks and wakes a worker immediately.
+An item becomes due `coalesce_window` seconds after the first put for its
+key, so a burst of webhooks for one post results in a single sync.
+
+Journal records are buffered and written by one flush task in a worker
+thread, one fsync per batch (group commit), so a burst of puts never blocks
+the event loop on disk I/O. Records queued within a flush are lost if the
+process crashes before it completes; producers that must not lose items
+(e.g. before advancing a sync cursor) await flush(). Dead letters are
+journaled too and survive restarts.
+"""
+
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import os
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Pending:
+    item: Any
+    due: float
+    seq: int
+    first_queued: float = field(default_factory=time.monotonic)
+
+
+class SyncJournal:
+    """Append-only JSON-lines journal of queued and finished items"""
+
+    def __init__(self, path: str, compact_every: int = 1000):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.compact_every = compact_every
+        self._writes = 0
+        self._file = None
+
+    def _handle(self):
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        return self._file
+
+    def _write(self, *records: Dict[str, Any]) -> None:
+        """Append records with a single fsync"""
+        handle = self._handle()
+        handle.write("".join(json.dumps(record, default=str) + "\n" for record in records))
+        handle.flush()
+        os.fsync(handle.fileno())
+        self._writes += len(records)
+
+    def record_put(self, key: Any, item: Dict[str, Any]) -> None:
+        self._write({"op": "put", "key": repr(key), "item": item})
+
+    def record_done(self, key: Any) -> None:
+        self._write({"op": "done", "key": repr(key)})
+
+    def record_many(self, puts: List[tuple] = (), done: List[Any] = ()) -> None:
+        """Several (key, item) puts and finished keys in one write"""
+        records = [{"op": "put", "key": repr(key), "item": item} for key, item in puts]
+        records.extend({"op": "done", "key": repr(key)} for key in done)
+        if records:
+            self._write(*records)
+
+    def write_records(self, records: List[Dict[str, Any]]) -> None:
+        """Append prebuilt records (see CoalescingQueue) with one fsync"""
+        if records:
+            self._write(*records)
+
+    def replay(self) -> List[Dict[str, Any]]:
+        """Items that were queued but never finished, in queue order"""
+        return self.replay_all()[0]
+
+    def replay_all(self):
+        """(pending items in queue order, dead letters oldest first)"""
+        if not self.path.exists():
+            return [], []
+        pending: Dict[str, Dict[str, Any]] = {}
+        dead: List[Dict[str, Any]] = []
+        with open(self.path, encoding="utf-8") as handle:
+            for line in handle:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn final line after a crash
+                    continue
+                op = record["op"]
+                if op == "put":
+                    pending.pop(record["key"], None)
+                    pending[record["key"]] = record["item"]
+                elif op == "dead":
+                    dead.append(record["record"])
+                elif op == "dead_cleared":
+                    dead.clear()
+                else:
+                    pending.pop(record["key"], None)
+        return list(pending.values()), dead
+
+    def read_from(self, offset: int = 0):
+        """(complete records written at or after byte offset, offset after the last one)"""
+        if not self.path.exists():
+            return [], 0
+        records = []
+        with open(self.path, "rb") as handle:
+            handle.seek(offset)
+            for line in handle:
+                if not line.endswith(b"\n"):
+                    break  # Torn or still being written
+                offset += len(line)
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        return records, offset
+
+    def should_compact(self, live: int = 0) -> bool:
+        """Compact after compact_every writes, and once writes outnumber live items twice over"""
+        return self._writes >= max(self.compact_every, 2 * live)
+
+    def compact(self, items: Dict[Any, Dict[str, Any]], dead_letters: List[Dict[str, Any]] = ()) -> None:
+        """Rewrite the journal with only the still-pending items and dead letters"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as handle:
+            for key, item in items.items():
+                handle.write(json.dumps({"op": "put", "key": repr(key), "item": item}, default=str) + "\n")
+            for record in dead_letters:
+                handle.write(json.dumps({"op": "dead", "record": record}, default=str) + "\n")
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(tmp, self.path)
+        self._writes = 0
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class CoalescingQueue:
+    """Coalescing asyncio work queue (see module docstring)"""
+
+    def __init__(
+        self,
+        handler: Callable[[Any], Awaitable[None]],
+        coalesce_window: float = 0.5,
+        max_retries: int = 3,
+        backoff_base: float = 1.0,
+        backoff_max: float = 300.0,
+        workers: int = 4,
+        journal_path: Optional[str] = None,
+        item_factory: Optional[Callable[[Dict[str, Any]], Any]] = None,
+        dead_letter_size: int = 1000
+    ):
+        self.handler = handler
+        self.coalesce_window = coalesce_window
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.worker_count = workers
+        self.item_factory = item_factory
+        self.journal = SyncJournal(journal_path) if journal_path else None
+
+        self._pending: Dict[Any, _Pending] = {}
+        self._heap: List[tuple] = []
+        # key -> item being synced (None once its sync has finished)
+        self._in_flight: Dict[Any, Any] = {}
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._workers: List[asyncio.Task] = []
+        self._journal_buffer: List[Dict[str, Any]] = []
+        self._flusher: Optional[asyncio.Task] = None
+        self.dead_letters: Deque[Dict[str, Any]] = deque(maxlen=dead_letter_size)
+        self.stats = {
+            "queued": 0, "coalesced": 0, "processed": 0, "retried": 0, "dead_lettered": 0,
+            "journal_errors": 0
+        }
+
+        if self.journal:
+            self._restore()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def _restore(self) -> None:
+        if self.item_factory is None:
+            raise ValueError("item_factory is required to replay a journal")
+        pending, dead = self.journal.replay_all()
+        for data in pending:
+            self._schedule(self.item_factory(data), delay=0.0, journal=False)
+        self.dead_letters.extend(dead)
+        if pending or dead:
+            logger.info(f"Restored {len(pending)} sync events and {len(dead)} dead letters from journal")
+        # Start from a compact journal that matches memory
+        self.journal.compact(self._journal_state(), list(self.dead_letters))
+
+    def _durable_item(self, key: Any) -> Any:
+        """What a replay must restore for key: the item in flight merged with anything pending"""
+        running = self._in_flight.get(key)
+        entry = self._pending.get(key)
+        if running is None:
+            return entry.item if entry else None
+        return running.merge(entry.item) if entry else running
+
+    def _journal_state(self) -> Dict[Any, Dict[str, Any]]:
+        keys = [k for k, running in self._in_flight.items() if running is not None]
+        keys.extend(k for k in self._pending if self._in_flight.get(k) is None)
+        return {k: self._durable_item(k).to_dict() for k in keys}
+
+    def _journal(self, record: Dict[str, Any]) -> None:
+        """Buffer a journal record for the flush task"""
+        self._journal_buffer.append(record)
+        if self._flusher is None or self._flusher.done():
+            try:
+                self._flusher = asyncio.get_running_loop().create_task(self._flush_journal())
+            except RuntimeError:
+                # No running loop (e.g. during startup): write inline
+                self._flusher = None
+                self._write_journal_now()
+
+    def _take_journal_batch(self):
+        """(records, compacted state or None), taken together on the loop"""
+        records, self._journal_buffer = self._journal_buffer, []
+        compacted = None
+        if self.journal.should_compact(len(self._pending) + len(self.dead_letters)):
+            # The snapshot already reflects every buffered record
+            compacted = (self._journal_state(), list(self.dead_letters))
+        return records, compacted
+
+    def _apply_journal_batch(self, records, compacted) -> None:
+        if compacted is not None:
+            self.journal.compact(*compacted)
+        else:
+            self.journal.write_records(records)
+
+    def _write_journal_now(self) -> None:
+        if self._journal_buffer:
+            self._apply_journal_batch(*self._take_journal_batch())
+
+    async def _flush_journal(self) -> None:
+        while self._journal_buffer:
+            records, compacted = self._take_journal_batch()
+            try:
+                await asyncio.to_thread(self._apply_journal_batch, records, compacted)
+            except Exception as e:
+                self.stats["journal_errors"] += 1
+                logger.error(f"Sync journal write failed: {e}")
+
+    async def flush(self) -> None:
+        """Wait until every buffered journal record is written; raises if a write failed"""
+        if self.journal is None:
+            return
+        errors = self.stats["journal_errors"]
+        while self._journal_buffer or (self._flusher is not None and not self._flusher.done()):
+            if self._flusher is None or self._flusher.done():
+                self._flusher = asyncio.get_running_loop().create_task(self._flush_journal())
+            await asyncio.shield(self._flusher)
+        if self.stats["journal_errors"] != errors:
+            raise RuntimeError("Sync journal write failed")
+
+    def put(self, item: Any) -> bool:
+        """Queue an item; returns True if it merged into a pending one"""
+        self.stats["queued"] += 1
+        return self._schedule(item, delay=self.coalesce_window)
+
+    def _schedule(self, item: Any, delay: float, journal: bool = True) -> bool:
+        key = item.coalesce_key
+        existing = self._pending.get(key)
+        coalesced = existing is not None
+
+        if coalesced:
+            existing.item = existing.item.merge(item)
+            self.stats["coalesced"] += 1
+            entry = existing
+        else:
+            entry = _Pending(item=item, due=time.monotonic() + delay, seq=next(self._seq))
+            self._pending[key] = entry
+            heapq.heappush(self._heap, (entry.due, entry.seq, key))
+
+        if journal and self.journal:
+            self._journal({"op": "put", "key": repr(key), "item": self._durable_item(key).to_dict()})
+        self._wakeup.set()
+        return coalesced
+
+    def start(self) -> None:
+        if not self._workers:
+            self._workers = [
+                asyncio.create_task(self._worker(i)) for i in range(self.worker_count)
+            ]
+
+    async def stop(self) -> None:
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self.journal:
+            if self._flusher is not None:
+                await asyncio.gather(self._flusher, return_exceptions=True)
+                self._flusher = None
+            self._write_journal_now()
+            self.journal.close()
+
+    def _claim(self):
+        """Pop the next due key; returns (key, None) or (None, seconds to wait)"""
+        while self._heap:
+            due, seq, key = self._heap[0]
+            entry = self._pending.get(key)
+            if entry is None or entry.seq != seq or key in self._in_flight:
+                # Stale entry, or the key is re-pushed when its sync finishes
+                heapq.heappop(self._heap)
+                continue
+            wait = due - time.monotonic()
+            if wait > 0:
+                return None, wait
+            heapq.heappop(self._heap)
+            return key, None
+        return None, None
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            key, wait = self._claim()
+            if key is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            entry = self._pending.pop(key)
+            self._in_flight[key] = entry.item
+            try:
+                await self._run(key, entry.item)
+            finally:
+                self._in_flight.pop(key, None)
+                follow_up = self._pending.get(key)
+                if follow_up is not None:
+                    # Events arrived while syncing; push them back on the heap
+                    heapq.heappush(self._heap, (follow_up.due, follow_up.seq, key))
+                    self._wakeup.set()
+
+    async def _run(self, key: Any, item: Any) -> None:
+        try:
+            await self.handler(item)
+        except asyncio.CancelledError:
+            self._in_flight[key] = None
+            # Shutting down mid-sync: keep the item for the next start. The
+            # in-flight item is older than anything pending for its key.
+            pending = self._pending.get(key)
+            if pending is not None:
+                pending.item = item.merge(pending.item)
+                if self.journal:
+                    self._journal({"op": "put", "key": repr(key), "item": pending.item.to_dict()})
+            else:
+                self._schedule(item, delay=0.0, journal=False)
+            raise
+        except Exception as e:
+            self._in_flight[key] = None
+            item.retry_count += 1
+            item.error_message = str(e)
+            if item.retry_count < self.max_retries:
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (item.retry_count - 1))
+                delay *= random.uniform(0.8, 1.2)
+                logger.warning(
+                    f"Sync of {key} failed, retrying in {delay:.1f}s "
+                    f"({item.retry_count}/{self.max_retries}): {e}"
+                )
+                self.stats["retried"] += 1
+                newer = self._pending.get(key)
+                if newer is not None:
+                    # A fresh event for this key is already waiting; fold into it
+                    newer.item = item.merge(newer.item)
+                    if self.journal:
+                        self._journal({"op": "put", "key": repr(key), "item": newer.item.to_dict()})
+                else:
+                    self._schedule(item, delay=delay)
+                return
+            logger.error(f"Sync of {key} failed after {self.max_retries} attempts: {e}")
+            self.stats["dead_lettered"] += 1
+            record = {
+                "key": repr(key),
+                "item": item.to_dict(),
+                "error": str(e),
+                "failed_at": time.time()
+            }
+            self.dead_letters.append(record)
+            if self.journal:
+                self._journal({"op": "dead", "record": record})
+        else:
+            self._in_flight[key] = None
+            self.stats["processed"] += 1
+
+        if self.journal:
+            if key in self._pending:
+                # A newer event for this key is still pending; keep it journaled
+                self._journal({"op": "put", "key": repr(key), "item": self._pending[key].item.to_dict()})
+            else:
+                self._journal({"op": "done", "key": repr(key)})
+
+    def retry_dead_letters(self) -> int:
+        """Move every dead-lettered item back onto the queue"""
+        if self.item_factory is None:
+            raise ValueError("item_factory is required to retry dead letters")
+        count = 0
+        if self.journal and self.dead_letters:
+            self._journal({"op": "dead_cleared"})
+        while self.dead_letters:
+            record = self.dead_letters.popleft()
+            item = self.item_factory(record["item"])
+            item.retry_count = 0
+            self._schedule(item, delay=0.0)
+            count += 1
+        return count
+
+    async def join(self, timeout: Optional[float] = None) -> None:
+        """Wait until nothing is pending or in flight"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._pending or self._in_flight:
+            if deadline is not None and time.monotonic() > deadline:
+                raise asyncio.TimeoutError()
+            await asyncio.sleep(0.01)
+
+    def snapshot(self, limit: int = 10) -> List[Any]:
+        """Pending items ordered by due time"""
+        entries = sorted(self._pending.values(), key=lambda p: (p.due, p.seq))
+        return [p.item for p in entries[:limit]]
@@ -17,6 +17,7 @@ from app.models.template_models import (
     TemplateDefinition, ACFFieldGroup, ACFField, BRAZILIAN_INDUSTRIES
 )
 from app.services.acf_integration import acf_service
+from app.services.wp_rest_pager import WordPressRESTPager
 
 logger = logging.getLogger(__name__)
 
@@ -33,6 +34,7 @@ class TemplateRepository:
         self.cache_ttl = timedelta(hours=2)  # Cache for 2 hours
         self.local_repository_path = Path("/app/templates_repository")
         self.local_repository_path.mkdir(exist_ok=True)
+        self.page_concurrency = int(os.getenv('WP_SYNC_PAGE_CONCURRENCY', '4'))
         
     async def initialize_repository(self) -> None:
         """Initialize the template repository"""
@@ -113,34 +115,28 @@ class TemplateRepository:
                 token = auth_data.get('token')
                 
                 headers = {"Authorization": f"Bearer {token}"}
-                
-                # Fetch templates (custom post type)
-                templates_response = await client.get(
-                    f"{self.wordpress_master_url}/wp-json/wp/v2/kz_template",
-                    headers=headers,
-                    params={"per_page": 100, "status": "publish"}
+                pager = WordPressRESTPager(
+                    client,
+                    self.wordpress_master_url,
+                    headers,
+                    concurrency=self.page_concurrency
                 )
                 
-                if templates_response.status_code != 200:
-                    raise Exception("Failed to fetch templates from WordPress Master")
-                
-                templates = templates_response.json()
+                # Fetch every page of templates (custom post type) concurrently
+                walk = await pager.fetch_all("wp/v2/kz_template", {"status": "publish"})
+                templates = walk.items
                 
-                # Fetch ACF data for each template
-                for template in templates:
-                    template_id = template['id']
-                    
-                    # Get ACF fields
-                    acf_response = await client.get(
-                        f"{self.wordpress_master_url}/wp-json/acf/v3/posts/{template_id}",
-                        headers=headers
-                    )
-                    
-                    if acf_response.status_code == 200:
-                        template['acf_data'] = acf_response.json()
-                    else:
-                        template['acf_data'] = {}
+                # Fetch ACF data for all templates under the same concurrency limit
+                acf_data = await pager.fetch_each(
+                    [f"acf/v3/posts/{template['id']}" for template in templates]
+                )
+                for template, acf in zip(templates, acf_data):
+                    template['acf_data'] = acf or {}
                 
+                logger.info(
+                    f"Fetched {len(templates)} templates in {walk.pages} pages "
+                    f"({walk.duration:.2f}s)"
+                )
                 return templates
                 
         except Exception as e:
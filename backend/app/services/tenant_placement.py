@@ -0,0 +1,462 @@
+"""
+Tenant Placement Engine
+Capacity-aware placement of shared-hosting tenants across a fleet of hosts
+
+Each host has a capacity vector (CPU cores, memory, disk, site slots and
+requests per minute it can serve). Its load on every dimension is the larger
+of what its tenants reserved (per-plan demand estimates) and what was last
+measured on the host, and its traffic is the sum of its tenants' recent
+request rates (exponentially weighted, so one spike does not move a tenant).
+
+New tenants are placed with a best-fit heuristic on the dominant resource:
+among the hosts that stay below `target_utilization` on every dimension
+after the placement, the one left fullest wins. This packs hosts densely
+without pushing any of them into overload; `spread` placement (emptiest host
+first) is available for fleets that prefer headroom over density. Batches
+are placed first-fit-decreasing, largest tenants first.
+
+Rebalancing simulates moves on a copy of the fleet: while a host is above
+`high_water`, the smallest tenant whose departure brings it back under the
+target (or the biggest one, if no single move suffices) is moved to the
+best-fitting host that can take it. A simulated move also takes the tenant's
+usage off the source's measured load (and adds it to the destination's), so
+a host stops shedding tenants once it is back under `high_water`. The engine
+only suggests migrations; performing them is left to the caller.
+
+The engine does no I/O. Hosts, metrics and traffic are fed in by the
+caller, which makes it straightforward to drive with a simulated fleet.
+"""
+
+import copy
+import logging
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+RESOURCES = ("cpu", "memory_mb", "disk_gb", "sites", "traffic_rpm")
+
+
+@dataclass
+class TenantDemand:
+    """Resources one tenant is expected to need"""
+    cpu: float = 0.1
+    memory_mb: float = 128
+    disk_gb: float = 1
+    traffic_rpm: float = 20
+    sites: int = 1
+
+    def get(self, resource: str) -> float:
+        return float(getattr(self, resource))
+
+
+# Reservation per plan; observed traffic replaces the estimate once known
+PLAN_DEMANDS = {
+    "basic": TenantDemand(cpu=0.1, memory_mb=128, disk_gb=1, traffic_rpm=20),
+    "professional": TenantDemand(cpu=0.25, memory_mb=256, disk_gb=5, traffic_rpm=60),
+    "business": TenantDemand(cpu=0.5, memory_mb=512, disk_gb=10, traffic_rpm=150),
+    "agency": TenantDemand(cpu=1.0, memory_mb=1024, disk_gb=25, traffic_rpm=400)
+}
+
+
+@dataclass
+class HostCapacity:
+    """What one host can serve"""
+    host_id: str
+    cpu: float
+    memory_mb: float
+    disk_gb: float
+    sites: int = 200
+    traffic_rpm: float = 6000
+    region: Optional[str] = None
+    draining: bool = False
+
+    def get(self, resource: str) -> float:
+        return float(getattr(self, resource))
+
+
+@dataclass
+class Tenant:
+    """A placed tenant"""
+    tenant_id: str
+    host_id: str
+    demand: TenantDemand
+    plan: str = "basic"
+    traffic_rpm: Optional[float] = None  # observed (EWMA); None until reported
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+    def usage(self, resource: str) -> float:
+        if resource == "traffic_rpm" and self.traffic_rpm is not None:
+            return self.traffic_rpm
+        return self.demand.get(resource)
+
+
+@dataclass
+class Migration:
+    """A suggested tenant move"""
+    tenant_id: str
+    source: str
+    destination: str
+    resource: str
+    source_utilization: float
+    source_utilization_after: float
+    destination_utilization_after: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        for key in ("source_utilization", "source_utilization_after", "destination_utilization_after"):
+            data[key] = round(data[key], 3)
+        return data
+
+
+class PlacementError(Exception):
+    """No host can take the tenant"""
+
+
+class HostState:
+    """Capacity, tenants and last measured usage of one host"""
+
+    def __init__(self, capacity: HostCapacity):
+        self.capacity = capacity
+        self.tenants: Dict[str, Tenant] = {}
+        self.measured: Dict[str, float] = {}
+        self.measured_at: Optional[float] = None
+
+    def used(self, resource: str) -> float:
+        reserved = sum(t.usage(resource) for t in self.tenants.values())
+        if resource in ("sites", "traffic_rpm"):
+            return reserved
+        # Measurements catch load the reservations did not predict
+        return max(reserved, self.measured.get(resource, 0.0))
+
+    def utilization(self, resource: str, extra: float = 0.0) -> float:
+        capacity = self.capacity.get(resource)
+        if capacity <= 0:
+            return float("inf")
+        return (self.used(resource) + extra) / capacity
+
+    def dominant(self, extra: Optional[Tenant] = None, sign: int = 1) -> Tuple[str, float]:
+        """Most utilized resource, optionally with a tenant added (sign=1) or removed (-1)"""
+        worst = ("cpu", 0.0)
+        for resource in RESOURCES:
+            delta = sign * extra.usage(resource) if extra is not None else 0.0
+            value = self.utilization(resource, delta)
+            if value > worst[1]:
+                worst = (resource, value)
+        return worst
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "capacity": asdict(self.capacity),
+            "tenants": len(self.tenants),
+            "utilization": {r: round(self.utilization(r), 3) for r in RESOURCES},
+            "dominant": self.dominant()[0],
+            "measured_at": self.measured_at
+        }
+
+
+class PlacementEngine:
+    """Bin-packing placement and rebalancing (see module docstring)"""
+
+    def __init__(
+        self,
+        target_utilization: float = 0.8,
+        high_water: float = 0.9,
+        strategy: str = "best_fit",
+        traffic_smoothing: float = 0.3,
+        plan_demands: Optional[Dict[str, TenantDemand]] = None
+    ):
+        if strategy not in ("best_fit", "spread"):
+            raise ValueError(f"Unknown placement strategy: {strategy}")
+        self.target_utilization = target_utilization
+        self.high_water = high_water
+        self.strategy = strategy
+        self.traffic_smoothing = traffic_smoothing
+        self.plan_demands = plan_demands or PLAN_DEMANDS
+        self.hosts: Dict[str, HostState] = {}
+        self.tenants: Dict[str, Tenant] = {}
+
+    # Fleet -----------------------------------------------------------------
+
+    def add_host(self, capacity: HostCapacity) -> None:
+        existing = self.hosts.get(capacity.host_id)
+        if existing is not None:
+            existing.capacity = capacity
+            return
+        self.hosts[capacity.host_id] = HostState(capacity)
+
+    def remove_host(self, host_id: str) -> None:
+        host = self.hosts.get(host_id)
+        if host is None:
+            return
+        if host.tenants:
+            raise ValueError(f"Host {host_id} still has {len(host.tenants)} tenants")
+        del self.hosts[host_id]
+
+    def set_draining(self, host_id: str, draining: bool = True) -> None:
+        """Draining hosts take no new tenants and are emptied by rebalancing"""
+        self.hosts[host_id].capacity.draining = draining
+
+    def update_host_metrics(self, host_id: str, **usage: float) -> None:
+        """Record measured usage (cpu, memory_mb, disk_gb) for a host"""
+        host = self.hosts[host_id]
+        for resource, value in usage.items():
+            if resource not in ("cpu", "memory_mb", "disk_gb"):
+                raise ValueError(f"Cannot measure resource: {resource}")
+            host.measured[resource] = float(value)
+        host.measured_at = time.time()
+
+    def record_traffic(self, tenant_id: str, requests_per_minute: float) -> None:
+        """Fold a traffic sample into the tenant's moving average"""
+        tenant = self.tenants.get(tenant_id)
+        if tenant is None:
+            return
+        if tenant.traffic_rpm is None:
+            tenant.traffic_rpm = float(requests_per_minute)
+        else:
+            alpha = self.traffic_smoothing
+            tenant.traffic_rpm = alpha * requests_per_minute + (1 - alpha) * tenant.traffic_rpm
+
+    # Placement -------------------------------------------------------------
+
+    def demand_for(self, plan: str) -> TenantDemand:
+        return copy.copy(self.plan_demands.get(plan.lower(), self.plan_demands["basic"]))
+
+    def _fits(self, host: HostState, tenant: Tenant, limit: float) -> bool:
+        return all(
+            host.utilization(resource, tenant.usage(resource)) <= limit
+            for resource in RESOURCES
+        )
+
+    def _choose_host(
+        self,
+        tenant: Tenant,
+        region: Optional[str] = None,
+        exclude: Iterable[str] = (),
+        hosts: Optional[Dict[str, HostState]] = None
+    ) -> Optional[HostState]:
+        hosts = self.hosts if hosts is None else hosts
+        excluded = set(exclude)
+        best, best_score = None, None
+        for host in hosts.values():
+            capacity = host.capacity
+            if capacity.draining or capacity.host_id in excluded:
+                continue
+            if region and capacity.region and capacity.region != region:
+                continue
+            if not self._fits(host, tenant, self.target_utilization):
+                continue
+            after = host.dominant(tenant)[1]
+            # best_fit: fullest host after placement; spread: emptiest
+            score = (after if self.strategy == "best_fit" else -after, -len(host.tenants))
+            if best_score is None or score > best_score:
+                best, best_score = host, score
+        return best
+
+    def place(
+        self,
+        tenant_id: str,
+        plan: str = "basic",
+        demand: Optional[TenantDemand] = None,
+        region: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """Reserve capacity for a tenant; returns the chosen host id"""
+        if tenant_id in self.tenants:
+            return self.tenants[tenant_id].host_id
+        tenant = Tenant(
+            tenant_id=tenant_id,
+            host_id="",
+            demand=demand or self.demand_for(plan),
+            plan=plan,
+            metadata=dict(metadata or {})
+        )
+        host = self._choose_host(tenant, region)
+        if host is None:
+            raise PlacementError(
+                f"No host has capacity for tenant {tenant_id} ({plan})"
+                + (f" in region {region}" if region else "")
+            )
+        self._assign(tenant, host)
+        logger.info(
+            f"Placed tenant {tenant_id} on {host.capacity.host_id} "
+            f"({host.dominant()[0]} at {host.dominant()[1]:.0%})"
+        )
+        return host.capacity.host_id
+
+    def place_batch(
+        self,
+        requests: Iterable[Dict[str, Any]],
+        region: Optional[str] = None
+    ) -> Tuple[Dict[str, str], List[str]]:
+        """
+        Place many tenants first-fit-decreasing
+
+        Each request is a dict with tenant_id and optional plan/demand/
+        metadata. Returns ({tenant_id: host_id}, [unplaced tenant ids]).
+        """
+        pending = []
+        for request in requests:
+            demand = request.get("demand") or self.demand_for(request.get("plan", "basic"))
+            pending.append((request, demand))
+
+        def size(item) -> float:
+            demand = item[1]
+            return max(
+                demand.get(r) / max(sum(h.capacity.get(r) for h in self.hosts.values()), 1e-9)
+                for r in RESOURCES
+            )
+
+        placed: Dict[str, str] = {}
+        unplaced: List[str] = []
+        for request, demand in sorted(pending, key=size, reverse=True):
+            try:
+                placed[request["tenant_id"]] = self.place(
+                    request["tenant_id"],
+                    plan=request.get("plan", "basic"),
+                    demand=demand,
+                    region=request.get("region", region),
+                    metadata=request.get("metadata")
+                )
+            except PlacementError:
+                unplaced.append(request["tenant_id"])
+        return placed, unplaced
+
+    def _assign(self, tenant: Tenant, host: HostState) -> None:
+        tenant.host_id = host.capacity.host_id
+        host.tenants[tenant.tenant_id] = tenant
+        self.tenants[tenant.tenant_id] = tenant
+
+    def release(self, tenant_id: str) -> Optional[str]:
+        """Free a tenant's reservation; returns the host it was on"""
+        tenant = self.tenants.pop(tenant_id, None)
+        if tenant is None:
+            return None
+        host = self.hosts.get(tenant.host_id)
+        if host is not None:
+            host.tenants.pop(tenant_id, None)
+        return tenant.host_id
+
+    def move(self, tenant_id: str, destination: str) -> None:
+        """Record that a tenant was migrated"""
+        tenant = self.tenants[tenant_id]
+        self.hosts[tenant.host_id].tenants.pop(tenant_id, None)
+        self._assign(tenant, self.hosts[destination])
+
+    def find_tenant(self, **metadata: Any) -> Optional[Tenant]:
+        """The single tenant whose metadata matches, if exactly one does"""
+        matches = [
+            t for t in self.tenants.values()
+            if all(t.metadata.get(k) == v for k, v in metadata.items())
+        ]
+        return matches[0] if len(matches) == 1 else None
+
+    # Rebalancing -----------------------------------------------------------
+
+    def suggest_migrations(self, max_moves: int = 10) -> List[Migration]:
+        """Moves that bring overloaded and draining hosts back in line"""
+        hosts = copy.deepcopy(self.hosts)
+        migrations: List[Migration] = []
+
+        def overloaded() -> List[HostState]:
+            candidates = [
+                h for h in hosts.values()
+                if h.tenants and (h.capacity.draining or h.dominant()[1] > self.high_water)
+            ]
+            # Draining hosts first, then hottest first
+            return sorted(candidates, key=lambda h: (not h.capacity.draining, -h.dominant()[1]))
+
+        stuck = set()
+        while len(migrations) < max_moves:
+            sources = [h for h in overloaded() if h.capacity.host_id not in stuck]
+            if not sources:
+                break
+            source = sources[0]
+            migration = self._plan_move(source, hosts)
+            if migration is None:
+                stuck.add(source.capacity.host_id)
+                continue
+            self._simulate_move(source.tenants[migration.tenant_id], source, hosts[migration.destination])
+            migrations.append(migration)
+
+        return migrations
+
+    @staticmethod
+    def _simulate_move(tenant: Tenant, source: HostState, destination: HostState) -> None:
+        """Move a tenant within a simulated fleet, measurements included"""
+        source.tenants.pop(tenant.tenant_id)
+        tenant.host_id = destination.capacity.host_id
+        destination.tenants[tenant.tenant_id] = tenant
+        # Measured load follows the tenant; what no tenant explains stays put
+        for resource, value in source.measured.items():
+            source.measured[resource] = max(value - tenant.usage(resource), 0.0)
+        for resource in destination.measured:
+            destination.measured[resource] += tenant.usage(resource)
+
+    def _plan_move(self, source: HostState, hosts: Dict[str, HostState]) -> Optional[Migration]:
+        resource, before = source.dominant()
+        target = 0.0 if source.capacity.draining else self.target_utilization
+
+        # Smallest tenant that fixes the host on its own, else the biggest
+        tenants = sorted(source.tenants.values(), key=lambda t: t.usage(resource))
+        sufficient = [t for t in tenants if source.dominant(t, sign=-1)[1] <= target]
+        ordered = sufficient + [t for t in reversed(tenants) if t not in sufficient]
+
+        for tenant in ordered:
+            destination = self._choose_host(tenant, exclude=[source.capacity.host_id], hosts=hosts)
+            if destination is None:
+                continue
+            return Migration(
+                tenant_id=tenant.tenant_id,
+                source=source.capacity.host_id,
+                destination=destination.capacity.host_id,
+                resource=resource,
+                source_utilization=before,
+                source_utilization_after=source.dominant(tenant, sign=-1)[1],
+                destination_utilization_after=destination.dominant(tenant)[1]
+            )
+        return None
+
+    # Introspection / persistence --------------------------------------------
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "strategy": self.strategy,
+            "target_utilization": self.target_utilization,
+            "high_water": self.high_water,
+            "tenants": len(self.tenants),
+            "hosts": {host_id: host.to_dict() for host_id, host in self.hosts.items()}
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Tenant reservations, for restoring placement after a restart"""
+        return {
+            "tenants": [
+                {
+                    "tenant_id": t.tenant_id,
+                    "host_id": t.host_id,
+                    "plan": t.plan,
+                    "demand": asdict(t.demand),
+                    "traffic_rpm": t.traffic_rpm,
+                    "metadata": t.metadata
+                }
+                for t in self.tenants.values()
+            ]
+        }
+
+    def restore(self, snapshot: Dict[str, Any]) -> None:
+        for data in snapshot.get("tenants", []):
+            host = self.hosts.get(data["host_id"])
+            if host is None:
+                logger.warning(f"Tenant {data['tenant_id']} is on unknown host {data['host_id']}")
+                continue
+            tenant = Tenant(
+                tenant_id=data["tenant_id"],
+                host_id=data["host_id"],
+                demand=TenantDemand(**data["demand"]),
+                plan=data.get("plan", "basic"),
+                traffic_rpm=data.get("traffic_rpm"),
+                metadata=data.get("metadata", {})
+            )
+            self._assign(tenant, host)
@@ -0,0 +1,724 @@
+"""
+Warm Pool of Pre-Provisioned WordPress Instances
+Idle, generic WordPress instances claimed and personalized at signup
+
+Full provisioning spends most of its time starting MySQL and WordPress and
+running the WP-CLI install. The pool does that work ahead of time: for each
+(plan, region) it keeps a configured number of idle instances ready, hands
+one out on claim() and personalizes it for the customer (domain, title,
+admin credentials, industry plugins), then replenishes in the background.
+
+Backends implement the provisioning specifics; the same pool drives the
+Kubernetes provisioner and the local Docker deployer. Idle instances are
+health-checked periodically, recycled when unhealthy or too old, and the
+total number of idle instances is capped. Pool state is persisted as JSON
+so idle instances survive an API restart instead of leaking.
+
+The state file is shared by every API worker. Each change reloads it, applies
+the change and writes it back under a file lock, so a claim marks an
+instance as taken atomically and two workers never hand out the same one.
+Only the worker holding the pool's leader lock replenishes and health-checks;
+the others just claim, and the leader notices the gaps on its next pass.
+
+Signups claim through claim() (see the template publish endpoint); on a miss
+the caller runs a full provisioning with the same backend (get_pool_backend()).
+The pool is only used when WARM_POOL_TARGETS configures one (see
+warm_pool_enabled()).
+
+Configuration (environment):
+    WARM_POOL_TARGETS     "basic:br-sp=2,professional:br-sp=1"
+    WARM_POOL_REGION      region used when a signup names none (default "default")
+    WARM_POOL_MAX_IDLE    cap on idle + in-creation instances (default 10)
+    WARM_POOL_BACKEND     "kubernetes" or "docker"
+    WARM_POOL_STATE_PATH  JSON state file
+"""
+
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+import os
+import secrets
+import shlex
+import shutil
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from contextlib import contextmanager
+import json
+
+from app.services.process_lock import acquire_leader_lock, file_lock, release_leader_lock
+
+logger = logging.getLogger(__name__)
+
+PoolKey = Tuple[str, str]  # (plan, region)
+
+PROVISIONING = "provisioning"
+IDLE = "idle"
+CLAIMED = "claimed"
+
+
+@dataclass
+class PoolInstance:
+    """One pre-provisioned instance"""
+    instance_id: str
+    plan: str
+    region: str
+    state: str = PROVISIONING
+    created_at: float = field(default_factory=time.time)
+    ready_at: Optional[float] = None
+    last_health_check: Optional[float] = None
+    health_failures: int = 0
+    claimed_by: Optional[str] = None
+    data: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def key(self) -> PoolKey:
+        return (self.plan, self.region)
+
+    def to_public_dict(self) -> Dict[str, Any]:
+        """Status view without backend data (which holds credentials)"""
+        public = asdict(self)
+        public.pop("data")
+        return public
+
+
+class PoolBackend(ABC):
+    """Provisioning operations a warm pool needs"""
+
+    name = "base"
+
+    @abstractmethod
+    async def create(self, instance_id: str, plan: str, region: str) -> Dict[str, Any]:
+        """Provision a generic idle instance; returns backend data"""
+
+    @abstractmethod
+    async def personalize(self, instance: PoolInstance, customer: Dict[str, Any]) -> Dict[str, Any]:
+        """Turn an idle instance into the customer's site; returns site info"""
+
+    @abstractmethod
+    async def provision(self, plan: str, region: str, customer: Dict[str, Any]) -> Dict[str, Any]:
+        """Full provisioning for when the pool is empty"""
+
+    @abstractmethod
+    async def health_check(self, instance: PoolInstance) -> bool:
+        """Whether an idle instance is still serving"""
+
+    @abstractmethod
+    async def destroy(self, instance: PoolInstance) -> None:
+        """Tear an instance down"""
+
+
+class KubernetesPoolBackend(PoolBackend):
+    """Pool instances are regular namespaces from WordPressProvisioner"""
+
+    name = "kubernetes"
+
+    def __init__(self, provisioner, pool_domain: str = "pool.kenzysites.com"):
+        self.provisioner = provisioner
+        self.pool_domain = pool_domain
+
+    async def create(self, instance_id: str, plan: str, region: str) -> Dict[str, Any]:
+        result = await self.provisioner.provision_wordpress(
+            business_name=instance_id,
+            domain=f"{instance_id}.{self.pool_domain}",
+            industry="",
+            plan=plan,
+            user_id="warm-pool"
+        )
+        return {
+            "client_id": result["client_id"],
+            "domain": result["domain"],
+            "wp_admin_user": result["credentials"]["wp_admin_user"]
+        }
+
+    async def personalize(self, instance: PoolInstance, customer: Dict[str, Any]) -> Dict[str, Any]:
+        client_id = instance.data["client_id"]
+        old_domain = instance.data["domain"]
+        domain = customer["domain"]
+        password = self.provisioner.generate_secure_password(16)
+        email = customer.get("email") or f"admin@{domain}"
+        q = shlex.quote
+
+        commands = [
+            f"wp search-replace {q('https://' + old_domain)} {q('https://' + domain)} --all-tables --skip-columns=guid",
+            f"wp option update blogname {q(customer.get('business_name', domain))}",
+            f"wp option update blogdescription {q(customer.get('description', ''))}",
+            f"wp user update {q(instance.data['wp_admin_user'])} --user_pass={q(password)} --user_email={q(email)} --skip-email"
+        ]
+        for plugin in self.provisioner.INDUSTRY_PLUGINS.get(customer.get("industry", "").lower(), []):
+            commands.append(f"wp plugin install {q(plugin)} --activate")
+
+        if self.provisioner.k8s_config_loaded:
+            namespace = f"client-{client_id}"
+            pod_name = await self.provisioner._get_wordpress_pod_name(client_id)
+            for command in commands:
+                await self.provisioner._exec_in_pod(namespace, pod_name, command)
+            await self.provisioner._configure_ingress(client_id, domain, replace=True)
+        else:
+            logger.info(f"[DEV MODE] Would personalize pool instance {client_id} for {domain}")
+        # The secret still holds the pool's generic admin password
+        await self.provisioner._update_wordpress_secret(client_id, {
+            "wp_admin_user": instance.data["wp_admin_user"],
+            "wp_admin_password": password,
+            "wp_admin_email": email
+        })
+
+        if customer.get("acf_config"):
+            await self.provisioner._configure_acf(client_id, customer["acf_config"])
+        if customer.get("template_id"):
+            await self.provisioner._apply_template(client_id, customer["template_id"])
+
+        return {
+            "success": True,
+            "client_id": client_id,
+            "domain": domain,
+            "status": "active",
+            "credentials": {
+                "wp_admin_url": f"https://{domain}/wp-admin",
+                "wp_admin_user": instance.data["wp_admin_user"],
+                "wp_admin_password": password,
+                "wp_admin_email": email
+            },
+            "infrastructure": {
+                "namespace": f"client-{client_id}",
+                "mysql_host": f"mysql-{client_id}",
+                "redis_host": f"redis-{client_id}"
+            }
+        }
+
+    async def provision(self, plan: str, region: str, customer: Dict[str, Any]) -> Dict[str, Any]:
+        return await self.provisioner.provision_wordpress(
+            business_name=customer.get("business_name", customer["domain"]),
+            domain=customer["domain"],
+            industry=customer.get("industry", ""),
+            plan=plan,
+            user_id=customer.get("user_id", ""),
+            template_id=customer.get("template_id"),
+            acf_config=customer.get("acf_config")
+        )
+
+    async def health_check(self, instance: PoolInstance) -> bool:
+        status = await self.provisioner.get_site_status(instance.data["client_id"])
+        return (
+            status.get("status") == "active"
+            and status.get("wordpress", {}).get("ready", False)
+            and status.get("mysql", {}).get("ready", False)
+        )
+
+    async def destroy(self, instance: PoolInstance) -> None:
+        if instance.data.get("client_id"):
+            await self.provisioner.delete_site(instance.data["client_id"])
+
+
+class DockerPoolBackend(PoolBackend):
+    """Pool instances are docker-compose projects from WordPressProvisionerV2"""
+
+    name = "docker"
+
+    def __init__(self, provisioner_v2, base_port: int = 8100):
+        self.provisioner = provisioner_v2
+        self.base_port = base_port
+        self._ports_in_use: set = set()
+
+    def _allocate_port(self) -> int:
+        # Two ports per instance: WordPress and phpMyAdmin
+        port = self.base_port
+        while port in self._ports_in_use:
+            port += 2
+        self._ports_in_use.add(port)
+        return port
+
+    def reserve_port(self, port: int) -> None:
+        self._ports_in_use.add(port)
+
+    async def create(self, instance_id: str, plan: str, region: str) -> Dict[str, Any]:
+        from app.services.wordpress_provisioner_v2 import DeploymentMethod
+
+        port = self._allocate_port()
+        try:
+            result = await self.provisioner.provision_site(
+                instance_id,
+                {"business_name": "KenzySites", "plan": plan},
+                DeploymentMethod.LOCAL_DOCKER,
+                {"http_port": port}
+            )
+        except Exception:
+            self._ports_in_use.discard(port)
+            raise
+        return {
+            "site_id": instance_id,
+            "url": result["url"],
+            "port": port,
+            "admin_user": result["admin_user"],
+            "deployment_path": result["deployment_path"]
+        }
+
+    async def _wp(self, instance: PoolInstance, command: str) -> None:
+        from app.services.command_runner import command_runner
+
+        result = await command_runner.run(
+            ["docker-compose", "exec", "-T", "wordpress", "wp", "--allow-root"] + shlex.split(command),
+            cwd=instance.data["deployment_path"],
+            target=f"docker:{instance.instance_id}"
+        )
+        result.check()
+
+    async def personalize(self, instance: PoolInstance, customer: Dict[str, Any]) -> Dict[str, Any]:
+        q = shlex.quote
+        url = instance.data["url"]
+        password = secrets.token_urlsafe(12)
+        email = customer.get("email") or "admin@kenzysites.com"
+        await self._wp(instance, f"option update blogname {q(customer.get('business_name', 'KenzySites'))}")
+        await self._wp(instance, f"option update blogdescription {q(customer.get('description', ''))}")
+        await self._wp(
+            instance,
+            f"user update {q(instance.data['admin_user'])} --user_pass={q(password)} --user_email={q(email)} --skip-email"
+        )
+        return {
+            "url": url,
+            "admin_url": f"{url}/wp-admin",
+            "admin_user": instance.data["admin_user"],
+            "admin_password": password,
+            "deployment_path": instance.data["deployment_path"],
+            "site_id": instance.instance_id
+        }
+
+    async def provision(self, plan: str, region: str, customer: Dict[str, Any]) -> Dict[str, Any]:
+        from app.services.wordpress_provisioner_v2 import DeploymentMethod
+
+        site_id = customer.get("site_id") or f"site-{secrets.token_hex(4)}"
+        port = self._allocate_port()
+        try:
+            return await self.provisioner.provision_site(
+                site_id, customer, DeploymentMethod.LOCAL_DOCKER, {"http_port": port}
+            )
+        except Exception:
+            self._ports_in_use.discard(port)
+            raise
+
+    async def health_check(self, instance: PoolInstance) -> bool:
+        import aiohttp
+
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(
+                    instance.data["url"],
+                    allow_redirects=False,
+                    timeout=aiohttp.ClientTimeout(total=10)
+                ) as response:
+                    return response.status < 500
+        except aiohttp.ClientError:
+            return False
+        except asyncio.TimeoutError:
+            return False
+
+    async def destroy(self, instance: PoolInstance) -> None:
+        from app.services.command_runner import command_runner
+
+        path = instance.data.get("deployment_path")
+        if path:
+            await command_runner.run(["docker-compose", "down", "-v"], cwd=path, timeout=120)
+            shutil.rmtree(path, ignore_errors=True)
+        self._ports_in_use.discard(instance.data.get("port"))
+
+
+def parse_targets(spec: str) -> Dict[PoolKey, int]:
+    """Parse "plan:region=count,..." into pool targets"""
+    targets: Dict[PoolKey, int] = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        key, _, count = item.partition("=")
+        plan, _, region = key.partition(":")
+        targets[(plan.strip(), region.strip() or "default")] = int(count or 0)
+    return targets
+
+
+class WarmPool:
+    """Pool of idle instances per (plan, region) (see module docstring)"""
+
+    def __init__(
+        self,
+        backend: PoolBackend,
+        targets: Optional[Dict[PoolKey, int]] = None,
+        max_idle: int = 10,
+        create_concurrency: int = 2,
+        health_interval: float = 60.0,
+        max_health_failures: int = 2,
+        max_idle_age: float = 7 * 24 * 3600,
+        state_path: Optional[Path] = None,
+        default_region: str = "default",
+        replenish_interval: float = 5.0
+    ):
+        self.backend = backend
+        self.targets: Dict[PoolKey, int] = dict(targets or {})
+        self.max_idle = max_idle
+        self.health_interval = health_interval
+        self.max_health_failures = max_health_failures
+        self.max_idle_age = max_idle_age
+        self.state_path = state_path
+        self.default_region = default_region
+        self.replenish_interval = replenish_interval
+        self.instances: Dict[str, PoolInstance] = {}
+        self._create_semaphore = asyncio.Semaphore(create_concurrency)
+        self._replenish_needed = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._creating: set = set()
+        self._leader_lock: Optional[int] = None
+        self.stats = {"claims": 0, "hits": 0, "misses": 0, "created": 0, "create_failures": 0, "recycled": 0}
+        self._load()
+
+    # Persistence
+
+    def _load(self) -> None:
+        """Replace the in-memory view with the state file (our claims are kept)"""
+        if self.state_path is None or not self.state_path.exists():
+            return
+        try:
+            records = json.loads(self.state_path.read_text())
+        except Exception as e:
+            logger.error(f"Failed to load warm pool state: {str(e)}")
+            return
+        # Instances we are personalizing are not in the file (see _save)
+        claimed = {k: i for k, i in self.instances.items() if i.state == CLAIMED}
+        self.instances = {}
+        for record in records:
+            instance = PoolInstance(**record)
+            self.instances[instance.instance_id] = instance
+            if isinstance(self.backend, DockerPoolBackend) and instance.data.get("port"):
+                self.backend.reserve_port(instance.data["port"])
+        self.instances.update(claimed)
+
+    def _save(self) -> None:
+        if self.state_path is None:
+            return
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_suffix(".tmp")
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as handle:
+            json.dump(
+                [asdict(i) for i in self.instances.values() if i.state != CLAIMED],
+                handle, indent=2, default=str
+            )
+        os.replace(tmp, self.state_path)
+
+    @contextmanager
+    def _shared_state(self) -> Iterator[None]:
+        """
+        Reload, change and save the pool state under the state file lock
+
+        Instances are reloaded, so look them up by id inside the block rather
+        than holding on to objects from before it. Nothing inside may await.
+        """
+        if self.state_path is None:
+            yield
+            return
+        with file_lock(self.state_path.with_suffix(".lock")):
+            self._load()
+            yield
+            self._save()
+
+    # Lifecycle
+
+    async def start(self) -> None:
+        """Start replenishing and health checking (no-op without targets)"""
+        if self._tasks or not self.targets:
+            return
+        if self.state_path is not None:
+            self._leader_lock = acquire_leader_lock(self.state_path.with_suffix(".leader"))
+            if self._leader_lock is None:
+                logger.info("Warm pool is maintained by another worker; this one only claims")
+                return
+        # Instances left mid-creation by a previous leader are unknown quantities
+        with self._shared_state():
+            interrupted = [i for i in self.instances.values() if i.state == PROVISIONING]
+        for instance in interrupted:
+            await self._recycle(instance, "interrupted during creation")
+        self._tasks = [
+            asyncio.create_task(self._replenish_loop()),
+            asyncio.create_task(self._health_loop())
+        ]
+        self._replenish_needed.set()
+        logger.info(f"Warm pool started ({self.backend.name}): {self._format_targets()}")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        release_leader_lock(self._leader_lock)
+        self._leader_lock = None
+
+    def set_target(self, plan: str, region: str, size: int) -> None:
+        self.targets[(plan, region)] = max(0, size)
+        self._replenish_needed.set()
+
+    # Claiming
+
+    def _idle(self, key: Optional[PoolKey] = None) -> List[PoolInstance]:
+        idle = [i for i in self.instances.values() if i.state == IDLE and (key is None or i.key == key)]
+        return sorted(idle, key=lambda i: i.ready_at or i.created_at)
+
+    async def claim(self, plan: str, region: str, customer: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Personalize an idle instance for a customer
+
+        Returns None when no healthy instance is available, so the caller
+        can fall back to full provisioning.
+        """
+        self.stats["claims"] += 1
+        while True:
+            # Taking the instance and saving it as taken is one locked step
+            with self._shared_state():
+                idle = self._idle((plan, region))
+                instance = idle[0] if idle else None
+                if instance is not None:
+                    instance.state = CLAIMED
+                    instance.claimed_by = customer.get("user_id") or customer.get("domain")
+            if instance is None:
+                break
+            self._replenish_needed.set()
+            started = time.monotonic()
+            try:
+                site = await self.backend.personalize(instance, customer)
+            except Exception as e:
+                logger.error(f"Personalizing pool instance {instance.instance_id} failed: {str(e)}")
+                await self._recycle(instance, "personalization failed")
+                continue
+            self.instances.pop(instance.instance_id, None)
+            self.stats["hits"] += 1
+            logger.info(
+                f"Claimed pool instance {instance.instance_id} for {instance.claimed_by} "
+                f"in {time.monotonic() - started:.1f}s"
+            )
+            site["warm_pool"] = {
+                "instance_id": instance.instance_id,
+                "personalize_seconds": round(time.monotonic() - started, 3)
+            }
+            return site
+        self.stats["misses"] += 1
+        self._replenish_needed.set()
+        return None
+
+    async def claim_or_provision(self, plan: str, region: str, customer: Dict[str, Any]) -> Dict[str, Any]:
+        """Claim from the pool, falling back to a full provisioning run"""
+        site = await self.claim(plan, region, customer)
+        if site is not None:
+            return site
+        logger.info(f"Warm pool empty for {plan}/{region}; provisioning from scratch")
+        return await self.backend.provision(plan, region, customer)
+
+    # Replenishing
+
+    def deficits(self) -> Dict[PoolKey, int]:
+        """Instances to create per key, respecting the idle cap"""
+        counts: Dict[PoolKey, int] = {}
+        for instance in self.instances.values():
+            if instance.state in (IDLE, PROVISIONING):
+                counts[instance.key] = counts.get(instance.key, 0) + 1
+        room = self.max_idle - sum(counts.values())
+        deficits = {}
+        # Emptiest keys first so one plan cannot starve the others
+        for key, target in sorted(self.targets.items(), key=lambda kv: counts.get(kv[0], 0) - kv[1]):
+            missing = min(target - counts.get(key, 0), room)
+            if missing > 0:
+                deficits[key] = missing
+                room -= missing
+        return deficits
+
+    async def replenish(self) -> int:
+        """Start creating instances for every deficit; returns how many"""
+        new: List[PoolInstance] = []
+        with self._shared_state():
+            for (plan, region), missing in self.deficits().items():
+                for _ in range(missing):
+                    instance = PoolInstance(
+                        instance_id=f"pool-{secrets.token_hex(4)}", plan=plan, region=region
+                    )
+                    self.instances[instance.instance_id] = instance
+                    new.append(instance)
+        for instance in new:
+            task = asyncio.create_task(self._create(instance))
+            self._creating.add(task)
+            task.add_done_callback(self._creating.discard)
+        return len(new)
+
+    async def _create(self, instance: PoolInstance) -> None:
+        async with self._create_semaphore:
+            try:
+                instance.data = await self.backend.create(instance.instance_id, instance.plan, instance.region)
+            except Exception as e:
+                self.stats["create_failures"] += 1
+                logger.error(f"Creating pool instance {instance.instance_id} failed: {str(e)}")
+                await self._recycle(instance, "creation failed", count=False)
+                return
+        instance.state = IDLE
+        instance.ready_at = time.time()
+        with self._shared_state():
+            current = self.instances.get(instance.instance_id)
+            if current is not None:
+                self.instances[instance.instance_id] = instance
+        if current is None:
+            # Recycled by a new leader while we were creating it
+            await self._destroy(instance)
+            return
+        self.stats["created"] += 1
+        logger.info(
+            f"Pool instance {instance.instance_id} ready for {instance.plan}/{instance.region} "
+            f"in {instance.ready_at - instance.created_at:.0f}s"
+        )
+
+    async def _replenish_loop(self) -> None:
+        while True:
+            # Claims made by other workers only show up in the state file
+            try:
+                await asyncio.wait_for(self._replenish_needed.wait(), timeout=self.replenish_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._replenish_needed.clear()
+            try:
+                await self.replenish()
+            except Exception as e:
+                logger.error(f"Warm pool replenish failed: {str(e)}")
+            # Failed creations are retried on the next health pass, not in a hot loop
+            await asyncio.sleep(1.0)
+
+    # Health
+
+    async def check_health(self) -> Dict[str, int]:
+        """Check idle instances; recycle unhealthy or expired ones"""
+        checked = recycled = 0
+        now = time.time()
+        with self._shared_state():
+            idle = self._idle()
+        for instance in idle:
+            if now - (instance.ready_at or instance.created_at) > self.max_idle_age:
+                await self._recycle(instance, "expired")
+                recycled += 1
+                continue
+            try:
+                healthy = await self.backend.health_check(instance)
+            except Exception as e:
+                logger.warning(f"Health check of {instance.instance_id} errored: {str(e)}")
+                healthy = False
+            checked += 1
+            with self._shared_state():
+                current = self.instances.get(instance.instance_id)
+                if current is None or current.state != IDLE:
+                    continue  # Claimed while we were checking
+                current.last_health_check = now
+                current.health_failures = 0 if healthy else current.health_failures + 1
+            if current.health_failures >= self.max_health_failures:
+                await self._recycle(current, "unhealthy")
+                recycled += 1
+        # Drop instances beyond the target (e.g. after lowering a target)
+        with self._shared_state():
+            surplus = [
+                instance
+                for key in {i.key for i in self._idle()}
+                for instance in self._idle(key)[self.targets.get(key, 0):]
+            ]
+        for instance in surplus:
+            await self._recycle(instance, "over target")
+            recycled += 1
+        self._replenish_needed.set()
+        return {"checked": checked, "recycled": recycled}
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_interval)
+            try:
+                await self.check_health()
+            except Exception as e:
+                logger.error(f"Warm pool health check failed: {str(e)}")
+
+    async def _recycle(self, instance: PoolInstance, reason: str, count: bool = True) -> None:
+        with self._shared_state():
+            current = self.instances.pop(instance.instance_id, None)
+        if current is None:
+            return  # Claimed or recycled by another worker in the meantime
+        logger.info(f"Recycling pool instance {instance.instance_id}: {reason}")
+        if count:
+            self.stats["recycled"] += 1
+        await self._destroy(instance)
+
+    async def _destroy(self, instance: PoolInstance) -> None:
+        try:
+            await self.backend.destroy(instance)
+        except Exception as e:
+            logger.error(f"Destroying pool instance {instance.instance_id} failed: {str(e)}")
+
+    # Reporting
+
+    def _format_targets(self) -> str:
+        return ", ".join(f"{p}/{r}={n}" for (p, r), n in self.targets.items())
+
+    def get_status(self) -> Dict[str, Any]:
+        # Writers replace the file atomically, so reading needs no lock
+        self._load()
+        pools = {}
+        for (plan, region), target in self.targets.items():
+            members = [i for i in self.instances.values() if i.key == (plan, region)]
+            pools[f"{plan}/{region}"] = {
+                "target": target,
+                "idle": sum(1 for i in members if i.state == IDLE),
+                "provisioning": sum(1 for i in members if i.state == PROVISIONING)
+            }
+        return {
+            "backend": self.backend.name,
+            "running": bool(self._tasks),
+            "leader": self._leader_lock is not None,
+            "max_idle": self.max_idle,
+            "pools": pools,
+            "instances": [i.to_public_dict() for i in self.instances.values()],
+            "stats": dict(self.stats)
+        }
+
+
+def warm_pool_enabled() -> bool:
+    """Whether WARM_POOL_TARGETS asks for any pre-provisioned instances"""
+    return any(count > 0 for count in parse_targets(os.getenv("WARM_POOL_TARGETS", "")).values())
+
+
+def _create_default_backend() -> PoolBackend:
+    backend_name = os.getenv("WARM_POOL_BACKEND", "kubernetes")
+    if backend_name == "docker":
+        from app.services.wordpress_provisioner_v2 import wordpress_provisioner_v2
+        return DockerPoolBackend(
+            wordpress_provisioner_v2, base_port=int(os.getenv("WARM_POOL_BASE_PORT", "8100"))
+        )
+    from app.services.wordpress_provisioner import wordpress_provisioner
+    return KubernetesPoolBackend(
+        wordpress_provisioner, pool_domain=os.getenv("WARM_POOL_DOMAIN", "pool.kenzysites.com")
+    )
+
+
+def _create_default_pool() -> WarmPool:
+    return WarmPool(
+        get_pool_backend(),
+        targets=parse_targets(os.getenv("WARM_POOL_TARGETS", "")),
+        max_idle=int(os.getenv("WARM_POOL_MAX_IDLE", "10")),
+        create_concurrency=int(os.getenv("WARM_POOL_CREATE_CONCURRENCY", "2")),
+        health_interval=float(os.getenv("WARM_POOL_HEALTH_INTERVAL_SECONDS", "60")),
+        state_path=Path(os.getenv("WARM_POOL_STATE_PATH", "/tmp/kenzysites/warm_pool.json")),
+        default_region=os.getenv("WARM_POOL_REGION", "default")
+    )
+
+
+_backend: Optional[PoolBackend] = None
+_warm_pool: Optional[WarmPool] = None
+
+
+def get_pool_backend() -> PoolBackend:
+    """Process-wide provisioning backend, shared by the pool and direct provisioning"""
+    global _backend
+    if _backend is None:
+        _backend = _create_default_backend()
+    return _backend
+
+
+def get_warm_pool() -> WarmPool:
+    """Process-wide pool, built on first use (imports the chosen provisioner)"""
+    global _warm_pool
+    if _warm_pool is None:
+        _warm_pool = _create_default_pool()
+    return _warm_pool
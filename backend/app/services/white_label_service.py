@@ -5,7 +5,10 @@ Allows agencies to customize branding
 """
 
 import logging
-from typing import Dict, Any, List, Optional
+import os
+import re
+from html import escape
+from typing import Dict, Any, List, Optional, Tuple, Callable
 from datetime import datetime
 from pydantic import BaseModel, Field, HttpUrl
 from enum import Enum
@@ -13,8 +16,16 @@ import uuid
 import json
 import hashlib
 
+from app.services.domain_trie import DomainTrie
+
 logger = logging.getLogger(__name__)
 
+# Agency subdomains live under this domain (agency.kenzysites.com)
+PLATFORM_DOMAIN = os.getenv("WHITE_LABEL_PLATFORM_DOMAIN", "kenzysites.com")
+
+# {{name}} placeholders of the white label email templates
+_PLACEHOLDER = re.compile(r"\{\{(.*?)\}\}")
+
 # Enums
 class BrandingElement(str, Enum):
     LOGO = "logo"
@@ -133,6 +144,7 @@ class WhiteLabelConfig(BaseModel):
     
     # Status
     active: bool = True
+    version: int = 1  # Bumped on every change; keys the rendered asset cache
     created_at: datetime = Field(default_factory=datetime.now)
     updated_at: datetime = Field(default_factory=datetime.now)
 
@@ -145,6 +157,18 @@ class ClientWhiteLabel(BaseModel):
     active: bool = True
     created_at: datetime = Field(default_factory=datetime.now)
 
+def _compile_placeholders(text: str) -> List[str]:
+    """Split text into alternating literal / placeholder-name parts"""
+    return _PLACEHOLDER.split(text)
+
+def _fill_placeholders(parts: List[str], variables: Dict[str, Any]) -> str:
+    """Render compiled parts; unknown placeholders are left as they were"""
+    out = parts[:]
+    for index in range(1, len(out), 2):
+        name = out[index]
+        out[index] = str(variables[name]) if name in variables else "{{" + name + "}}"
+    return "".join(out)
+
 class WhiteLabelService:
     """Service for managing white label configurations"""
     
@@ -152,6 +176,10 @@ class WhiteLabelService:
         self.configs: Dict[str, WhiteLabelConfig] = {}
         self.client_mappings: Dict[str, ClientWhiteLabel] = {}
         self.domain_mappings: Dict[str, str] = {}  # domain -> config_id
+        # Same mappings as a reversed-label trie, with wildcard entries for subdomains
+        self.domain_index = DomainTrie()
+        # config_id -> (config version, {asset key: rendered asset})
+        self._asset_cache: Dict[str, Tuple[int, Dict[Any, Any]]] = {}
         
         # Initialize default email templates
         self.default_templates = self._create_default_templates()
@@ -191,6 +219,39 @@ class WhiteLabelService:
         
         return templates
     
+    def _map_domain(self, domain: str, config_id: str, with_subdomains: bool = True):
+        """Route domain (and, unless it is a wildcard already, its subdomains) to config_id"""
+        
+        self.domain_mappings[domain] = config_id
+        self.domain_index.insert(domain, config_id)
+        if with_subdomains and not domain.startswith("*."):
+            self.domain_index.insert(f"*.{domain}", config_id)
+    
+    def _unmap_domain(self, domain: str):
+        self.domain_mappings.pop(domain, None)
+        self.domain_index.remove(domain)
+        if not domain.startswith("*."):
+            self.domain_index.remove(f"*.{domain}")
+    
+    def mark_updated(self, config: WhiteLabelConfig):
+        """Record a change to config, invalidating its rendered assets"""
+        
+        config.version += 1
+        config.updated_at = datetime.now()
+        self._asset_cache.pop(config.id, None)
+    
+    def _cached_asset(self, config: WhiteLabelConfig, key: Any, build: Callable[[], Any]) -> Any:
+        """Rendered asset for the current version of config, built on first use"""
+        
+        entry = self._asset_cache.get(config.id)
+        if entry is None or entry[0] != config.version:
+            entry = (config.version, {})
+            self._asset_cache[config.id] = entry
+        assets = entry[1]
+        if key not in assets:
+            assets[key] = build()
+        return assets[key]
+    
     async def create_white_label_config(
         self,
         agency_id: str,
@@ -230,9 +291,11 @@ class WhiteLabelService:
         self.configs[config.id] = config
         self.configs[agency_id] = config  # Also store by agency ID
         self.domain_mappings[subdomain] = config.id
+        self.domain_index.insert(subdomain, config.id)
+        self._map_domain(f"{subdomain}.{PLATFORM_DOMAIN}", config.id)
         
         if config.custom_domain:
-            self.domain_mappings[config.custom_domain] = config.id
+            self._map_domain(config.custom_domain, config.id)
         
         logger.info(f"Created white label config {config.id} for agency {agency_id}")
         return config
@@ -262,11 +325,11 @@ class WhiteLabelService:
         elif element == BrandingElement.DOMAIN:
             # Update domain mappings
             if config.custom_domain:
-                del self.domain_mappings[config.custom_domain]
+                self._unmap_domain(config.custom_domain)
             
             config.custom_domain = data.get("custom_domain")
             if config.custom_domain:
-                self.domain_mappings[config.custom_domain] = config.id
+                self._map_domain(config.custom_domain, config.id)
             
         elif element == BrandingElement.FOOTER:
             config.footer_text = data.get("footer_text")
@@ -279,7 +342,7 @@ class WhiteLabelService:
             config.meta_keywords = data.get("meta_keywords", [])
             config.og_image = data.get("og_image")
         
-        config.updated_at = datetime.now()
+        self.mark_updated(config)
         
         logger.info(f"Updated {element.value} for white label config {config_id}")
         return config
@@ -311,6 +374,9 @@ class WhiteLabelService:
                 html_template=html_template or "",
                 text_template=text_template or ""
             )
+        elif template is self.default_templates.get(template_type):
+            # Defaults are shared by every config; customize a copy
+            template = template.copy(deep=True)
         
         # Update template
         if subject:
@@ -321,7 +387,7 @@ class WhiteLabelService:
             template.text_template = text_template
         
         config.email_templates[template_type] = template
-        config.updated_at = datetime.now()
+        self.mark_updated(config)
         
         logger.info(f"Customized {template_type.value} email template for config {config_id}")
         return template
@@ -351,28 +417,25 @@ class WhiteLabelService:
         
         # Register custom subdomain if provided
         if custom_subdomain:
-            full_domain = f"{custom_subdomain}.{config.subdomain}.kenzysites.com"
-            self.domain_mappings[full_domain] = config.id
+            full_domain = f"{custom_subdomain}.{config.subdomain}.{PLATFORM_DOMAIN}"
+            self._map_domain(full_domain, config.id, with_subdomains=False)
         
         logger.info(f"Applied white label to client {client_id} from agency {agency_id}")
         return client_wl
     
     async def get_config_by_domain(self, domain: str) -> Optional[WhiteLabelConfig]:
-        """Get white label config by domain"""
+        """
+        Get white label config by domain
+        
+        Matches exact domains first, then the closest wildcard: custom
+        domains and agency.kenzysites.com also serve all their subdomains.
+        Ports, case and a trailing dot are ignored.
+        """
         
-        config_id = self.domain_mappings.get(domain)
+        config_id = self.domain_index.lookup(domain)
         if config_id:
             return self.configs.get(config_id)
         
-        # Check if it's a subdomain
-        parts = domain.split(".")
-        if len(parts) > 2:
-            # Try agency.kenzysites.com format
-            subdomain = parts[0]
-            config_id = self.domain_mappings.get(subdomain)
-            if config_id:
-                return self.configs.get(config_id)
-        
         return None
     
     async def get_client_branding(self, client_id: str) -> Optional[Dict[str, Any]]:
@@ -421,27 +484,96 @@ class WhiteLabelService:
             raise ValueError(f"Template {template_type.value} not found")
         
         # Add branding variables
-        variables["brand_name"] = config.brand_name
-        variables["primary_color"] = config.colors.primary
-        variables["logo_url"] = config.logo_url or ""
-        
-        # Simple template rendering (in production, use Jinja2 or similar)
-        subject = template.subject
-        html_body = template.html_template
-        text_body = template.text_template
+        variables = {
+            **variables,
+            "brand_name": config.brand_name,
+            "primary_color": config.colors.primary,
+            "logo_url": config.logo_url or ""
+        }
         
-        for key, value in variables.items():
-            placeholder = f"{{{{{key}}}}}"
-            subject = subject.replace(placeholder, str(value))
-            html_body = html_body.replace(placeholder, str(value))
-            text_body = text_body.replace(placeholder, str(value))
+        subject, html_body, text_body = self._cached_asset(
+            config,
+            ("email", template_type),
+            lambda: tuple(
+                _compile_placeholders(text)
+                for text in (template.subject, template.html_template, template.text_template)
+            )
+        )
+        html_body = _fill_placeholders(html_body, variables)
+        shell_start, shell_end = self.get_email_shell(config)
         
         return {
-            "subject": subject,
+            "subject": _fill_placeholders(subject, variables),
             "html_body": html_body,
-            "text_body": text_body
+            "text_body": _fill_placeholders(text_body, variables),
+            "html_document": shell_start + html_body + shell_end
         }
     
+    def get_branded_css(self, config: WhiteLabelConfig) -> str:
+        """CSS custom properties for the brand colors and fonts, plus custom CSS"""
+        
+        def build() -> str:
+            lines = [":root {"]
+            for name, value in config.colors.dict().items():
+                lines.append(f"  --brand-{name.replace('_', '-')}: {value};")
+            fonts = config.fonts
+            lines.append(f"  --brand-heading-font: '{fonts.heading_font}', sans-serif;")
+            lines.append(f"  --brand-body-font: '{fonts.body_font}', sans-serif;")
+            lines.append(f"  --brand-code-font: '{fonts.code_font}', monospace;")
+            lines.append(f"  --brand-heading-weight: {fonts.heading_weight};")
+            lines.append(f"  --brand-body-weight: {fonts.body_weight};")
+            lines.append(f"  --brand-base-size: {fonts.base_size}px;")
+            lines.append("}")
+            if config.custom_css:
+                lines.append(config.custom_css)
+            return "\n".join(lines) + "\n"
+        
+        return self._cached_asset(config, "css", build)
+    
+    def get_logo_html(self, config: WhiteLabelConfig) -> str:
+        """Logo <img> (or the brand name when there is no logo)"""
+        
+        def build() -> str:
+            name = escape(config.brand_name)
+            if not config.logo_url:
+                return f'<span style="font-size: 24px; font-weight: bold; color: {config.colors.primary};">{name}</span>'
+            return f'<img src="{escape(config.logo_url)}" alt="{name}" style="max-height: 48px;">'
+        
+        return self._cached_asset(config, "logo", build)
+    
+    def get_email_shell(self, config: WhiteLabelConfig) -> Tuple[str, str]:
+        """(opening, closing) HTML that wraps email bodies in the brand layout"""
+        
+        def build() -> Tuple[str, str]:
+            colors = config.colors
+            fonts = config.fonts
+            start = (
+                '<!DOCTYPE html><html><head><meta charset="utf-8">'
+                f"<title>{escape(config.brand_name)}</title></head>"
+                f'<body style="margin: 0; background: {colors.light}; color: {colors.text}; '
+                f"font-family: '{fonts.body_font}', sans-serif; font-size: {fonts.base_size}px;\">"
+                f'<div style="max-width: 600px; margin: 0 auto; background: {colors.background}; padding: 24px;">'
+                f'<div style="margin-bottom: 24px;">{self.get_logo_html(config)}</div>'
+            )
+            footer = []
+            if config.footer_text:
+                footer.append(f"<p>{escape(config.footer_text)}</p>")
+            if config.footer_links:
+                footer.append(" | ".join(
+                    f'<a href="{escape(link.get("url", "#"))}" style="color: {colors.secondary};">{escape(link.get("text", ""))}</a>'
+                    for link in config.footer_links
+                ))
+            if not config.hide_powered_by:
+                footer.append("<p>Powered by KenzySites</p>")
+            end = (
+                f'<div style="margin-top: 32px; font-size: 12px; color: {colors.secondary};">'
+                + "".join(footer)
+                + "</div></div></body></html>"
+            )
+            return start, end
+        
+        return self._cached_asset(config, "email_shell", build)
+    
     async def update_pricing(
         self,
         config_id: str,
@@ -457,7 +589,7 @@ class WhiteLabelService:
         config.custom_pricing = custom_pricing
         config.markup_percentage = markup_percentage
         config.hide_original_pricing = True
-        config.updated_at = datetime.now()
+        self.mark_updated(config)
         
         logger.info(f"Updated pricing for white label config {config_id}")
         return config
@@ -6,6 +6,7 @@ Manages WordPress Multisite installations with Astra and Spectra
 import logging
 import httpx
 import json
+import os
 import asyncio
 import subprocess
 from typing import Dict, Any, List, Optional, Tuple
@@ -15,6 +16,8 @@ from pathlib import Path
 
 from pydantic import BaseModel, Field
 
+from app.services.tenant_placement import HostCapacity, PlacementEngine
+
 logger = logging.getLogger(__name__)
 
 class MultisiteConfig(BaseModel):
@@ -26,6 +29,19 @@ class MultisiteConfig(BaseModel):
     db_name: str = "wordpress_multisite"
     db_user: str = "wp_multisite"
     db_password: str = "wp_multisite_pass"
+    
+    # WP-CLI container of this network (docker_host selects a remote daemon)
+    wpcli_container: str = "kenzysites-wpcli"
+    docker_host: Optional[str] = None
+    
+    # Placement: identity and capacity of this network's server
+    network_id: str = "default"
+    cpu: float = 4
+    memory_mb: float = 8192
+    disk_gb: float = 100
+    max_sites: int = 500
+    traffic_rpm: float = 6000
+    region: Optional[str] = None
 
 class SiteConfig(BaseModel):
     """Configuration for a new WordPress site"""
@@ -34,6 +50,7 @@ class SiteConfig(BaseModel):
     business_type: str
     description: Optional[str] = ""
     admin_email: Optional[str] = "admin@kenzysites.com"
+    plan: str = "basic"
     
     # Astra theme settings
     primary_color: str = "#0274be"
@@ -79,17 +96,98 @@ class WordPressMultisiteManager:
     Creates and configures sites programmatically
     """
     
-    def __init__(self, config: Optional[MultisiteConfig] = None):
-        self.config = config or MultisiteConfig()
+    def __init__(
+        self,
+        config: Optional[MultisiteConfig] = None,
+        networks: Optional[List[MultisiteConfig]] = None,
+        placement: Optional[PlacementEngine] = None,
+        placement_state_path: Optional[str] = None
+    ):
+        self.config = config or (networks[0] if networks else MultisiteConfig())
         self.api_base = f"{self.config.main_url}/wp-json"
         self.auth_header = self._create_auth_header()
         
-    def _create_auth_header(self) -> str:
+        # New sites go to the network with the best fit for their plan
+        self.networks: Dict[str, MultisiteConfig] = {
+            network.network_id: network for network in (networks or [self.config])
+        }
+        self.placement = placement or PlacementEngine()
+        for network in self.networks.values():
+            self.placement.add_host(HostCapacity(
+                host_id=network.network_id,
+                cpu=network.cpu,
+                memory_mb=network.memory_mb,
+                disk_gb=network.disk_gb,
+                sites=network.max_sites,
+                traffic_rpm=network.traffic_rpm,
+                region=network.region
+            ))
+        
+        # Saved by default: WP-CLI commands refuse sites of unknown placement
+        self.placement_state_path = Path(placement_state_path or os.getenv(
+            "MULTISITE_PLACEMENT_STATE", "/tmp/kenzysites/multisite_placement.json"
+        ))
+        self._restore_placement()
+    
+    def _restore_placement(self):
+        if not self.placement_state_path.exists():
+            return
+        try:
+            self.placement.restore(json.loads(self.placement_state_path.read_text()))
+        except Exception as e:
+            logger.error(f"Failed to restore multisite placement: {str(e)}")
+    
+    def _save_placement(self):
+        try:
+            self.placement_state_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.placement_state_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self.placement.snapshot(), indent=2))
+            os.replace(tmp, self.placement_state_path)
+        except Exception as e:
+            logger.error(f"Failed to save multisite placement: {str(e)}")
+    
+    def _create_auth_header(self, config: Optional[MultisiteConfig] = None) -> str:
         """Create basic auth header"""
-        credentials = f"{self.config.admin_user}:{self.config.admin_password}"
+        config = config or self.config
+        credentials = f"{config.admin_user}:{config.admin_password}"
         encoded = base64.b64encode(credentials.encode()).decode()
         return f"Basic {encoded}"
     
+    def _endpoint(self, network_id: Optional[str] = None) -> Tuple[str, str]:
+        """REST API base and auth header of a network"""
+        config = self.networks.get(network_id) if network_id else None
+        if config is None:
+            return self.api_base, self.auth_header
+        return f"{config.main_url}/wp-json", self._create_auth_header(config)
+    
+    def _network_for_site(self, site_id: int, network_id: Optional[str] = None) -> Optional[str]:
+        """Network hosting a site; site ids are only unique within one network"""
+        if network_id:
+            return network_id
+        tenant = self.placement.find_tenant(site_id=site_id)
+        return tenant.host_id if tenant else None
+    
+    def _wpcli_network(self, site_id: int, network_id: Optional[str] = None) -> MultisiteConfig:
+        """
+        Network a WP-CLI command for a site must run on
+        
+        Raises ValueError when it is unknown: the same site id on another
+        network is a different tenant.
+        """
+        network_id = self._network_for_site(site_id, network_id)
+        if network_id is None and len(self.networks) == 1:
+            network_id = next(iter(self.networks))
+        if network_id is None:
+            raise ValueError(f"Placement of site {site_id} is unknown; pass network_id explicitly")
+        if network_id not in self.networks:
+            raise ValueError(f"Unknown multisite network {network_id}")
+        return self.networks[network_id]
+    
+    @staticmethod
+    def _wpcli_command(network: MultisiteConfig, *args: str) -> List[str]:
+        docker = ["docker", "-H", network.docker_host] if network.docker_host else ["docker"]
+        return [*docker, "exec", network.wpcli_container, "wp", *args, "--allow-root"]
+    
     async def create_site(self, site_config: SiteConfig) -> Dict[str, Any]:
         """
         Create a new WordPress site with Astra and Spectra configured
@@ -102,11 +200,22 @@ class WordPressMultisiteManager:
         """
         logger.info(f"🚀 Creating WordPress site: {site_config.subdomain}")
         
+        try:
+            network_id = self.placement.place(
+                site_config.subdomain,
+                plan=site_config.plan,
+                metadata={"title": site_config.title}
+            )
+        except Exception as e:
+            logger.error(f"No multisite network can take {site_config.subdomain}: {str(e)}")
+            return {"success": False, "error": str(e)}
+        api_base, auth_header = self._endpoint(network_id)
+        
         try:
             # Step 1: Create site via REST API
             async with httpx.AsyncClient() as client:
                 response = await client.post(
-                    f"{self.api_base}/kenzysites/v1/sites/create",
+                    f"{api_base}/kenzysites/v1/sites/create",
                     json={
                         "domain": site_config.subdomain,
                         "title": site_config.title,
@@ -114,31 +223,35 @@ class WordPressMultisiteManager:
                         "primary_color": site_config.primary_color,
                         "accent_color": site_config.accent_color
                     },
-                    headers={"Authorization": self.auth_header},
+                    headers={"Authorization": auth_header},
                     timeout=30.0
                 )
                 
                 if response.status_code != 200:
                     logger.error(f"Failed to create site: {response.text}")
+                    self.placement.release(site_config.subdomain)
                     return {"success": False, "error": response.text}
                 
                 result = response.json()
                 site_id = result.get("site_id")
+                self.placement.tenants[site_config.subdomain].metadata["site_id"] = site_id
+                self._save_placement()
                 
-            logger.info(f"✅ Site created with ID: {site_id}")
+            logger.info(f"✅ Site created with ID: {site_id} on network {network_id}")
             
             # Step 2: Configure Astra theme settings
-            await self._configure_astra_theme(site_id, site_config)
+            await self._configure_astra_theme(site_id, site_config, network_id)
             
             # Step 3: Create pages with Spectra blocks
-            await self._create_pages_with_spectra(site_id, site_config)
+            await self._create_pages_with_spectra(site_id, site_config, network_id)
             
             # Step 4: Configure menus and settings
-            await self._configure_site_settings(site_id, site_config)
+            await self._configure_site_settings(site_id, site_config, network_id)
             
             return {
                 "success": True,
                 "site_id": site_id,
+                "network_id": network_id,
                 "url": f"http://{site_config.subdomain}.localhost:8090",
                 "admin_url": f"http://{site_config.subdomain}.localhost:8090/wp-admin",
                 "credentials": {
@@ -151,7 +264,7 @@ class WordPressMultisiteManager:
             logger.error(f"Error creating site: {str(e)}")
             return {"success": False, "error": str(e)}
     
-    async def _configure_astra_theme(self, site_id: int, site_config: SiteConfig):
+    async def _configure_astra_theme(self, site_id: int, site_config: SiteConfig, network_id: Optional[str] = None):
         """Configure Astra theme settings for the site"""
         
         astra_settings = {
@@ -180,17 +293,18 @@ class WordPressMultisiteManager:
         }
         
         # Apply settings via API
+        api_base, auth_header = self._endpoint(network_id)
         async with httpx.AsyncClient() as client:
             await client.post(
-                f"{self.api_base}/kenzysites/v1/sites/{site_id}/configure",
+                f"{api_base}/kenzysites/v1/sites/{site_id}/configure",
                 json={"astra_settings": astra_settings},
-                headers={"Authorization": self.auth_header},
+                headers={"Authorization": auth_header},
                 timeout=30.0
             )
         
         logger.info(f"✅ Astra theme configured for site {site_id}")
     
-    async def _create_pages_with_spectra(self, site_id: int, site_config: SiteConfig):
+    async def _create_pages_with_spectra(self, site_id: int, site_config: SiteConfig, network_id: Optional[str] = None):
         """Create pages using Spectra blocks"""
         
         # Get page templates based on business type
@@ -208,11 +322,12 @@ class WordPressMultisiteManager:
             })
         
         # Create pages via API
+        api_base, auth_header = self._endpoint(network_id)
         async with httpx.AsyncClient() as client:
             await client.post(
-                f"{self.api_base}/kenzysites/v1/sites/{site_id}/configure",
+                f"{api_base}/kenzysites/v1/sites/{site_id}/configure",
                 json={"pages": pages_data},
-                headers={"Authorization": self.auth_header},
+                headers={"Authorization": auth_header},
                 timeout=30.0
             )
         
@@ -671,7 +786,7 @@ class WordPressMultisiteManager:
 </div>
 <!-- /wp:{block.block_type} -->"""
     
-    async def _configure_site_settings(self, site_id: int, site_config: SiteConfig):
+    async def _configure_site_settings(self, site_id: int, site_config: SiteConfig, network_id: Optional[str] = None):
         """Configure additional site settings"""
         
         settings = {
@@ -684,52 +799,68 @@ class WordPressMultisiteManager:
             "default_ping_status": "closed"
         }
         
+        api_base, auth_header = self._endpoint(network_id)
         async with httpx.AsyncClient() as client:
             await client.post(
-                f"{self.api_base}/kenzysites/v1/sites/{site_id}/configure",
+                f"{api_base}/kenzysites/v1/sites/{site_id}/configure",
                 json=settings,
-                headers={"Authorization": self.auth_header},
+                headers={"Authorization": auth_header},
                 timeout=30.0
             )
         
         logger.info(f"✅ Site settings configured for site {site_id}")
     
     async def list_sites(self) -> List[Dict[str, Any]]:
-        """List all sites in the multisite network"""
+        """List all sites in the multisite networks"""
         
-        try:
-            async with httpx.AsyncClient() as client:
+        async def list_network(client: httpx.AsyncClient, network_id: str) -> List[Dict[str, Any]]:
+            api_base, auth_header = self._endpoint(network_id)
+            try:
                 response = await client.get(
-                    f"{self.api_base}/kenzysites/v1/sites",
-                    headers={"Authorization": self.auth_header},
+                    f"{api_base}/kenzysites/v1/sites",
+                    headers={"Authorization": auth_header},
                     timeout=30.0
                 )
                 
                 if response.status_code == 200:
-                    return response.json().get("sites", [])
+                    sites = response.json().get("sites", [])
+                    if len(self.networks) > 1:
+                        for site in sites:
+                            site["network_id"] = network_id
+                    return sites
                 else:
-                    logger.error(f"Failed to list sites: {response.text}")
+                    logger.error(f"Failed to list sites on {network_id}: {response.text}")
                     return []
                     
-        except Exception as e:
-            logger.error(f"Error listing sites: {str(e)}")
-            return []
+            except Exception as e:
+                logger.error(f"Error listing sites on {network_id}: {str(e)}")
+                return []
+        
+        async with httpx.AsyncClient() as client:
+            results = await asyncio.gather(*(
+                list_network(client, network_id) for network_id in self.networks
+            ))
+        return [site for sites in results for site in sites]
     
-    async def delete_site(self, site_id: int) -> bool:
-        """Delete a site from the multisite network"""
+    async def delete_site(self, site_id: int, network_id: Optional[str] = None) -> bool:
+        """Delete a site from the multisite network it is placed on"""
         
         try:
+            network = self._wpcli_network(site_id, network_id)
             # Use WP-CLI to delete site (safer than API)
-            result = subprocess.run(
-                ["docker", "exec", "kenzysites-wpcli", 
-                 "wp", "site", "delete", str(site_id), 
-                 "--yes", "--allow-root"],
+            result = await asyncio.to_thread(
+                subprocess.run,
+                self._wpcli_command(network, "site", "delete", str(site_id), "--yes"),
                 capture_output=True,
                 text=True
             )
             
             if result.returncode == 0:
-                logger.info(f"✅ Site {site_id} deleted successfully")
+                logger.info(f"✅ Site {site_id} deleted from network {network.network_id}")
+                tenant = self.placement.find_tenant(site_id=site_id)
+                if tenant is not None and tenant.host_id == network.network_id:
+                    self.placement.release(tenant.tenant_id)
+                    self._save_placement()
                 return True
             else:
                 logger.error(f"Failed to delete site: {result.stderr}")
@@ -739,15 +870,15 @@ class WordPressMultisiteManager:
             logger.error(f"Error deleting site: {str(e)}")
             return False
     
-    async def export_site(self, site_id: int) -> Optional[bytes]:
+    async def export_site(self, site_id: int, network_id: Optional[str] = None) -> Optional[bytes]:
         """Export a site as a WordPress export file"""
         
         try:
+            network = self._wpcli_network(site_id, network_id)
             # Use WP-CLI to export
-            result = subprocess.run(
-                ["docker", "exec", "kenzysites-wpcli",
-                 "wp", f"--url={site_id}", "export",
-                 "--stdout", "--allow-root"],
+            result = await asyncio.to_thread(
+                subprocess.run,
+                self._wpcli_command(network, f"--url={site_id}", "export", "--stdout"),
                 capture_output=True
             )
             
@@ -837,5 +968,17 @@ class WordPressMultisiteManager:
         return variations
 
 
+def _networks_from_env() -> Optional[List[MultisiteConfig]]:
+    """MULTISITE_NETWORKS: JSON list of MultisiteConfig fields, one per network"""
+    raw = os.getenv("MULTISITE_NETWORKS", "")
+    if not raw:
+        return None
+    try:
+        return [MultisiteConfig(**network) for network in json.loads(raw)]
+    except Exception as e:
+        logger.error(f"Invalid MULTISITE_NETWORKS: {str(e)}")
+        return None
+
+
 # Global instance
-wordpress_multisite_manager = WordPressMultisiteManager()
\ No newline at end of file
+wordpress_multisite_manager = WordPressMultisiteManager(networks=_networks_from_env())
\ No newline at end of file
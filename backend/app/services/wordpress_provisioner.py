@@ -9,28 +9,56 @@ import secrets
 import string
 from typing import Dict, Any, Optional, List
 from datetime import datetime
-import subprocess
 import yaml
 import json
 import os
+from contextlib import contextmanager
 from pathlib import Path
 
 from kubernetes import client, config
 from kubernetes.client.rest import ApiException
 
+from app.services.command_runner import command_runner
+from app.services.process_lock import release_leader_lock
+from app.services.provisioning_graph import (
+    ProvisioningCheckpointStore,
+    ProvisioningGraph,
+    Stage,
+    StageGraphError,
+    StageGraphRunner
+)
+from app.services.readiness import KubernetesReadinessWaiter
+
 logger = logging.getLogger(__name__)
 
+class ProvisioningInProgress(Exception):
+    """Another process holds the run's lock"""
+
 class WordPressProvisioner:
     """
     Handles real WordPress provisioning using Kubernetes
     """
     
+    # Industry-specific plugins
+    INDUSTRY_PLUGINS = {
+        "restaurante": ["restaurant-menu", "wp-reservation"],
+        "saude": ["bookly", "medical-history"],
+        "ecommerce": ["woocommerce", "woocommerce-pagseguro"],
+        "educacao": ["learnpress", "wp-courseware"],
+        "imobiliaria": ["estatik", "property-listings"],
+    }
+    
     def __init__(self):
         self.k8s_config_loaded = False
         self.v1 = None
         self.apps_v1 = None
         self.networking_v1 = None
+        self.readiness = None
         self.templates_path = Path("/home/douglaskenzy/workspace/kenzysites/kubernetes")
+        self.checkpoints = ProvisioningCheckpointStore(
+            Path(os.getenv("PROVISIONING_STATE_DIR", "/tmp/kenzysites/provisioning"))
+        )
+        self._resumed_runs: set = set()
         self._initialize_k8s()
     
     def _initialize_k8s(self):
@@ -52,6 +80,7 @@ class WordPressProvisioner:
             self.v1 = client.CoreV1Api()
             self.apps_v1 = client.AppsV1Api()
             self.networking_v1 = client.NetworkingV1Api()
+            self.readiness = KubernetesReadinessWaiter(self.apps_v1, self.v1)
     
     def generate_secure_password(self, length: int = 16) -> str:
         """Generate a secure random password"""
@@ -92,75 +121,187 @@ class WordPressProvisioner:
             "redis_password": self.generate_secure_password(16)
         }
         
+        params = {
+            "business_name": business_name,
+            "domain": domain,
+            "industry": industry,
+            "plan": plan,
+            "user_id": user_id,
+            "template_id": template_id,
+            "acf_config": acf_config,
+            "credentials": credentials
+        }
+        with self._run_lock(client_id):
+            return await self._run_provisioning(client_id, params)
+    
+    async def resume_provisioning(self, client_id: str) -> Dict[str, Any]:
+        """Resume a provisioning run that crashed, skipping completed stages"""
+        
+        with self._run_lock(client_id):
+            # Loaded under the lock: the run may have finished since it was listed
+            state = self.checkpoints.load(client_id)
+            if state is None:
+                raise ValueError(f"No provisioning checkpoint for client {client_id}")
+            if state.get("status") == "completed":
+                raise ValueError(f"Provisioning for client {client_id} already completed")
+            return await self._run_provisioning(client_id, state["params"])
+    
+    def pending_provisioning_runs(self) -> List[str]:
+        """Client ids whose provisioning was interrupted mid-run"""
+        return self.checkpoints.pending_runs()
+    
+    async def resume_interrupted_provisioning(self) -> List[str]:
+        """
+        Resume every interrupted run in the background (called at startup)
+        
+        Runs that another worker is running or resuming are skipped. Returns
+        the client ids found pending.
+        """
+        
+        pending = self.pending_provisioning_runs()
+        for client_id in pending:
+            task = asyncio.create_task(self._resume_in_background(client_id))
+            self._resumed_runs.add(task)
+            task.add_done_callback(self._resumed_runs.discard)
+        if pending:
+            logger.info(f"Resuming {len(pending)} interrupted provisioning runs")
+        return pending
+    
+    async def _resume_in_background(self, client_id: str):
         try:
-            # Step 1: Create namespace
-            namespace = await self._create_namespace(client_id)
-            
-            # Step 2: Create secrets
-            await self._create_secrets(client_id, credentials)
-            
-            # Step 3: Create ConfigMaps
-            await self._create_configmaps(client_id, domain)
-            
-            # Step 4: Deploy MySQL
-            await self._deploy_mysql(client_id, credentials)
-            
-            # Step 5: Wait for MySQL to be ready
-            await self._wait_for_mysql(client_id)
-            
-            # Step 6: Deploy WordPress
-            await self._deploy_wordpress(client_id, domain, credentials)
-            
-            # Step 7: Wait for WordPress to be ready
-            await self._wait_for_wordpress(client_id)
-            
-            # Step 8: Configure ingress
-            await self._configure_ingress(client_id, domain)
-            
-            # Step 9: Install WordPress via WP-CLI
-            await self._install_wordpress(client_id, domain, credentials)
-            
-            # Step 10: Install and configure plugins
-            await self._configure_plugins(client_id, industry, plan)
-            
-            # Step 11: Configure ACF if provided
-            if acf_config:
-                await self._configure_acf(client_id, acf_config)
-            
-            # Step 12: Apply template if provided
-            if template_id:
-                await self._apply_template(client_id, template_id)
-            
-            # Step 13: Set up automated backups
-            await self._setup_backups(client_id)
-            
-            # Step 14: Configure monitoring
-            await self._setup_monitoring(client_id)
-            
-            return {
-                "success": True,
-                "client_id": client_id,
-                "domain": domain,
-                "status": "active",
-                "credentials": {
-                    "wp_admin_url": f"https://{domain}/wp-admin",
-                    "wp_admin_user": credentials["wp_admin_user"],
-                    "wp_admin_password": credentials["wp_admin_password"],
-                    "wp_admin_email": credentials["wp_admin_email"]
-                },
-                "infrastructure": {
-                    "namespace": f"client-{client_id}",
-                    "mysql_host": f"mysql-{client_id}",
-                    "redis_host": f"redis-{client_id}"
-                },
-                "created_at": datetime.now().isoformat()
-            }
-            
+            await self.resume_provisioning(client_id)
+        except ProvisioningInProgress:
+            logger.info(f"Provisioning for {client_id} is being run by another worker")
         except Exception as e:
-            logger.error(f"Provisioning failed for {client_id}: {str(e)}")
-            # Cleanup on failure
-            await self._cleanup_failed_provisioning(client_id)
-            raise
+            logger.error(f"Resuming provisioning for {client_id} failed: {str(e)}")
+    
+    async def stop_resumed_provisioning(self):
+        """Cancel background resumes; their checkpoints are resumed on the next start"""
+        
+        for task in list(self._resumed_runs):
+            task.cancel()
+        await asyncio.gather(*self._resumed_runs, return_exceptions=True)
+    
+    @contextmanager
+    def _run_lock(self, client_id: str):
+        """Hold the run's lock for the duration of a provisioning run"""
+        
+        lock = self.checkpoints.lock(client_id)
+        if lock is None:
+            raise ProvisioningInProgress(f"Provisioning for client {client_id} is already running")
+        try:
+            yield
+        finally:
+            release_leader_lock(lock)
+    
+    def _build_stage_graph(self, client_id: str, params: Dict[str, Any]) -> ProvisioningGraph:
+        """
+        Provisioning stages and their dependencies
+        
+        WordPress is deployed while MySQL is still starting, and ingress,
+        backups and monitoring only need the namespace, so they overlap
+        with the readiness waits and the WP-CLI install.
+        """
+        domain = params["domain"]
+        credentials = params["credentials"]
+        namespace = f"client-{client_id}"
+        
+        stages = [
+            Stage("namespace", lambda: self._create_namespace(client_id),
+                  rollback=lambda: self._delete_quietly("delete_namespace", namespace)),
+            Stage("secrets", lambda: self._create_secrets(client_id, credentials), ["namespace"]),
+            Stage("configmaps", lambda: self._create_configmaps(client_id, domain), ["namespace"]),
+            Stage("mysql_deploy", lambda: self._deploy_mysql(client_id, credentials), ["secrets"],
+                  rollback=lambda: self._delete_quietly(
+                      "delete_namespaced_deployment", f"mysql-{client_id}", namespace, api="apps_v1"
+                  )),
+            Stage("mysql_ready", lambda: self._wait_for_mysql(client_id), ["mysql_deploy"]),
+            Stage("wordpress_deploy", lambda: self._deploy_wordpress(client_id, domain, credentials),
+                  ["secrets", "configmaps", "mysql_deploy"],
+                  rollback=lambda: self._delete_quietly(
+                      "delete_namespaced_deployment", f"wordpress-{client_id}", namespace, api="apps_v1"
+                  )),
+            Stage("wordpress_ready", lambda: self._wait_for_wordpress(client_id),
+                  ["wordpress_deploy", "mysql_ready"]),
+            Stage("ingress", lambda: self._configure_ingress(client_id, domain), ["namespace"],
+                  rollback=lambda: self._delete_quietly(
+                      "delete_namespaced_ingress", f"wordpress-{client_id}", namespace, api="networking_v1"
+                  )),
+            Stage("wordpress_install", lambda: self._install_wordpress(client_id, domain, credentials),
+                  ["wordpress_ready"]),
+            Stage("plugins", lambda: self._configure_plugins(client_id, params["industry"], params["plan"]),
+                  ["wordpress_install"]),
+            Stage("backups", lambda: self._setup_backups(client_id), ["namespace"]),
+            Stage("monitoring", lambda: self._setup_monitoring(client_id), ["namespace"])
+        ]
+        last_content_stage = "plugins"
+        if params.get("acf_config"):
+            stages.append(Stage("acf", lambda: self._configure_acf(client_id, params["acf_config"]), ["plugins"]))
+            last_content_stage = "acf"
+        if params.get("template_id"):
+            stages.append(Stage("template", lambda: self._apply_template(client_id, params["template_id"]),
+                                [last_content_stage]))
+        return ProvisioningGraph(stages)
+    
+    async def _run_provisioning(self, client_id: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Run (or resume) the stage graph for one client"""
+        
+        domain = params["domain"]
+        credentials = params["credentials"]
+        runner = StageGraphRunner(
+            self._build_stage_graph(client_id, params),
+            store=self.checkpoints
+        )
+        
+        try:
+            state = await runner.run(client_id, params)
+        except StageGraphError as e:
+            logger.error(
+                f"Provisioning failed for {client_id} at stage {e.stage}: {str(e.error)} "
+                f"(rolled back: {', '.join(e.rolled_back) or 'nothing'}; {runner.timer.summary()})"
+            )
+            # Rolled back, nothing to resume; the checkpoint only holds credentials now
+            self.checkpoints.delete(client_id)
+            raise e.error
+        self.checkpoints.delete(client_id)
+        
+        logger.info(
+            f"Provisioned {client_id} in {runner.timer.total_seconds:.1f}s "
+            f"(critical path: {' -> '.join(state['critical_path'])}; {runner.timer.summary()})"
+        )
+        
+        return {
+            "success": True,
+            "client_id": client_id,
+            "domain": domain,
+            "status": "active",
+            "credentials": {
+                "wp_admin_url": f"https://{domain}/wp-admin",
+                "wp_admin_user": credentials["wp_admin_user"],
+                "wp_admin_password": credentials["wp_admin_password"],
+                "wp_admin_email": credentials["wp_admin_email"]
+            },
+            "infrastructure": {
+                "namespace": f"client-{client_id}",
+                "mysql_host": f"mysql-{client_id}",
+                "redis_host": f"redis-{client_id}"
+            },
+            "timings": {**runner.timer.to_dict(), "critical_path": state["critical_path"]},
+            "created_at": datetime.now().isoformat()
+        }
+    
+    async def _delete_quietly(self, method: str, *args, api: str = "v1"):
+        """Delete a Kubernetes object, treating 'not found' as success"""
+        
+        if not self.k8s_config_loaded:
+            logger.info(f"[DEV MODE] Would {method} {args[0]}")
+            return
+        
+        try:
+            await asyncio.to_thread(getattr(getattr(self, api), method), *args)
+        except ApiException as e:
+            if e.status != 404:
+                raise
     
     async def _create_namespace(self, client_id: str) -> str:
         """Create Kubernetes namespace for client"""
@@ -182,7 +323,7 @@ class WordPressProvisioner:
         )
         
         try:
-            self.v1.create_namespace(namespace)
+            await asyncio.to_thread(self.v1.create_namespace, namespace)
             logger.info(f"Created namespace: {namespace_name}")
         except ApiException as e:
             if e.status == 409:  # Already exists
@@ -228,13 +369,35 @@ class WordPressProvisioner:
         )
         
         try:
-            self.v1.create_namespaced_secret(namespace, mysql_secret)
-            self.v1.create_namespaced_secret(namespace, wp_secret)
+            await asyncio.to_thread(self.v1.create_namespaced_secret, namespace, mysql_secret)
+            await asyncio.to_thread(self.v1.create_namespaced_secret, namespace, wp_secret)
             logger.info(f"Created secrets for client: {client_id}")
         except ApiException as e:
             if e.status != 409:  # Ignore if already exists
                 raise
     
+    async def _update_wordpress_secret(self, client_id: str, credentials: Dict):
+        """Replace the WordPress admin credentials stored in the client's secret"""
+        
+        if not self.k8s_config_loaded:
+            logger.info(f"[DEV MODE] Would update WordPress secret for client: {client_id}")
+            return
+        
+        body = {
+            "stringData": {
+                "admin-user": credentials["wp_admin_user"],
+                "admin-password": credentials["wp_admin_password"],
+                "admin-email": credentials["wp_admin_email"]
+            }
+        }
+        await asyncio.to_thread(
+            self.v1.patch_namespaced_secret,
+            f"wordpress-{client_id}-secret",
+            f"client-{client_id}",
+            body
+        )
+        logger.info(f"Updated WordPress secret for client: {client_id}")
+    
     async def _create_configmaps(self, client_id: str, domain: str):
         """Create ConfigMaps for nginx and other configurations"""
         
@@ -262,7 +425,7 @@ class WordPressProvisioner:
         )
         
         try:
-            self.v1.create_namespaced_config_map(namespace, configmap)
+            await asyncio.to_thread(self.v1.create_namespaced_config_map, namespace, configmap)
             logger.info(f"Created nginx configmap for client: {client_id}")
         except ApiException as e:
             if e.status != 409:
@@ -292,11 +455,11 @@ class WordPressProvisioner:
             # Apply based on kind
             try:
                 if manifest['kind'] == 'Deployment':
-                    self.apps_v1.create_namespaced_deployment(namespace, manifest)
+                    await asyncio.to_thread(self.apps_v1.create_namespaced_deployment, namespace, manifest)
                 elif manifest['kind'] == 'PersistentVolumeClaim':
-                    self.v1.create_namespaced_persistent_volume_claim(namespace, manifest)
+                    await asyncio.to_thread(self.v1.create_namespaced_persistent_volume_claim, namespace, manifest)
                 elif manifest['kind'] == 'Service':
-                    self.v1.create_namespaced_service(namespace, manifest)
+                    await asyncio.to_thread(self.v1.create_namespaced_service, namespace, manifest)
                 
                 logger.info(f"Created MySQL {manifest['kind']} for client: {client_id}")
             except ApiException as e:
@@ -312,22 +475,16 @@ class WordPressProvisioner:
             return
         
         namespace = f"client-{client_id}"
-        deployment_name = f"mysql-{client_id}"
-        
-        start_time = asyncio.get_event_loop().time()
-        
-        while asyncio.get_event_loop().time() - start_time < timeout:
-            try:
-                deployment = self.apps_v1.read_namespaced_deployment(deployment_name, namespace)
-                if deployment.status.ready_replicas and deployment.status.ready_replicas > 0:
-                    logger.info(f"MySQL is ready for client: {client_id}")
-                    return
-            except:
-                pass
-            
-            await asyncio.sleep(5)
         
-        raise TimeoutError(f"MySQL not ready after {timeout} seconds")
+        # Watch the deployment and its pods; fails fast on CrashLoopBackOff
+        # or image pull errors instead of waiting out the timeout
+        await self.readiness.wait_for_deployment(
+            namespace,
+            f"mysql-{client_id}",
+            timeout=timeout,
+            label_selector=f"app=mysql,client={client_id}"
+        )
+        logger.info(f"MySQL is ready for client: {client_id}")
     
     async def _deploy_wordpress(self, client_id: str, domain: str, credentials: Dict):
         """Deploy WordPress with nginx and Redis"""
@@ -354,9 +511,9 @@ class WordPressProvisioner:
             # Apply based on kind
             try:
                 if manifest['kind'] == 'Deployment':
-                    self.apps_v1.create_namespaced_deployment(namespace, manifest)
+                    await asyncio.to_thread(self.apps_v1.create_namespaced_deployment, namespace, manifest)
                 elif manifest['kind'] == 'PersistentVolumeClaim':
-                    self.v1.create_namespaced_persistent_volume_claim(namespace, manifest)
+                    await asyncio.to_thread(self.v1.create_namespaced_persistent_volume_claim, namespace, manifest)
                 
                 logger.info(f"Created WordPress {manifest['kind']} for client: {client_id}")
             except ApiException as e:
@@ -372,25 +529,19 @@ class WordPressProvisioner:
             return
         
         namespace = f"client-{client_id}"
-        deployment_name = f"wordpress-{client_id}"
-        
-        start_time = asyncio.get_event_loop().time()
-        
-        while asyncio.get_event_loop().time() - start_time < timeout:
-            try:
-                deployment = self.apps_v1.read_namespaced_deployment(deployment_name, namespace)
-                if deployment.status.ready_replicas and deployment.status.ready_replicas > 0:
-                    logger.info(f"WordPress is ready for client: {client_id}")
-                    return
-            except:
-                pass
-            
-            await asyncio.sleep(5)
         
-        raise TimeoutError(f"WordPress not ready after {timeout} seconds")
+        # Watch the deployment and its pods; fails fast on CrashLoopBackOff
+        # or image pull errors instead of waiting out the timeout
+        await self.readiness.wait_for_deployment(
+            namespace,
+            f"wordpress-{client_id}",
+            timeout=timeout,
+            label_selector=f"app=wordpress,client={client_id}"
+        )
+        logger.info(f"WordPress is ready for client: {client_id}")
     
-    async def _configure_ingress(self, client_id: str, domain: str):
-        """Configure ingress for WordPress"""
+    async def _configure_ingress(self, client_id: str, domain: str, replace: bool = False):
+        """Configure ingress for WordPress (replace=True repoints an existing one)"""
         
         if not self.k8s_config_loaded:
             logger.info(f"[DEV MODE] Would configure ingress for domain: {domain}")
@@ -411,8 +562,15 @@ class WordPressProvisioner:
         
         try:
             namespace = f"client-{client_id}"
-            self.networking_v1.create_namespaced_ingress(namespace, ingress_manifest)
-            logger.info(f"Created ingress for domain: {domain}")
+            if replace:
+                await asyncio.to_thread(
+                    self.networking_v1.replace_namespaced_ingress,
+                    f"wordpress-{client_id}", namespace, ingress_manifest
+                )
+                logger.info(f"Repointed ingress to domain: {domain}")
+            else:
+                await asyncio.to_thread(self.networking_v1.create_namespaced_ingress, namespace, ingress_manifest)
+                logger.info(f"Created ingress for domain: {domain}")
         except ApiException as e:
             if e.status != 409:
                 raise
@@ -490,15 +648,6 @@ class WordPressProvisioner:
             "w3-total-cache",  # Performance
         ]
         
-        # Industry-specific plugins
-        industry_plugins = {
-            "restaurante": ["restaurant-menu", "wp-reservation"],
-            "saude": ["bookly", "medical-history"],
-            "ecommerce": ["woocommerce", "woocommerce-pagseguro"],
-            "educacao": ["learnpress", "wp-courseware"],
-            "imobiliaria": ["estatik", "property-listings"],
-        }
-        
         # Plan-specific plugins
         plan_plugins = {
             "professional": ["google-analytics-for-wordpress", "mailchimp-for-wp"],
@@ -508,7 +657,7 @@ class WordPressProvisioner:
         
         # Combine all plugins
         plugins_to_install = essential_plugins
-        plugins_to_install.extend(industry_plugins.get(industry.lower(), []))
+        plugins_to_install.extend(self.INDUSTRY_PLUGINS.get(industry.lower(), []))
         plugins_to_install.extend(plan_plugins.get(plan.lower(), []))
         
         # Install plugins
@@ -605,7 +754,7 @@ class WordPressProvisioner:
         # Create the CronJob
         batch_v1 = client.BatchV1Api()
         try:
-            batch_v1.create_namespaced_cron_job(f"client-{client_id}", backup_cronjob)
+            await asyncio.to_thread(batch_v1.create_namespaced_cron_job, f"client-{client_id}", backup_cronjob)
             logger.info(f"Created backup CronJob for client: {client_id}")
         except ApiException as e:
             if e.status != 409:
@@ -654,7 +803,8 @@ class WordPressProvisioner:
             return f"wordpress-{client_id}-mock-pod"
         
         namespace = f"client-{client_id}"
-        pods = self.v1.list_namespaced_pod(
+        pods = await asyncio.to_thread(
+            self.v1.list_namespaced_pod,
             namespace,
             label_selector=f"app=wordpress,client={client_id}"
         )
@@ -671,38 +821,21 @@ class WordPressProvisioner:
             logger.info(f"[DEV MODE] Would execute in pod: {command}")
             return
         
-        # This would use the Kubernetes exec API
-        # For now, we'll use subprocess as a placeholder
         kubectl_cmd = [
             "kubectl", "exec", "-n", namespace, pod_name,
             "--", "/bin/sh", "-c", command
         ]
         
         try:
-            result = subprocess.run(kubectl_cmd, capture_output=True, text=True)
-            if result.returncode != 0:
+            result = await command_runner.run(kubectl_cmd, target=f"{namespace}/{pod_name}")
+            if not result.ok:
                 raise Exception(f"Command failed: {result.stderr}")
-            logger.info(f"Executed command in pod: {command[:50]}...")
+            logger.info(f"Executed command in pod: {command[:50]}... ({result.duration:.1f}s)")
+            return result
         except Exception as e:
             logger.error(f"Failed to execute command: {str(e)}")
             raise
     
-    async def _cleanup_failed_provisioning(self, client_id: str):
-        """Cleanup resources if provisioning fails"""
-        
-        if not self.k8s_config_loaded:
-            logger.info(f"[DEV MODE] Would cleanup failed provisioning for client: {client_id}")
-            return
-        
-        namespace = f"client-{client_id}"
-        
-        try:
-            # Delete namespace (will delete all resources within it)
-            self.v1.delete_namespace(namespace)
-            logger.info(f"Cleaned up failed provisioning for client: {client_id}")
-        except:
-            pass
-    
     async def suspend_site(self, client_id: str):
         """Suspend a WordPress site (scale down to 0)"""
         
@@ -777,7 +910,7 @@ class WordPressProvisioner:
         
         try:
             # Delete the entire namespace
-            self.v1.delete_namespace(namespace)
+            await asyncio.to_thread(self.v1.delete_namespace, namespace)
             logger.info(f"Deleted site for client: {client_id}")
             
             return {
@@ -806,27 +939,29 @@ class WordPressProvisioner:
         namespace = f"client-{client_id}"
         
         try:
-            # Check WordPress deployment
-            wp_deployment = self.apps_v1.read_namespaced_deployment(
-                f"wordpress-{client_id}", namespace
-            )
-            
-            # Check MySQL deployment
-            mysql_deployment = self.apps_v1.read_namespaced_deployment(
-                f"mysql-{client_id}", namespace
+            # Check WordPress and MySQL deployments (blocking client calls)
+            wp_deployment, mysql_deployment = await asyncio.gather(
+                asyncio.to_thread(
+                    self.apps_v1.read_namespaced_deployment, f"wordpress-{client_id}", namespace
+                ),
+                asyncio.to_thread(
+                    self.apps_v1.read_namespaced_deployment, f"mysql-{client_id}", namespace
+                )
             )
+            wp_ready = wp_deployment.status.ready_replicas or 0
+            mysql_ready = mysql_deployment.status.ready_replicas or 0
             
             return {
                 "client_id": client_id,
-                "status": "active" if wp_deployment.status.ready_replicas > 0 else "suspended",
+                "status": "active" if wp_ready > 0 else "suspended",
                 "wordpress": {
-                    "ready": wp_deployment.status.ready_replicas > 0,
-                    "replicas": wp_deployment.status.ready_replicas or 0,
+                    "ready": wp_ready > 0,
+                    "replicas": wp_ready,
                     "available": wp_deployment.status.available_replicas or 0
                 },
                 "mysql": {
-                    "ready": mysql_deployment.status.ready_replicas > 0,
-                    "replicas": mysql_deployment.status.ready_replicas or 0
+                    "ready": mysql_ready > 0,
+                    "replicas": mysql_ready
                 },
                 "created": wp_deployment.metadata.creation_timestamp.isoformat()
             }
@@ -6,12 +6,12 @@ Automated WordPress site deployment and configuration
 import os
 import asyncio
 import logging
-import subprocess
+import shlex
 import json
 import yaml
 import shutil
 from pathlib import Path
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Callable, Awaitable
 from datetime import datetime
 import aiohttp
 import aioftp
@@ -19,6 +19,9 @@ import paramiko
 import mysql.connector
 from jinja2 import Template
 
+from app.services.command_runner import command_runner
+from app.services.readiness import ReadinessError, StageTimer, http_probe, wait_with_backoff
+
 logger = logging.getLogger(__name__)
 
 class DeploymentMethod:
@@ -89,27 +92,24 @@ class WordPressProvisionerV2:
         
         logger.info(f"🚀 Starting WordPress provisioning for {site_id}")
         start_time = datetime.now()
+        timer = StageTimer()
+        
+        if deployment_config and deployment_config.get("http_port"):
+            # Lets several local Docker sites (e.g. a warm pool) run side by side
+            site_data = {**site_data, "http_port": deployment_config["http_port"]}
         
         try:
             # Prepare site package
-            site_package = await self._prepare_site_package(site_id, site_data)
+            with timer.stage("package"):
+                site_package = await self._prepare_site_package(site_id, site_data)
             
             # Deploy based on method
-            if deployment_method == DeploymentMethod.LOCAL_DOCKER:
-                result = await self._deploy_local_docker(site_id, site_package)
-            elif deployment_method == DeploymentMethod.FTP:
-                result = await self._deploy_ftp(site_id, site_package, deployment_config)
-            elif deployment_method == DeploymentMethod.SSH:
-                result = await self._deploy_ssh(site_id, site_package, deployment_config)
-            elif deployment_method == DeploymentMethod.MANAGED_HOSTING:
-                result = await self._deploy_managed_hosting(site_id, site_package, deployment_config)
-            elif deployment_method == DeploymentMethod.KUBERNETES:
-                result = await self._deploy_kubernetes(site_id, site_package, deployment_config)
-            else:
-                raise ValueError(f"Unknown deployment method: {deployment_method}")
+            with timer.stage(f"deploy_{deployment_method}"):
+                result = await self._deploy(site_id, site_package, deployment_method, deployment_config)
             
             # Post-deployment configuration
-            await self._configure_wordpress(result["url"], site_data)
+            with timer.stage("configure"):
+                await self._configure_wordpress(result["url"], site_data)
             
             # Calculate deployment time
             deployment_time = (datetime.now() - start_time).total_seconds()
@@ -118,16 +118,41 @@ class WordPressProvisionerV2:
                 "deployment_time": deployment_time,
                 "deployment_method": deployment_method,
                 "site_id": site_id,
+                "timings": timer.to_dict(),
                 "deployed_at": datetime.now().isoformat()
             })
             
-            logger.info(f"✅ WordPress site provisioned in {deployment_time:.2f}s")
+            logger.info(f"✅ WordPress site provisioned in {deployment_time:.2f}s ({timer.summary()})")
             return result
             
         except Exception as e:
-            logger.error(f"❌ Provisioning failed: {str(e)}")
+            logger.error(f"❌ Provisioning failed: {str(e)} ({timer.summary()})")
             raise
     
+    async def _deploy(
+        self,
+        site_id: str,
+        site_package: Path,
+        deployment_method: str,
+        deployment_config: Optional[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Dispatch to the deployment method"""
+        
+        if deployment_method == DeploymentMethod.LOCAL_DOCKER:
+            return await self._deploy_local_docker(
+                site_id, site_package, (deployment_config or {}).get("http_port", 8080)
+            )
+        elif deployment_method == DeploymentMethod.FTP:
+            return await self._deploy_ftp(site_id, site_package, deployment_config)
+        elif deployment_method == DeploymentMethod.SSH:
+            return await self._deploy_ssh(site_id, site_package, deployment_config)
+        elif deployment_method == DeploymentMethod.MANAGED_HOSTING:
+            return await self._deploy_managed_hosting(site_id, site_package, deployment_config)
+        elif deployment_method == DeploymentMethod.KUBERNETES:
+            return await self._deploy_kubernetes(site_id, site_package, deployment_config)
+        else:
+            raise ValueError(f"Unknown deployment method: {deployment_method}")
+    
     async def _prepare_site_package(
         self,
         site_id: str,
@@ -177,36 +202,40 @@ class WordPressProvisionerV2:
     async def _deploy_local_docker(
         self,
         site_id: str,
-        package_dir: Path
+        package_dir: Path,
+        port: int = 8080
     ) -> Dict[str, Any]:
         """Deploy site using local Docker"""
         
         logger.info("🐳 Deploying with Docker...")
+        site_url = f"http://localhost:{port}"
         
         # Stop existing containers if any
-        subprocess.run(
+        await command_runner.run(
             ["docker-compose", "down"],
             cwd=package_dir,
-            capture_output=True
+            target=f"docker:{site_id}"
         )
         
         # Start new containers
-        result = subprocess.run(
+        result = await command_runner.run(
             ["docker-compose", "up", "-d"],
             cwd=package_dir,
-            capture_output=True,
-            text=True
+            target=f"docker:{site_id}"
         )
         
-        if result.returncode != 0:
+        if not result.ok:
             raise Exception(f"Docker deployment failed: {result.stderr}")
         
         # Wait for WordPress to be ready
-        await self._wait_for_wordpress("http://localhost:8080")
+        await self._wait_for_wordpress(
+            site_url,
+            failure_check=lambda: self._docker_failure(package_dir)
+        )
         
         # Run WordPress CLI commands
         wp_commands = [
-            "core install --url=http://localhost:8080 --title='KenzySites' --admin_user=admin --admin_password=admin123 --admin_email=admin@kenzysites.com",
+            f"core install --url={site_url} --title='KenzySites' --admin_user=admin --admin_password=admin123 --admin_email=admin@kenzysites.com",
             "theme activate kenzysites-" + site_id,
             "plugin activate elementor",
             "plugin activate advanced-custom-fields",
@@ -217,15 +246,17 @@ class WordPressProvisionerV2:
         ]
         
         for cmd in wp_commands:
-            subprocess.run(
-                ["docker-compose", "exec", "-T", "wordpress", "wp", "--allow-root"] + cmd.split(),
+            result = await command_runner.run(
+                ["docker-compose", "exec", "-T", "wordpress", "wp", "--allow-root"] + shlex.split(cmd),
                 cwd=package_dir,
-                capture_output=True
+                target=f"docker:{site_id}"
             )
+            if not result.ok:
+                logger.warning(f"WP-CLI command failed ({cmd}): {result.stderr.strip()}")
         
         return {
-            "url": "http://localhost:8080",
-            "admin_url": "http://localhost:8080/wp-admin",
+            "url": site_url,
+            "admin_url": f"{site_url}/wp-admin",
             "admin_user": "admin",
             "admin_password": "admin123",
             "deployment_path": str(package_dir)
@@ -413,26 +444,25 @@ class WordPressProvisionerV2:
             manifest_file = package_dir / f"{manifest['name']}.yaml"
             manifest_file.write_text(yaml.dump(manifest['content']))
             
-            result = subprocess.run(
+            result = await command_runner.run(
                 ["kubectl", "apply", "-f", str(manifest_file)],
-                capture_output=True,
-                text=True
+                target=f"k8s:{site_id}"
             )
             
-            if result.returncode != 0:
+            if not result.ok:
                 raise Exception(f"Kubernetes deployment failed: {result.stderr}")
         
         # Wait for deployment to be ready
-        subprocess.run(
+        await command_runner.run(
             ["kubectl", "wait", "--for=condition=available", f"deployment/wordpress-{site_id}", "--timeout=300s"],
-            capture_output=True
+            target=f"k8s:{site_id}",
+            timeout=330
         )
         
         # Get service URL
-        result = subprocess.run(
+        result = await command_runner.run(
             ["kubectl", "get", f"service/wordpress-{site_id}", "-o", "jsonpath='{.status.loadBalancer.ingress[0].ip}'"],
-            capture_output=True,
-            text=True
+            target=f"k8s:{site_id}"
         )
         
         service_ip = result.stdout.strip().replace("'", "")
@@ -476,24 +506,57 @@ class WordPressProvisionerV2:
             except:
                 logger.warning("Could not update settings via API")
     
-    async def _wait_for_wordpress(self, url: str, timeout: int = 60):
-        """Wait for WordPress to be accessible"""
+    async def _wait_for_wordpress(
+        self,
+        url: str,
+        timeout: int = 60,
+        failure_check: Optional[Callable[[], Awaitable[Optional[str]]]] = None
+    ):
+        """
+        Wait for WordPress to be accessible
         
-        start_time = datetime.now()
+        Probes with exponential backoff; failure_check, when given, runs
+        after each unsuccessful probe and aborts the wait on a fatal state.
+        """
         
         async with aiohttp.ClientSession() as session:
-            while (datetime.now() - start_time).total_seconds() < timeout:
+            check_http = http_probe(session, url)
+            
+            async def probe() -> bool:
                 try:
-                    async with session.get(url) as response:
-                        if response.status == 200:
-                            logger.info(f"✅ WordPress is accessible at {url}")
-                            return
-                except:
+                    if await check_http():
+                        return True
+                except aiohttp.ClientError:
                     pass
-                
-                await asyncio.sleep(2)
+                if failure_check is not None:
+                    reason = await failure_check()
+                    if reason:
+                        raise ReadinessError(url, reason)
+                return False
+            
+            waited = await wait_with_backoff(probe, f"WordPress at {url}", timeout=timeout)
+            logger.info(f"✅ WordPress is accessible at {url} after {waited:.1f}s")
+    
+    async def _docker_failure(self, package_dir: Path, service: str = "wordpress") -> Optional[str]:
+        """Reason if the compose service container exited or keeps restarting"""
+        
+        ps = await command_runner.run(["docker-compose", "ps", "-q", service], cwd=package_dir, timeout=15)
+        container_id = ps.stdout.strip()
+        if not ps.ok or not container_id:
+            return None
         
-        raise TimeoutError(f"WordPress not accessible after {timeout} seconds")
+        inspect = await command_runner.run(
+            ["docker", "inspect", "-f", "{{.State.Status}} {{.RestartCount}} {{.State.ExitCode}}", container_id],
+            timeout=15
+        )
+        if not inspect.ok:
+            return None
+        status, restarts, exit_code = (inspect.stdout.split() + ["", "0", "0"])[:3]
+        if status in ("exited", "dead"):
+            return f"Container {service} {status} with code {exit_code}"
+        if int(restarts or 0) >= 3:
+            return f"Container {service} restarted {restarts} times"
+        return None
     
     def _generate_wp_config(self, site_data: Dict[str, Any]) -> str:
         """Generate wp-config.php file"""
@@ -564,6 +627,8 @@ require_once ABSPATH . 'wp-settings.php';
     def _generate_docker_compose(self, site_id: str, site_data: Dict[str, Any]) -> str:
         """Generate docker-compose.yml file"""
         
+        http_port = site_data.get("http_port", 8080)
+        
         return f"""version: '3.8'
 
 services:
@@ -571,7 +636,7 @@ services:
     image: wordpress:latest
     container_name: wp_{site_id}
     ports:
-      - "8080:80"
+      - "{http_port}:80"
     environment:
       WORDPRESS_DB_HOST: db
       WORDPRESS_DB_USER: wordpress
@@ -603,7 +668,7 @@ services:
     image: phpmyadmin:latest
     container_name: pma_{site_id}
     ports:
-      - "8081:80"
+      - "{http_port + 1}:80"
     environment:
       PMA_HOST: db
       PMA_USER: root
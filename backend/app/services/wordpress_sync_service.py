@@ -8,13 +8,15 @@ import logging
 import json
 import httpx
 from typing import Dict, Any, List, Optional, Callable
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 import hashlib
 import os
 from dataclasses import dataclass
 from enum import Enum
 
+from app.services.sync_queue import CoalescingQueue
+from app.services.wp_rest_pager import WordPressRESTPager
 from app.services.template_repository import template_repository
 from app.services.acf_integration import acf_service
 from app.models.template_models import TemplateDefinition, BRAZILIAN_INDUSTRIES
@@ -30,6 +32,13 @@ class SyncEventType(str, Enum):
     MEDIA_UPDATED = "media_updated"
     FULL_SYNC = "full_sync"
 
+# Event types a full template update (re-fetch of post + ACF) supersedes
+_PARTIAL_UPDATES = {
+    SyncEventType.TEMPLATE_UPDATED,
+    SyncEventType.ACF_UPDATED,
+    SyncEventType.MEDIA_UPDATED
+}
+
 @dataclass
 class SyncEvent:
     """Represents a sync event"""
@@ -40,6 +49,98 @@ class SyncEvent:
     processed: bool = False
     retry_count: int = 0
     error_message: Optional[str] = None
+    site_id: str = "master"
+    coalesced_count: int = 1
+    
+    @property
+    def coalesce_key(self):
+        """Events for the same site and object are merged while queued"""
+        return (self.site_id, self.template_id)
+    
+    def merge(self, newer: "SyncEvent") -> "SyncEvent":
+        """Combine this pending event with a newer one for the same object"""
+        if newer.event_type == SyncEventType.TEMPLATE_DELETED:
+            event_type = newer.event_type
+        elif self.event_type == SyncEventType.TEMPLATE_DELETED:
+            # Re-created after a delete: treat as a fresh create
+            event_type = SyncEventType.TEMPLATE_CREATED
+        elif self.event_type == SyncEventType.TEMPLATE_CREATED:
+            # The create handler fetches the full post, covering later edits
+            event_type = self.event_type
+        elif self.event_type == newer.event_type:
+            event_type = newer.event_type
+        elif {self.event_type, newer.event_type} <= _PARTIAL_UPDATES:
+            event_type = SyncEventType.TEMPLATE_UPDATED
+        else:
+            event_type = newer.event_type
+        
+        return SyncEvent(
+            event_type=event_type,
+            template_id=self.template_id,
+            data={**self.data, **newer.data},
+            timestamp=self.timestamp,
+            retry_count=self.retry_count,
+            error_message=self.error_message,
+            site_id=self.site_id,
+            coalesced_count=self.coalesced_count + newer.coalesced_count
+        )
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "event_type": self.event_type.value,
+            "template_id": self.template_id,
+            "data": self.data,
+            "timestamp": self.timestamp.isoformat(),
+            "retry_count": self.retry_count,
+            "error_message": self.error_message,
+            "site_id": self.site_id,
+            "coalesced_count": self.coalesced_count
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SyncEvent":
+        return cls(
+            event_type=SyncEventType(data["event_type"]),
+            template_id=data.get("template_id"),
+            data=data.get("data", {}),
+            timestamp=datetime.fromisoformat(data["timestamp"]),
+            retry_count=data.get("retry_count", 0),
+            error_message=data.get("error_message"),
+            site_id=data.get("site_id", "master"),
+            coalesced_count=data.get("coalesced_count", 1)
+        )
+
+class SyncCursorStore:
+    """
+    Per-site incremental sync cursors persisted as JSON
+    
+    Each site/resource keeps a `modified_after` watermark (UTC, ISO 8601).
+    """
+    
+    def __init__(self, path: Path):
+        self.path = path
+        self.cursors: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._load()
+    
+    def _load(self):
+        try:
+            if self.path.exists():
+                self.cursors = json.loads(self.path.read_text())
+        except Exception as e:
+            logger.error(f"Failed to load sync cursors: {str(e)}")
+            self.cursors = {}
+    
+    def get(self, site_id: str, resource: str) -> Dict[str, Any]:
+        return self.cursors.get(site_id, {}).get(resource, {})
+    
+    def update(self, site_id: str, resource: str, **values):
+        self.cursors.setdefault(site_id, {}).setdefault(resource, {}).update(values)
+        try:
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self.cursors, indent=2))
+            os.replace(tmp, self.path)
+        except Exception as e:
+            logger.error(f"Failed to persist sync cursors: {str(e)}")
 
 class WordPressSyncService:
     """
@@ -52,12 +153,32 @@ class WordPressSyncService:
         self.webhook_secret = os.getenv('WP_WEBHOOK_SECRET', 'your-secret-key')
         self.sync_interval = int(os.getenv('SYNC_INTERVAL_MINUTES', '30'))  # Default 30 minutes
         self.max_retries = int(os.getenv('SYNC_MAX_RETRIES', '3'))
+        self.page_concurrency = int(os.getenv('WP_SYNC_PAGE_CONCURRENCY', '4'))
+        # Re-read a small overlap so clock skew with WordPress never drops changes
+        self.cursor_overlap = timedelta(seconds=int(os.getenv('SYNC_CURSOR_OVERLAP_SECONDS', '60')))
+        
+        # Sites synced incrementally; the master is the only one configured today
+        self.sites: Dict[str, str] = {"master": self.wordpress_master_url}
+        cursor_path = Path(os.getenv('SYNC_CURSOR_PATH', str(template_repository.local_repository_path / "sync_cursors.json")))
+        self.cursor_store = SyncCursorStore(cursor_path)
+        self.sync_metrics: Dict[str, Dict[str, Any]] = {}
         
-        # Event queue for processing sync events
-        self.event_queue: List[SyncEvent] = []
+        # Event queue for processing sync events: coalesces bursts per object,
+        # retries with backoff and journals to disk. The journal is always on:
+        # a saved cursor would otherwise skip changes lost in a restart
+        self.event_queue = CoalescingQueue(
+            handler=self._process_sync_event,
+            coalesce_window=float(os.getenv('SYNC_COALESCE_MS', '500')) / 1000,
+            max_retries=self.max_retries,
+            backoff_base=float(os.getenv('SYNC_RETRY_BACKOFF_SECONDS', '2')),
+            workers=int(os.getenv('SYNC_WORKERS', '4')),
+            journal_path=os.getenv('SYNC_JOURNAL_PATH') or str(cursor_path.with_name("sync_journal.jsonl")),
+            item_factory=SyncEvent.from_dict
+        )
         self.webhook_handlers: Dict[str, Callable] = {}
         self.is_running = False
         self.last_full_sync = None
+        self._scheduled_task: Optional[asyncio.Task] = None
         
         # Register webhook handlers
         self._register_webhook_handlers()
@@ -82,8 +203,8 @@ class WordPressSyncService:
         logger.info("Starting WordPress sync service")
         
         # Start background tasks
-        asyncio.create_task(self._process_event_queue())
-        asyncio.create_task(self._scheduled_sync_task())
+        self.event_queue.start()
+        self._scheduled_task = asyncio.create_task(self._scheduled_sync_task())
         
         # Initial full sync if needed
         if not self.last_full_sync or (datetime.now() - self.last_full_sync) > timedelta(hours=24):
@@ -92,22 +213,12 @@ class WordPressSyncService:
     async def stop_sync_service(self):
         """Stop the background sync service"""
         self.is_running = False
+        if self._scheduled_task:
+            self._scheduled_task.cancel()
+            self._scheduled_task = None
+        await self.event_queue.stop()
         logger.info("WordPress sync service stopped")
     
-    async def _process_event_queue(self):
-        """Process sync events from the queue"""
-        while self.is_running:
-            try:
-                if self.event_queue:
-                    event = self.event_queue.pop(0)
-                    await self._process_sync_event(event)
-                else:
-                    await asyncio.sleep(1)  # Wait if queue is empty
-                    
-            except Exception as e:
-                logger.error(f"Error processing event queue: {str(e)}")
-                await asyncio.sleep(5)  # Wait before retrying
-    
     async def _scheduled_sync_task(self):
         """Periodic sync task"""
         while self.is_running:
@@ -120,36 +231,35 @@ class WordPressSyncService:
                 await asyncio.sleep(60)  # Wait before retrying
     
     async def _process_sync_event(self, event: SyncEvent):
-        """Process a single sync event"""
-        try:
-            logger.info(f"Processing sync event: {event.event_type} for template {event.template_id}")
-            
-            if event.event_type == SyncEventType.TEMPLATE_CREATED:
-                await self._sync_template_created(event.data)
-            elif event.event_type == SyncEventType.TEMPLATE_UPDATED:
-                await self._sync_template_updated(event.data)
-            elif event.event_type == SyncEventType.TEMPLATE_DELETED:
-                await self._sync_template_deleted(event.template_id)
-            elif event.event_type == SyncEventType.ACF_UPDATED:
-                await self._sync_acf_updated(event.template_id, event.data)
-            elif event.event_type == SyncEventType.MEDIA_UPDATED:
-                await self._sync_media_updated(event.template_id, event.data)
-            elif event.event_type == SyncEventType.FULL_SYNC:
-                await self._perform_full_sync()
-            
-            event.processed = True
-            logger.info(f"Successfully processed sync event: {event.event_type}")
-            
-        except Exception as e:
-            event.retry_count += 1
-            event.error_message = str(e)
-            
-            if event.retry_count < self.max_retries:
-                logger.warning(f"Event processing failed, retrying ({event.retry_count}/{self.max_retries}): {str(e)}")
-                # Re-queue for retry
-                self.event_queue.append(event)
-            else:
-                logger.error(f"Event processing failed after {self.max_retries} retries: {str(e)}")
+        """
+        Process a single sync event
+        
+        Failures propagate to the queue, which retries with backoff and
+        dead-letters the event after max_retries attempts.
+        """
+        logger.info(
+            f"Processing sync event: {event.event_type} for template {event.template_id}"
+            f" ({event.coalesced_count} coalesced)"
+        )
+        
+        # Webhooks carry post_id; coalesced partial updates may lack the id
+        template_data = {"id": event.template_id, **event.data}
+        
+        if event.event_type == SyncEventType.TEMPLATE_CREATED:
+            await self._sync_template_created(template_data)
+        elif event.event_type == SyncEventType.TEMPLATE_UPDATED:
+            await self._sync_template_updated(template_data)
+        elif event.event_type == SyncEventType.TEMPLATE_DELETED:
+            await self._sync_template_deleted(event.template_id)
+        elif event.event_type == SyncEventType.ACF_UPDATED:
+            await self._sync_acf_updated(event.template_id, event.data)
+        elif event.event_type == SyncEventType.MEDIA_UPDATED:
+            await self._sync_media_updated(event.template_id, event.data)
+        elif event.event_type == SyncEventType.FULL_SYNC:
+            await self._perform_full_sync()
+        
+        event.processed = True
+        logger.info(f"Successfully processed sync event: {event.event_type}")
     
     async def _sync_template_created(self, template_data: Dict[str, Any]):
         """Sync a newly created template"""
@@ -165,6 +275,8 @@ class WordPressSyncService:
                     logger.info(f"Template created: {template.id}")
                 else:
                     raise Exception("Failed to create template in repository")
+            else:
+                logger.warning(f"Template {template_data['id']} no longer exists in WordPress; skipping")
                     
         except Exception as e:
             logger.error(f"Error syncing created template: {str(e)}")
@@ -184,6 +296,8 @@ class WordPressSyncService:
                     logger.info(f"Template updated: {template.id}")
                 else:
                     raise Exception("Failed to update template in repository")
+            else:
+                logger.warning(f"Template {template_data['id']} no longer exists in WordPress; skipping")
                     
         except Exception as e:
             logger.error(f"Error syncing updated template: {str(e)}")
@@ -260,9 +374,15 @@ class WordPressSyncService:
         """Perform a full synchronization"""
         try:
             logger.info("Starting full sync with WordPress Master")
+            started = datetime.now(timezone.utc)
             result = await template_repository.sync_with_wordpress_master()
             
             self.last_full_sync = datetime.now()
+            if not result.get("error"):
+                # Incremental syncs continue from the start of this full sync
+                self.cursor_store.update(
+                    "master", "kz_template", modified_after=started.isoformat()
+                )
             
             logger.info(f"Full sync completed: {result}")
             
@@ -271,49 +391,44 @@ class WordPressSyncService:
             raise
     
     async def _fetch_template_from_wordpress(self, wp_template_id: str) -> Optional[Dict[str, Any]]:
-        """Fetch a single template from WordPress Master"""
-        try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                # Authenticate
-                auth_response = await client.post(
-                    f"{self.wordpress_master_url}/wp-json/jwt-auth/v1/token",
-                    json={
-                        "username": os.getenv('WP_MASTER_USER'),
-                        "password": os.getenv('WP_MASTER_PASSWORD')
-                    }
+        """
+        Fetch a single template from WordPress Master
+        
+        Returns None when the post does not exist (404); any other failure
+        raises, so the sync queue retries the event and dead-letters it
+        once retries run out.
+        """
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            headers = await self._auth_headers(client)
+            
+            # Fetch template
+            template_response = await client.get(
+                f"{self.wordpress_master_url}/wp-json/wp/v2/kz_template/{wp_template_id}",
+                headers=headers
+            )
+            
+            if template_response.status_code == 404:
+                return None
+            if template_response.status_code != 200:
+                raise Exception(
+                    f"Failed to fetch template {wp_template_id}: HTTP {template_response.status_code}"
                 )
-                
-                if auth_response.status_code != 200:
-                    raise Exception("Failed to authenticate with WordPress Master")
-                
-                token = auth_response.json().get('token')
-                headers = {"Authorization": f"Bearer {token}"}
-                
-                # Fetch template
-                template_response = await client.get(
-                    f"{self.wordpress_master_url}/wp-json/wp/v2/kz_template/{wp_template_id}",
-                    headers=headers
+            template_data = template_response.json()
+            
+            # Get ACF data
+            acf_response = await client.get(
+                f"{self.wordpress_master_url}/wp-json/acf/v3/posts/{wp_template_id}",
+                headers=headers
+            )
+            
+            if acf_response.status_code == 200:
+                template_data['acf_data'] = acf_response.json()
+            elif acf_response.status_code != 404:
+                raise Exception(
+                    f"Failed to fetch ACF data for template {wp_template_id}: HTTP {acf_response.status_code}"
                 )
-                
-                if template_response.status_code == 200:
-                    template_data = template_response.json()
-                    
-                    # Get ACF data
-                    acf_response = await client.get(
-                        f"{self.wordpress_master_url}/wp-json/acf/v3/posts/{wp_template_id}",
-                        headers=headers
-                    )
-                    
-                    if acf_response.status_code == 200:
-                        template_data['acf_data'] = acf_response.json()
-                    
-                    return template_data
-                
-                return None
-                
-        except Exception as e:
-            logger.error(f"Error fetching template {wp_template_id}: {str(e)}")
-            return None
+            
+            return template_data
     
     async def _process_wordpress_template(self, wp_template: Dict[str, Any]) -> TemplateDefinition:
         """Process WordPress template data into our format"""
@@ -348,10 +463,11 @@ class WordPressSyncService:
         event = SyncEvent(
             event_type=SyncEventType.TEMPLATE_CREATED,
             template_id=str(webhook_data.get('post_id')),
+            site_id=str(webhook_data.get('site_id', 'master')),
             data=webhook_data,
             timestamp=datetime.now()
         )
-        self.event_queue.append(event)
+        self.event_queue.put(event)
         logger.info(f"Queued template created event: {event.template_id}")
     
     async def _handle_template_updated(self, webhook_data: Dict[str, Any]):
@@ -359,10 +475,11 @@ class WordPressSyncService:
         event = SyncEvent(
             event_type=SyncEventType.TEMPLATE_UPDATED,
             template_id=str(webhook_data.get('post_id')),
+            site_id=str(webhook_data.get('site_id', 'master')),
             data=webhook_data,
             timestamp=datetime.now()
         )
-        self.event_queue.append(event)
+        self.event_queue.put(event)
         logger.info(f"Queued template updated event: {event.template_id}")
     
     async def _handle_template_deleted(self, webhook_data: Dict[str, Any]):
@@ -370,10 +487,11 @@ class WordPressSyncService:
         event = SyncEvent(
             event_type=SyncEventType.TEMPLATE_DELETED,
             template_id=str(webhook_data.get('post_id')),
+            site_id=str(webhook_data.get('site_id', 'master')),
             data=webhook_data,
             timestamp=datetime.now()
         )
-        self.event_queue.append(event)
+        self.event_queue.put(event)
         logger.info(f"Queued template deleted event: {event.template_id}")
     
     async def _handle_acf_updated(self, webhook_data: Dict[str, Any]):
@@ -381,10 +499,11 @@ class WordPressSyncService:
         event = SyncEvent(
             event_type=SyncEventType.ACF_UPDATED,
             template_id=str(webhook_data.get('post_id')),
+            site_id=str(webhook_data.get('site_id', 'master')),
             data=webhook_data,
             timestamp=datetime.now()
         )
-        self.event_queue.append(event)
+        self.event_queue.put(event)
         logger.info(f"Queued ACF updated event: {event.template_id}")
     
     async def _handle_media_updated(self, webhook_data: Dict[str, Any]):
@@ -392,10 +511,11 @@ class WordPressSyncService:
         event = SyncEvent(
             event_type=SyncEventType.MEDIA_UPDATED,
             template_id=str(webhook_data.get('post_id')),
+            site_id=str(webhook_data.get('site_id', 'master')),
             data=webhook_data,
             timestamp=datetime.now()
         )
-        self.event_queue.append(event)
+        self.event_queue.put(event)
         logger.info(f"Queued media updated event: {event.template_id}")
     
     # Public API methods
@@ -447,54 +567,104 @@ class WordPressSyncService:
             data={},
             timestamp=datetime.now()
         )
-        self.event_queue.append(event)
+        self.event_queue.put(event)
         logger.info("Queued full sync event")
     
-    async def queue_incremental_sync(self):
-        """Queue incremental sync (only changed templates)"""
+    async def _auth_headers(self, client: httpx.AsyncClient) -> Dict[str, str]:
+        """Authenticate with WordPress Master and return request headers"""
+        auth_response = await client.post(
+            f"{self.wordpress_master_url}/wp-json/jwt-auth/v1/token",
+            json={
+                "username": os.getenv('WP_MASTER_USER'),
+                "password": os.getenv('WP_MASTER_PASSWORD')
+            }
+        )
+        
+        if auth_response.status_code != 200:
+            raise Exception("Failed to authenticate with WordPress Master")
+        
+        token = auth_response.json().get('token')
+        return {"Authorization": f"Bearer {token}"}
+    
+    async def queue_incremental_sync(self, site_id: str = "master", resource: str = "kz_template"):
+        """
+        Queue incremental sync (only changed templates)
+        
+        Walks every page of items modified since the site's persisted
+        watermark, bounded above by the walk start so pages stay stable
+        while items keep changing. The watermark only advances after all
+        changes are queued and journaled.
+        """
+        site_url = self.sites.get(site_id)
+        if not site_url:
+            logger.error(f"Unknown sync site: {site_id}")
+            return
+        
         try:
-            # Get templates modified since last sync
-            since = self.last_full_sync or (datetime.now() - timedelta(hours=24))
+            cursor = self.cursor_store.get(site_id, resource)
+            if cursor.get("modified_after"):
+                since = datetime.fromisoformat(cursor["modified_after"]) - self.cursor_overlap
+                if since.tzinfo is None:
+                    since = since.replace(tzinfo=timezone.utc)
+            else:
+                since = datetime.now(timezone.utc) - timedelta(hours=24)
+            walk_started = datetime.now(timezone.utc)
             
             async with httpx.AsyncClient(timeout=30.0) as client:
-                # Authenticate
-                auth_response = await client.post(
-                    f"{self.wordpress_master_url}/wp-json/jwt-auth/v1/token",
-                    json={
-                        "username": os.getenv('WP_MASTER_USER'),
-                        "password": os.getenv('WP_MASTER_PASSWORD')
-                    }
-                )
-                
-                if auth_response.status_code != 200:
-                    raise Exception("Failed to authenticate for incremental sync")
-                
-                token = auth_response.json().get('token')
-                headers = {"Authorization": f"Bearer {token}"}
+                headers = await self._auth_headers(client)
+                pager = WordPressRESTPager(client, site_url, headers, concurrency=self.page_concurrency)
                 
                 # Get modified templates
-                modified_response = await client.get(
-                    f"{self.wordpress_master_url}/wp-json/wp/v2/kz_template",
-                    headers=headers,
+                walk = await pager.fetch_all(
+                    f"wp/v2/{resource}",
                     params={
                         "modified_after": since.isoformat(),
-                        "per_page": 100
+                        "modified_before": walk_started.isoformat(),
+                        "orderby": "modified",
+                        "order": "asc"
                     }
                 )
-                
-                if modified_response.status_code == 200:
-                    modified_templates = modified_response.json()
-                    
-                    for template_data in modified_templates:
-                        event = SyncEvent(
-                            event_type=SyncEventType.TEMPLATE_UPDATED,
-                            template_id=str(template_data['id']),
-                            data=template_data,
-                            timestamp=datetime.now()
-                        )
-                        self.event_queue.append(event)
-                    
-                    logger.info(f"Queued {len(modified_templates)} templates for incremental sync")
+            
+            for template_data in walk.items:
+                event = SyncEvent(
+                    event_type=SyncEventType.TEMPLATE_UPDATED,
+                    template_id=str(template_data['id']),
+                    site_id=site_id,
+                    data=template_data,
+                    timestamp=datetime.now()
+                )
+                self.event_queue.put(event)
+            
+            # Never move the cursor past changes a restart could still lose
+            await self.event_queue.flush()
+            self.cursor_store.update(
+                site_id,
+                resource,
+                modified_after=walk_started.isoformat()
+            )
+            
+            newest = max(
+                (item.get('modified_gmt') for item in walk.items if item.get('modified_gmt')),
+                default=None
+            )
+            self.sync_metrics[site_id] = {
+                "resource": resource,
+                "last_incremental_sync": datetime.now().isoformat(),
+                "items": len(walk.items),
+                "pages": walk.pages,
+                "requests": walk.requests,
+                "duration_seconds": round(walk.duration, 3),
+                "items_per_second": round(walk.items_per_second, 1),
+                # Age of the newest change seen when it was queued
+                "sync_lag_seconds": round(
+                    (walk_started - datetime.fromisoformat(newest).replace(tzinfo=timezone.utc)).total_seconds(), 1
+                ) if newest else 0.0
+            }
+            
+            logger.info(
+                f"Queued {len(walk.items)} templates for incremental sync of {site_id} "
+                f"({walk.pages} pages, {walk.items_per_second:.0f} items/s)"
+            )
                     
         except Exception as e:
             logger.error(f"Error queuing incremental sync: {str(e)}")
@@ -511,10 +681,20 @@ class WordPressSyncService:
                     "template_id": event.template_id,
                     "timestamp": event.timestamp.isoformat(),
                     "retry_count": event.retry_count,
+                    "coalesced_count": event.coalesced_count,
                     "processed": event.processed
                 }
-                for event in self.event_queue[:10]  # Show only first 10
+                for event in self.event_queue.snapshot(10)  # Show only first 10
             ],
+            "dead_letters": len(self.event_queue.dead_letters),
+            "queue_stats": dict(self.event_queue.stats),
+            "sites": {
+                site_id: {
+                    "cursor": self.cursor_store.get(site_id, "kz_template").get("modified_after"),
+                    **self.sync_metrics.get(site_id, {})
+                }
+                for site_id in self.sites
+            },
             "sync_interval_minutes": self.sync_interval,
             "max_retries": self.max_retries
         }
@@ -0,0 +1,360 @@
+"""
+WP-CLI Batch Blueprint Compiler
+Compiles blueprint deployment steps into a single `wp eval-file` script
+
+Applying a blueprint through one `wp` process per option, plugin, page and
+menu item boots WordPress hundreds of times. The compiler turns the same
+steps into one PHP script that runs inside a single bootstrap:
+
+    - options, pages, front page, menus and permalinks use WordPress APIs
+      directly (update_option, wp_insert_post, wp_update_nav_menu_item, ...)
+    - plugin/theme installs and other commands go through
+      WP_CLI::runcommand(..., ['launch' => false]), which reuses the
+      running process instead of spawning a new one
+
+Every step prints a structured result on its own RESULTS_MARKER line as
+soon as it finishes, so when the session dies (e.g. a PHP fatal) the caller
+still knows exactly which steps were applied. Pages are matched by slug or
+title and menu items by page, so applying a step twice does not duplicate
+content. Each step also knows its equivalent standalone WP-CLI command,
+used as the per-step fallback.
+"""
+
+import base64
+import json
+import shlex
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Callable
+
+RESULTS_MARKER = "@@KENZY_BLUEPRINT_RESULTS@@"
+
+# Essential plugins mapping (blueprint slug -> wordpress.org slug)
+PLUGIN_SLUGS = {
+    "elementor": "elementor",
+    "advanced-custom-fields": "advanced-custom-fields",
+    "contact-form-7": "contact-form-7",
+    "yoast-seo": "wordpress-seo",
+    "woocommerce": "woocommerce",
+    "astra-sites": "astra-sites",
+    "restaurant-reservations": "restaurant-reservations",
+    "appointment-booking": "simply-schedule-appointments",
+    "testimonials": "testimonials-widget"
+}
+
+PLUGIN_OPTIONS = {
+    "elementor": {
+        "elementor_disable_color_schemes": "yes",
+        "elementor_disable_typography_schemes": "yes",
+        "elementor_css_print_method": "internal",
+        "elementor_allow_tracking": ""
+    },
+    "woocommerce": {
+        "woocommerce_onboarding_opt_in": "no",
+        "woocommerce_currency": "BRL",
+        "woocommerce_default_country": "BR:SP",
+        "woocommerce_enable_guest_checkout": "yes"
+    }
+}
+
+THEME_OPTIONS = {
+    "astra": {
+        "astra-settings[page-builder-support]": "elementor",
+        "astra-settings[site-layout]": "ast-full-width-layout",
+        "astra-settings[header-layouts]": "header-main-layout-1"
+    }
+}
+
+
+@dataclass
+class BlueprintStep:
+    """One unit of blueprint work"""
+    kind: str  # option, plugin, theme, page, front_page, menu, permalinks, cli
+    name: str
+    args: Dict[str, Any] = field(default_factory=dict)
+    group: str = ""
+    optional: bool = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"kind": self.kind, "name": self.name, "args": self.args}
+
+    def to_wp_cli(self) -> List[str]:
+        """Equivalent standalone WP-CLI commands (per-step fallback)"""
+        q = shlex.quote
+        if self.kind == "option":
+            return [f"option update {q(self.name)} {q(str(self.args['value']))}"]
+        if self.kind in ("plugin", "theme"):
+            return [f"{self.kind} install {q(self.name)} --activate"]
+        if self.kind == "page":
+            command = (
+                f"post create --post_type=page --post_status=publish --porcelain"
+                f" --post_title={q(self.name)} --post_content={q(self.args.get('content', ''))}"
+            )
+            if self.args.get("slug"):
+                command += f" --post_name={q(self.args['slug'])}"
+            return [command]
+        if self.kind == "permalinks":
+            return [f"rewrite structure {q(self.name)} --hard"]
+        if self.kind == "cli":
+            return [self.name]
+        # front_page and menu steps reference ids created earlier in the run;
+        # they have no faithful one-line equivalent
+        return []
+
+
+def compile_blueprint_steps(
+    blueprint_data: Dict[str, Any],
+    site_config: Dict[str, Any],
+    personalize: Callable[[str, Dict[str, Any]], str]
+) -> List[BlueprintStep]:
+    """Translate a blueprint into the ordered steps of a deployment"""
+    configuration = blueprint_data.get("configuration", {})
+    steps: List[BlueprintStep] = []
+
+    def option(name: str, value: Any, group: str) -> None:
+        steps.append(BlueprintStep("option", name, {"value": value}, group=group))
+
+    # Site basics
+    group = "Site configuration"
+    option("blogname", site_config.get("site_title", "KenzySites Generated Site"), group)
+    option("blogdescription", site_config.get("site_description", "Powered by AI"), group)
+    steps.append(BlueprintStep("permalinks", "/%postname%/", group=group))
+    option("timezone_string", "America/Sao_Paulo", group)
+    option("date_format", "j/m/Y", group)
+    option("time_format", "H:i", group)
+    option("default_comment_status", "closed", group)
+
+    # Plugins
+    group = "Plugin installation"
+    for plugin in configuration.get("plugins", []):
+        steps.append(BlueprintStep(
+            "plugin", PLUGIN_SLUGS.get(plugin, plugin), group=group, optional=True
+        ))
+        for name, value in PLUGIN_OPTIONS.get(plugin, {}).items():
+            option(name, value, group)
+
+    # Theme
+    group = "Theme setup"
+    theme = configuration.get("theme", "astra")
+    steps.append(BlueprintStep("theme", theme, group=group, optional=True))
+    for name, value in THEME_OPTIONS.get(theme, {}).items():
+        option(name, value, group)
+
+    # Pages
+    group = "Content import"
+    front_page = None
+    components = sorted(blueprint_data.get("components", []), key=lambda x: x.get("priority", 0))
+    for component in components:
+        if component.get("type") != "page":
+            continue
+        title = component.get("name", "Untitled Page")
+        meta = component.get("meta", {})
+        steps.append(BlueprintStep("page", title, {
+            "content": personalize(component.get("content", ""), site_config),
+            "slug": meta.get("slug", "")
+        }, group=group, optional=True))
+        if meta.get("is_front_page"):
+            front_page = title
+    if front_page:
+        steps.append(BlueprintStep("front_page", front_page, group=group))
+
+    # Menus
+    group = "Menu configuration"
+    for location, items in configuration.get("menus", {}).items():
+        steps.append(BlueprintStep("menu", f"{location.title()} Menu", {
+            "location": location,
+            "items": list(items)
+        }, group=group, optional=True))
+
+    # Customizer
+    group = "Customizer settings"
+    customizer = configuration.get("customizer", {})
+    for color_name, color_value in customizer.get("colors", {}).items():
+        option(f"astra-settings[{color_name}-color]", color_value, group)
+    for font_type, font_family in customizer.get("fonts", {}).items():
+        option(f"astra-settings[{font_type}-font-family]", font_family, group)
+
+    # Finalization
+    group = "Finalization"
+    steps.append(BlueprintStep("permalinks", "/%postname%/", group=group))
+    steps.append(BlueprintStep("cli", "cache flush", group=group, optional=True))
+    steps.append(BlueprintStep("cli", "media regenerate --yes", group=group, optional=True))
+
+    return steps
+
+
+_PHP_RUNNER = r"""<?php
+// Generated by KenzySites: applies a blueprint in a single WordPress bootstrap
+$kz_steps = json_decode(base64_decode('%(payload)s'), true);
+$kz_pages = array();
+
+function kz_update_option($name, $value) {
+    // "base[key]" updates one key of an array option (e.g. astra-settings)
+    if (preg_match('/^([^\[]+)\[([^\]]+)\]$/', $name, $m)) {
+        $current = get_option($m[1], array());
+        if (!is_array($current)) {
+            $current = array();
+        }
+        $current[$m[2]] = $value;
+        update_option($m[1], $current);
+        return $current[$m[2]];
+    }
+    update_option($name, $value);
+    return $value;
+}
+
+function kz_run_cli($command) {
+    $out = WP_CLI::runcommand($command, array(
+        'launch' => false, 'exit_error' => false, 'return' => 'all'
+    ));
+    if ($out->return_code !== 0) {
+        throw new Exception(trim($out->stderr) ?: "'$command' exited with {$out->return_code}");
+    }
+    return trim($out->stdout);
+}
+
+function kz_page_id($title, $pages) {
+    if (isset($pages[$title])) {
+        return $pages[$title];
+    }
+    $query = new WP_Query(array(
+        'post_type' => 'page', 'title' => $title, 'posts_per_page' => 1, 'fields' => 'ids'
+    ));
+    return $query->posts ? (int) $query->posts[0] : null;
+}
+
+foreach ($kz_steps as $i => $step) {
+    $args = $step['args'];
+    $result = array('index' => $i, 'kind' => $step['kind'], 'name' => $step['name'], 'ok' => true);
+    try {
+        switch ($step['kind']) {
+            case 'option':
+                $result['value'] = kz_update_option($step['name'], $args['value']);
+                break;
+            case 'plugin':
+                if (!array_key_exists($step['name'], get_plugins())) {
+                    $installed = false;
+                    foreach (array_keys(get_plugins()) as $file) {
+                        if (strpos($file, $step['name'] . '/') === 0) { $installed = true; break; }
+                    }
+                    if (!$installed) {
+                        kz_run_cli('plugin install ' . escapeshellarg($step['name']));
+                    }
+                }
+                kz_run_cli('plugin activate ' . escapeshellarg($step['name']));
+                break;
+            case 'theme':
+                if (!wp_get_theme($step['name'])->exists()) {
+                    kz_run_cli('theme install ' . escapeshellarg($step['name']));
+                }
+                switch_theme($step['name']);
+                break;
+            case 'page':
+                $existing = !empty($args['slug'])
+                    ? get_page_by_path($args['slug'], OBJECT, 'page')
+                    : null;
+                $existing_id = $existing ? $existing->ID : kz_page_id($step['name'], $kz_pages);
+                $post = array(
+                    'post_type' => 'page',
+                    'post_status' => 'publish',
+                    'post_title' => $step['name'],
+                    'post_content' => $args['content']
+                );
+                if (!empty($args['slug'])) {
+                    $post['post_name'] = $args['slug'];
+                }
+                if ($existing_id) {
+                    // Applied by an earlier run: update in place
+                    $post['ID'] = $existing_id;
+                    $id = wp_update_post(wp_slash($post), true);
+                } else {
+                    $id = wp_insert_post(wp_slash($post), true);
+                }
+                if (is_wp_error($id)) {
+                    throw new Exception($id->get_error_message());
+                }
+                $kz_pages[$step['name']] = $id;
+                $result['id'] = $id;
+                break;
+            case 'front_page':
+                $id = kz_page_id($step['name'], $kz_pages);
+                if (!$id) {
+                    throw new Exception('Front page not found: ' . $step['name']);
+                }
+                update_option('show_on_front', 'page');
+                update_option('page_on_front', $id);
+                $result['id'] = $id;
+                break;
+            case 'menu':
+                $menu = wp_get_nav_menu_object($step['name']);
+                $menu_id = $menu ? $menu->term_id : wp_create_nav_menu($step['name']);
+                if (is_wp_error($menu_id)) {
+                    throw new Exception($menu_id->get_error_message());
+                }
+                $linked = array();
+                foreach ((array) wp_get_nav_menu_items($menu_id) as $menu_item) {
+                    $linked[(int) $menu_item->object_id] = true;
+                }
+                $added = array();
+                foreach ($args['items'] as $item) {
+                    $page_id = kz_page_id($item, $kz_pages);
+                    if (!$page_id || isset($linked[$page_id])) {
+                        continue;
+                    }
+                    $linked[$page_id] = true;
+                    wp_update_nav_menu_item($menu_id, 0, array(
+                        'menu-item-object-id' => $page_id,
+                        'menu-item-object' => 'page',
+                        'menu-item-type' => 'post_type',
+                        'menu-item-status' => 'publish'
+                    ));
+                    $added[] = $item;
+                }
+                $locations = get_theme_mod('nav_menu_locations', array());
+                $locations[$args['location']] = $menu_id;
+                set_theme_mod('nav_menu_locations', $locations);
+                $result['id'] = $menu_id;
+                $result['items'] = $added;
+                break;
+            case 'permalinks':
+                global $wp_rewrite;
+                $wp_rewrite->set_permalink_structure($step['name']);
+                flush_rewrite_rules(true);
+                break;
+            case 'cli':
+                $result['output'] = kz_run_cli($step['name']);
+                break;
+            default:
+                throw new Exception('Unknown step kind: ' . $step['kind']);
+        }
+    } catch (Throwable $e) {
+        $result['ok'] = false;
+        $result['error'] = $e->getMessage();
+    }
+    // Report each step before starting the next one
+    echo "\n%(marker)s" . json_encode($result) . "\n";
+    flush();
+}
+"""
+
+
+def render_php_script(steps: List[BlueprintStep]) -> str:
+    """Render the single-bootstrap PHP script for `wp eval-file`"""
+    # Base64 keeps arbitrary page content safe inside the PHP literal
+    payload = base64.b64encode(
+        json.dumps([step.to_dict() for step in steps], ensure_ascii=False).encode("utf-8")
+    ).decode("ascii")
+    return _PHP_RUNNER % {"payload": payload, "marker": RESULTS_MARKER}
+
+
+def parse_script_results(stdout: str) -> List[Dict[str, Any]]:
+    """Per-step results reported before the script ended, in step order"""
+    results = []
+    for line in stdout.splitlines():
+        if not line.startswith(RESULTS_MARKER):
+            continue
+        try:
+            results.append(json.loads(line[len(RESULTS_MARKER):]))
+        except json.JSONDecodeError:
+            # Torn line from a session that died mid-write
+            break
+    return results
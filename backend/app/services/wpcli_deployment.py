@@ -13,6 +13,15 @@ from typing import Dict, Any, List, Optional
 from pathlib import Path
 from datetime import datetime
 
+from app.services.command_runner import command_runner
+from app.services.wpcli_batch import (
+    PLUGIN_SLUGS,
+    BlueprintStep,
+    compile_blueprint_steps,
+    parse_script_results,
+    render_php_script
+)
+
 logger = logging.getLogger(__name__)
 
 class WPCLIDeployment:
@@ -26,6 +35,7 @@ class WPCLIDeployment:
         
         # WP-CLI command templates
         self.wp_cli_base = f"docker exec {self.wp_container} wp --path={self.wp_path}"
+        self.wp_cli_stdin_base = f"docker exec -i {self.wp_container} wp --path={self.wp_path}"
         
         # Deployment settings
         self.default_admin_user = "admin"
@@ -35,10 +45,15 @@ class WPCLIDeployment:
     async def deploy_blueprint(
         self, 
         blueprint_data: Dict[str, Any], 
-        site_config: Dict[str, Any]
+        site_config: Dict[str, Any],
+        batched: bool = True
     ) -> Dict[str, Any]:
         """
         Deploy complete blueprint using WP-CLI
+
+        With batched=True every step runs in one `wp eval-file` session;
+        failed steps are retried as standalone commands, and if the batch
+        session itself fails the per-step deployment runs instead.
         """
         
         logger.info(f"🚀 Starting WP-CLI deployment for {blueprint_data.get('name')}")
@@ -58,6 +73,22 @@ class WPCLIDeployment:
             await self._verify_wordpress()
             deployment_result["steps_completed"].append("WordPress verification")
             
+            if batched:
+                batch = await self._deploy_batched(blueprint_data, site_config)
+                if batch is not None:
+                    deployment_result["mode"] = "batched"
+                    deployment_result["step_results"] = batch["results"]
+                    deployment_result["steps_completed"].extend(batch["groups_completed"])
+                    deployment_result["errors"].extend(batch["errors"])
+                    deployment_result["success"] = not batch["errors"]
+                    deployment_time = (datetime.now() - start_time).total_seconds()
+                    deployment_result["deployment_time"] = round(deployment_time, 2)
+                    logger.info(f"✅ Batched WP-CLI deployment completed in {deployment_time:.2f}s")
+                    return deployment_result
+                logger.warning("⚠️ Batched deployment unavailable, falling back to per-step commands")
+            
+            deployment_result["mode"] = "per_step"
+            
             # Step 2: Configure site basics
             await self._configure_site_basics(site_config)
             deployment_result["steps_completed"].append("Site configuration")
@@ -102,6 +133,91 @@ class WPCLIDeployment:
         
         return deployment_result
     
+    async def _deploy_batched(
+        self,
+        blueprint_data: Dict[str, Any],
+        site_config: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Apply all blueprint steps in a single WordPress bootstrap
+
+        Steps report their results as they finish. If the session dies, the
+        step it died in is left to the standalone retry below and a new
+        session continues with the steps after it, so nothing that was
+        already applied runs again. Returns None only when the first session
+        reported nothing at all, so the caller can run the per-step
+        deployment instead.
+        """
+        steps = compile_blueprint_steps(blueprint_data, site_config, self._personalize_content)
+        logger.info(f"📜 Applying {len(steps)} blueprint steps in one WP-CLI session")
+
+        results: List[Dict[str, Any]] = []
+        while len(results) < len(steps):
+            start = len(results)
+            remaining = steps[start:]
+            result = await self._run_wp_command(
+                "eval-file -", ignore_errors=True, stdin=render_php_script(remaining)
+            )
+            reported = parse_script_results(result.stdout)[:len(remaining)]
+            if not reported and not results:
+                logger.warning(f"Batched blueprint session failed: {result.stderr.strip()[:500]}")
+                return None
+            for offset, step_result in enumerate(reported):
+                step_result["index"] = start + offset
+                results.append(step_result)
+            if len(results) < len(steps):
+                # The session died inside this step; retry it on its own
+                step = steps[len(results)]
+                error = result.stderr.strip()[:500] or "WP-CLI session ended during this step"
+                logger.warning(f"Batched blueprint session stopped at {step.kind} '{step.name}': {error}")
+                results.append({
+                    "index": len(results), "kind": step.kind, "name": step.name,
+                    "ok": False, "error": error
+                })
+
+        errors = []
+        failed_groups = set()
+        for step, step_result in zip(steps, results):
+            step_result["group"] = step.group
+            if step_result.get("ok"):
+                continue
+            # Per-step fallback for anything the session could not apply
+            if await self._retry_step(step):
+                step_result.update({"ok": True, "fallback": True})
+                continue
+            message = f"{step.group}: {step.kind} '{step.name}' failed: {step_result.get('error')}"
+            failed_groups.add(step.group)
+            if step.optional:
+                logger.warning(f"⚠️ {message}")
+            else:
+                errors.append(message)
+
+        groups = list(dict.fromkeys(step.group for step in steps))
+        return {
+            "results": results,
+            "groups_completed": [g for g in groups if g not in failed_groups],
+            "errors": errors
+        }
+
+    async def _retry_step(self, step: BlueprintStep) -> bool:
+        """Re-run one step as standalone WP-CLI commands"""
+        if step.kind in ("page", "front_page", "menu"):
+            # A session of its own looks the page/menu up first, so a step
+            # that was applied before the session died is not duplicated
+            result = await self._run_wp_command(
+                "eval-file -", ignore_errors=True, stdin=render_php_script([step])
+            )
+            reported = parse_script_results(result.stdout)
+            return bool(reported) and bool(reported[0].get("ok"))
+        commands = step.to_wp_cli()
+        if not commands:
+            return False
+        for command in commands:
+            result = await self._run_wp_command(command, ignore_errors=True)
+            if result.returncode != 0:
+                return False
+        return True
+    
     async def _verify_wordpress(self):
         """Verify WordPress installation and WP-CLI access"""
         
@@ -184,23 +300,10 @@ class WPCLIDeployment:
         
         logger.info(f"📦 Installing {len(plugins)} plugins...")
         
-        # Essential plugins mapping (slug -> name)
-        plugin_mapping = {
-            "elementor": "elementor",
-            "advanced-custom-fields": "advanced-custom-fields", 
-            "contact-form-7": "contact-form-7",
-            "yoast-seo": "wordpress-seo",
-            "woocommerce": "woocommerce",
-            "astra-sites": "astra-sites",
-            "restaurant-reservations": "restaurant-reservations",
-            "appointment-booking": "simply-schedule-appointments",
-            "testimonials": "testimonials-widget"
-        }
-        
         for plugin_slug in plugins:
             try:
                 # Map to actual plugin slug
-                actual_slug = plugin_mapping.get(plugin_slug, plugin_slug)
+                actual_slug = PLUGIN_SLUGS.get(plugin_slug, plugin_slug)
                 
                 # Check if plugin is already installed
                 check_result = await self._run_wp_command(f"plugin is-installed {actual_slug}")
@@ -463,30 +566,27 @@ class WPCLIDeployment:
         except Exception as e:
             logger.warning(f"⚠️ Finalization warning: {str(e)}")
     
-    async def _run_wp_command(self, command: str, ignore_errors: bool = False) -> subprocess.CompletedProcess:
-        """Run WP-CLI command in Docker container"""
+    async def _run_wp_command(
+        self,
+        command: str,
+        ignore_errors: bool = False,
+        stdin: Optional[str] = None
+    ) -> subprocess.CompletedProcess:
+        """Run WP-CLI command in Docker container (optionally feeding stdin)"""
         
-        full_command = f"{self.wp_cli_base} {command}"
+        base = self.wp_cli_stdin_base if stdin is not None else self.wp_cli_base
+        full_command = f"{base} {command}"
         
         logger.debug(f"Running: {full_command}")
         
         try:
-            # Run command asynchronously
-            process = await asyncio.create_subprocess_shell(
+            # Shared runner: bounded per container, killed on timeout
+            result = (await command_runner.run_shell(
                 full_command,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
+                target=self.wp_container,
+                input=stdin,
                 cwd="/"
-            )
-            
-            stdout, stderr = await process.communicate()
-            
-            result = subprocess.CompletedProcess(
-                args=full_command,
-                returncode=process.returncode,
-                stdout=stdout.decode('utf-8') if stdout else '',
-                stderr=stderr.decode('utf-8') if stderr else ''
-            )
+            )).to_completed_process()
             
             if result.returncode != 0 and not ignore_errors:
                 logger.warning(f"WP-CLI command failed: {command}")
@@ -517,15 +617,15 @@ class WPCLIDeployment:
             
             # Export uploads
             uploads_cmd = f"docker cp {self.wp_container}:{self.wp_path}/wp-content/uploads {export_path}/"
-            await asyncio.create_subprocess_shell(uploads_cmd)
+            await command_runner.run_shell(uploads_cmd, target=self.wp_container, check=True)
             
             # Export themes
             themes_cmd = f"docker cp {self.wp_container}:{self.wp_path}/wp-content/themes {export_path}/"
-            await asyncio.create_subprocess_shell(themes_cmd)
+            await command_runner.run_shell(themes_cmd, target=self.wp_container, check=True)
             
             # Export plugins
             plugins_cmd = f"docker cp {self.wp_container}:{self.wp_path}/wp-content/plugins {export_path}/"
-            await asyncio.create_subprocess_shell(plugins_cmd)
+            await command_runner.run_shell(plugins_cmd, target=self.wp_container, check=True)
             
             # Generate site info
             site_info = {
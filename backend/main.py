@@ -31,10 +31,30 @@ async def lifespan(app: FastAPI):
     
     logger.info("✅ Agno Framework initialized successfully")
     
+    # Pre-provisioned WordPress instances for instant signups
+    from app.services.warm_pool import get_warm_pool, warm_pool_enabled
+    warm_pool = None
+    if warm_pool_enabled():
+        warm_pool = get_warm_pool()
+        await warm_pool.start()
+    
+    # Provisioning runs a previous process left unfinished
+    from app.services.wordpress_provisioner import wordpress_provisioner
+    await wordpress_provisioner.resume_interrupted_provisioning()
+    
+    # Delayed marketing automation emails (every worker follows the shared
+    # timer journal; the one holding the scheduler lock sends)
+    from app.services.marketing_automation_service import marketing_automation_service
+    await marketing_automation_service.start_automation_scheduler()
+    
     yield
     
     # Shutdown
     logger.info("🔄 Shutting down WordPress AI SaaS Backend")
+    await marketing_automation_service.stop_automation_scheduler()
+    if warm_pool is not None:
+        await warm_pool.stop()
+    await wordpress_provisioner.stop_resumed_provisioning()
     await agno_manager.cleanup()
     logger.info("✅ Cleanup completed")
 
@@ -0,0 +1,96 @@
+"""
+Tests for registration when password hashing is saturated
+"""
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+NEW_USER = {
+    "email": "ana@example.com.br",
+    "username": "ana",
+    "password": "Senha!Forte123",
+    "confirm_password": "Senha!Forte123",
+    "accept_terms": True
+}
+
+
+@pytest.fixture
+def auth(monkeypatch):
+    """Auth router over an in-memory database; bcrypt is faked, `busy` sheds verifies"""
+    # The default database URL needs a Postgres driver at import time
+    monkeypatch.setenv("USE_SQLITE", "true")
+    pytest.importorskip("multipart")  # the login form needs python-multipart
+    router = pytest.importorskip("app.api.routers.auth")
+    from app.database import get_db
+    from app.models.user import Base, User
+    from app.services.auth_service import PasswordHashingBusy, auth_service
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+
+    def db():
+        session = Session()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    state = {"busy": False, "verifies": 0}
+
+    async def hash_password(password):
+        return f"fake${password}"
+
+    async def verify_password(password, hashed):
+        state["verifies"] += 1
+        if state["busy"]:
+            raise PasswordHashingBusy(retry_after=2)
+        return hashed == f"fake${password}", None
+
+    # Email validation checks the domain's DNS
+    monkeypatch.setattr(auth_service, "validate_email", lambda email: (True, ""))
+    monkeypatch.setattr(auth_service, "hash_password_async", hash_password)
+    monkeypatch.setattr(auth_service, "verify_password_async", verify_password)
+
+    app = FastAPI()
+    app.include_router(router.router)
+    app.dependency_overrides[get_db] = db
+
+    state.update(client=TestClient(app), users=lambda: Session().query(User).count())
+    return state
+
+
+def test_register_logs_in_without_a_second_hash(auth):
+    auth["busy"] = True  # every verify would be shed with a 503
+
+    response = auth["client"].post("/api/auth/register", json=NEW_USER)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["access_token"] and body["refresh_token"]
+    assert body["user"]["username"] == "ana"
+    assert auth["verifies"] == 0
+    assert auth["users"]() == 1
+
+
+def test_retry_after_success_reports_the_existing_account(auth):
+    auth["client"].post("/api/auth/register", json=NEW_USER)
+
+    again = auth["client"].post("/api/auth/register", json=NEW_USER)
+
+    assert again.status_code == 400
+    assert again.json()["detail"] == "Email already registered"
+
+
+def test_login_is_still_shed_when_hashing_is_saturated(auth):
+    auth["client"].post("/api/auth/register", json=NEW_USER)
+    auth["busy"] = True
+
+    response = auth["client"].post("/api/auth/login", data={"username": "ana", "password": NEW_USER["password"]})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "2"
@@ -0,0 +1,155 @@
+"""
+Tests for the email automation scheduler: retries, workers sharing a journal
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.services.email_service import email_service
+from app.services.marketing_automation_service import MarketingAutomationService
+from app.services.sync_queue import SyncJournal
+
+USER = {"id": "u1", "email": "ana@example.com.br"}
+
+
+@pytest.fixture
+def journal(monkeypatch, tmp_path):
+    path = tmp_path / "automation_timers.jsonl"
+    monkeypatch.setenv("AUTOMATION_TIMER_JOURNAL_PATH", str(path))
+    monkeypatch.setenv("AUTOMATION_TIMER_TICK_SECONDS", "1")
+    monkeypatch.setenv("AUTOMATION_RETRY_BACKOFF_SECONDS", "10")
+    monkeypatch.setenv("AUTOMATION_MAX_SEND_ATTEMPTS", "3")
+    return path
+
+
+@pytest.fixture
+def outbox(monkeypatch):
+    """Sent emails; failures holds how many sends fail before they succeed"""
+    sent = []
+    outbox = {"sent": sent, "failures": 0}
+
+    async def send_email(email):
+        if outbox["failures"] > 0:
+            outbox["failures"] -= 1
+            return {"success": False, "error": "SMTP unavailable"}
+        sent.append(email["to"])
+        return {"success": True}
+
+    monkeypatch.setattr(email_service, "send_email", send_email)
+    return outbox
+
+
+async def welcome_automation(service: MarketingAutomationService):
+    return await service.create_email_automation(
+        name="Welcome", trigger="user_signup", emails=[{"subject": "Bem-vindo"}]
+    )
+
+
+def test_failed_send_is_retried_with_backoff(journal, outbox):
+    outbox["failures"] = 1
+
+    async def run():
+        service = MarketingAutomationService()
+        await welcome_automation(service)
+        await service.trigger_email_automation("user_signup", USER)
+        now = time.time() + 2
+        first = await service.process_due_automation_steps(now)
+        early = await service.process_due_automation_steps(now + 5)
+        retried = await service.process_due_automation_steps(now + 12)
+        await service.stop_automation_scheduler()
+        return first, early, retried, service
+
+    first, early, retried, service = asyncio.run(run())
+
+    assert (first, early, retried) == (0, 0, 1)
+    assert outbox["sent"] == [USER["email"]]
+    assert len(service.automation_timers) == 0
+    assert service._enrollments == {}
+
+
+def test_send_is_abandoned_after_max_attempts(journal, outbox):
+    outbox["failures"] = 100
+
+    async def run():
+        service = MarketingAutomationService()
+        await welcome_automation(service)
+        await service.trigger_email_automation("user_signup", USER)
+        now = time.time() + 2
+        for offset in (0, 11, 32, 100):
+            await service.process_due_automation_steps(now + offset)
+        await service.stop_automation_scheduler()
+        return service
+
+    service = asyncio.run(run())
+
+    # Three attempts use three failures; nothing is left scheduled
+    assert outbox["failures"] == 97
+    assert len(service.automation_timers) == 0
+
+
+def test_only_one_worker_sends_steps_scheduled_by_another(journal, outbox):
+    async def run():
+        leader, other = MarketingAutomationService(), MarketingAutomationService()
+        # Created through the other worker; the leader learns of it from the saved definitions
+        automation = await welcome_automation(other)
+        now = time.time() + 2
+        assert await leader._automation_scheduler_tick(now) == 0  # takes the leader lock
+
+        await other.trigger_email_automation("user_signup", USER)
+        sent = [await other._automation_scheduler_tick(now), await leader._automation_scheduler_tick(now)]
+        await other._automation_scheduler_tick(now)
+
+        for service in (leader, other):
+            await service.stop_automation_scheduler()
+        return sent, leader, other, automation
+
+    sent, leader, other, automation = asyncio.run(run())
+
+    assert sent == [0, 1]
+    assert outbox["sent"] == [USER["email"]]
+    assert leader.email_automations[automation.id].sent == 1
+    # The other worker saw the step complete through the journal
+    assert len(other.automation_timers) == 0
+    assert other._enrollments == {}
+
+
+def test_journal_is_written_off_the_event_loop(journal, monkeypatch):
+    writers = []
+    write = SyncJournal._write
+
+    def recording_write(self, *records):
+        writers.append(threading.current_thread())
+        return write(self, *records)
+
+    monkeypatch.setattr(SyncJournal, "_write", recording_write)
+
+    async def run():
+        service = MarketingAutomationService()
+        await welcome_automation(service)
+        await service.trigger_email_automation("user_signup", USER)
+        return threading.current_thread()
+
+    loop_thread = asyncio.run(run())
+
+    assert writers
+    assert loop_thread not in writers
+
+
+def test_restarted_worker_restores_journaled_steps(journal, outbox):
+    async def enroll():
+        service = MarketingAutomationService()
+        await welcome_automation(service)
+        await service.trigger_email_automation("user_signup", USER)
+
+    asyncio.run(enroll())
+
+    async def restart():
+        service = MarketingAutomationService()
+        sent = await service._automation_scheduler_tick(time.time() + 2)
+        await service.stop_automation_scheduler()
+        return sent
+
+    assert asyncio.run(restart()) == 1
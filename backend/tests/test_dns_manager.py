@@ -0,0 +1,334 @@
+"""
+Tests for batched DNS record changes and propagation checks, against a fake
+Cloudflare API and local fake DNS servers
+"""
+
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+dns_message = pytest.importorskip("dns.message")
+import dns.rcode
+import dns.rrset
+
+from app.services.dns_manager import DNSManager, diff_records
+
+ZONE = "kenzysites.com.br"
+
+
+class FakeCloudflare:
+    """In-memory zone behind the DNS records API (list, batch, single calls)"""
+
+    def __init__(self, records=(), batch=True, per_page=1000):
+        self.records = {}
+        self.batch = batch
+        self.per_page = per_page
+        self.calls = []
+        self._next_id = 0
+        for record in records:
+            self._create(dict(record))
+
+    def _create(self, record):
+        self._next_id += 1
+        record["id"] = f"rec{self._next_id}"
+        self.records[record["id"]] = record
+        return record
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path.split("/dns_records", 1)[1]
+        self.calls.append((request.method, path))
+        if request.method == "GET":
+            name = request.url.params.get("name")
+            page = int(request.url.params.get("page", 1))
+            matching = [r for r in self.records.values() if name is None or r["name"] == name]
+            chunk = matching[(page - 1) * self.per_page:page * self.per_page]
+            total_pages = max(1, -(-len(matching) // self.per_page))
+            return httpx.Response(200, json={
+                "success": True, "result": chunk, "result_info": {"total_pages": total_pages}
+            })
+        if path == "/batch":
+            if not self.batch:
+                return httpx.Response(404, json={"success": False})
+            body = _json(request)
+            for deleted in body.get("deletes", []):
+                self.records.pop(deleted["id"])
+            patches = [self._patch(p["id"], p) for p in body.get("patches", [])]
+            posts = [self._create(dict(p)) for p in body.get("posts", [])]
+            return httpx.Response(200, json={"success": True, "result": {"patches": patches, "posts": posts}})
+        if request.method == "POST":
+            return httpx.Response(200, json={"success": True, "result": self._create(_json(request))})
+        record_id = path.lstrip("/")
+        if request.method == "PATCH":
+            return httpx.Response(200, json={"success": True, "result": self._patch(record_id, _json(request))})
+        if request.method == "DELETE":
+            self.records.pop(record_id)
+            return httpx.Response(200, json={"success": True, "result": {"id": record_id}})
+        return httpx.Response(405)
+
+    def _patch(self, record_id, changes):
+        self.records[record_id].update({k: v for k, v in changes.items() if k != "id"})
+        return self.records[record_id]
+
+    def writes(self):
+        return [call for call in self.calls if call[0] != "GET"]
+
+
+def _json(request):
+    return json.loads(request.content)
+
+
+@pytest.fixture
+def env(monkeypatch):
+    monkeypatch.setenv("CLOUDFLARE_ZONE_ID", "zone1")
+    monkeypatch.setenv("BASE_DOMAIN", ZONE)
+    monkeypatch.setenv("SERVER_IPS", "10.0.0.1,10.0.0.2")
+
+
+def manager_for(cloudflare, **settings):
+    manager = DNSManager(client=httpx.AsyncClient(transport=httpx.MockTransport(cloudflare.handle)))
+    for name, value in settings.items():
+        setattr(manager, name, value)
+    return manager
+
+
+def a_record(name, ip, **extra):
+    return {"type": "A", "name": name, "content": ip, "ttl": 1, "proxied": True, **extra}
+
+
+def test_diff_skips_matching_records_and_updates_changed_ones():
+    existing = [
+        {"id": "1", **a_record(f"acme.{ZONE}", "10.0.0.1")},
+        {"id": "2", **a_record(f"bella.{ZONE}", "10.0.0.1", proxied=False)},
+        {"id": "3", "type": "CNAME", "name": f"www.{ZONE}", "content": f"{ZONE}.", "ttl": 1},
+        {"id": "4", "type": "TXT", "name": ZONE, "content": '"v=spf1 ~all"', "ttl": 3600}
+    ]
+    desired = [
+        a_record(f"ACME.{ZONE}.", "10.0.0.1"),
+        a_record(f"bella.{ZONE}", "10.0.0.1"),
+        {"type": "CNAME", "name": f"www.{ZONE}", "content": ZONE.upper(), "ttl": 1},
+        {"type": "TXT", "name": ZONE, "content": "v=spf1 ~all", "ttl": 3600},
+        a_record(f"nova.{ZONE}", "10.0.0.1"),
+        a_record(f"nova.{ZONE}", "10.0.0.1")  # duplicates are applied once
+    ]
+
+    diff = diff_records(existing, desired)
+
+    assert diff.summary() == {"created": 1, "updated": 1, "deleted": 0, "unchanged": 3}
+    assert [found["id"] for found, _ in diff.update] == ["2"]
+    assert diff.create[0]["name"] == f"nova.{ZONE}"
+
+
+def test_prune_deletes_stale_values_of_managed_names_only():
+    existing = [
+        {"id": "1", **a_record(f"acme.{ZONE}", "10.0.0.1")},
+        {"id": "2", **a_record(f"acme.{ZONE}", "10.0.0.9")},
+        {"id": "3", **a_record(f"other.{ZONE}", "10.0.0.9")}
+    ]
+
+    diff = diff_records(existing, [a_record(f"acme.{ZONE}", "10.0.0.1")], prune=True)
+
+    assert [r["id"] for r in diff.delete] == ["2"]
+    assert diff_records(existing, [a_record(f"acme.{ZONE}", "10.0.0.1")]).delete == []
+
+
+def test_apply_sends_only_the_changes_in_one_batch(env):
+    cloudflare = FakeCloudflare([a_record(f"acme.{ZONE}", "10.0.0.1")])
+    manager = manager_for(cloudflare)
+    desired = [a_record(name, ip) for name in ("acme", "bella", "nova") for ip in ("10.0.0.1", "10.0.0.2")]
+
+    result = asyncio.run(manager.apply_records(desired))
+
+    assert result["success"]
+    assert (result["created"], result["unchanged"]) == (5, 1)
+    assert cloudflare.writes() == [("POST", "/batch")]
+    assert len(cloudflare.records) == 6
+
+    cloudflare.calls.clear()
+    again = asyncio.run(manager.apply_records(desired))
+
+    assert (again["created"], again["updated"], again["unchanged"]) == (0, 0, 6)
+    assert cloudflare.writes() == []
+
+
+def test_large_changes_are_chunked(env):
+    cloudflare = FakeCloudflare(per_page=50)
+    manager = manager_for(cloudflare, batch_size=40)
+    desired = [a_record(f"site{i}", "10.0.0.1") for i in range(100)]
+
+    result = asyncio.run(manager.apply_records(desired))
+
+    assert result["created"] == 100
+    assert cloudflare.writes() == [("POST", "/batch")] * 3
+
+    # A later listing follows pagination
+    assert len(asyncio.run(manager.list_zone_records())) == 100
+
+
+def test_single_calls_are_used_without_the_batch_endpoint(env):
+    cloudflare = FakeCloudflare(
+        [a_record(f"acme.{ZONE}", "10.0.0.1", proxied=False), a_record(f"acme.{ZONE}", "10.0.0.9")],
+        batch=False
+    )
+    manager = manager_for(cloudflare)
+
+    result = asyncio.run(manager.apply_records(
+        [a_record("acme", "10.0.0.1"), a_record("acme", "10.0.0.2")], prune=True
+    ))
+
+    assert result["success"]
+    assert result["created"] == result["updated"] == result["deleted"] == 1
+    methods = sorted(method for method, _ in cloudflare.writes())
+    assert methods == ["DELETE", "PATCH", "POST", "POST"]  # first batch attempt, then singles
+    assert sorted(r["content"] for r in cloudflare.records.values()) == ["10.0.0.1", "10.0.0.2"]
+    assert not manager._batch_supported
+
+
+def test_failed_batch_reports_every_operation(env):
+    def broken(request):
+        if request.method == "GET":
+            return httpx.Response(200, json={"success": True, "result": []})
+        return httpx.Response(500, json={"success": False})
+
+    manager = DNSManager(client=httpx.AsyncClient(transport=httpx.MockTransport(broken)))
+
+    result = asyncio.run(manager.apply_records([a_record("acme", "10.0.0.1"), a_record("bella", "10.0.0.1")]))
+
+    assert not result["success"]
+    assert len(result["errors"]) == 2
+
+
+def test_create_subdomain_is_idempotent(env):
+    cloudflare = FakeCloudflare()
+    manager = manager_for(cloudflare)
+
+    first = asyncio.run(manager.create_subdomain("acme", "client_1"))
+    second = asyncio.run(manager.create_subdomain("acme", "client_1"))
+
+    assert first["success"] and first["domain"] == f"acme.{ZONE}"
+    assert first["ip_address"] == "10.0.0.1"
+    assert second["message"] == "Record already exists"
+    assert second["record_id"] == first["record_id"]
+    assert len(cloudflare.records) == 2
+
+
+def test_delete_subdomain_removes_its_records_in_one_batch(env):
+    cloudflare = FakeCloudflare([
+        a_record(f"acme.{ZONE}", "10.0.0.1"), a_record(f"acme.{ZONE}", "10.0.0.2"),
+        a_record(f"bella.{ZONE}", "10.0.0.1")
+    ])
+    manager = manager_for(cloudflare)
+
+    result = asyncio.run(manager.delete_subdomain("acme"))
+
+    assert result["deleted_records"] == 2
+    assert [r["name"] for r in cloudflare.records.values()] == [f"bella.{ZONE}"]
+    assert cloudflare.writes() == [("POST", "/batch")]
+
+
+class FakeResolver(asyncio.DatagramProtocol):
+    """
+    Local UDP DNS server; answers[name] is a list of IPs or a callable
+    returning one, None means NXDOMAIN
+    """
+
+    def __init__(self, answers, ttl=1, delay=0.0):
+        self.answers = answers
+        self.ttl = ttl
+        self.delay = delay
+        self.queries = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.queries += 1
+        query = dns_message.from_wire(data)
+        response = dns_message.make_response(query)
+        question = query.question[0]
+        name = question.name.to_text().rstrip(".")
+        ips = self.answers.get(name)
+        if callable(ips):
+            ips = ips(self)
+        if ips is None:
+            response.set_rcode(dns.rcode.NXDOMAIN)
+        elif ips:
+            response.answer.append(dns.rrset.from_text(question.name, self.ttl, "IN", "A", *ips))
+        asyncio.get_running_loop().call_later(self.delay, self.transport.sendto, response.to_wire(), addr)
+
+
+async def start_resolvers(*protocols):
+    loop = asyncio.get_running_loop()
+    addresses = []
+    for protocol in protocols:
+        transport, _ = await loop.create_datagram_endpoint(lambda p=protocol: p, local_addr=("127.0.0.1", 0))
+        host, port = transport.get_extra_info("sockname")
+        addresses.append(f"{host}:{port}")
+    return addresses
+
+
+def verify(protocols, domain, **kwargs):
+    async def run():
+        resolvers = await start_resolvers(*protocols)
+        manager = DNSManager(client=httpx.AsyncClient())
+        try:
+            return await manager.verify_dns_propagation(domain, resolvers=resolvers, **kwargs)
+        finally:
+            for protocol in protocols:
+                protocol.transport.close()
+
+    return asyncio.run(run())
+
+
+def test_propagated_when_every_resolver_has_the_expected_answer(env):
+    servers = [FakeResolver({f"acme.{ZONE}": ["10.0.0.1"]}) for _ in range(3)]
+
+    result = verify(servers, f"acme.{ZONE}", expected=["10.0.0.1"])
+
+    assert result["propagated"]
+    assert result["propagated_resolvers"] == 3
+    assert result["attempts"] == 1
+    assert result["is_configured"]
+
+
+def test_only_stale_resolvers_are_asked_again(env):
+    def flips(server):
+        return ["10.0.0.9"] if server.queries == 1 else ["10.0.0.1"]
+
+    fresh = FakeResolver({f"acme.{ZONE}": ["10.0.0.1"]})
+    stale = FakeResolver({f"acme.{ZONE}": flips})
+
+    result = verify([fresh, stale], f"acme.{ZONE}", expected=["10.0.0.1"],
+                    wait_seconds=5, initial_delay=0.05, max_delay=0.1)
+
+    assert result["propagated"]
+    assert result["attempts"] == 2
+    assert (fresh.queries, stale.queries) == (1, 2)
+
+
+def test_quorum_and_deadline(env):
+    servers = [FakeResolver({f"acme.{ZONE}": ["10.0.0.1"]}), FakeResolver({f"acme.{ZONE}": None})]
+
+    quorum = verify(servers, f"acme.{ZONE}", expected=["10.0.0.1"], min_resolvers=1)
+    assert quorum["propagated"]
+
+    started = time.monotonic()
+    everyone = verify([FakeResolver({f"acme.{ZONE}": None})], f"acme.{ZONE}",
+                      wait_seconds=0.3, initial_delay=0.05, max_delay=0.1)
+
+    assert not everyone["propagated"]
+    assert everyone["message"] == "DNS not propagated yet"
+    assert everyone["attempts"] >= 2
+    assert time.monotonic() - started < 1.5
+
+
+def test_resolvers_are_queried_concurrently(env):
+    servers = [FakeResolver({f"acme.{ZONE}": ["10.0.0.1"]}, delay=0.3) for _ in range(4)]
+
+    started = time.monotonic()
+    result = verify(servers, f"acme.{ZONE}")
+
+    assert result["propagated"]
+    assert time.monotonic() - started < 0.9
@@ -0,0 +1,120 @@
+"""
+Tests for landing page A/B tests: the mSPRT stopping rule and the V2 endpoints
+"""
+
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.routers import landing_pages_v2
+from app.services.landing_page_v2_service import LandingPageV2, LandingPageV2Service
+
+
+@pytest.fixture
+def service():
+    service = LandingPageV2Service()
+    page = LandingPageV2(id="lpv2_acme", name="Acme", slug="acme")
+    service.pages[page.id] = page
+    return service
+
+
+def run_traffic(service, visitors, rates, prefix="v"):
+    """Expose `visitors` per variant; every 1/rate-th visitor converts"""
+    async def run():
+        for variant, every in rates.items():
+            for i in range(visitors):
+                visitor = f"{prefix}_{variant}_{i}"
+                await service.record_ab_view("lpv2_acme", visitor, variant)
+                if every and i % every == 0:
+                    await service.record_ab_conversion("lpv2_acme", visitor)
+        return await service.get_ab_test_results("lpv2_acme")
+
+    return asyncio.run(run())
+
+
+def start(service, **kwargs):
+    return asyncio.run(service.start_ab_test("lpv2_acme", ["control", "b"], **kwargs))
+
+
+def test_clear_winner_stops_the_test(service):
+    start(service)
+
+    results = run_traffic(service, 2000, {"control": 20, "b": 7})
+
+    assert results["recommendation"] == "stop_winner"
+    assert results["winner"] == "b"
+    challenger = next(v for v in results["variants"] if v["name"] == "b")
+    assert challenger["significant"]
+    assert challenger["p_value"] < 0.05
+
+
+def test_equal_variants_keep_running(service):
+    start(service)
+
+    results = run_traffic(service, 2000, {"control": 10, "b": 10})
+
+    assert results["recommendation"] == "continue"
+    assert results["winner"] is None
+    assert all(not v.get("significant") for v in results["variants"])
+
+
+def test_visitor_cap_stops_an_inconclusive_test(service):
+    start(service, max_visitors_per_variant=500)
+
+    results = run_traffic(service, 500, {"control": 10, "b": 10})
+
+    assert results["recommendation"] == "stop_inconclusive"
+
+
+def test_page_conversion_rate_follows_recorded_events(service):
+    start(service)
+
+    run_traffic(service, 100, {"control": 10, "b": 5})
+
+    page = service.pages["lpv2_acme"]
+    assert (page.views, page.conversions) == (200, 30)
+    assert page.conversion_rate == pytest.approx(15.0)
+
+
+@pytest.fixture
+def client(service, monkeypatch):
+    monkeypatch.setattr(landing_pages_v2, "landing_page_v2_service", service)
+    app = FastAPI()
+    app.include_router(landing_pages_v2.router, prefix="/api/v2/landing-pages")
+    return TestClient(app)
+
+
+def test_ab_test_endpoints(client):
+    base = "/api/v2/landing-pages/pages/lpv2_acme/ab-test"
+
+    started = client.post(base, json={"variants": ["control", "b"], "traffic_split": [1, 1]})
+    assert started.status_code == 200
+    assert started.json()["ab_test"]["status"] == "running"
+
+    view = client.post(f"{base}/views", json={"visitor_id": "ana", "variant": "b"})
+    assert view.json() == {"success": True, "counted": True}
+    conversion = client.post(f"{base}/conversions", json={"visitor_id": "ana", "value": 99.0})
+    assert conversion.json() == {"success": True, "counted": True}
+
+    results = client.get(base).json()
+    b = next(v for v in results["variants"] if v["name"] == "b")
+    assert (b["visitors"], b["conversions"], b["conversion_value"]) == (1, 1, 99.0)
+
+    stopped = client.post(f"{base}/stop").json()
+    assert stopped["ab_test"]["status"] == "stopped"
+    late = client.post(f"{base}/views", json={"visitor_id": "bia", "variant": "control"})
+    assert late.json()["counted"] is False
+
+
+def test_ab_test_endpoint_errors(client):
+    base = "/api/v2/landing-pages/pages"
+
+    assert client.get(f"{base}/lpv2_acme/ab-test").status_code == 404
+    assert client.post(f"{base}/missing/ab-test", json={"variants": ["a", "b"]}).status_code == 404
+    assert client.post(f"{base}/lpv2_acme/ab-test", json={"variants": ["a"]}).status_code == 400
+
+    client.post(f"{base}/lpv2_acme/ab-test", json={"variants": ["a", "b"]})
+    unknown = client.post(f"{base}/lpv2_acme/ab-test/views", json={"visitor_id": "ana", "variant": "z"})
+    assert unknown.status_code == 400
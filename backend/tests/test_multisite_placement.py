@@ -0,0 +1,97 @@
+"""
+Tests for routing site commands to the network or host a site is placed on
+"""
+
+import asyncio
+import json
+import subprocess
+
+import pytest
+
+from app.services import wordpress_multisite_manager as multisite_module
+from app.services.shared_hosting_provisioner import SharedHostingProvisioner
+from app.services.wordpress_multisite_manager import MultisiteConfig, WordPressMultisiteManager
+
+
+@pytest.fixture
+def commands(monkeypatch):
+    ran = []
+
+    def run(command, **kwargs):
+        ran.append(command)
+        return subprocess.CompletedProcess(command, 0, stdout="", stderr="")
+
+    monkeypatch.setattr(multisite_module.subprocess, "run", run)
+    return ran
+
+
+def make_manager(tmp_path) -> WordPressMultisiteManager:
+    return WordPressMultisiteManager(
+        networks=[
+            MultisiteConfig(network_id="a", wpcli_container="wpcli-a"),
+            MultisiteConfig(network_id="b", wpcli_container="wpcli-b", docker_host="ssh://b.example.com")
+        ],
+        placement_state_path=str(tmp_path / "placement.json")
+    )
+
+
+def place_site(manager: WordPressMultisiteManager, tenant_id: str, site_id: int, network_id: str) -> None:
+    manager.placement.place(tenant_id)
+    manager.placement.move(tenant_id, network_id)
+    manager.placement.tenants[tenant_id].metadata["site_id"] = site_id
+    manager._save_placement()
+
+
+def test_delete_runs_on_the_network_the_site_is_placed_on(tmp_path, commands):
+    manager = make_manager(tmp_path)
+    place_site(manager, "acme", 5, "b")
+
+    assert asyncio.run(manager.delete_site(5))
+
+    assert commands == [[
+        "docker", "-H", "ssh://b.example.com", "exec", "wpcli-b",
+        "wp", "site", "delete", "5", "--yes", "--allow-root"
+    ]]
+    assert "acme" not in manager.placement.tenants
+
+
+def test_delete_of_unknown_placement_is_refused(tmp_path, commands):
+    manager = make_manager(tmp_path)
+
+    assert not asyncio.run(manager.delete_site(5))
+    assert commands == []
+
+
+def test_placement_survives_a_restart(tmp_path, commands):
+    place_site(make_manager(tmp_path), "acme", 5, "b")
+
+    restarted = make_manager(tmp_path)
+
+    assert asyncio.run(restarted.delete_site(5))
+    assert commands[0][4] == "wpcli-b"
+    saved = json.loads((tmp_path / "placement.json").read_text())
+    assert saved["tenants"] == []
+
+
+def test_shared_hosting_refuses_unknown_placement_on_a_fleet(monkeypatch, tmp_path):
+    monkeypatch.setenv("SHARED_HOSTING_HOSTS", json.dumps([{"id": "a"}, {"id": "b"}]))
+    monkeypatch.setenv("SHARED_HOSTING_PLACEMENT_STATE", str(tmp_path / "placement.json"))
+    provisioner = SharedHostingProvisioner()
+    ran = []
+
+    async def run_command(command, host=None):
+        ran.append((command, host.host_id))
+        return ""
+
+    monkeypatch.setattr(provisioner, "_run_command", run_command)
+
+    result = asyncio.run(provisioner.delete_site(7))
+
+    assert not result["success"]
+    assert ran == []
+
+    provisioner.placement.place("acme")
+    provisioner.placement.move("acme", "b")
+    provisioner.placement.tenants["acme"].metadata["site_id"] = 7
+    assert asyncio.run(provisioner.delete_site(7))["success"]
+    assert ran == [(f"{provisioner.wp_cli_path} site delete 7 --yes", "b")]
@@ -0,0 +1,237 @@
+"""
+Tests for the principal cache behind AuthMiddleware: hits, expiry, invalidation
+"""
+
+import asyncio
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.models.user import UserPlan, UserRole
+from app.services import principal_cache as principal_cache_module
+from app.services.principal_cache import Principal, PrincipalCache
+
+
+class FakeClock:
+    """Stands in for the time module; both clocks advance together"""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(principal_cache_module, "time", clock)
+    return clock
+
+
+def principal(user_id=7, plan=UserPlan.FREE):
+    return Principal(id=user_id, username=f"user{user_id}", email=f"user{user_id}@example.com.br",
+                     role=UserRole.USER, plan=plan)
+
+
+class Loader:
+    """Counts loads; `value` is what the database currently returns"""
+
+    def __init__(self, value):
+        self.value = value
+        self.loads = 0
+
+    async def __call__(self):
+        self.loads += 1
+        await asyncio.sleep(0)
+        return self.value
+
+
+def test_repeated_lookups_hit_the_cache(clock):
+    cache, loader = PrincipalCache(ttl=30), Loader(principal())
+
+    async def run():
+        return [await cache.get_or_load("tok1", 7, loader) for _ in range(5)]
+
+    assert asyncio.run(run()) == [principal()] * 5
+    assert loader.loads == 1
+    assert cache.stats()["hits"] == 4
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache, loader = PrincipalCache(ttl=30), Loader(principal())
+
+    asyncio.run(cache.get_or_load("tok1", 7, loader))
+    clock.advance(29)
+    asyncio.run(cache.get_or_load("tok1", 7, loader))
+    assert loader.loads == 1
+
+    loader.value = principal(plan=UserPlan.PROFESSIONAL)
+    clock.advance(2)
+    assert asyncio.run(cache.get_or_load("tok1", 7, loader)).plan == UserPlan.PROFESSIONAL
+    assert loader.loads == 2
+
+
+def test_inactive_users_are_cached_as_none(clock):
+    cache, loader = PrincipalCache(ttl=30), Loader(None)
+
+    assert asyncio.run(cache.get_or_load("tok1", 7, loader)) is None
+    assert asyncio.run(cache.get_or_load("tok1", 7, loader)) is None
+    assert loader.loads == 1
+
+
+def test_invalidating_a_user_drops_all_their_tokens(clock):
+    cache = PrincipalCache(ttl=30)
+    mine, theirs = Loader(principal(7)), Loader(principal(8))
+
+    async def load_all():
+        await cache.get_or_load("tok1", 7, mine)
+        await cache.get_or_load("tok2", 7, mine)
+        await cache.get_or_load("tok3", 8, theirs)
+
+    asyncio.run(load_all())
+    cache.invalidate_user(7)
+    asyncio.run(load_all())
+
+    assert (mine.loads, theirs.loads) == (4, 1)
+
+
+def test_revoked_token_stays_revoked_until_it_expires(clock):
+    cache, loader = PrincipalCache(ttl=30), Loader(principal())
+    asyncio.run(cache.get_or_load("tok1", 7, loader))
+
+    cache.revoke("tok1", expires_at=clock.now + 600)
+
+    assert cache.get("tok1") == (False, None)
+    assert cache.is_revoked("tok1")
+    clock.advance(601)
+    assert not cache.is_revoked("tok1")
+
+
+def test_concurrent_misses_share_one_load(clock):
+    cache, loader = PrincipalCache(ttl=30), Loader(principal())
+
+    async def run():
+        return await asyncio.gather(*[cache.get_or_load("tok1", 7, loader) for _ in range(20)])
+
+    assert asyncio.run(run()) == [principal()] * 20
+    assert loader.loads == 1
+
+
+def test_load_racing_an_invalidation_is_not_stored(clock):
+    cache = PrincipalCache(ttl=30)
+    stale = principal(plan=UserPlan.FREE)
+
+    async def run():
+        release = asyncio.Event()
+
+        async def slow_loader():
+            await release.wait()
+            return stale
+
+        pending = asyncio.ensure_future(cache.get_or_load("tok1", 7, slow_loader))
+        await asyncio.sleep(0)
+        cache.invalidate_user(7)  # e.g. the plan changed while the old row was being read
+        release.set()
+        return await pending
+
+    assert asyncio.run(run()) == stale
+    assert cache.get("tok1") == (False, None)
+
+
+def test_least_recently_used_entries_are_evicted(clock):
+    cache = PrincipalCache(ttl=30, max_entries=2)
+
+    async def run():
+        for token in ("tok1", "tok2"):
+            await cache.get_or_load(token, 7, Loader(principal()))
+        cache.get("tok1")
+        await cache.get_or_load("tok3", 7, Loader(principal()))
+
+    asyncio.run(run())
+
+    assert cache.get("tok1")[0] and cache.get("tok3")[0]
+    assert cache.get("tok2") == (False, None)
+
+
+@pytest.fixture
+def auth(monkeypatch, clock):
+    """AuthMiddleware over a fresh cache; the database is replaced by `users`"""
+    # The default database URL needs a Postgres driver at import time
+    monkeypatch.setenv("USE_SQLITE", "true")
+    middleware = pytest.importorskip("app.middleware.auth_middleware")
+    auth_service_module = pytest.importorskip("app.services.auth_service")
+    service = auth_service_module.auth_service
+
+    cache = PrincipalCache(ttl=30)
+    users = {7: principal(7)}
+    loads = []
+
+    def load_principal(user_id):
+        loads.append(user_id)
+        return users.get(user_id)
+
+    monkeypatch.setattr(auth_service_module, "principal_cache", cache)
+    monkeypatch.setattr(service, "_load_principal", load_principal)
+
+    app = FastAPI()
+    app.add_middleware(middleware.AuthMiddleware)
+
+    @app.get("/api/me")
+    async def me(request: Request):
+        return {"user_id": request.state.user_id, "plan": request.state.user.plan.value}
+
+    client = TestClient(app)
+
+    def get(token):
+        return client.get("/api/me", headers={"Authorization": f"Bearer {token}"})
+
+    return {"get": get, "client": client, "service": service, "cache": cache, "users": users, "loads": loads}
+
+
+def test_middleware_loads_each_token_once_per_ttl(auth, clock):
+    token = auth["service"].create_access_token({"sub": "7"})
+
+    responses = [auth["get"](token) for _ in range(3)]
+
+    assert [r.json()["user_id"] for r in responses] == [7, 7, 7]
+    assert auth["loads"] == [7]
+
+    clock.advance(31)
+    auth["get"](token)
+    assert auth["loads"] == [7, 7]
+
+
+def test_middleware_sees_changes_after_invalidation(auth):
+    token = auth["service"].create_access_token({"sub": "7"})
+    assert auth["get"](token).json()["plan"] == UserPlan.FREE.value
+
+    auth["users"][7] = principal(7, plan=UserPlan.PROFESSIONAL)
+    auth["cache"].invalidate_user(7)
+    assert auth["get"](token).json()["plan"] == UserPlan.PROFESSIONAL.value
+
+    del auth["users"][7]  # deactivated
+    auth["cache"].invalidate_user(7)
+    assert auth["get"](token).status_code == 401
+
+
+def test_middleware_rejects_revoked_and_missing_tokens(auth):
+    service = auth["service"]
+    token = service.create_access_token({"sub": "7"})
+    assert auth["get"](token).status_code == 200
+
+    payload = service.decode_token(token)
+    auth["cache"].revoke(service.token_id(token, payload), payload["exp"])
+    loads = len(auth["loads"])
+
+    assert auth["get"](token).status_code == 401
+    assert len(auth["loads"]) == loads
+    assert auth["client"].get("/api/me").status_code == 401
+    assert auth["get"]("not-a-jwt").status_code == 401
@@ -0,0 +1,100 @@
+"""
+Tests for provisioning checkpoints: cleanup and resuming interrupted runs
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from app.services.process_lock import release_leader_lock
+from app.services.wordpress_provisioner import WordPressProvisioner
+
+
+@pytest.fixture
+def provisioner(monkeypatch, tmp_path):
+    """Development-mode provisioner (no cluster) with checkpoints in tmp_path"""
+    monkeypatch.setenv("PROVISIONING_STATE_DIR", str(tmp_path))
+    provisioner = WordPressProvisioner()
+    assert not provisioner.k8s_config_loaded
+
+    async def ready(client_id):
+        return True
+
+    # Development mode simulates the readiness waits with sleeps
+    monkeypatch.setattr(provisioner, "_wait_for_mysql", ready)
+    monkeypatch.setattr(provisioner, "_wait_for_wordpress", ready)
+    return provisioner
+
+
+def interrupted_run(provisioner: WordPressProvisioner, client_id: str, completed):
+    params = {
+        "business_name": "Acme", "domain": "acme.com.br", "industry": "", "plan": "basic",
+        "user_id": "u1", "template_id": None, "acf_config": None,
+        "credentials": {
+            "client_id": client_id, "mysql_root_password": "r", "mysql_user": f"wp_{client_id}",
+            "mysql_password": "m", "wp_admin_user": "admin", "wp_admin_password": "w",
+            "wp_admin_email": "admin@acme.com.br", "redis_password": "p"
+        }
+    }
+    provisioner.checkpoints.save(client_id, {
+        "run_id": client_id, "params": params, "completed": list(completed), "status": "running"
+    })
+
+
+def resume_all(provisioner: WordPressProvisioner):
+    async def run():
+        pending = await provisioner.resume_interrupted_provisioning()
+        await asyncio.gather(*provisioner._resumed_runs)
+        return pending
+
+    return asyncio.run(run())
+
+
+def test_finished_run_deletes_its_checkpoint(provisioner, tmp_path):
+    result = asyncio.run(provisioner.provision_wordpress("Acme", "acme.com.br", "", "basic", "u1"))
+
+    assert result["status"] == "active"
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_rolled_back_run_deletes_its_checkpoint(provisioner, monkeypatch, tmp_path):
+    async def broken(*args):
+        raise RuntimeError("image pull failed")
+
+    monkeypatch.setattr(provisioner, "_deploy_wordpress", broken)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(provisioner.provision_wordpress("Acme", "acme.com.br", "", "basic", "u1"))
+
+    assert list(tmp_path.glob("*.json")) == []
+
+
+def test_interrupted_run_is_resumed_at_startup(provisioner, monkeypatch, tmp_path):
+    interrupted_run(provisioner, "acme_1", completed=["namespace", "secrets"])
+    created = []
+
+    async def create_namespace(client_id):
+        created.append(client_id)
+
+    monkeypatch.setattr(provisioner, "_create_namespace", create_namespace)
+
+    assert resume_all(provisioner) == ["acme_1"]
+
+    assert created == []  # checkpointed stages are skipped
+    assert not (tmp_path / "acme_1.json").exists()
+
+
+def test_run_held_by_another_worker_is_left_alone(provisioner, tmp_path):
+    interrupted_run(provisioner, "acme_1", completed=["namespace"])
+    held = provisioner.checkpoints.lock("acme_1")
+    assert held is not None
+
+    try:
+        resume_all(provisioner)
+    finally:
+        release_leader_lock(held)
+
+    state = json.loads((tmp_path / "acme_1.json").read_text())
+    assert state["status"] == "running"
+    assert state["completed"] == ["namespace"]
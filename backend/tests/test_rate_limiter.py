@@ -0,0 +1,179 @@
+"""
+Tests for the GCRA rate limiter and RateLimitMiddleware, driven by a fake clock
+"""
+
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.services.rate_limiter import RateLimit, RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def hits(limiter, buckets, count):
+    async def run():
+        return [await limiter.hit(buckets) for _ in range(count)]
+
+    return asyncio.run(run())
+
+
+def test_burst_of_limit_then_rejected(clock):
+    limiter = RateLimiter(clock=clock)
+    buckets = [("ip:1.2.3.4", RateLimit(10, 60))]
+
+    results = hits(limiter, buckets, 11)
+
+    assert [r.allowed for r in results] == [True] * 10 + [False]
+    assert [r.remaining for r in results[:10]] == list(range(9, -1, -1))
+    # One request frees up every period / limit
+    assert results[-1].retry_after == pytest.approx(6.0)
+    assert results[-1].reset_after == pytest.approx(60.0)
+
+
+def test_refill_admits_one_request_per_interval(clock):
+    limiter = RateLimiter(clock=clock)
+    buckets = [("ip:1.2.3.4", RateLimit(10, 60))]
+    hits(limiter, buckets, 10)
+
+    clock.advance(5.9)
+    assert not hits(limiter, buckets, 1)[0].allowed
+
+    clock.advance(0.1)
+    assert [r.allowed for r in hits(limiter, buckets, 2)] == [True, False]
+
+    clock.advance(60)  # fully replenished: a whole burst again
+    assert [r.allowed for r in hits(limiter, buckets, 11)] == [True] * 10 + [False]
+
+
+def test_steady_rate_below_the_limit_is_never_rejected(clock):
+    limiter = RateLimiter(clock=clock)
+    buckets = [("user:7", RateLimit(60, 60))]
+
+    allowed = []
+    for _ in range(500):
+        allowed.extend(r.allowed for r in hits(limiter, buckets, 1))
+        clock.advance(1.0)
+
+    assert all(allowed)
+
+
+def test_rejected_requests_do_not_consume_any_bucket(clock):
+    limiter = RateLimiter(clock=clock)
+    general = ("ip:1.2.3.4", RateLimit(100, 60))
+    login = ("ip:1.2.3.4:/api/auth/login", RateLimit(3, 60))
+
+    results = hits(limiter, [general, login], 5)
+
+    assert [r.allowed for r in results] == [True, True, True, False, False]
+    # The result reports the most restrictive bucket
+    assert results[0].limit == 3
+    # Only the three admitted requests were counted against the general limit
+    assert hits(limiter, [general], 1)[0].remaining == 96
+
+
+def test_buckets_are_independent(clock):
+    limiter = RateLimiter(clock=clock)
+    hits(limiter, [("ip:1.1.1.1", RateLimit(2, 60))], 2)
+
+    assert hits(limiter, [("ip:2.2.2.2", RateLimit(2, 60))], 1)[0].allowed
+    assert not hits(limiter, [("ip:1.1.1.1", RateLimit(2, 60))], 1)[0].allowed
+
+
+def test_local_table_is_bounded(clock):
+    limiter = RateLimiter(clock=clock, max_local_keys=3)
+
+    for i in range(5):
+        hits(limiter, [(f"ip:{i}", RateLimit(1, 60))], 1)
+
+    assert list(limiter._local) == ["ip:2", "ip:3", "ip:4"]
+
+
+class BrokenRedis:
+    """Redis client whose script calls always fail"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def register_script(self, script):
+        async def run(keys, args):
+            self.calls += 1
+            raise ConnectionError("Connection refused")
+        return run
+
+
+def test_redis_errors_fall_back_to_local_limits(clock):
+    redis = BrokenRedis()
+    limiter = RateLimiter(redis_client=redis, clock=clock)
+    buckets = [("ip:1.2.3.4", RateLimit(2, 60))]
+
+    assert [r.allowed for r in hits(limiter, buckets, 3)] == [True, True, False]
+    # Redis is not retried on every request after an error
+    assert redis.calls == 1
+
+    clock.advance(5)
+    hits(limiter, buckets, 1)
+    assert redis.calls == 2
+
+
+@pytest.fixture
+def client(monkeypatch, clock):
+    # The middleware module imports the auth service, whose default database
+    # URL needs a Postgres driver at import time
+    monkeypatch.setenv("USE_SQLITE", "true")
+    middleware = pytest.importorskip("app.middleware.auth_middleware")
+
+    app = FastAPI()
+    app.add_middleware(
+        middleware.RateLimitMiddleware,
+        requests_per_minute=5,
+        route_limits={"/api/auth/login": RateLimit(2, 60)},
+        limiter=RateLimiter(clock=clock)
+    )
+
+    @app.get("/api/sites")
+    async def sites():
+        return {"ok": True}
+
+    @app.post("/api/auth/login")
+    async def login():
+        return {"ok": True}
+
+    return TestClient(app)
+
+
+def test_middleware_rejects_with_retry_after(client, clock):
+    responses = [client.get("/api/sites") for _ in range(6)]
+
+    assert [r.status_code for r in responses] == [200] * 5 + [429]
+    assert responses[0].headers["X-RateLimit-Limit"] == "5"
+    assert responses[0].headers["X-RateLimit-Remaining"] == "4"
+    assert responses[-1].headers["Retry-After"] == "12"
+    assert responses[-1].headers["X-RateLimit-Remaining"] == "0"
+
+    clock.advance(12)
+    assert client.get("/api/sites").status_code == 200
+
+
+def test_middleware_applies_route_limits(client):
+    logins = [client.post("/api/auth/login").status_code for _ in range(3)]
+
+    assert logins == [200, 200, 429]
+    # The rejected login did not use up the general limit
+    assert client.get("/api/sites").headers["X-RateLimit-Remaining"] == "2"
@@ -0,0 +1,128 @@
+"""
+Tests for the watch-based Kubernetes readiness waiter, driven by fake watches
+"""
+
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.readiness import KubernetesReadinessWaiter, ReadinessTimeout
+
+
+def deployment(ready_replicas: int, replicas: int = 1):
+    return SimpleNamespace(
+        metadata=SimpleNamespace(name="wordpress", generation=1),
+        spec=SimpleNamespace(replicas=replicas),
+        status=SimpleNamespace(observed_generation=1, ready_replicas=ready_replicas, conditions=[])
+    )
+
+
+class FakeWatch:
+    """
+    Replays scripted chunks; each stream() call consumes one
+
+    A chunk is a list of events (the stream then ends, like a server-side
+    watch timeout) or an exception to raise. With no chunks left the stream
+    stays idle until stopped or the chunk times out.
+    """
+
+    def __init__(self, chunks, opened):
+        self.chunks = chunks
+        self.opened = opened
+        self.stopped = threading.Event()
+
+    def stream(self, list_func, namespace, timeout_seconds, _request_timeout, **kwargs):
+        self.opened.append(kwargs)
+        if not self.chunks:
+            self.stopped.wait(timeout_seconds)
+            return
+        chunk = self.chunks.pop(0)
+        if isinstance(chunk, Exception):
+            raise chunk
+        for event in chunk:
+            yield event
+
+    def stop(self):
+        self.stopped.set()
+
+
+def make_waiter(chunks):
+    opened = []
+    waiter = KubernetesReadinessWaiter(
+        apps_v1=SimpleNamespace(list_namespaced_deployment=None),
+        core_v1=SimpleNamespace(list_namespaced_pod=None),
+        watch_factory=lambda: FakeWatch(chunks, opened),
+        watch_chunk_seconds=1
+    )
+    return waiter, opened
+
+
+def test_watch_is_reopened_after_the_chunk_ends():
+    waiter, opened = make_waiter([
+        [{"type": "ADDED", "object": deployment(ready_replicas=0)}],
+        [{"type": "MODIFIED", "object": deployment(ready_replicas=1)}]
+    ])
+
+    asyncio.run(waiter.wait_for_deployment("client-acme", "wordpress", timeout=5))
+
+    assert len(opened) == 2
+
+
+def test_watch_is_reopened_after_an_error():
+    waiter, opened = make_waiter([
+        ConnectionResetError("connection reset by peer"),
+        [{"type": "MODIFIED", "object": deployment(ready_replicas=1)}]
+    ])
+
+    asyncio.run(waiter.wait_for_deployment("client-acme", "wordpress", timeout=5))
+
+    assert len(opened) == 2
+
+
+def test_timeout_reports_the_last_state_seen():
+    waiter, _ = make_waiter([[{"type": "ADDED", "object": deployment(ready_replicas=0)}]])
+
+    started = time.monotonic()
+    with pytest.raises(ReadinessTimeout, match="0 replicas ready"):
+        asyncio.run(waiter.wait_for_deployment("client-acme", "wordpress", timeout=0.3))
+
+    assert time.monotonic() - started < 1.0
+
+
+def test_concurrent_waits_do_not_starve_each_other():
+    waits = 12
+    watching = set()
+    lock = threading.Lock()
+    everyone_watching = threading.Event()
+
+    class ClusterWatch(FakeWatch):
+        """Deployments only become ready once every wait is watching"""
+
+        def stream(self, list_func, namespace, timeout_seconds, _request_timeout, **kwargs):
+            if "label_selector" in kwargs:
+                self.stopped.wait(timeout_seconds)
+                return
+            with lock:
+                watching.add(namespace)
+                if len(watching) == waits:
+                    everyone_watching.set()
+            if everyone_watching.wait(timeout_seconds):
+                yield {"type": "MODIFIED", "object": deployment(ready_replicas=1)}
+
+    waiter = KubernetesReadinessWaiter(
+        apps_v1=SimpleNamespace(list_namespaced_deployment=None),
+        core_v1=SimpleNamespace(list_namespaced_pod=None),
+        watch_factory=lambda: ClusterWatch([], []),
+        watch_chunk_seconds=1
+    )
+
+    async def run():
+        return await asyncio.gather(*[
+            waiter.wait_for_deployment(f"client-{i}", "wordpress", timeout=3, label_selector="app=wordpress")
+            for i in range(waits)
+        ])
+
+    assert len(asyncio.run(run())) == waits
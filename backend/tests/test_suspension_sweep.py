@@ -0,0 +1,107 @@
+"""
+Tests for the overdue payment sweep against a fake Asaas API
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services.suspension_service import SuspensionService, SuspensionStatus
+
+
+class FakeAsaas:
+    """Overdue invoices served in pages, like GET /payments?status=OVERDUE"""
+
+    def __init__(self, invoices):
+        self.invoices = invoices
+        self.calls = []
+
+    async def list_payments(self, status=None, offset=0, limit=100):
+        self.calls.append(offset)
+        page = self.invoices[offset:offset + limit]
+        return {
+            "success": True,
+            "payments": page,
+            "has_more": offset + limit < len(self.invoices),
+            "total": len(self.invoices)
+        }
+
+
+def clients(count):
+    return [
+        {
+            "id": f"client_{i:03d}", "name": f"Cliente {i}", "domain": f"c{i}.kenzysites.com.br",
+            "email": f"c{i}@example.com.br", "subscription_id": f"sub_{i:03d}", "status": "active"
+        }
+        for i in range(count)
+    ]
+
+
+def invoices(count, days_overdue=5):
+    due = (datetime.now() - timedelta(days=days_overdue)).date().isoformat()
+    return [
+        {"id": f"pay_{i:03d}", "subscription": f"sub_{i:03d}", "dueDate": due, "value": 49.9}
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def sweep(monkeypatch, tmp_path):
+    """Service over 250 overdue clients; `failing` holds client ids whose warning fails"""
+    asaas = FakeAsaas(invoices(250))
+    service = SuspensionService(asaas_client=asaas, state_dir=tmp_path)
+    service.failing = set()
+    service.warned = []
+
+    async def active_clients():
+        return clients(250)
+
+    async def send_first_warning(site):
+        if site["client_id"] in service.failing:
+            raise ConnectionError("SMTP unavailable")
+        service.warned.append(site["client_id"])
+
+    async def update_site_status(client_id, status):
+        pass
+
+    monkeypatch.setattr(service, "_get_all_active_clients", active_clients)
+    monkeypatch.setattr(service, "_send_first_warning", send_first_warning)
+    monkeypatch.setattr(service, "_update_site_status", update_site_status)
+    return service
+
+
+def test_sweep_pages_every_overdue_invoice(sweep):
+    results = asyncio.run(sweep.check_overdue_payments())
+
+    assert sorted(sweep.asaas.calls) == [0, 100, 200]
+    assert len(results) == 250
+    assert {r["new_status"] for r in results} == {SuspensionStatus.WARNING_SENT.value}
+
+
+def test_failed_sites_are_retried_by_the_next_run(sweep):
+    sweep.failing = {"client_007", "client_123"}
+
+    first = asyncio.run(sweep.check_overdue_payments())
+
+    assert len(sweep.warned) == 248
+    assert {r["client_id"] for r in first if r["new_status"] is None} == sweep.failing
+
+    sweep.failing = set()
+    sweep.warned.clear()
+    second = asyncio.run(sweep.check_overdue_payments())
+
+    assert sorted(sweep.warned) == ["client_007", "client_123"]
+    assert all(r["new_status"] == SuspensionStatus.WARNING_SENT.value for r in second)
+
+
+def test_clean_sweep_is_not_repeated_the_same_day(sweep):
+    asyncio.run(sweep.check_overdue_payments())
+    sweep.warned.clear()
+    calls = len(sweep.asaas.calls)
+
+    results = asyncio.run(sweep.check_overdue_payments())
+
+    assert sweep.warned == []
+    assert len(sweep.asaas.calls) == calls
+    assert len(results) == 250
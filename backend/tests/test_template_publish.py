@@ -0,0 +1,72 @@
+"""
+Tests for publishing a template preview as a WordPress site
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("agno")
+
+from app.api.routers import templates as templates_router
+from app.models.template_models import SitePreview
+
+USER = {"user_id": "user-1", "plan": "basic"}
+
+
+class FakeBackend:
+    def __init__(self, error=None):
+        self.error = error
+        self.provisioned = []
+
+    async def provision(self, plan, region, customer):
+        if self.error:
+            raise self.error
+        self.provisioned.append(customer["domain"])
+        return {"domain": customer["domain"]}
+
+
+@pytest.fixture
+def preview(monkeypatch):
+    monkeypatch.delenv("WARM_POOL_TARGETS", raising=False)
+    monkeypatch.setattr(templates_router, "get_warm_pool", lambda: pytest.fail("pool used without targets"))
+    preview = SitePreview(
+        preview_id="preview_1",
+        customization_id="custom_1",
+        preview_url="https://preview.kenzysites.com/preview_1",
+        expires_at=datetime.now() + timedelta(hours=1)
+    )
+    monkeypatch.setitem(templates_router.preview_storage, preview.preview_id, preview)
+    return preview
+
+
+def publish(preview):
+    async def run():
+        response = await templates_router.publish_preview(preview.preview_id, "acme.com.br", current_user=USER)
+        await asyncio.gather(*templates_router._publish_tasks)
+        return response
+
+    return asyncio.run(run())
+
+
+def test_preview_is_published_once_provisioning_succeeds(monkeypatch, preview):
+    backend = FakeBackend()
+    monkeypatch.setattr(templates_router, "get_pool_backend", lambda: backend)
+
+    response = publish(preview)
+
+    assert response["status"] == "provisioning"
+    assert backend.provisioned == ["acme.com.br"]
+    assert preview.is_published
+    assert preview.publish_status == "active"
+
+
+def test_failed_provisioning_leaves_the_preview_unpublished(monkeypatch, preview):
+    monkeypatch.setattr(templates_router, "get_pool_backend", lambda: FakeBackend(RuntimeError("cluster unreachable")))
+
+    publish(preview)
+
+    assert not preview.is_published
+    assert preview.publish_status == "failed"
+    assert preview.publish_error == "cluster unreachable"
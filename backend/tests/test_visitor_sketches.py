@@ -0,0 +1,172 @@
+"""
+Tests for the HyperLogLog visitor sketches: accuracy against exact counts and merges
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.services.visitor_sketches import HyperLogLog, RealtimeVisitorCounter, UniqueVisitorStore
+
+
+def sketch_of(visitors, precision=12):
+    sketch = HyperLogLog(precision)
+    for visitor in visitors:
+        sketch.add(visitor)
+    return sketch
+
+
+def visitors(start, stop):
+    return [f"visitor-{i}" for i in range(start, stop)]
+
+
+@pytest.mark.parametrize("precision", [10, 12, 14])
+@pytest.mark.parametrize("exact", [50, 1_000, 20_000, 120_000])
+def test_estimate_is_within_the_error_bound(precision, exact):
+    estimate = sketch_of(visitors(0, exact), precision).count()
+
+    # The docstring promises ~95% of estimates within two standard errors;
+    # three keeps a single deterministic sample well inside the bound
+    bound = 3 * HyperLogLog.relative_error(precision)
+    assert abs(estimate - exact) / exact <= bound
+
+
+def test_estimates_across_many_streams_stay_mostly_within_two_errors():
+    precision = 10
+    bound = 2 * HyperLogLog.relative_error(precision)
+    misses = 0
+    for run in range(40):
+        exact = 5_000
+        keys = [f"run{run}-{i}" for i in range(exact)]
+        if abs(sketch_of(keys, precision).count() - exact) / exact > bound:
+            misses += 1
+
+    assert misses <= 6  # ~5% expected, generous for 40 samples
+
+
+def test_repeated_visitors_are_counted_once():
+    once = sketch_of(visitors(0, 3_000))
+    repeated = sketch_of(visitors(0, 3_000) * 5)
+
+    assert repeated.to_bytes() == once.to_bytes()
+
+
+def test_small_counts_are_close_to_exact():
+    sketch = HyperLogLog()
+
+    assert sketch.count() == 0
+    for i, visitor in enumerate(visitors(0, 200), start=1):
+        sketch.add(visitor)
+        assert abs(sketch.count() - i) <= 1
+
+
+def test_sketch_densifies_without_a_jump_in_the_estimate():
+    sketch = HyperLogLog(10)
+    keys = visitors(0, 2_000)
+    previous = 0
+    for visitor in keys:
+        was_sparse = sketch.is_sparse
+        sketch.add(visitor)
+        if was_sparse and not sketch.is_sparse:
+            # The switch keeps the registers, so the estimate is unchanged
+            assert sketch.count() >= previous
+        previous = sketch.count()
+
+    assert not sketch.is_sparse
+    assert sketch.to_bytes() == sketch_of(keys, 10).to_bytes()
+
+
+@pytest.mark.parametrize("left_size, right_size", [
+    (100, 150),        # sparse + sparse
+    (100, 20_000),     # sparse + dense
+    (20_000, 100),     # dense + sparse
+    (20_000, 30_000)   # dense + dense
+])
+def test_merge_equals_the_sketch_of_the_union(left_size, right_size):
+    # The streams overlap by half of the smaller one
+    overlap = min(left_size, right_size) // 2
+    left_keys = visitors(0, left_size)
+    right_keys = visitors(left_size - overlap, left_size - overlap + right_size)
+
+    merged = sketch_of(left_keys).merge(sketch_of(right_keys))
+    union = sketch_of(left_keys + right_keys)
+
+    assert merged.to_bytes() == union.to_bytes()
+    exact = len(set(left_keys) | set(right_keys))
+    assert abs(merged.count() - exact) / exact <= 3 * HyperLogLog.relative_error(12)
+
+
+def test_merge_is_commutative_and_idempotent():
+    a, b = sketch_of(visitors(0, 5_000)), sketch_of(visitors(3_000, 9_000))
+
+    ab = a.copy().merge(b)
+    ba = b.copy().merge(a)
+
+    assert ab.to_bytes() == ba.to_bytes()
+    assert ab.copy().merge(b).to_bytes() == ab.to_bytes()
+    # copy() leaves the source untouched
+    assert a.to_bytes() == sketch_of(visitors(0, 5_000)).to_bytes()
+
+
+def test_merge_rejects_different_precision():
+    with pytest.raises(ValueError):
+        HyperLogLog(12).merge(HyperLogLog(14))
+
+
+def test_serialization_round_trip():
+    for size in (10, 20_000):
+        sketch = sketch_of(visitors(0, size))
+        restored = HyperLogLog.from_bytes(sketch.to_bytes())
+
+        assert restored.count() == sketch.count()
+        assert restored.to_bytes() == sketch.to_bytes()
+
+    with pytest.raises(ValueError):
+        HyperLogLog.from_bytes(bytes([12]) + bytes(10))
+
+
+def test_store_counts_uniques_over_a_range_of_buckets():
+    store = UniqueVisitorStore(precision=12)
+    start = datetime(2026, 10, 1, tzinfo=timezone.utc)
+    exact = set()
+    by_page = {"/": set(), "/produtos": set()}
+
+    # 48 hourly buckets; visitors come back on later hours
+    for hour in range(48):
+        for i in range(hour * 100, hour * 100 + 400):
+            visitor = f"visitor-{i % 6_000}"
+            page = "/produtos" if i % 3 == 0 else "/"
+            store.add("acme", visitor, start + timedelta(hours=hour), {"page": page})
+            exact.add(visitor)
+            by_page[page].add(visitor)
+
+    end = start + timedelta(hours=47)
+    bound = 3 * HyperLogLog.relative_error(12)
+    assert abs(store.unique_visitors("acme", start, end) - len(exact)) / len(exact) <= bound
+
+    breakdown = dict(store.unique_by_dimension("acme", "page", start, end))
+    for page, seen in by_page.items():
+        assert abs(breakdown[page] - len(seen)) / len(seen) <= bound
+
+    first_day = {f"visitor-{i % 6_000}" for hour in range(24) for i in range(hour * 100, hour * 100 + 400)}
+    estimate = store.unique_visitors("acme", start, start + timedelta(hours=23))
+    assert abs(estimate - len(first_day)) / len(first_day) <= bound
+
+
+def test_realtime_counter_drops_slots_outside_the_window():
+    now = [1_000_000.0]
+    counter = RealtimeVisitorCounter(window_seconds=60, slot_seconds=10, clock=lambda: now[0])
+
+    for visitor in visitors(0, 300):
+        counter.add("acme", visitor, {"country": "BR"})
+    now[0] += 30
+    for visitor in visitors(200, 500):
+        counter.add("acme", visitor, {"country": "PT"})
+
+    bound = 3 * HyperLogLog.relative_error(12)
+    assert abs(counter.active_visitors("acme") - 500) / 500 <= bound
+    assert {country for country, _ in counter.snapshot("acme")["breakdown"]["country"]} == {"BR", "PT"}
+
+    now[0] += 40  # the first slot has left the window
+    assert abs(counter.active_visitors("acme") - 300) / 300 <= bound
+    assert [country for country, _ in counter.snapshot("acme")["breakdown"]["country"]] == ["PT"]
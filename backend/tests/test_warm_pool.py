@@ -0,0 +1,135 @@
+"""
+Tests for the warm pool's shared state and leader election
+"""
+
+import asyncio
+
+from app.services.warm_pool import IDLE, PoolBackend, WarmPool, warm_pool_enabled
+
+
+class FakeBackend(PoolBackend):
+    """Instances are dicts; personalization can be slowed down to interleave claims"""
+
+    name = "fake"
+
+    def __init__(self, personalize_delay: float = 0.0):
+        self.personalize_delay = personalize_delay
+        self.personalized = []
+        self.destroyed = []
+
+    async def create(self, instance_id, plan, region):
+        return {"instance_id": instance_id}
+
+    async def personalize(self, instance, customer):
+        await asyncio.sleep(self.personalize_delay)
+        self.personalized.append(instance.instance_id)
+        return {"domain": customer["domain"], "instance_id": instance.instance_id}
+
+    async def provision(self, plan, region, customer):
+        return {"domain": customer["domain"]}
+
+    async def health_check(self, instance):
+        return True
+
+    async def destroy(self, instance):
+        self.destroyed.append(instance.instance_id)
+
+
+def make_pool(tmp_path, backend=None, size=2) -> WarmPool:
+    return WarmPool(
+        backend or FakeBackend(),
+        targets={("basic", "default"): size},
+        state_path=tmp_path / "warm_pool.json"
+    )
+
+
+async def fill(pool: WarmPool) -> None:
+    await pool.replenish()
+    await asyncio.gather(*pool._creating)
+
+
+def test_workers_sharing_state_never_claim_the_same_instance(tmp_path):
+    backend = FakeBackend(personalize_delay=0.01)
+    leader = make_pool(tmp_path, backend)
+    workers = [make_pool(tmp_path, backend) for _ in range(3)]
+
+    async def run():
+        await fill(leader)
+        customers = [{"domain": f"site{i}.example.com"} for i in range(4)]
+        return await asyncio.gather(*[
+            worker.claim("basic", "default", customer)
+            for worker, customer in zip(workers + [leader], customers)
+        ])
+
+    sites = asyncio.run(run())
+
+    claimed = [site["instance_id"] for site in sites if site is not None]
+    assert len(claimed) == 2
+    assert len(set(claimed)) == 2
+    assert sorted(backend.personalized) == sorted(claimed)
+    assert leader.get_status()["pools"]["basic/default"]["idle"] == 0
+
+
+def test_instances_created_by_the_leader_are_claimable_elsewhere(tmp_path):
+    leader = make_pool(tmp_path, size=1)
+    asyncio.run(fill(leader))
+
+    worker = make_pool(tmp_path, size=1)
+
+    assert [i.state for i in worker.instances.values()] == [IDLE]
+    assert asyncio.run(worker.claim("basic", "default", {"domain": "a.example.com"})) is not None
+    assert asyncio.run(leader.claim("basic", "default", {"domain": "b.example.com"})) is None
+
+
+def test_health_check_skips_instances_claimed_by_another_worker(tmp_path):
+    backend = FakeBackend()
+    leader = make_pool(tmp_path, backend, size=1)
+    leader.max_health_failures = 1
+    worker = make_pool(tmp_path, backend, size=1)
+
+    async def unhealthy_while_claimed(instance):
+        # Another worker claims the instance while its check is in flight
+        await worker.claim("basic", "default", {"domain": "a.example.com"})
+        return False
+
+    backend.health_check = unhealthy_while_claimed
+
+    async def run():
+        await fill(leader)
+        return await leader.check_health()
+
+    result = asyncio.run(run())
+
+    assert result["recycled"] == 0
+    assert backend.destroyed == []
+    assert len(backend.personalized) == 1
+
+
+def test_only_one_worker_maintains_the_pool(tmp_path):
+    async def run():
+        first, second = make_pool(tmp_path), make_pool(tmp_path)
+        await first.start()
+        await second.start()
+        running = (first.get_status()["running"], second.get_status()["running"])
+        await first.stop()
+        # The lock is released on stop, so a new leader can take over
+        await second.start()
+        running_after = second.get_status()["leader"]
+        await second.stop()
+        return running, running_after
+
+    running, running_after = asyncio.run(run())
+
+    assert running == (True, False)
+    assert running_after
+
+
+def test_pool_is_disabled_without_targets(monkeypatch):
+    monkeypatch.delenv("WARM_POOL_TARGETS", raising=False)
+    assert not warm_pool_enabled()
+
+    monkeypatch.setenv("WARM_POOL_TARGETS", "basic:br-sp=0")
+    assert not warm_pool_enabled()
+
+    monkeypatch.setenv("WARM_POOL_TARGETS", "basic:br-sp=2")
+    assert warm_pool_enabled()
@@ -0,0 +1,184 @@
+"""
+Tests for the WordPress sync service against a fake WordPress REST API
+"""
+
+import asyncio
+import json
+from functools import partial
+
+import httpx
+import pytest
+
+from app.services import wordpress_sync_service as sync_module
+from app.services.wp_rest_pager import WordPressRESTPager
+from app.services.wordpress_sync_service import WordPressSyncService
+
+MASTER = "https://master.example.com"
+
+
+class FakeWordPress:
+    """Just enough of the WordPress REST API for the sync service"""
+
+    def __init__(self, posts: int = 0):
+        self.posts = {
+            str(i): {
+                "id": i,
+                "title": {"rendered": f"Template {i}"},
+                "excerpt": {"rendered": ""},
+                "content": {"rendered": "<p>content</p>"},
+                "modified_gmt": "2024-01-01T00:00:00"
+            }
+            for i in range(1, posts + 1)
+        }
+        self.failures: dict = {}  # post id -> remaining 503 responses
+        self.shrink_after_page = None  # pages past this answer 400
+        self.requests = []
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        path = request.url.path
+        if path == "/wp-json/jwt-auth/v1/token":
+            return httpx.Response(200, json={"token": "token"})
+        if path == "/wp-json/wp/v2/kz_template":
+            per_page = int(request.url.params["per_page"])
+            page = int(request.url.params["page"])
+            items = list(self.posts.values())
+            total_pages = max(1, -(-len(items) // per_page))
+            if page > total_pages or (self.shrink_after_page and page > self.shrink_after_page):
+                return httpx.Response(400, json={"code": "rest_post_invalid_page_number"})
+            return httpx.Response(
+                200,
+                json=items[(page - 1) * per_page:page * per_page],
+                headers={"X-WP-TotalPages": str(total_pages)}
+            )
+        if path.startswith("/wp-json/wp/v2/kz_template/"):
+            post_id = path.rsplit("/", 1)[1]
+            if self.failures.get(post_id, 0) > 0:
+                self.failures[post_id] -= 1
+                return httpx.Response(503, text="upstream unavailable")
+            if post_id not in self.posts:
+                return httpx.Response(404, json={"code": "rest_post_invalid_id"})
+            return httpx.Response(200, json=self.posts[post_id])
+        if path.startswith("/wp-json/acf/v3/posts/"):
+            return httpx.Response(200, json={"acf": {}})
+        return httpx.Response(404)
+
+
+@pytest.fixture
+def fake_wp(monkeypatch, tmp_path):
+    wordpress = FakeWordPress()
+    transport = httpx.MockTransport(wordpress.handler)
+    monkeypatch.setattr(httpx, "AsyncClient", partial(httpx.AsyncClient, transport=transport))
+    monkeypatch.setenv("WORDPRESS_MASTER_URL", MASTER)
+    monkeypatch.setenv("SYNC_CURSOR_PATH", str(tmp_path / "sync_cursors.json"))
+    monkeypatch.delenv("SYNC_JOURNAL_PATH", raising=False)
+    monkeypatch.setenv("SYNC_COALESCE_MS", "0")
+    monkeypatch.setenv("SYNC_RETRY_BACKOFF_SECONDS", "0.01")
+    monkeypatch.setenv("SYNC_MAX_RETRIES", "3")
+    return wordpress
+
+
+@pytest.fixture
+def saved_templates(monkeypatch):
+    saved = {}
+
+    async def save(template):
+        saved[template.id] = template
+        return True
+
+    monkeypatch.setattr(sync_module.template_repository, "create_template", save)
+    monkeypatch.setattr(sync_module.template_repository, "update_template", save)
+    return saved
+
+
+def sync_webhook(event_type: str, post_id: int) -> WordPressSyncService:
+    async def run():
+        service = WordPressSyncService()
+        service.event_queue.start()
+        await service.handle_webhook(event_type, {"post_id": post_id})
+        await service.event_queue.join(timeout=5)
+        await service.event_queue.stop()
+        return service
+
+    return asyncio.run(run())
+
+
+def test_restart_between_enqueue_and_drain_keeps_changes(fake_wp, tmp_path):
+    fake_wp.posts.update(FakeWordPress(posts=250).posts)
+
+    async def enqueue_then_crash():
+        service = WordPressSyncService()
+        await service.queue_incremental_sync()
+        # The process dies here: the workers never drained the queue
+        return service.cursor_store.get("master", "kz_template")
+
+    cursor = asyncio.run(enqueue_then_crash())
+    assert cursor.get("modified_after")
+
+    restarted = WordPressSyncService()
+
+    queued = {event.template_id for event in restarted.event_queue.snapshot(limit=1000)}
+    assert queued == {str(i) for i in range(1, 251)}
+    saved = json.loads((tmp_path / "sync_cursors.json").read_text())
+    assert saved["master"]["kz_template"]["modified_after"] == cursor["modified_after"]
+
+
+def test_failed_fetch_is_retried_until_it_succeeds(fake_wp, saved_templates):
+    fake_wp.posts.update(FakeWordPress(posts=7).posts)
+    fake_wp.failures["7"] = 2
+
+    service = sync_webhook("post_updated", 7)
+
+    assert "wp_7" in saved_templates
+    assert service.event_queue.stats["retried"] == 2
+    assert not service.event_queue.dead_letters
+
+
+def test_fetch_failing_past_max_retries_is_dead_lettered(fake_wp, saved_templates):
+    fake_wp.posts.update(FakeWordPress(posts=7).posts)
+    fake_wp.failures["7"] = 100
+
+    service = sync_webhook("post_created", 7)
+
+    assert saved_templates == {}
+    [dead] = service.event_queue.dead_letters
+    assert dead["item"]["template_id"] == "7"
+    assert dead["item"]["retry_count"] == 3
+    assert "HTTP 503" in dead["error"]
+
+
+def test_deleted_post_is_skipped_without_retry(fake_wp, saved_templates):
+    service = sync_webhook("post_updated", 42)
+
+    assert saved_templates == {}
+    assert service.event_queue.stats["processed"] == 1
+    assert service.event_queue.stats["retried"] == 0
+
+
+def fetch_templates():
+    async def run():
+        async with httpx.AsyncClient() as client:
+            pager = WordPressRESTPager(client, MASTER, concurrency=2)
+            return await pager.fetch_all("wp/v2/kz_template")
+
+    return asyncio.run(run())
+
+
+def test_pager_walks_every_page(fake_wp):
+    fake_wp.posts.update(FakeWordPress(posts=250).posts)
+
+    walk = fetch_templates()
+
+    assert [item["id"] for item in walk.items] == list(range(1, 251))
+    assert walk.pages == 3
+    assert walk.requests == 3
+    assert {r.url.params["per_page"] for r in fake_wp.requests} == {"100"}
+
+
+def test_pager_stops_when_the_collection_shrinks_mid_walk(fake_wp):
+    fake_wp.posts.update(FakeWordPress(posts=250).posts)
+    fake_wp.shrink_after_page = 2
+
+    walk = fetch_templates()
+
+    assert len(walk.items) == 200
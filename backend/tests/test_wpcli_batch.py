@@ -0,0 +1,147 @@
+"""
+Tests for the WP-CLI batch compiler: step compilation, quoting, result parsing
+"""
+
+import base64
+import json
+import re
+import shlex
+
+from app.services.wpcli_batch import (
+    RESULTS_MARKER,
+    BlueprintStep,
+    compile_blueprint_steps,
+    parse_script_results,
+    render_php_script
+)
+
+BLUEPRINT = {
+    "configuration": {
+        "plugins": ["elementor", "yoast-seo"],
+        "theme": "astra",
+        "menus": {"primary": ["Início", "Contato"]},
+        "customizer": {"colors": {"primary": "#ff6600"}, "fonts": {"body": "Inter"}}
+    },
+    "components": [
+        {"type": "page", "name": "Contato", "priority": 2, "content": "Fale com {business}",
+         "meta": {"slug": "contato"}},
+        {"type": "page", "name": "Início", "priority": 1, "content": "<h1>{business}</h1>",
+         "meta": {"slug": "inicio", "is_front_page": True}},
+        {"type": "widget", "name": "Sidebar", "priority": 0}
+    ]
+}
+
+SITE = {"site_title": "Padaria do João", "business": "Padaria do João"}
+
+
+def personalize(content, site_config):
+    return content.replace("{business}", site_config["business"])
+
+
+def compiled():
+    return compile_blueprint_steps(BLUEPRINT, SITE, personalize)
+
+
+def test_blueprint_compiles_to_ordered_steps():
+    steps = compiled()
+    kinds = [step.kind for step in steps]
+
+    assert steps[0].to_dict() == {"kind": "option", "name": "blogname", "args": {"value": "Padaria do João"}}
+    # Plugins are installed before the theme, pages before the front page and menus
+    assert kinds.index("plugin") < kinds.index("theme") < kinds.index("page")
+    assert kinds.index("page") < kinds.index("front_page") < kinds.index("menu")
+    assert [s.name for s in steps if s.kind == "plugin"] == ["elementor", "wordpress-seo"]
+    assert [s.name for s in steps if s.kind == "page"] == ["Início", "Contato"]
+    assert [s.name for s in steps if s.kind == "front_page"] == ["Início"]
+    assert steps[-1].to_dict()["name"] == "media regenerate --yes"
+
+
+def test_plugin_theme_and_customizer_options_are_compiled():
+    options = {s.name: s.args["value"] for s in compiled() if s.kind == "option"}
+
+    assert options["elementor_css_print_method"] == "internal"
+    assert options["astra-settings[site-layout]"] == "ast-full-width-layout"
+    assert options["astra-settings[primary-color]"] == "#ff6600"
+    assert options["astra-settings[body-font-family]"] == "Inter"
+
+
+def test_page_content_is_personalized():
+    pages = {s.name: s.args for s in compiled() if s.kind == "page"}
+
+    assert pages["Início"] == {"content": "<h1>Padaria do João</h1>", "slug": "inicio"}
+    assert pages["Contato"]["content"] == "Fale com Padaria do João"
+
+
+def test_menu_step_keeps_its_items_and_location():
+    menu = next(s for s in compiled() if s.kind == "menu")
+
+    assert menu.name == "Primary Menu"
+    assert menu.args == {"location": "primary", "items": ["Início", "Contato"]}
+    assert menu.optional
+
+
+def test_fallback_commands_quote_their_arguments():
+    hostile = "O'Brien; rm -rf / $(whoami)"
+    option = BlueprintStep("option", "blogname", {"value": hostile})
+    page = BlueprintStep("page", "Sobre nós", {"content": "<p class=\"x\">it's</p>", "slug": "sobre"})
+
+    [option_command] = option.to_wp_cli()
+    [page_command] = page.to_wp_cli()
+
+    assert shlex.split(option_command) == ["option", "update", "blogname", hostile]
+    argv = shlex.split(page_command)
+    assert "--post_title=Sobre nós" in argv
+    assert "--post_content=<p class=\"x\">it's</p>" in argv
+    assert "--post_name=sobre" in argv
+
+
+def test_steps_without_a_standalone_command_have_no_fallback():
+    assert BlueprintStep("front_page", "Início").to_wp_cli() == []
+    assert BlueprintStep("menu", "Primary Menu", {"location": "primary", "items": []}).to_wp_cli() == []
+    assert BlueprintStep("cli", "cache flush").to_wp_cli() == ["cache flush"]
+
+
+def test_script_embeds_steps_safely():
+    steps = [
+        BlueprintStep("page", "Início", {"content": "'); system('id'); //\n<?php ?>", "slug": ""}),
+        BlueprintStep("option", "blogname", {"value": "Padaria do João"})
+    ]
+
+    script = render_php_script(steps)
+    payload = re.search(r"base64_decode\('([A-Za-z0-9+/=]*)'\)", script).group(1)
+
+    assert json.loads(base64.b64decode(payload)) == [step.to_dict() for step in steps]
+    assert "system('id')" not in script
+    assert RESULTS_MARKER in script
+
+
+def test_results_report_success_and_failure_per_step():
+    stdout = "\n".join([
+        "Deprecated: something noisy",
+        RESULTS_MARKER + json.dumps({"index": 0, "kind": "option", "name": "blogname", "ok": True}),
+        "Success: Installed 1 of 1 plugins.",
+        RESULTS_MARKER + json.dumps({"index": 1, "kind": "plugin", "name": "elementor", "ok": False,
+                                     "error": "Download failed"}),
+        ""
+    ])
+
+    results = parse_script_results(stdout)
+
+    assert [r["index"] for r in results] == [0, 1]
+    assert results[0]["ok"] is True
+    assert results[1] == {"index": 1, "kind": "plugin", "name": "elementor", "ok": False,
+                          "error": "Download failed"}
+
+
+def test_results_stop_at_a_torn_line():
+    stdout = "\n".join([
+        RESULTS_MARKER + json.dumps({"index": 0, "kind": "option", "name": "blogname", "ok": True}),
+        RESULTS_MARKER + '{"index": 1, "kind": "pa',
+        "PHP Fatal error:  Allowed memory size exhausted"
+    ])
+
+    assert [r["index"] for r in parse_script_results(stdout)] == [0]
+
+
+def test_no_results_when_the_script_never_ran():
+    assert parse_script_results("Error: This does not seem to be a WordPress installation.") == []